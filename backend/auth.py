@@ -3,18 +3,26 @@ from typing import Optional
 from sqlmodel import Session
 from .database import get_session
 from .models import User
+from .core.sso_sessions import sso_sessions
 
 from passlib.context import CryptContext
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# password_hash marker for accounts that only sign in through CAS
+SSO_PASSWORD_HASH = "SSO_USER"
+
 def verify_password(plain_password, hashed_password):
+    if hashed_password == SSO_PASSWORD_HASH:
+        return False
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password):
     return pwd_context.hash(password)
 
 COOKIE_NAME = "user_id"
+# Token of the local session a CAS login opened (see core/sso_sessions.py)
+SSO_COOKIE_NAME = "sso_session"
 
 def create_access_token(data: dict):
     """
@@ -34,13 +42,27 @@ def get_current_user(request: Request, session: Session = Depends(get_session))
     user = session.get(User, int(user_id))
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+    if not _session_live(request, session, user):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Session ended")
     return user
 
 def get_current_user_optional(request: Request, session: Session = Depends(get_session)) -> Optional[User]:
     user_id = request.cookies.get("user_id")
     if not user_id:
         return None
-    return session.get(User, int(user_id))
+    user = session.get(User, int(user_id))
+    if user and not _session_live(request, session, user):
+        return None
+    return user
+
+def _session_live(request: Request, session: Session, user: User) -> bool:
+    token = request.cookies.get(SSO_COOKIE_NAME)
+    found = sso_sessions.lookup(session, token) if token else None
+    if found is None or found[0] != user.id:
+        # No CAS session of this user (a leftover one of another account is ignored). Accounts that can
+        # only sign in through CAS need one that single logout has not ended.
+        return user.password_hash != SSO_PASSWORD_HASH
+    return found[1]
 
 def get_current_active_user(user: User = Depends(get_current_user)) -> User:
     return user
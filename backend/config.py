@@ -0,0 +1,111 @@
+import os
+
+# Runtime settings (override via environment variables)
+
+# "development" keeps template auto-reload on; "production" turns it off
+ENV = os.environ.get("ETRAP_ENV", "development")
+IS_PRODUCTION = ENV == "production"
+
+DATA_DIR = os.environ.get("ETRAP_DATA_DIR", "data")
+# Signs short-lived tokens (e.g. profiling). Dev default; set a real secret in production.
+DEV_SECRET_KEY = "etrap-dev-secret"
+SECRET_KEY = os.environ.get("ETRAP_SECRET_KEY", DEV_SECRET_KEY)
+DATABASE_URL = os.environ.get("ETRAP_DATABASE_URL", f"sqlite:///{DATA_DIR}/database.db")
+
+# CAS (SWUFE unified auth). The service URL must match what is registered with the school CAS.
+CAS_SERVER_URL = os.environ.get("ETRAP_CAS_SERVER_URL", "https://authserver.swufe.edu.cn/authserver")
+CAS_SERVICE_URL = os.environ.get("ETRAP_CAS_SERVICE_URL", "http://192.168.77.87/resource")
+# Ticket validation protocol: "3.0" (/p3/serviceValidate, releases attributes) or "2.0" (/serviceValidate)
+CAS_VERSION = os.environ.get("ETRAP_CAS_VERSION", "3.0")
+# CAS attributes -> User fields ("field=attr|attr,..."), see backend/core/cas_provisioning.py
+CAS_ATTRIBUTE_MAP = os.environ.get(
+    "ETRAP_CAS_ATTRIBUTE_MAP",
+    "name=name|cn|displayName,email=email|mail,phone=phone|mobile|telephoneNumber,department=department|ou")
+# Lifetime of a CAS login's local session (seconds), and the upper bound on how long another worker
+# keeps accepting a session ended by CAS single logout
+SSO_SESSION_TTL = int(os.environ.get("ETRAP_SSO_SESSION_TTL", "1800"))
+SSO_SESSION_REFRESH = float(os.environ.get("ETRAP_SSO_SESSION_REFRESH", "2"))
+
+# Templates
+TEMPLATE_CACHE_DIR = os.environ.get("ETRAP_TEMPLATE_CACHE_DIR", os.path.join(DATA_DIR, "cache", "templates"))
+PRECOMPILE_TEMPLATES = os.environ.get("ETRAP_PRECOMPILE_TEMPLATES", "1" if IS_PRODUCTION else "0") == "1"
+
+# i18n: optional directory of <lang>.json or <lang>/LC_MESSAGES/messages.mo catalogs
+LOCALE_DIR = os.environ.get("ETRAP_LOCALE_DIR")
+
+# Per-user application state cache for the /resource catalog (TTL in seconds, 0 disables)
+APP_STATE_CACHE_SIZE = int(os.environ.get("ETRAP_APP_STATE_CACHE_SIZE", "4096"))
+APP_STATE_CACHE_TTL = float(os.environ.get("ETRAP_APP_STATE_CACHE_TTL", "30"))
+
+# Metrics: optional bearer token so Prometheus can scrape /metrics without an admin session
+METRICS_TOKEN = os.environ.get("ETRAP_METRICS_TOKEN", "")
+
+# Per-request profiling (middleware is only installed when enabled)
+PROFILING_ENABLED = os.environ.get("ETRAP_PROFILING", "0") == "1"
+PROFILE_SAMPLE_RATE = float(os.environ.get("ETRAP_PROFILE_SAMPLE_RATE", "0"))
+PROFILE_PATHS = tuple(p for p in os.environ.get("ETRAP_PROFILE_PATHS", "/admin").split(",") if p)
+PROFILE_INTERVAL = float(os.environ.get("ETRAP_PROFILE_INTERVAL", "0.001"))
+PROFILE_KEEP = int(os.environ.get("ETRAP_PROFILE_KEEP", "50"))
+PROFILE_DIR = os.environ.get("ETRAP_PROFILE_DIR", os.path.join(DATA_DIR, "profiles"))
+
+# Audit log: "async" batches APPLY/DOWNLOAD events through a background writer, "sync" writes
+# every event in the request transaction. Admin actions are always written synchronously.
+AUDIT_MODE = os.environ.get("ETRAP_AUDIT_MODE", "async")
+AUDIT_QUEUE_SIZE = int(os.environ.get("ETRAP_AUDIT_QUEUE_SIZE", "10000"))
+AUDIT_BATCH_SIZE = int(os.environ.get("ETRAP_AUDIT_BATCH_SIZE", "500"))
+AUDIT_FLUSH_INTERVAL = float(os.environ.get("ETRAP_AUDIT_FLUSH_INTERVAL", "0.5"))
+# Audit rows older than this many days are moved to monthly gzipped JSONL archives by scripts/archive_audit.py
+AUDIT_RETENTION_DAYS = int(os.environ.get("ETRAP_AUDIT_RETENTION_DAYS", "180"))
+AUDIT_ARCHIVE_DIR = os.environ.get("ETRAP_AUDIT_ARCHIVE_DIR", os.path.join(DATA_DIR, "audit_archive"))
+
+# API gateway (/api/v1/proxy/{resource_id}/...): pooled upstream connections per worker.
+# The read timeout bounds the gap between streamed chunks, not the whole response.
+GATEWAY_MAX_CONNECTIONS = int(os.environ.get("ETRAP_GATEWAY_MAX_CONNECTIONS", "200"))
+GATEWAY_MAX_KEEPALIVE = int(os.environ.get("ETRAP_GATEWAY_MAX_KEEPALIVE", "50"))
+GATEWAY_CONNECT_TIMEOUT = float(os.environ.get("ETRAP_GATEWAY_CONNECT_TIMEOUT", "5"))
+GATEWAY_READ_TIMEOUT = float(os.environ.get("ETRAP_GATEWAY_READ_TIMEOUT", "300"))
+# Upstream circuit breaker: skip an upstream for COOLDOWN seconds once at least MIN_REQUESTS calls
+# within WINDOW seconds failed at ERROR_RATE or more
+GATEWAY_BREAKER_ERROR_RATE = float(os.environ.get("ETRAP_GATEWAY_BREAKER_ERROR_RATE", "0.5"))
+GATEWAY_BREAKER_MIN_REQUESTS = int(os.environ.get("ETRAP_GATEWAY_BREAKER_MIN_REQUESTS", "10"))
+GATEWAY_BREAKER_WINDOW = float(os.environ.get("ETRAP_GATEWAY_BREAKER_WINDOW", "30"))
+GATEWAY_BREAKER_COOLDOWN = float(os.environ.get("ETRAP_GATEWAY_BREAKER_COOLDOWN", "10"))
+# Gateway response cache (resources opt in via config["response_cache"]): per-worker memory LRU,
+# spilling to GATEWAY_CACHE_DIR up to GATEWAY_CACHE_DISK_BYTES (0 keeps it in memory only)
+GATEWAY_CACHE_MEMORY_BYTES = int(os.environ.get("ETRAP_GATEWAY_CACHE_MEMORY_BYTES", str(64 * 1024 * 1024)))
+GATEWAY_CACHE_DISK_BYTES = int(os.environ.get("ETRAP_GATEWAY_CACHE_DISK_BYTES", str(512 * 1024 * 1024)))
+GATEWAY_CACHE_DIR = os.environ.get("ETRAP_GATEWAY_CACHE_DIR", os.path.join(DATA_DIR, "cache", "gateway"))
+# Upper bound on how long another worker keeps accepting a revoked gateway key (seconds)
+GATEWAY_KEY_REFRESH = float(os.environ.get("ETRAP_GATEWAY_KEY_REFRESH", "2"))
+# Gateway token usage is applied to the database in batches this often (seconds); usage not yet
+# written is journaled under METERING_DIR and replayed after a crash
+METERING_FLUSH_INTERVAL = float(os.environ.get("ETRAP_METERING_FLUSH_INTERVAL", "1"))
+METERING_DIR = os.environ.get("ETRAP_METERING_DIR", os.path.join(DATA_DIR, "metering"))
+
+# Rate limits ("<count>/<s|min|h>", optionally ", burst=<n>"; empty disables): a token bucket per
+# user for apply and download, per client IP for password login and per API key for the gateway.
+# "sqlite" shares the buckets between the workers of one host through RATE_LIMIT_DB.
+RATE_LIMIT_BACKEND = os.environ.get("ETRAP_RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_DB = os.environ.get("ETRAP_RATE_LIMIT_DB", os.path.join(DATA_DIR, "ratelimit.db"))
+RATE_LIMIT_APPLY = os.environ.get("ETRAP_RATE_LIMIT_APPLY", "30/min")
+RATE_LIMIT_DOWNLOAD = os.environ.get("ETRAP_RATE_LIMIT_DOWNLOAD", "60/min")
+RATE_LIMIT_LOGIN = os.environ.get("ETRAP_RATE_LIMIT_LOGIN", "20/min")
+RATE_LIMIT_GATEWAY = os.environ.get("ETRAP_RATE_LIMIT_GATEWAY", "1200/min, burst=100")
+
+# Approval notifications: written to an outbox with the status change and delivered in batches by a
+# background dispatcher. Email is enabled by NOTIFY_SMTP_HOST, SMS by NOTIFY_SMS_URL (an HTTP gateway
+# taking {"messages": [{"to", "text"}]}). Failed deliveries are retried with exponential backoff from
+# NOTIFY_RETRY_BASE up to NOTIFY_RETRY_MAX seconds, NOTIFY_MAX_ATTEMPTS times in all.
+NOTIFY_SMTP_HOST = os.environ.get("ETRAP_NOTIFY_SMTP_HOST", "")
+NOTIFY_SMTP_PORT = int(os.environ.get("ETRAP_NOTIFY_SMTP_PORT", "25"))
+NOTIFY_SMTP_USER = os.environ.get("ETRAP_NOTIFY_SMTP_USER", "")
+NOTIFY_SMTP_PASSWORD = os.environ.get("ETRAP_NOTIFY_SMTP_PASSWORD", "")
+NOTIFY_SMTP_STARTTLS = os.environ.get("ETRAP_NOTIFY_SMTP_STARTTLS", "0") == "1"
+NOTIFY_SENDER = os.environ.get("ETRAP_NOTIFY_SENDER", "etrap-noreply@swufe.edu.cn")
+NOTIFY_SMS_URL = os.environ.get("ETRAP_NOTIFY_SMS_URL", "")
+NOTIFY_SMS_TOKEN = os.environ.get("ETRAP_NOTIFY_SMS_TOKEN", "")
+NOTIFY_BATCH_SIZE = int(os.environ.get("ETRAP_NOTIFY_BATCH_SIZE", "100"))
+NOTIFY_POLL_INTERVAL = float(os.environ.get("ETRAP_NOTIFY_POLL_INTERVAL", "5"))
+NOTIFY_MAX_ATTEMPTS = int(os.environ.get("ETRAP_NOTIFY_MAX_ATTEMPTS", "8"))
+NOTIFY_RETRY_BASE = float(os.environ.get("ETRAP_NOTIFY_RETRY_BASE", "30"))
+NOTIFY_RETRY_MAX = float(os.environ.get("ETRAP_NOTIFY_RETRY_MAX", "3600"))
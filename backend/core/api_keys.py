@@ -0,0 +1,201 @@
+"""
+Gateway API keys and the per-worker key index.
+
+Keys are stored as SHA-256 hashes in the `apikey` table, one row per issued
+key, with the application's expiry. Every change (issue, revoke, expiry,
+resource edit) stamps the affected rows with the next `version`, so each
+worker keeps a dict of key hash -> Grant and brings it up to date with
+
+    SELECT ... FROM apikey WHERE version > <last seen>
+
+at most every `GATEWAY_KEY_REFRESH` seconds (immediately after a change made
+by the same worker). Authenticating a proxied request is a dict lookup; a key
+revoked on one worker stops working on all of them within the refresh interval.
+"""
+import hashlib
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+from sqlalchemy import bindparam, insert, update
+from sqlmodel import Session, select, func
+
+from .. import config
+from ..models import ApiKey, Application, Resource
+from .gateway import KEY_PREFIX, Grant, issue_key
+from .response_cache import policy_for
+from .upstream_pool import upstream_pools
+
+ID_CHUNK_SIZE = 1000
+
+def hash_key(key: str) -> str:
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+def _next_version():
+    # Evaluated inside the writing statement, i.e. under SQLite's write lock, so versions follow commit order
+    return select(func.coalesce(func.max(ApiKey.version), 0) + 1).scalar_subquery()
+
+def _chunks(values: list) -> Iterable[list]:
+    for i in range(0, len(values), ID_CHUNK_SIZE):
+        yield values[i:i + ID_CHUNK_SIZE]
+
+def set_status(session: Session, application_ids: Sequence[int], status: str):
+    """
+    Retire the active keys of these applications (REVOKED or EXPIRED).
+    """
+    for chunk in _chunks(list(application_ids)):
+        session.execute(
+            update(ApiKey)
+            .where(ApiKey.application_id.in_(chunk), ApiKey.status == "ACTIVE")
+            .values(status=status, version=_next_version())
+            .execution_options(synchronize_session=False)
+        )
+
+def issue(session: Session, rows: Sequence[Tuple[int, int, int]]) -> Dict[int, str]:
+    """
+    New keys for freshly approved applications, rows of (application id, user id,
+    resource id); any key an application already had is revoked. Returns
+    {application id: plaintext key}; only the hash is stored here.
+    """
+    if not rows:
+        return {}
+    # The approval (and its expired_at) may still be pending in the session
+    session.flush()
+    set_status(session, [row[0] for row in rows], "REVOKED")
+    keys = {row[0]: issue_key() for row in rows}
+    table = ApiKey.__table__
+    expires_at = select(Application.expired_at).where(Application.id == bindparam("b_app")).scalar_subquery()
+    session.execute(
+        insert(table).values(
+            key_hash=bindparam("b_hash"), application_id=bindparam("b_app"), resource_id=bindparam("b_resource"),
+            user_id=bindparam("b_user"), status="ACTIVE", expires_at=expires_at, version=_next_version(),
+            created_at=datetime.now(),
+        ),
+        [{"b_hash": hash_key(keys[app_id]), "b_app": app_id, "b_user": user_id, "b_resource": resource_id}
+         for app_id, user_id, resource_id in rows],
+    )
+    return keys
+
+def touch_resource(session: Session, resource_id: int):
+    """
+    Make workers reload this resource's keys after its upstream settings, state or existence changed.
+    """
+    session.execute(
+        update(ApiKey)
+        .where(ApiKey.resource_id == resource_id, ApiKey.status == "ACTIVE")
+        .values(version=_next_version())
+        .execution_options(synchronize_session=False)
+    )
+
+def ensure_keys(session: Session) -> int:
+    """
+    Index the keys of approved applications that only have one in `auth_output`
+    (approved before the key table existed). Returns the number added.
+    """
+    rows = session.exec(
+        select(Application.id, Application.user_id, Application.resource_id, Application.expired_at,
+               Application.auth_output)
+        .join(Resource, Resource.id == Application.resource_id)
+        .where(
+            Application.status == "APPROVED",
+            Resource.auth_type == "API_GATEWAY",
+            Application.id.not_in(select(ApiKey.application_id)),
+        )
+    ).all()
+    added = 0
+    for app_id, user_id, resource_id, expired_at, auth_output in rows:
+        key = (auth_output or {}).get("api_key")
+        if not key:
+            continue
+        session.execute(insert(ApiKey.__table__).values(
+            key_hash=hash_key(key), application_id=app_id, resource_id=resource_id, user_id=user_id,
+            status="ACTIVE", expires_at=expired_at, version=_next_version(), created_at=datetime.now()))
+        added += 1
+    return added
+
+class KeyIndex:
+    """
+    In-memory key hash -> (Grant, expires_at) for one worker.
+
+    `refresh` applies the rows changed since the last seen version; callers run
+    it when `stale()` (every `refresh_interval` seconds, or right after
+    `invalidate()`). `lookup` never touches the database.
+    """
+    def __init__(self, refresh_interval: float = 2.0):
+        self.refresh_interval = refresh_interval
+        self._entries: Dict[str, Tuple[Grant, Optional[datetime]]] = {}
+        self._version = 0
+        self._next_refresh = 0.0
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def stale(self) -> bool:
+        return time.monotonic() >= self._next_refresh
+
+    def invalidate(self):
+        # Called after committing a change; the next request reloads what changed
+        self._generation += 1
+        self._next_refresh = 0.0
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+            self._version = 0
+            self.invalidate()
+
+    def refresh(self, session: Session) -> int:
+        """
+        Apply key changes since the last refresh. Returns the number of rows read.
+        """
+        with self._lock:
+            if not self.stale():
+                # Another thread refreshed while this one waited for the lock
+                return 0
+            generation = self._generation
+            statement = (
+                select(ApiKey.key_hash, ApiKey.application_id, ApiKey.user_id, ApiKey.resource_id, ApiKey.status,
+                       ApiKey.expires_at, ApiKey.version, Resource.auth_type, Resource.is_active, Resource.config)
+                .outerjoin(Resource, Resource.id == ApiKey.resource_id)
+                .where(ApiKey.version > self._version)
+                .order_by(ApiKey.version)
+            )
+            if self._version == 0:
+                statement = statement.where(ApiKey.status == "ACTIVE")
+            rows = session.exec(statement).all()
+            for key_hash, app_id, user_id, resource_id, status, expires_at, version, auth_type, is_active, \
+                    resource_config in rows:
+                pool = None
+                if status == "ACTIVE" and auth_type == "API_GATEWAY" and is_active:
+                    pool = upstream_pools.configure(resource_id, resource_config)
+                if pool is not None:
+                    quota = resource_config.get("quota")
+                    grant = Grant(app_id, user_id, resource_id, pool, int(quota) if quota not in (None, "") else None,
+                                  policy_for(resource_config))
+                    self._entries[key_hash] = (grant, expires_at)
+                else:
+                    self._entries.pop(key_hash, None)
+                self._version = max(self._version, version)
+            # An invalidate() during the query may concern a commit the query didn't see
+            if generation == self._generation:
+                self._next_refresh = time.monotonic() + self.refresh_interval
+            return len(rows)
+
+    def lookup(self, resource_id: int, key: str) -> Optional[Grant]:
+        """
+        The grant for a presented key on this resource, or None if unknown, retired or expired.
+        """
+        if not key.startswith(KEY_PREFIX):
+            return None
+        entry = self._entries.get(hash_key(key))
+        if entry is None:
+            return None
+        grant, expires_at = entry
+        if grant.resource_id != resource_id or (expires_at and expires_at < datetime.now()):
+            return None
+        return grant
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+key_index = KeyIndex(refresh_interval=config.GATEWAY_KEY_REFRESH)
@@ -0,0 +1,90 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, NamedTuple, Optional
+
+from sqlmodel import Session, select, func
+
+from ..models import Application
+from .. import config
+
+class ApplicationState(NamedTuple):
+    """
+    Detached snapshot of a user's latest application for one resource (what the catalog overlay renders).
+    """
+    id: int
+    resource_id: int
+    status: str
+    approved_at: Optional[datetime]
+    expired_at: Optional[datetime]
+    auth_output: Dict[str, Any]
+
+def load_latest_applications(session: Session, user_id: int) -> Dict[int, ApplicationState]:
+    """
+    Latest application per resource for a user, selected in SQL via MAX(id) per resource_id.
+    """
+    latest_ids = (
+        select(func.max(Application.id))
+        .where(Application.user_id == user_id)
+        .group_by(Application.resource_id)
+    )
+    rows = session.exec(
+        select(
+            Application.id,
+            Application.resource_id,
+            Application.status,
+            Application.approved_at,
+            Application.expired_at,
+            Application.auth_output,
+        ).where(Application.id.in_(latest_ids))
+    ).all()
+    return {row[1]: ApplicationState(*row) for row in rows}
+
+class ApplicationStateCache:
+    """
+    Bounded LRU of user_id -> {resource_id: ApplicationState}.
+    Entries are dropped explicitly when a user's applications change and expire after
+    `ttl` seconds so other workers converge too.
+    """
+    def __init__(self, maxsize: int = 1024, ttl: float = 30.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, session: Session, user_id: int) -> Dict[int, ApplicationState]:
+        if self.ttl <= 0:
+            return load_latest_applications(session, user_id)
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                return entry[1]
+            generation = self._generation
+
+        app_map = load_latest_applications(session, user_id)
+        with self._lock:
+            # An invalidation raced with the load; serve the result but don't cache it
+            if generation != self._generation:
+                return app_map
+            self._entries[user_id] = (now + self.ttl, app_map)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return app_map
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+app_state_cache = ApplicationStateCache(maxsize=config.APP_STATE_CACHE_SIZE, ttl=config.APP_STATE_CACHE_TTL)
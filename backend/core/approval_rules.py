@@ -0,0 +1,220 @@
+"""
+Auto-approval rules for MANUAL resources.
+
+Rules live in `Resource.config["approval_rules"]`:
+
+    {"version": "...", "rules": [
+        {"name": "econ-teaching", "action": "approve",
+         "departments": ["经济学院"], "roles": ["user"],
+         "fields": {"usage_purpose": "Teaching", "course_code": {"regex": "^FIN\\\\d{3}$"}},
+         "hours": "08:00-22:00", "weekdays": [1, 2, 3, 4, 5],
+         "from": "2025-09-01", "until": "2026-01-15", "quota": 200},
+        {"name": "no-externals", "action": "reject", "roles": ["guest"], "reason": "..."}
+    ]}
+
+Every condition a rule sets must hold; the first matching rule wins, in list
+order. `action` is approve, reject or manual (stop and leave for review). A
+rule with a `quota` only matches while the resource has fewer APPROVED
+applications than that, so later rules still apply once it is used up.
+The apply route counts while holding the database write lock, so concurrent
+applies cannot both take the last place under a rule's quota.
+No match leaves the application PENDING.
+
+Rule sets are validated and compiled into predicates once per resource and
+`version` (stamped on save) and cached, so applying costs a few set lookups.
+"""
+import hashlib
+import json
+import logging
+import re
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, time
+from typing import Callable, List, NamedTuple, Optional
+
+from ..models import User
+
+logger = logging.getLogger(__name__)
+
+ACTIONS = ("approve", "reject", "manual")
+CONDITIONS = ("departments", "roles", "fields", "hours", "weekdays", "from", "until", "quota")
+CACHE_SIZE = 512
+
+class Decision(NamedTuple):
+    action: str
+    rule: str
+    reason: Optional[str] = None
+
+class _Rule(NamedTuple):
+    name: str
+    action: str
+    reason: Optional[str]
+    checks: tuple
+    quota: Optional[int]
+
+def _string_set(rule_name: str, key: str, value) -> frozenset:
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, list) or not value:
+        raise ValueError(f"Rule {rule_name!r}: {key} must be a non-empty list")
+    return frozenset(str(v) for v in value)
+
+def _field_check(rule_name: str, field: str, spec):
+    if isinstance(spec, dict):
+        if set(spec) != {"regex"}:
+            raise ValueError(f"Rule {rule_name!r}: field {field!r} supports only {{\"regex\": ...}}")
+        try:
+            pattern = re.compile(spec["regex"])
+        except re.error as e:
+            raise ValueError(f"Rule {rule_name!r}: invalid regex for {field!r}: {e}")
+        return lambda user, data, now: pattern.search(str(data.get(field, ""))) is not None
+    allowed = _string_set(rule_name, f"field {field!r}", spec)
+    return lambda user, data, now: str(data.get(field, "")).strip() in allowed
+
+def _parse_hours(rule_name: str, value: str):
+    try:
+        start, end = (time.fromisoformat(part.strip()) for part in value.split("-"))
+    except ValueError:
+        raise ValueError(f"Rule {rule_name!r}: hours must look like 08:00-22:00")
+    if start <= end:
+        return lambda user, data, now: start <= now.time() < end
+    # Window wrapping midnight, e.g. 22:00-06:00
+    return lambda user, data, now: now.time() >= start or now.time() < end
+
+def _parse_date(rule_name: str, key: str, value: str) -> date:
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Rule {rule_name!r}: {key} must be a YYYY-MM-DD date")
+
+def _compile_rule(index: int, spec: dict) -> _Rule:
+    if not isinstance(spec, dict):
+        raise ValueError(f"Rule #{index + 1} must be an object")
+    name = str(spec.get("name") or f"#{index + 1}")
+    action = spec.get("action", "approve")
+    if action not in ACTIONS:
+        raise ValueError(f"Rule {name!r}: action must be one of {', '.join(ACTIONS)}")
+    unknown = set(spec) - set(CONDITIONS) - {"name", "action", "reason"}
+    if unknown:
+        raise ValueError(f"Rule {name!r}: unknown keys {', '.join(sorted(unknown))}")
+
+    checks = []
+    if "departments" in spec:
+        departments = _string_set(name, "departments", spec["departments"])
+        checks.append(lambda user, data, now: user.department in departments)
+    if "roles" in spec:
+        roles = _string_set(name, "roles", spec["roles"])
+        checks.append(lambda user, data, now: user.role in roles)
+    fields = spec.get("fields", {})
+    if not isinstance(fields, dict):
+        raise ValueError(f"Rule {name!r}: fields must be an object")
+    checks.extend(_field_check(name, field, value) for field, value in fields.items())
+    if "hours" in spec:
+        checks.append(_parse_hours(name, str(spec["hours"])))
+    if "weekdays" in spec:
+        weekdays = spec["weekdays"]
+        if not isinstance(weekdays, list) or not all(isinstance(d, int) and 1 <= d <= 7 for d in weekdays):
+            raise ValueError(f"Rule {name!r}: weekdays must be ISO weekday numbers 1-7")
+        weekday_set = frozenset(weekdays)
+        checks.append(lambda user, data, now: now.isoweekday() in weekday_set)
+    if "from" in spec:
+        first = _parse_date(name, "from", spec["from"])
+        checks.append(lambda user, data, now: now.date() >= first)
+    if "until" in spec:
+        last = _parse_date(name, "until", spec["until"])
+        checks.append(lambda user, data, now: now.date() <= last)
+
+    quota = spec.get("quota")
+    if quota is not None and (not isinstance(quota, int) or isinstance(quota, bool) or quota < 0):
+        raise ValueError(f"Rule {name!r}: quota must be a non-negative integer")
+    return _Rule(name, action, spec.get("reason"), tuple(checks), quota)
+
+def compile_rules(rule_set: dict) -> List[_Rule]:
+    """
+    Validate a rule set and compile it. Raises ValueError with a message for the admin.
+    """
+    if not isinstance(rule_set, dict) or not isinstance(rule_set.get("rules"), list):
+        raise ValueError('Approval rules must be an object with a "rules" list')
+    return [_compile_rule(i, spec) for i, spec in enumerate(rule_set["rules"])]
+
+def parse_rules(text: str) -> Optional[dict]:
+    """
+    Parse and validate rules submitted from the resource editor; stamps a new `version`.
+    Empty text means no rules.
+    """
+    if not text or not text.strip():
+        return None
+    try:
+        rule_set = json.loads(text)
+    except ValueError as e:
+        raise ValueError(f"Approval rules are not valid JSON: {e}")
+    compile_rules(rule_set)
+    rule_set.pop("version", None)
+    digest = hashlib.sha1(json.dumps(rule_set, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    return {"version": digest.hexdigest()[:12], **rule_set}
+
+class RuleCache:
+    """
+    Bounded LRU of (resource id, rule set version) -> compiled rules.
+    """
+    def __init__(self, maxsize: int = CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[tuple, List[_Rule]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, resource_id: int, rule_set: dict) -> List[_Rule]:
+        # Rule sets stored without a version (edited by hand) are keyed by content
+        version = isinstance(rule_set, dict) and rule_set.get("version") or json.dumps(rule_set, sort_keys=True)
+        key = (resource_id, version)
+        with self._lock:
+            rules = self._entries.get(key)
+            if rules is not None:
+                self._entries.move_to_end(key)
+                return rules
+        rules = compile_rules(rule_set)
+        with self._lock:
+            self._entries[key] = rules
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return rules
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+rule_cache = RuleCache()
+
+def evaluate(rules: List[_Rule], user: User, user_input: dict, now: datetime,
+             approved_count: Callable[[], int]) -> Optional[Decision]:
+    """
+    First matching rule's decision, or None. `approved_count` is only called
+    (once) if a rule with a quota is reached; for the quota to hold under
+    concurrent applies it must count inside the transaction that approves.
+    """
+    count = None
+    for rule in rules:
+        if not all(check(user, user_input, now) for check in rule.checks):
+            continue
+        if rule.quota is not None:
+            if count is None:
+                count = approved_count()
+            if count >= rule.quota:
+                continue
+        return Decision(rule.action, rule.name, rule.reason)
+    return None
+
+def decide(resource, user: User, user_input: dict, approved_count: Callable[[], int],
+           now: datetime = None) -> Optional[Decision]:
+    """
+    Decision for an application to `resource`, or None when it has no rules or none match.
+    Invalid stored rules are treated as absent (the editor validates them on save).
+    """
+    rule_set = (resource.config or {}).get("approval_rules")
+    if not rule_set:
+        return None
+    try:
+        rules = rule_cache.get(resource.id, rule_set)
+    except ValueError as e:
+        logger.warning("Ignoring invalid approval rules of resource %s: %s", resource.id, e)
+        return None
+    return evaluate(rules, user, user_input, now or datetime.now(), approved_count)
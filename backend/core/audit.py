@@ -0,0 +1,131 @@
+"""
+Audit log pipeline.
+
+High-volume events (APPLY, DOWNLOAD) are queued in memory and written by a
+background thread in batched multi-row INSERTs, so they stay off the request's
+critical path and don't contend for the SQLite write lock per request. Events
+that must commit atomically with the change they describe pass `durable=True`
+(or ETRAP_AUDIT_MODE=sync) and are added to the caller's session instead.
+
+Queued events that have not been flushed are lost if the process is killed;
+a clean shutdown (the app lifespan) flushes everything.
+"""
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+from sqlmodel import Session
+
+from .. import config
+from ..models import AuditLog
+from .metrics import AUDIT_QUEUE_DEPTH, AUDIT_FLUSH_ROWS, AUDIT_DROPPED
+
+logger = logging.getLogger(__name__)
+
+class AuditWriter:
+    """
+    Bounded queue drained by one writer thread. When the writer is not running
+    (tests, scripts) or the queue is full, `record` writes through the session.
+    """
+    def __init__(self, maxsize: int = 10000, batch_size: int = 500, flush_interval: float = 0.5):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._engine = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, engine):
+        if self.running:
+            return
+        self._engine = engine
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="etrap-audit-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """
+        Stop the writer and flush everything still queued. If the writer is
+        still busy after `timeout` (e.g. waiting on a locked database), it is
+        left to finish its final flush and `running` stays True.
+        """
+        if not self.running:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.warning("Audit writer still flushing after %.1fs; %d events queued", timeout, self._queue.qsize())
+            return
+        self._thread = None
+
+    def record(self, session: Session, *, user_id: int, action: str, details: str, ip_address: str = "unknown",
+               resource_id: Optional[int] = None, durable: bool = False) -> bool:
+        """
+        Queue an audit event. Returns True if queued, False if it was added to
+        `session` instead (the caller's commit then persists it).
+        """
+        row = {"user_id": user_id, "action": action, "resource_id": resource_id,
+               "ip_address": ip_address, "details": details, "timestamp": datetime.now()}
+        if not durable and config.AUDIT_MODE == "async" and self.running:
+            try:
+                self._queue.put_nowait(row)
+                AUDIT_QUEUE_DEPTH.inc()
+                return True
+            except queue.Full:
+                logger.warning("Audit queue full; writing %s event synchronously", action)
+        session.add(AuditLog(**row))
+        return False
+
+    def flush(self) -> int:
+        """
+        Write everything currently queued. Returns the number of rows written.
+        """
+        written = 0
+        while True:
+            batch = self._drain(self.batch_size)
+            if not batch:
+                return written
+            written += self._write(batch)
+
+    def _drain(self, limit: int) -> list:
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        AUDIT_QUEUE_DEPTH.dec(len(batch))
+        return batch
+
+    def _write(self, batch: list) -> int:
+        try:
+            with Session(self._engine) as session:
+                session.execute(AuditLog.__table__.insert(), batch)
+                session.commit()
+        except Exception:
+            logger.exception("Failed to write %d audit events", len(batch))
+            AUDIT_DROPPED.inc(len(batch))
+            return 0
+        AUDIT_FLUSH_ROWS.observe(len(batch))
+        return len(batch)
+
+    def _run(self):
+        while not self._stop.is_set():
+            deadline = time.monotonic() + self.flush_interval
+            # Wake early once a full batch is waiting
+            while self._queue.qsize() < self.batch_size and not self._stop.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._stop.wait(min(remaining, 0.05))
+            self.flush()
+        self.flush()
+
+audit_writer = AuditWriter(config.AUDIT_QUEUE_SIZE, config.AUDIT_BATCH_SIZE, config.AUDIT_FLUSH_INTERVAL)
@@ -0,0 +1,214 @@
+"""
+Audit log retention and archival.
+
+The `auditlog` table only keeps recent events. Older rows are exported per
+calendar month ("partition") to gzipped JSONL files under AUDIT_ARCHIVE_DIR and
+then deleted. `index.json` records, per partition, the files with their row
+count, id range, timestamp range and action counts so lookups only open the
+files that can match.
+
+Each export is written to a temp file, fsynced and renamed before the index is
+updated, and rows are only deleted after the index points at them. A month can
+be archived more than once (late rows get a new part file); ids already
+recorded in the index are never exported twice.
+"""
+import gzip
+import hashlib
+import json
+import os
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Iterator, List, Optional
+
+from sqlalchemy import delete, func, select
+from sqlmodel import Session
+
+from ..models import AuditLog
+
+INDEX_FILE = "index.json"
+TABLE = AuditLog.__table__
+COLUMNS = [c.name for c in TABLE.columns]
+
+def month_start(dt: datetime) -> datetime:
+    return datetime(dt.year, dt.month, 1)
+
+def next_month(dt: datetime) -> datetime:
+    return datetime(dt.year + dt.month // 12, dt.month % 12 + 1, 1)
+
+def retention_cutoff(retention_days: int, now: datetime = None) -> datetime:
+    """
+    Start of the month containing `now - retention_days`: only whole months are archived.
+    """
+    return month_start((now or datetime.now()) - timedelta(days=retention_days))
+
+# --- Index ---
+
+def load_index(archive_dir: str) -> dict:
+    path = os.path.join(archive_dir, INDEX_FILE)
+    if not os.path.exists(path):
+        return {"partitions": {}}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def _save_index(archive_dir: str, index: dict):
+    path = os.path.join(archive_dir, INDEX_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=2, sort_keys=True)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+# --- Rows ---
+
+def _encode(row) -> str:
+    record = dict(zip(COLUMNS, row))
+    record["timestamp"] = record["timestamp"].isoformat()
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+
+def _decode(line: str) -> dict:
+    record = json.loads(line)
+    record["timestamp"] = datetime.fromisoformat(record["timestamp"])
+    return record
+
+# --- Archival ---
+
+def archive_audit_logs(session: Session, archive_dir: str, before: datetime, dry_run: bool = False,
+                       chunk_size: int = 10000) -> List[dict]:
+    """
+    Export and delete audit rows with timestamp < `before`, one part file per month.
+    Returns the parts written (or, for a dry run, the parts that would be written).
+    """
+    oldest = session.execute(select(func.min(TABLE.c.timestamp)).where(TABLE.c.timestamp < before)).scalar()
+    if oldest is None:
+        return []
+    os.makedirs(archive_dir, exist_ok=True)
+    index = load_index(archive_dir)
+    parts = []
+    start = month_start(oldest)
+    while start < before:
+        end = min(next_month(start), before)
+        part = _archive_month(session, archive_dir, index, start, end, dry_run, chunk_size)
+        if part:
+            parts.append(part)
+        start = next_month(start)
+    return parts
+
+def _archive_month(session, archive_dir, index, start, end, dry_run, chunk_size) -> Optional[dict]:
+    month = start.strftime("%Y-%m")
+    existing = index["partitions"].get(month, [])
+    archived_max_id = max((p["last_id"] for p in existing), default=0)
+    in_range = (TABLE.c.timestamp >= start) & (TABLE.c.timestamp < end)
+    # Rows already in an archive file but not yet deleted (interrupted run) are not exported again
+    pending = in_range & (TABLE.c.id > archived_max_id)
+
+    if dry_run:
+        rows = session.execute(select(func.count()).where(pending)).scalar()
+        return {"month": month, "rows": rows} if rows else None
+
+    if archived_max_id:
+        # A run that died between saving the index and deleting leaves archived rows behind
+        session.execute(delete(TABLE).where(in_range & (TABLE.c.id <= archived_max_id)))
+        session.commit()
+
+    filename = f"{month}.{len(existing) + 1:04d}.jsonl.gz"
+    path = os.path.join(archive_dir, filename)
+    tmp = path + ".tmp"
+    rows, first_id, last_id, min_ts, max_ts = 0, None, None, None, None
+    actions = Counter()
+    digest = hashlib.sha256()
+    result = session.execute(select(*TABLE.columns).where(pending).order_by(TABLE.c.id).execution_options(yield_per=chunk_size))
+    with open(tmp, "wb") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as gz:
+            for row in result:
+                line = (_encode(row) + "\n").encode("utf-8")
+                gz.write(line)
+                digest.update(line)
+                rows += 1
+                record_id, ts = row.id, row.timestamp
+                first_id = record_id if first_id is None else first_id
+                last_id = record_id
+                min_ts = ts if min_ts is None or ts < min_ts else min_ts
+                max_ts = ts if max_ts is None or ts > max_ts else max_ts
+                actions[row.action] += 1
+        raw.flush()
+        os.fsync(raw.fileno())
+    if rows == 0:
+        os.remove(tmp)
+        return None
+    os.replace(tmp, path)
+
+    part = {
+        "file": filename, "rows": rows, "first_id": first_id, "last_id": last_id,
+        "min_ts": min_ts.isoformat(), "max_ts": max_ts.isoformat(),
+        "actions": dict(actions), "sha256": digest.hexdigest(),
+    }
+    index["partitions"][month] = existing + [part]
+    _save_index(archive_dir, index)
+
+    session.execute(delete(TABLE).where(in_range & (TABLE.c.id <= last_id)))
+    session.commit()
+    return {"month": month, **part}
+
+# --- Lookup & restore ---
+
+def read_partition(archive_dir: str, part: dict) -> Iterator[dict]:
+    with gzip.open(os.path.join(archive_dir, part["file"]), "rt", encoding="utf-8") as f:
+        for line in f:
+            yield _decode(line)
+
+def search_archive(archive_dir: str, start: datetime = None, end: datetime = None, user_id: int = None,
+                   action: str = None, resource_id: int = None) -> Iterator[dict]:
+    """
+    Archived events matching the filters, oldest month first. Parts whose
+    timestamp range or action counts rule them out are not opened.
+    """
+    index = load_index(archive_dir)
+    for month in sorted(index["partitions"]):
+        for part in index["partitions"][month]:
+            if start and datetime.fromisoformat(part["max_ts"]) < start:
+                continue
+            if end and datetime.fromisoformat(part["min_ts"]) >= end:
+                continue
+            if action and action not in part["actions"]:
+                continue
+            for record in read_partition(archive_dir, part):
+                if start and record["timestamp"] < start:
+                    continue
+                if end and record["timestamp"] >= end:
+                    continue
+                if user_id is not None and record["user_id"] != user_id:
+                    continue
+                if action and record["action"] != action:
+                    continue
+                if resource_id is not None and record["resource_id"] != resource_id:
+                    continue
+                yield record
+
+def restore_partition(session: Session, archive_dir: str, month: str, chunk_size: int = 10000) -> int:
+    """
+    Re-import an archived month into `auditlog` (original ids kept) and drop it from the archive.
+    """
+    index = load_index(archive_dir)
+    parts = index["partitions"].get(month)
+    if not parts:
+        raise ValueError(f"No archived partition for {month}")
+    restored = 0
+    for part in parts:
+        batch = []
+        for record in read_partition(archive_dir, part):
+            batch.append(record)
+            if len(batch) >= chunk_size:
+                session.execute(TABLE.insert(), batch)
+                restored += len(batch)
+                batch = []
+        if batch:
+            session.execute(TABLE.insert(), batch)
+            restored += len(batch)
+    session.commit()
+
+    del index["partitions"][month]
+    _save_index(archive_dir, index)
+    for part in parts:
+        os.remove(os.path.join(archive_dir, part["file"]))
+    return restored
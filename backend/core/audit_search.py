@@ -0,0 +1,96 @@
+"""
+Audit log search.
+
+Filters map onto the composite (column, timestamp) indexes on `auditlog`, and
+results are paged newest-first with a keyset cursor on (timestamp, id), so
+deep pages cost the same as the first one. Free-text search over `details`
+uses an FTS5 side index (see fts.py); terms shorter than three characters,
+terms too common for the FTS lookup to narrow anything, or databases without
+FTS5 fall back to LIKE.
+"""
+import base64
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text, tuple_
+from sqlmodel import Session, select
+
+from ..models import AuditLog
+from .fts import FTSIndex, match_expression
+
+MAX_LIMIT = 500
+# FTS hit count above which a search term is treated as common (see _text_filters)
+FTS_SELECTIVE_ROWS = 2000
+
+AUDIT_FTS = FTSIndex(AuditLog.__table__, ["details"])
+
+# --- Cursor ---
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{timestamp.isoformat()}|{row_id}".encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Raises ValueError on a malformed cursor.
+    """
+    raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    timestamp, row_id = raw.rsplit("|", 1)
+    return datetime.fromisoformat(timestamp), int(row_id)
+
+# --- Query ---
+
+def _text_filters(session: Session, q: str) -> list:
+    terms = q.split()
+    fts_terms = [t for t in terms if len(t) >= 3]
+    like_terms = [t for t in terms if len(t) < 3]
+    filters = []
+    if fts_terms and AUDIT_FTS.available(session):
+        fts = AUDIT_FTS.name
+        ids = session.execute(
+            text(f"SELECT rowid FROM {fts} WHERE {fts} MATCH :match LIMIT :cap"),
+            {"match": match_expression(fts_terms), "cap": FTS_SELECTIVE_ROWS + 1},
+        ).scalars().all()
+        if len(ids) <= FTS_SELECTIVE_ROWS:
+            filters.append(AuditLog.id.in_(ids))
+        else:
+            # Common terms: scanning newest-first with LIKE finds a page of matches sooner
+            # than materialising every FTS hit
+            like_terms += fts_terms
+    else:
+        like_terms += fts_terms
+    filters += [AuditLog.details.contains(t, autoescape=True) for t in like_terms]
+    return filters
+
+def query_audit_logs(session: Session, *, user_id: int = None, action: str = None, resource_id: int = None,
+                     ip_address: str = None, start: datetime = None, end: datetime = None, q: str = None,
+                     limit: int = 50, cursor: str = None) -> Tuple[List[AuditLog], Optional[str]]:
+    """
+    One page of audit events, newest first, and the cursor for the next page (None on the last page).
+    """
+    limit = max(1, min(limit, MAX_LIMIT))
+    query = select(AuditLog)
+    if user_id is not None:
+        query = query.where(AuditLog.user_id == user_id)
+    if action:
+        query = query.where(AuditLog.action == action)
+    if resource_id is not None:
+        query = query.where(AuditLog.resource_id == resource_id)
+    if ip_address:
+        query = query.where(AuditLog.ip_address == ip_address)
+    if start:
+        query = query.where(AuditLog.timestamp >= start)
+    if end:
+        query = query.where(AuditLog.timestamp < end)
+    if q and q.strip():
+        query = query.where(*_text_filters(session, q))
+    if cursor:
+        ts, row_id = decode_cursor(cursor)
+        # Row-value comparison lets SQLite seek the index instead of filtering from the top
+        query = query.where(tuple_(AuditLog.timestamp, AuditLog.id) < tuple_(ts, row_id))
+
+    rows = session.exec(query.order_by(AuditLog.timestamp.desc(), AuditLog.id.desc()).limit(limit + 1)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].timestamp, rows[-1].id)
+    return rows, next_cursor
@@ -0,0 +1,197 @@
+"""
+Bulk approve/reject/revoke of applications.
+
+Each action is one set-based UPDATE per chunk of ids (or one UPDATE for a
+filter selection) guarded by the expected current status, so an application
+another admin handled in the meantime is skipped rather than overwritten.
+Approval computes `expired_at` from `Resource.valid_until` in SQL and takes
+quota seats per resource afterwards (approvals beyond a full quota are put
+back to PENDING and reported; API_GATEWAY approvals get their downstream
+keys in one executemany); revocation releases seats and retires gateway keys. Every changed
+application gets its audit row in one multi-row INSERT in the same
+transaction. Nothing is committed here; the caller commits.
+"""
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from typing import Iterator, List, Optional, Sequence
+
+from sqlalchemy import DateTime, String, bindparam, cast, func, literal, update
+from sqlmodel import Session, select
+
+from ..models import Application, AuditLog, Resource, User
+from . import api_keys, quota
+
+# action -> (required current status, new status, audit action)
+ACTIONS = {
+    "approve": ("PENDING", "APPROVED", "APPROVE"),
+    "reject": ("PENDING", "REJECTED", "REJECT"),
+    "revoke": ("APPROVED", "REVOKED", "REVOKE"),
+}
+ID_CHUNK_SIZE = 1000
+# Same fallback as the single approve when a resource has no valid_until
+DEFAULT_VALIDITY = timedelta(days=180)
+
+@dataclass
+class BulkResult:
+    action: str
+    updated: List[tuple] = field(default_factory=list)  # (app id, user id, resource id)
+    failed: List[dict] = field(default_factory=list)
+
+    @property
+    def user_ids(self) -> set:
+        return {row[1] for row in self.updated}
+
+    def as_dict(self) -> dict:
+        return {"action": self.action, "updated": len(self.updated),
+                "ids": [row[0] for row in self.updated], "failed": self.failed}
+
+def _chunks(values: list) -> Iterator[list]:
+    # Keeps IN lists under SQLite's bound-parameter limit
+    for i in range(0, len(values), ID_CHUNK_SIZE):
+        yield values[i:i + ID_CHUNK_SIZE]
+
+def _expires_at(now: datetime):
+    """
+    SQL for datetime.combine(resource.valid_until, time.max), in SQLite's stored datetime format.
+    """
+    valid_until = (
+        select(cast(Resource.valid_until, String) + " " + time.max.isoformat())
+        .where(Resource.id == Application.resource_id)
+        .scalar_subquery()
+    )
+    return func.coalesce(valid_until, literal(now + DEFAULT_VALIDITY, DateTime), type_=DateTime)
+
+def _values(action: str, now: datetime, reason: Optional[str]) -> dict:
+    new_status = ACTIONS[action][1]
+    if action == "approve":
+        return {"status": new_status, "approved_at": now, "expired_at": _expires_at(now), "updated_at": now}
+    if action == "reject":
+        return {"status": new_status, "auth_output": {"rejection_reason": reason}, "updated_at": now}
+    return {"status": new_status, "expired_at": now, "updated_at": now}
+
+def _filters(user_id: Optional[int], resource_id: Optional[int], category: Optional[str],
+             start: Optional[date], end: Optional[date]) -> list:
+    """
+    Selection by owner, resource, resource category and submission date range (end inclusive).
+    """
+    clauses = []
+    if user_id is not None:
+        clauses.append(Application.user_id == user_id)
+    if resource_id is not None:
+        clauses.append(Application.resource_id == resource_id)
+    if category:
+        clauses.append(Application.resource_id.in_(select(Resource.id).where(Resource.category == category)))
+    if start:
+        clauses.append(Application.created_at >= datetime.combine(start, time.min))
+    if end:
+        clauses.append(Application.created_at < datetime.combine(end + timedelta(days=1), time.min))
+    return clauses
+
+def _take_seats(session: Session, result: BulkResult, per_resource: dict, limited: dict):
+    """
+    Take quota seats for the approved rows; the newest applications beyond what is
+    left go back to PENDING. We hold SQLite's write lock since the UPDATE, so
+    nothing can take seats in between.
+    """
+    rejected = set()
+    for resource_id, rows in per_resource.items():
+        if resource_id not in limited:
+            continue
+        granted = quota.acquire(session, limited[resource_id], len(rows), partial=True)
+        for app_id, _, _ in sorted(rows)[granted:]:
+            rejected.add(app_id)
+    if not rejected:
+        return
+    for chunk in _chunks(sorted(rejected)):
+        session.execute(
+            update(Application).where(Application.id.in_(chunk))
+            .values(status="PENDING", approved_at=None, expired_at=None)
+            .execution_options(synchronize_session=False)
+        )
+    result.updated = [row for row in result.updated if row[0] not in rejected]
+    result.failed.extend({"id": app_id, "error": "Resource quota exhausted"} for app_id in sorted(rejected))
+
+def _issue_gateway_keys(session: Session, result: BulkResult):
+    resource_ids = {row[2] for row in result.updated}
+    if not resource_ids:
+        return
+    gateway_ids = set(session.exec(select(Resource.id).where(
+        Resource.id.in_(list(resource_ids)), Resource.auth_type == "API_GATEWAY")).all())
+    keys = api_keys.issue(session, [row for row in result.updated if row[2] in gateway_ids])
+    if keys:
+        session.execute(
+            update(Application.__table__)
+            .where(Application.__table__.c.id == bindparam("b_id"))
+            .values(auth_output=bindparam("b_output", type_=Application.__table__.c.auth_output.type)),
+            [{"b_id": app_id, "b_output": {"api_key": key}} for app_id, key in keys.items()],
+        )
+
+def bulk_review(session: Session, action: str, *, admin_id: int, ip_address: str = "unknown",
+                ids: Sequence[int] = None, user_id: int = None, resource_id: int = None, category: str = None,
+                start: date = None, end: date = None, reason: str = None, audit: bool = True) -> BulkResult:
+    """
+    Apply `action` to the listed `ids` and/or every application matching the filters.
+    Listed ids that cannot be changed are reported in `failed` with the reason;
+    with `audit=False` the caller writes its own summary audit entry.
+    """
+    if action not in ACTIONS:
+        raise ValueError(f"Unknown action: {action!r}")
+    if action == "reject" and not (reason or "").strip():
+        raise ValueError("Rejection reason cannot be empty")
+    from_status, _, audit_action = ACTIONS[action]
+    now = datetime.now()
+    result = BulkResult(action)
+    statement = (
+        update(Application)
+        .where(Application.status == from_status, *_filters(user_id, resource_id, category, start, end))
+        .values(**_values(action, now, reason))
+        .returning(Application.id, Application.user_id, Application.resource_id)
+        .execution_options(synchronize_session=False)
+    )
+
+    limited = quota.ensure_counters(session) if action == "approve" else {}
+
+    if ids is None:
+        result.updated.extend(tuple(row) for row in session.execute(statement))
+    else:
+        ids = list(dict.fromkeys(ids))
+        for chunk in _chunks(ids):
+            result.updated.extend(tuple(row) for row in session.execute(statement.where(Application.id.in_(chunk))))
+        missing = set(ids) - {row[0] for row in result.updated}
+        if missing:
+            found = {}
+            for chunk in _chunks(list(missing)):
+                found.update(session.execute(
+                    select(Application.id, Application.status).where(Application.id.in_(chunk))).all())
+            for app_id in ids:
+                if app_id not in missing:
+                    continue
+                if app_id not in found:
+                    result.failed.append({"id": app_id, "error": "Application not found"})
+                else:
+                    result.failed.append({"id": app_id, "error": f"Status is {found[app_id]}, expected {from_status}"})
+
+    per_resource: dict = {}
+    for row in result.updated:
+        per_resource.setdefault(row[2], []).append(row)
+    if action == "approve":
+        _take_seats(session, result, per_resource, limited)
+        _issue_gateway_keys(session, result)
+    elif action == "revoke":
+        quota.release(session, {resource_id: len(rows) for resource_id, rows in per_resource.items()})
+        api_keys.set_status(session, [row[0] for row in result.updated], "REVOKED")
+
+    if audit and result.updated:
+        names = {}
+        for chunk in _chunks(list(result.user_ids)):
+            names.update(session.execute(select(User.id, User.name).where(User.id.in_(chunk))).all())
+        rows = []
+        for app_id, owner_id, app_resource_id in result.updated:
+            if action == "reject":
+                details = f"Rejected Application #{app_id}. Reason: {reason}"
+            else:
+                details = f"{ACTIONS[action][1].capitalize()} Application #{app_id} for {names.get(owner_id)}"
+            rows.append({"user_id": admin_id, "action": audit_action, "resource_id": app_resource_id,
+                         "ip_address": ip_address, "details": f"{details} (bulk)", "timestamp": now})
+        session.execute(AuditLog.__table__.insert(), rows)
+    return result
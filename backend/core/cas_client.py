@@ -1,10 +1,157 @@
-import httpx
-import xmltodict
+"""
+CAS client: login/logout URLs and service ticket validation.
+
+Tickets are validated against /p3/serviceValidate (CAS 3.0, which releases
+user attributes) or /serviceValidate (CAS 2.0) per ETRAP_CAS_VERSION; a
+server answering 404 on the CAS 3.0 path is remembered as 2.0-only.
+
+The service response is fed to ElementTree's C parser as it arrives and
+only the user, proxy granting ticket, attributes and failure code/text are
+copied out, instead of converting the whole document into nested dicts.
+Attributes are keyed `cas:<name>` as servers write them; repeated ones
+become lists.
+
+`validate` raises a CASError subclass saying why no user came back;
+`validate_ticket` logs it and returns None for callers that only need the
+user. `parse_logout_request` reads the ticket out of a single logout
+request.
+"""
+import logging
+import time
+from typing import Any, Dict, NamedTuple, Optional
 from urllib.parse import urlencode
+from xml.etree import ElementTree
+
+import httpx
+
+from .. import config
+from .metrics import CAS_VALIDATION_DURATION
+
+logger = logging.getLogger(__name__)
+
+VALIDATE_PATHS = {"3.0": "/p3/serviceValidate", "2.0": "/serviceValidate"}
+
+class CASError(Exception):
+    """
+    Ticket validation produced no user. `code` is the CAS failure code
+    (INVALID_TICKET, INVALID_SERVICE, ...) or one of ours.
+    """
+    def __init__(self, code: str, message: str = ""):
+        super().__init__(f"{code}: {message}" if message else code)
+        self.code = code
+        self.message = message
+
+class CASAuthenticationFailure(CASError):
+    """
+    The CAS server rejected the ticket (<cas:authenticationFailure>).
+    """
+
+class CASProtocolError(CASError):
+    """
+    The CAS server answered, but not with a usable service response.
+    """
+
+class CASUnavailable(CASError):
+    """
+    The CAS server could not be reached in time.
+    """
+
+class CASResponse(NamedTuple):
+    user: str
+    attributes: Dict[str, Any]
+    proxy_granting_ticket: Optional[str] = None
+
+    def as_dict(self) -> dict:
+        return {"user": self.user, "attributes": self.attributes}
+
+def _local(tag: str) -> str:
+    return tag.rpartition("}")[2]
+
+class ServiceResponseParser:
+    """
+    Incremental parser for a <cas:serviceResponse> document: `feed` bytes as
+    they arrive, then `result`. The element tree is built by the C parser;
+    Python only walks the handful of elements it needs.
+    """
+    def __init__(self):
+        self._parser = ElementTree.XMLParser()
+
+    def feed(self, data: bytes):
+        try:
+            self._parser.feed(data)
+        except ElementTree.ParseError as e:
+            raise CASProtocolError("INVALID_RESPONSE", f"Malformed XML: {e}")
+
+    def result(self) -> CASResponse:
+        try:
+            root = self._parser.close()
+        except ElementTree.ParseError as e:
+            raise CASProtocolError("INVALID_RESPONSE", f"Malformed XML: {e}")
+        if _local(root.tag) != "serviceResponse":
+            raise CASProtocolError("INVALID_RESPONSE", f"Unexpected root element {_local(root.tag)!r}")
+        for section in root:
+            local = _local(section.tag)
+            if local == "authenticationSuccess":
+                return _success(section)
+            if local == "authenticationFailure":
+                raise CASAuthenticationFailure(section.get("code") or "UNKNOWN", (section.text or "").strip())
+        raise CASProtocolError("INVALID_RESPONSE", "Neither authenticationSuccess nor authenticationFailure")
+
+def _success(section) -> CASResponse:
+    user = pgt = None
+    values: Dict[str, list] = {}
+    for child in section:
+        local = _local(child.tag)
+        if local == "user":
+            user = (child.text or "").strip()
+        elif local == "proxyGrantingTicket":
+            pgt = (child.text or "").strip()
+        elif local == "attributes":
+            # "{http://www.yale.edu/tp/cas}mail" -> "cas:mail", as servers write it; repeated names repeat
+            names: Dict[str, str] = {}
+            for attribute in child:
+                tag = attribute.tag
+                if tag.endswith("}attribute") and "name" in attribute.attrib:
+                    # <cas:attribute name="..." value="..."/> as some servers release them
+                    values.setdefault(attribute.get("name"), []).append(attribute.get("value", ""))
+                    continue
+                key = names.get(tag)
+                if key is None:
+                    key = names[tag] = "cas:" + _local(tag) if tag[0] == "{" else tag
+                values.setdefault(key, []).append((attribute.text or "").strip())
+    if not user:
+        raise CASProtocolError("INVALID_RESPONSE", "authenticationSuccess without a user")
+    attributes = {name: found[0] if len(found) == 1 else found for name, found in values.items()}
+    return CASResponse(user, attributes, pgt)
+
+def parse_service_response(content: bytes) -> CASResponse:
+    parser = ServiceResponseParser()
+    parser.feed(content)
+    return parser.result()
+
+def parse_logout_request(content: bytes) -> str:
+    """
+    The service ticket named by a CAS single logout request (the SAML
+    <samlp:LogoutRequest> posted as `logoutRequest`).
+    """
+    try:
+        root = ElementTree.fromstring(content)
+    except ElementTree.ParseError as e:
+        raise CASProtocolError("INVALID_REQUEST", f"Malformed XML: {e}")
+    if _local(root.tag) != "LogoutRequest":
+        raise CASProtocolError("INVALID_REQUEST", f"Unexpected root element {_local(root.tag)!r}")
+    for child in root:
+        if _local(child.tag) == "SessionIndex" and (child.text or "").strip():
+            return child.text.strip()
+    raise CASProtocolError("INVALID_REQUEST", "LogoutRequest without a SessionIndex")
 
 class CASClient:
-    def __init__(self, server_url: str):
+    def __init__(self, server_url: str, version: str = None):
         self.server_url = server_url.rstrip('/')
+        version = version or config.CAS_VERSION
+        if version not in VALIDATE_PATHS:
+            raise ValueError(f"Unsupported CAS version: {version!r}")
+        self.validate_path = VALIDATE_PATHS[version]
 
     def get_login_url(self, service_url: str) -> str:
         """
@@ -23,45 +170,53 @@ class CASClient:
             url += f"?{urlencode(params)}"
         return url
 
-    async def validate_ticket(self, ticket: str, service_url: str) -> dict:
+    async def validate(self, ticket: str, service_url: str) -> CASResponse:
         """
-        Validate the generic Service Ticket (ST) against the CAS server.
-        Uses /serviceValidate (CAS 2.0).
-        Returns user attributes if valid, else None.
+        Validate a service ticket (ST). Raises CASAuthenticationFailure,
+        CASProtocolError or CASUnavailable when no user comes back.
         """
-        validate_url = f"{self.server_url}/serviceValidate"
-        params = {
-            'service': service_url,
-            'ticket': ticket
-        }
-        
-        async with httpx.AsyncClient() as client:
-            try:
-                # Disable SSL verification for testing if needed, but best to keep verify=True in prod
-                # Usage: verify=False if self-signed certs (common in dev/staging)
-                response = await client.get(validate_url, params=params, timeout=10.0)
-                if response.status_code != 200:
-                    print(f"CAS Validation Failed: HTTP {response.status_code}")
-                    return None
-                
-                # Parse XML response
-                data = xmltodict.parse(response.content)
-                service_response = data.get('cas:serviceResponse', {})
-                
-                if 'cas:authenticationSuccess' in service_response:
-                    success = service_response['cas:authenticationSuccess']
-                    user = success.get('cas:user')
-                    attributes = success.get('cas:attributes', {})
-                    
-                    return {
-                        'user': user,
-                        'attributes': attributes
-                    }
-                else:
-                    failure = service_response.get('cas:authenticationFailure', {})
-                    print(f"CAS Auth Failure: {failure}")
-                    return None
-                    
-            except Exception as e:
-                print(f"CAS Validation Error: {str(e)}")
+        params = {'service': service_url, 'ticket': ticket}
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            async with httpx.AsyncClient() as client:
+                try:
+                    result = await self._fetch(client, params)
+                    if result is None:
+                        logger.warning("CAS server has no %s; falling back to CAS 2.0", self.validate_path)
+                        self.validate_path = VALIDATE_PATHS["2.0"]
+                        result = await self._fetch(client, params)
+                except httpx.HTTPError as e:
+                    raise CASUnavailable("UNAVAILABLE", str(e) or type(e).__name__)
+            outcome = "success"
+            return result
+        except CASAuthenticationFailure:
+            outcome = "failure"
+            raise
+        finally:
+            CAS_VALIDATION_DURATION.observe(time.perf_counter() - start, outcome=outcome)
+
+    async def _fetch(self, client: httpx.AsyncClient, params: dict) -> Optional[CASResponse]:
+        # The body goes to the parser chunk by chunk as it arrives; None for a 404 on the CAS 3.0 path
+        async with client.stream("GET", self.server_url + self.validate_path, params=params,
+                                 timeout=10.0) as response:
+            if response.status_code == 404 and self.validate_path != VALIDATE_PATHS["2.0"]:
                 return None
+            if response.status_code != 200:
+                raise CASProtocolError("HTTP_ERROR", f"HTTP {response.status_code}")
+            parser = ServiceResponseParser()
+            async for chunk in response.aiter_bytes():
+                parser.feed(chunk)
+        return parser.result()
+
+    async def validate_ticket(self, ticket: str, service_url: str) -> Optional[dict]:
+        """
+        {'user': ..., 'attributes': {...}} for a valid ticket, else None (the reason is logged).
+        """
+        try:
+            return (await self.validate(ticket, service_url)).as_dict()
+        except CASAuthenticationFailure as e:
+            logger.info("CAS authentication failure: %s", e)
+        except CASError as e:
+            logger.warning("CAS validation error: %s", e)
+        return None
@@ -0,0 +1,180 @@
+"""
+User provisioning from CAS attributes.
+
+The attributes released with a service ticket (or found in a directory
+export) are mapped onto User fields by CAS_ATTRIBUTE_MAP:
+
+    name=name|cn|displayName,email=email|mail,phone=phone|mobile,department=department|ou
+
+(each field takes the first listed attribute that is present; names are
+matched case-insensitively without the `cas:` prefix). Users are written
+with one INSERT ... ON CONFLICT(swufe_uid) DO UPDATE per batch:
+
+- name and department follow the directory whenever it provides them;
+- email and phone only fill in blanks, since students may have corrected
+  them on their profile;
+- role, is_active and the password are never touched.
+
+The update only fires for rows that would change, so a returning user costs
+one indexed read at login and no write. Students whose export was
+prefetched (`scripts/prefetch_cas_users.py`) log in for the first time
+without a write either, and with email and phone known they skip
+/profile/complete.
+"""
+from typing import Dict, Iterable, Iterator, NamedTuple, Optional, Tuple
+
+from sqlalchemy import func, or_
+from sqlalchemy.dialects.sqlite import insert
+from sqlmodel import Session, select
+
+from .. import config
+from ..auth import SSO_PASSWORD_HASH
+from ..models import User
+
+FIELDS = ("name", "email", "phone", "department")
+UID_ATTRIBUTES = ("swufe_uid", "uid", "user", "cas:user")
+
+def parse_attribute_map(text: str) -> Dict[str, Tuple[str, ...]]:
+    """
+    Parse "field=attr|attr,field=attr" into {field: (attr, ...)}. Raises ValueError.
+    """
+    mapping = {}
+    for part in (text or "").split(","):
+        if not part.strip():
+            continue
+        field, _, attributes = part.partition("=")
+        field = field.strip()
+        if field not in FIELDS:
+            raise ValueError(f"Unknown user field in CAS attribute map: {field!r}")
+        names = tuple(name.strip().lower() for name in attributes.split("|") if name.strip())
+        if not names:
+            raise ValueError(f"No attributes listed for {field!r}")
+        mapping[field] = names
+    return mapping
+
+ATTRIBUTE_MAP = parse_attribute_map(config.CAS_ATTRIBUTE_MAP)
+
+def _value(value) -> Optional[str]:
+    # Repeated attributes come as lists; the first value wins
+    if isinstance(value, list):
+        value = value[0] if value else None
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+def map_attributes(attributes: dict, mapping: Dict[str, Tuple[str, ...]] = None) -> Dict[str, str]:
+    """
+    User field values found in `attributes` (fields without a value are left out).
+    """
+    mapping = ATTRIBUTE_MAP if mapping is None else mapping
+    normalized = {}
+    for name, value in (attributes or {}).items():
+        normalized.setdefault(name.split(":", 1)[-1].lower(), value)
+    fields = {}
+    for field, names in mapping.items():
+        for name in names:
+            value = _value(normalized.get(name))
+            if value:
+                fields[field] = value
+                break
+    return fields
+
+class Profile(NamedTuple):
+    id: int
+    email: str
+    phone: Optional[str]
+
+    @property
+    def complete(self) -> bool:
+        return bool(self.email and self.phone)
+
+_user = User.__table__.c
+
+def _upsert():
+    statement = insert(User.__table__)
+    new = statement.excluded
+    values = {
+        # Placeholders on insert (uid as name, empty department) never replace known values
+        "name": func.coalesce(func.nullif(new.name, new.swufe_uid), _user.name),
+        "department": func.coalesce(func.nullif(new.department, ""), _user.department),
+        "email": func.coalesce(func.nullif(_user.email, ""), new.email),
+        "phone": func.coalesce(func.nullif(_user.phone, ""), new.phone, _user.phone),
+    }
+    return statement.on_conflict_do_update(
+        index_elements=["swufe_uid"],
+        set_=values,
+        where=or_(*(values[name].is_distinct_from(_user[name]) for name in FIELDS)),
+    ).returning(_user.id, _user.email, _user.phone)
+
+# Built once so its compiled form is cached; a list of rows goes out as one multi-row statement
+_UPSERT = _upsert()
+
+def _row(uid: str, fields: Dict[str, str]) -> dict:
+    return {"swufe_uid": uid, "name": fields.get("name") or uid, "email": fields.get("email") or "",
+            "phone": fields.get("phone"), "department": fields.get("department") or "", "role": "user",
+            "is_active": True, "password_hash": SSO_PASSWORD_HASH}
+
+def _changes(current, fields: Dict[str, str]) -> bool:
+    name, email, phone, department = current[1:]
+    return ((fields.get("name") and fields["name"] != name)
+            or (fields.get("department") and fields["department"] != department)
+            or (fields.get("email") and not email)
+            or (fields.get("phone") and not phone))
+
+def provision(session: Session, uid: str, attributes: dict = None) -> Profile:
+    """
+    The local account for a CAS login, created or updated from `attributes`
+    as needed. Commits only when something was written.
+    """
+    fields = map_attributes(attributes)
+    current = session.execute(
+        select(User.id, User.name, User.email, User.phone, User.department).where(User.swufe_uid == uid)).first()
+    if current is not None and not _changes(current, fields):
+        return Profile(current[0], current[2], current[3])
+    row = session.execute(_UPSERT, [_row(uid, fields)]).first()
+    session.commit()
+    if row is None:
+        # A concurrent login wrote the same values first
+        row = session.execute(select(User.id, User.email, User.phone).where(User.swufe_uid == uid)).first()
+    return Profile(*row)
+
+class PrefetchReport(NamedTuple):
+    processed: int
+    written: int
+    skipped: int
+
+def _batches(rows: Iterable[dict], size: int) -> Iterator[Dict[str, dict]]:
+    batch: Dict[str, dict] = {}
+    for row in rows:
+        # A uid repeated within a batch: the later row wins
+        batch[row["swufe_uid"]] = row
+        if len(batch) >= size:
+            yield batch
+            batch = {}
+    if batch:
+        yield batch
+
+def prefetch(session: Session, records: Iterable[Tuple[int, dict]], batch_size: int = 1000,
+             mapping: Dict[str, Tuple[str, ...]] = None) -> PrefetchReport:
+    """
+    Provision users ahead of their first login from directory export records
+    ((line number, attributes) as from user_import.read_rows), one upsert and
+    commit per batch. Records without a uid are skipped.
+    """
+    processed = written = skipped = 0
+
+    def rows():
+        nonlocal processed, skipped
+        for _, record in records:
+            processed += 1
+            uid = next((_value(record.get(name)) for name in UID_ATTRIBUTES if _value(record.get(name))), None)
+            if uid is None or "_error" in record:
+                skipped += 1
+                continue
+            yield _row(uid, map_attributes(record, mapping))
+
+    for batch in _batches(rows(), batch_size):
+        written += len(session.execute(_UPSERT, list(batch.values())).all())
+        session.commit()
+    return PrefetchReport(processed, written, skipped)
@@ -0,0 +1,88 @@
+"""
+SQLite FTS5 side indexes.
+
+An `FTSIndex` is an external-content FTS5 table over some text columns of a
+regular table, kept in sync by triggers. It uses the trigram tokenizer when
+available (substring matching, works for CJK text) and is created/dropped
+together with its table by metadata.create_all()/drop_all();
+`install_all()` adds missing indexes to an existing database. On other
+databases, or SQLite builds without FTS5, `available()` is False and callers
+fall back to LIKE.
+"""
+from typing import List, Sequence
+
+from sqlalchemy import Table, event, inspect, text
+from sqlmodel import Session
+
+REGISTRY: List["FTSIndex"] = []
+
+class FTSIndex:
+    def __init__(self, table: Table, columns: Sequence[str], name: str = None):
+        self.table = table
+        self.columns = list(columns)
+        self.name = name or f"{table.name}_fts"
+        REGISTRY.append(self)
+        event.listen(table, "after_create", lambda target, connection, **kw: self.install(connection))
+        event.listen(table, "before_drop", lambda target, connection, **kw: self.drop(connection))
+
+    def _triggers(self) -> dict:
+        table, fts = self.table.name, self.name
+        cols = ", ".join(self.columns)
+        new = ", ".join(f"new.{c}" for c in self.columns)
+        old = ", ".join(f"old.{c}" for c in self.columns)
+        insert = f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new});"
+        delete = f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old});"
+        changed = " OR ".join(f"old.{c} IS NOT new.{c}" for c in self.columns)
+        return {
+            f"{fts}_ai": f'CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON "{table}" BEGIN {insert} END',
+            f"{fts}_ad": f'CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON "{table}" BEGIN {delete} END',
+            # Re-index only when an indexed value actually changed (bulk upserts rewrite unchanged rows)
+            f"{fts}_au": f'CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON "{table}" WHEN {changed} '
+                         f'BEGIN {delete} {insert} END',
+        }
+
+    def install(self, connection) -> bool:
+        """
+        Create the FTS table and triggers if missing and index existing rows.
+        Returns False if FTS5 is unavailable.
+        """
+        if connection.dialect.name != "sqlite":
+            return False
+        if inspect(connection).has_table(self.name):
+            return True
+        create = (f"CREATE VIRTUAL TABLE {self.name} USING fts5({', '.join(self.columns)}, "
+                  f"content='{self.table.name}', content_rowid='id', tokenize='{{}}')")
+        try:
+            connection.exec_driver_sql(create.format("trigram"))
+        except Exception:
+            # SQLite < 3.34 has no trigram tokenizer; FTS5 itself may be missing too
+            try:
+                connection.exec_driver_sql(create.format("unicode61"))
+            except Exception:
+                return False
+        for trigger in self._triggers().values():
+            connection.exec_driver_sql(trigger)
+        connection.exec_driver_sql(f"INSERT INTO {self.name}({self.name}) VALUES ('rebuild')")
+        return True
+
+    def drop(self, connection):
+        if connection.dialect.name != "sqlite":
+            return
+        for name in self._triggers():
+            connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+        connection.exec_driver_sql(f"DROP TABLE IF EXISTS {self.name}")
+
+    def available(self, session: Session) -> bool:
+        if session.get_bind().dialect.name != "sqlite":
+            return False
+        return bool(session.execute(text("SELECT 1 FROM sqlite_master WHERE name = :name"), {"name": self.name}).first())
+
+def match_expression(terms: Sequence[str]) -> str:
+    """
+    Quote each term so user input is never parsed as FTS query syntax; terms are ANDed.
+    """
+    return " ".join('"' + t.replace('"', '""') + '"' for t in terms)
+
+def install_all(connection):
+    for index in REGISTRY:
+        index.install(connection)
@@ -0,0 +1,98 @@
+"""
+API gateway for API_GATEWAY resources.
+
+Approved applications get a downstream key in `Application.auth_output["api_key"]`
+(looked up by hash in the worker's `api_keys.key_index`). Requests to
+/api/v1/proxy/{resource_id}/{path} carrying that key (as `Authorization: Bearer
+...` or `X-API-Key`) are forwarded to one of the resource's upstreams (see `upstream_pool`) over a
+pooled httpx client; request and response bodies are
+streamed through unbuffered (chunked and SSE responses included, compressed
+bodies are passed on as-is). The downstream key and portal cookies never reach
+the upstream; the upstream's own key, if set, is sent instead.
+"""
+import asyncio
+import secrets
+from typing import NamedTuple, Optional
+
+import httpx
+
+from .. import config
+from .response_cache import CachePolicy
+from .upstream_pool import UpstreamPool
+
+KEY_PREFIX = "sk-etrap-"
+PROXY_PREFIX = "/api/v1/proxy"
+
+# Connection-scoped headers (RFC 9110 7.6.1) are never forwarded in either direction
+HOP_BY_HOP = frozenset({
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization", "te", "trailer",
+    "transfer-encoding", "upgrade",
+})
+STRIPPED_REQUEST = HOP_BY_HOP | {"host", "authorization", "x-api-key", "cookie"}
+
+class Grant(NamedTuple):
+    application_id: int
+    user_id: int
+    resource_id: int
+    pool: UpstreamPool
+    token_quota: Optional[int] = None
+    cache: Optional[CachePolicy] = None
+
+def issue_key() -> str:
+    return KEY_PREFIX + secrets.token_urlsafe(32)
+
+def endpoint(resource_id: int) -> str:
+    return f"{PROXY_PREFIX}/{resource_id}"
+
+def extract_key(headers) -> Optional[str]:
+    authorization = headers.get("authorization", "")
+    if authorization[:7].lower() == "bearer ":
+        return authorization[7:].strip() or None
+    return headers.get("x-api-key") or None
+
+def upstream_url(base: str, path: str, query: str) -> str:
+    url = base.rstrip("/") + "/" + path.lstrip("/")
+    return f"{url}?{query}" if query else url
+
+def request_headers(headers, upstream_key: Optional[str], client_host: Optional[str]) -> list:
+    forwarded = [(k, v) for k, v in headers.items() if k.lower() not in STRIPPED_REQUEST]
+    if upstream_key:
+        forwarded.append(("authorization", f"Bearer {upstream_key}"))
+    if client_host:
+        prior = headers.get("x-forwarded-for")
+        forwarded = [(k, v) for k, v in forwarded if k.lower() != "x-forwarded-for"]
+        forwarded.append(("x-forwarded-for", f"{prior}, {client_host}" if prior else client_host))
+    return forwarded
+
+def response_headers(headers: httpx.Headers) -> dict:
+    # Upstream cookies would be set on the portal's domain
+    return {k: v for k, v in headers.items() if k.lower() not in HOP_BY_HOP and k.lower() != "set-cookie"}
+
+class GatewayClient:
+    """
+    Per-worker pooled AsyncClient. httpx pools are bound to the event loop that
+    first used them, so a client is recreated if the loop changes (tests).
+    """
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop = None
+
+    def get(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or self._loop is not loop:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=config.GATEWAY_MAX_CONNECTIONS,
+                                    max_keepalive_connections=config.GATEWAY_MAX_KEEPALIVE),
+                timeout=httpx.Timeout(config.GATEWAY_READ_TIMEOUT, connect=config.GATEWAY_CONNECT_TIMEOUT),
+                follow_redirects=False,
+                trust_env=False,
+            )
+            self._loop = loop
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None and self._loop is asyncio.get_running_loop():
+            await self._client.aclose()
+        self._client = None
+
+gateway_client = GatewayClient()
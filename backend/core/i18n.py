@@ -1,5 +1,17 @@
+import ast
+import gettext
+import json
+import os
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Callable, Dict, List, Mapping, Optional, Tuple
+
 from fastapi import Request
 
+from .. import config
+
+DEFAULT_LANG = "zh"
+
 TRANSLATIONS = {
     "zh": {
         "Software": "软件资源",
@@ -30,10 +42,8 @@ TRANSLATIONS = {
         "App ID": "申请编号",
         "Priority": "优先级",
         "User Info": "用户信息",
-        "Resource": "资源",
         "Submission Details": "提交详情",
         "Time": "时间",
-        "Actions": "操作",
         "HIGH": "高",
         "NORMAL": "普通",
         "No pending applications": "暂无待审批申请",
@@ -43,16 +53,12 @@ TRANSLATIONS = {
         "Top Requested Resources": "热门资源",
         "Recent Audit Logs": "最近审计日志",
         "Admin": "管理员",
-        "Action": "动作",
-        "Details": "详情",
         "IP": "IP地址",
         "Reject Application": "拒绝申请",
         "Reason for Rejection": "拒绝原因",
         "Cancel": "取消",
         "Submit Application": "提交申请",
         "New Resource Wizard": "新建资源向导",
-        "Resource Name": "资源名称",
-        "Category": "分类",
         "Description / Introduction": "描述 / 介绍",
         "Valid Until (Expiry Date)": "有效期至",
         "Authorization Type": "授权类型",
@@ -210,7 +216,35 @@ TRANSLATIONS = {
         "Create Resource": "创建资源",
         "Preview Resource Card": "预览资源卡片",
         "Footer Institution": "教务处-实验教学管理中心",
-        "Footer Contact": "联系电话 028-87092348 颐德楼i507"
+        "Footer Contact": "联系电话 028-87092348 颐德楼i507",
+        "Request Profiles - E-TRAP Admin": "请求性能分析 - E-TRAP 管理后台",
+        "Request Profiles": "请求性能分析",
+        "Profile a single request by adding this header or query parameter (valid for 1 hour):": "在请求中添加以下请求头或查询参数即可对单个请求进行性能分析（1小时内有效）：",
+        "Sampling rate": "采样率",
+        "Profiling is disabled. Start the server with ETRAP_PROFILING=1 to enable it.": "性能分析未启用。请使用 ETRAP_PROFILING=1 启动服务。",
+        "Request": "请求",
+        "Duration (ms)": "耗时 (毫秒)",
+        "Trigger": "触发方式",
+        "Download": "下载",
+        "No profiles captured yet": "暂无性能分析记录",
+        "Results": "结果数",
+        "Previous Page": "上一页",
+        "Next Page": "下一页",
+        "Auto-Approval Rules (JSON)": "自动审批规则（JSON）",
+        "Manual Approval only: the first matching rule approves or rejects instantly; otherwise the application waits for review.": "仅适用于人工审批：首条匹配的规则将立即批准或拒绝申请，否则申请进入待审核队列。",
+        "Quota": "配额",
+        "Maximum number of active approvals; for API Gateway resources, the default token quota. Leave empty for no limit.": "同时有效的最大批准数；API 网关资源为默认 Token 配额。留空表示不限制。",
+        "API Endpoint": "API 地址",
+        "API Key": "API 密钥",
+        "Copy": "复制",
+        "Upstream Pool (JSON)": "上游池 (JSON)",
+        "Optional: spreads requests over several upstream endpoints and keys, replacing the endpoint above. Failing upstreams are skipped for a while.": "可选：将请求分摊到多个上游端点和密钥，替代上方的端点。故障的上游会被暂时跳过。",
+        "Response Cache TTL (seconds)": "响应缓存时长（秒）",
+        "Optional: identical GET requests from any user are answered from the cache for this long. Leave empty for no caching.": "可选：在此时长内，任何用户的相同 GET 请求都直接由缓存应答。留空表示不缓存。",
+        "Application approved: {resource}": "申请已通过：{resource}",
+        "Your application #{id} for {resource} has been approved.": "您对 {resource} 的申请（#{id}）已通过审核。",
+        "Application rejected: {resource}": "申请未通过：{resource}",
+        "Your application #{id} for {resource} was rejected. Reason: {reason}": "您对 {resource} 的申请（#{id}）未通过审核。原因：{reason}"
     },
     "en": {
         "Software": "Software",
@@ -241,10 +275,8 @@ TRANSLATIONS = {
         "App ID": "App ID",
         "Priority": "Priority",
         "User Info": "User Info",
-        "Resource": "Resource",
         "Submission Details": "Submission Details",
         "Time": "Time",
-        "Actions": "Actions",
         "HIGH": "HIGH",
         "NORMAL": "NORMAL",
         "No pending applications": "No pending applications",
@@ -254,16 +286,12 @@ TRANSLATIONS = {
         "Top Requested Resources": "Top Requested Resources",
         "Recent Audit Logs": "Recent Audit Logs",
         "Admin": "Admin",
-        "Action": "Action",
-        "Details": "Details",
         "IP": "IP",
         "Reject Application": "Reject Application",
         "Reason for Rejection": "Reason for Rejection",
         "Cancel": "Cancel",
         "Submit Application": "Submit Application",
         "New Resource Wizard": "New Resource Wizard",
-        "Resource Name": "Resource Name",
-        "Category": "Category",
         "Description / Introduction": "Description / Introduction",
         "Valid Until (Expiry Date)": "Valid Until (Expiry Date)",
         "Authorization Type": "Authorization Type",
@@ -387,17 +415,243 @@ TRANSLATIONS = {
         "Count": "Count",
         "No data available": "No data available",
         "Footer Institution": "Dean's Office - Experimental Teaching Management Center",
-        "Footer Contact": "Contact: 028-87092348 Yide Building i507"
+        "Footer Contact": "Contact: 028-87092348 Yide Building i507",
+        "Request Profiles - E-TRAP Admin": "Request Profiles - E-TRAP Admin",
+        "Request Profiles": "Request Profiles",
+        "Profile a single request by adding this header or query parameter (valid for 1 hour):": "Profile a single request by adding this header or query parameter (valid for 1 hour):",
+        "Sampling rate": "Sampling rate",
+        "Profiling is disabled. Start the server with ETRAP_PROFILING=1 to enable it.": "Profiling is disabled. Start the server with ETRAP_PROFILING=1 to enable it.",
+        "Request": "Request",
+        "Duration (ms)": "Duration (ms)",
+        "Trigger": "Trigger",
+        "Download": "Download",
+        "No profiles captured yet": "No profiles captured yet",
+        "Results": "Results",
+        "Previous Page": "Previous Page",
+        "Next Page": "Next Page",
+        "Auto-Approval Rules (JSON)": "Auto-Approval Rules (JSON)",
+        "Manual Approval only: the first matching rule approves or rejects instantly; otherwise the application waits for review.": "Manual Approval only: the first matching rule approves or rejects instantly; otherwise the application waits for review.",
+        "Quota": "Quota",
+        "Maximum number of active approvals; for API Gateway resources, the default token quota. Leave empty for no limit.": "Maximum number of active approvals; for API Gateway resources, the default token quota. Leave empty for no limit.",
+        "API Endpoint": "API Endpoint",
+        "API Key": "API Key",
+        "Copy": "Copy",
+        "Upstream Pool (JSON)": "Upstream Pool (JSON)",
+        "Optional: spreads requests over several upstream endpoints and keys, replacing the endpoint above. Failing upstreams are skipped for a while.": "Optional: spreads requests over several upstream endpoints and keys, replacing the endpoint above. Failing upstreams are skipped for a while.",
+        "Response Cache TTL (seconds)": "Response Cache TTL (seconds)",
+        "Optional: identical GET requests from any user are answered from the cache for this long. Leave empty for no caching.": "Optional: identical GET requests from any user are answered from the cache for this long. Leave empty for no caching.",
+        "Application approved: {resource}": "Application approved: {resource}",
+        "Your application #{id} for {resource} has been approved.": "Your application #{id} for {resource} has been approved.",
+        "Application rejected: {resource}": "Application rejected: {resource}",
+        "Your application #{id} for {resource} was rejected. Reason: {reason}": "Your application #{id} for {resource} was rejected. Reason: {reason}"
     }
 }
 
-def get_translator(request: Request):
-    # Get lang from cookie, default to zh
-    lang = request.cookies.get("lang", "zh")
-    if lang not in TRANSLATIONS:
-        lang = "zh"
-            
+def _find_duplicate_keys() -> Dict[str, List[str]]:
+    """
+    A dict literal silently keeps the last value for a repeated key, so duplicates
+    can only be found in the source itself.
+    """
+    with open(__file__, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    duplicates = {}
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and getattr(node.targets[0], "id", None) == "TRANSLATIONS":
+            for lang_node, table_node in zip(node.value.keys, node.value.values):
+                seen = set()
+                dupes = []
+                for key_node in table_node.keys:
+                    if key_node.value in seen:
+                        dupes.append(key_node.value)
+                    seen.add(key_node.value)
+                if dupes:
+                    duplicates[lang_node.value] = dupes
+    return duplicates
+
+def _load_json_catalog(path: str, duplicates: Dict[str, List[str]], lang: str) -> Dict[str, str]:
+    def collect(pairs):
+        table = {}
+        for key, value in pairs:
+            if key in table:
+                duplicates.setdefault(lang, []).append(key)
+            table[key] = value
+        return table
+    with open(path, encoding="utf-8") as f:
+        return json.load(f, object_pairs_hook=collect)
+
+def load_catalogs(locale_dir: str, duplicates: Dict[str, List[str]] = None) -> Dict[str, Dict[str, str]]:
+    """
+    Load translation catalogs from disk.
+    Supports `<lang>.json` files and gettext `<lang>/LC_MESSAGES/messages.mo`.
+    """
+    duplicates = {} if duplicates is None else duplicates
+    catalogs = {}
+    if not locale_dir or not os.path.isdir(locale_dir):
+        return catalogs
+    for entry in sorted(os.listdir(locale_dir)):
+        path = os.path.join(locale_dir, entry)
+        if entry.endswith(".json"):
+            lang = entry[:-len(".json")]
+            catalogs.setdefault(lang, {}).update(_load_json_catalog(path, duplicates, lang))
+        else:
+            mo_path = os.path.join(path, "LC_MESSAGES", "messages.mo")
+            if os.path.isfile(mo_path):
+                with open(mo_path, "rb") as f:
+                    mo = gettext.GNUTranslations(f)
+                # Plural entries are keyed (msgid, n); only plain messages are looked up
+                catalogs.setdefault(entry, {}).update(
+                    {k: v for k, v in mo._catalog.items() if isinstance(k, str) and k})
+    return catalogs
+
+def validate_translations(tables: Mapping[str, Mapping[str, str]] = None, duplicates: Dict[str, List[str]] = None) -> dict:
+    """
+    Report duplicate keys and keys missing from a language compared to the union of all languages.
+    """
+    if tables is None:
+        tables = TABLES
+    if duplicates is None:
+        duplicates = _find_duplicate_keys()
+        for lang, keys in CATALOG_DUPLICATES.items():
+            duplicates[lang] = duplicates.get(lang, []) + keys
+    all_keys = set()
+    for table in tables.values():
+        all_keys.update(table)
+    missing = {}
+    for lang, table in tables.items():
+        absent = sorted(all_keys - set(table))
+        if absent:
+            missing[lang] = absent
+    return {"duplicates": duplicates, "missing": missing}
+
+def _make_translator(table: Mapping[str, str]) -> Callable[[str], str]:
+    lookup = table.get
+
     def translate(key):
-        return TRANSLATIONS.get(lang, {}).get(key, key)
-        
-    return translate, lang
+        return lookup(key, key)
+
+    return translate
+
+def build_tables(locale_dir: str = None, duplicates: Dict[str, List[str]] = None) -> Mapping[str, Mapping[str, str]]:
+    """
+    Merge the built-in TRANSLATIONS with on-disk catalogs into immutable per-language mappings.
+    Keys repeated within a catalog file are added to `duplicates`.
+    """
+    merged = {lang: dict(table) for lang, table in TRANSLATIONS.items()}
+    for lang, table in load_catalogs(locale_dir, duplicates).items():
+        merged.setdefault(lang, {}).update(table)
+    return MappingProxyType({lang: MappingProxyType(table) for lang, table in merged.items()})
+
+def reload_translations(locale_dir: str = None):
+    """
+    Rebuild the language tables and translators (e.g. after catalogs on disk change).
+    """
+    global TABLES, TRANSLATORS, CATALOG_DUPLICATES
+    duplicates = {}
+    TABLES = build_tables(locale_dir if locale_dir is not None else config.LOCALE_DIR, duplicates)
+    CATALOG_DUPLICATES = duplicates
+    TRANSLATORS = MappingProxyType({lang: _make_translator(table) for lang, table in TABLES.items()})
+    negotiate_language.cache_clear()
+
+@lru_cache(maxsize=256)
+def parse_accept_language(header: str) -> Tuple[str, ...]:
+    """
+    Parse an Accept-Language header into language tags ordered by q-value (highest first).
+    Ties keep header order; tags with q=0 are dropped. Results are memoized since
+    browsers send a handful of distinct headers.
+    """
+    weighted = []
+    for index, part in enumerate(header.split(",")):
+        tag, _, params = part.strip().partition(";")
+        tag = tag.strip().lower()
+        if not tag:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q <= 0:
+            continue
+        weighted.append((-q, index, tag))
+    weighted.sort()
+    return tuple(tag for _, _, tag in weighted)
+
+@lru_cache(maxsize=256)
+def negotiate_language(header: str) -> Optional[str]:
+    """
+    Pick the best supported language for an Accept-Language header, or None.
+    `zh-CN` falls back to `zh`; `*` matches the default language.
+    """
+    for tag in parse_accept_language(header):
+        if tag in TRANSLATORS:
+            return tag
+        primary = tag.split("-", 1)[0]
+        if primary in TRANSLATORS:
+            return primary
+        if tag == "*":
+            return DEFAULT_LANG
+    return None
+
+def get_language(request: Request) -> str:
+    """
+    Resolve the request language: `lang` cookie, then Accept-Language, then zh.
+    """
+    lang = request.cookies.get("lang")
+    if lang in TRANSLATORS:
+        return lang
+    header = request.headers.get("accept-language")
+    if header:
+        lang = negotiate_language(header)
+        if lang:
+            return lang
+    return DEFAULT_LANG
+
+def get_translator(request: Request):
+    lang = get_language(request)
+    # Without a lang cookie the page depends on the Accept-Language header too
+    request.state.vary_language = "Cookie" if request.cookies.get("lang") in TRANSLATORS \
+        else "Accept-Language, Cookie"
+    return TRANSLATORS[lang], lang
+
+class LanguageVaryMiddleware:
+    """
+    Adds `Vary` to responses rendered through get_translator, so shared
+    caches keep the zh and en versions of a page apart. Pure ASGI, since
+    routes return their own Response objects.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            vary = scope.get("state", {}).get("vary_language")
+            if message["type"] == "http.response.start" and vary:
+                headers = list(message.get("headers", []))
+                existing = [value.decode("latin-1") for name, value in headers if name.lower() == b"vary"]
+                headers = [(name, value) for name, value in headers if name.lower() != b"vary"]
+                headers.append((b"vary", ", ".join(existing + [vary]).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+TABLES: Mapping[str, Mapping[str, str]] = MappingProxyType({})
+TRANSLATORS: Mapping[str, Callable[[str], str]] = MappingProxyType({})
+# Keys repeated within the on-disk catalogs loaded by the last reload_translations()
+CATALOG_DUPLICATES: Dict[str, List[str]] = {}
+reload_translations()
+
+if __name__ == "__main__":
+    report = validate_translations()
+    for lang, keys in report["duplicates"].items():
+        print(f"[{lang}] duplicate keys: {', '.join(keys)}")
+    for lang, keys in report["missing"].items():
+        print(f"[{lang}] missing {len(keys)} keys: {', '.join(keys)}")
+    raise SystemExit(1 if report["duplicates"] else 0)
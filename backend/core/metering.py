@@ -0,0 +1,350 @@
+"""
+Token metering for API_GATEWAY resources.
+
+For gateway resources `Resource.config["quota"]` is a token allowance per
+application. Usage is read from upstream responses as they stream through
+(the `usage` object of OpenAI- and Anthropic-style JSON bodies and SSE
+events) and charged to the application in memory; a background thread
+applies the accumulated amounts in one transaction per interval, so proxied
+calls never wait for SQLite's write lock.
+
+Crash safety: every charge is appended to this worker's journal file before
+it is counted. A flush switches to a new journal, applies the old one's
+totals and records its name in `meterjournal` in the same transaction, then
+deletes the file. At startup, journals left by dead workers (no longer
+flock()ed) are replayed unless their name was already applied, so usage is
+neither lost nor counted twice when a worker is killed.
+
+Workers see each other's usage after their next flush; overspend is bounded
+by what the other workers charge within one flush interval.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy.dialects.sqlite import insert
+from sqlmodel import Session, select
+
+try:
+    import fcntl
+except ImportError:  # Windows: no journal locking, run a single worker
+    fcntl = None
+
+from .. import config
+from ..models import MeterJournal, TokenUsage
+from .gateway import Grant
+from .metrics import GATEWAY_TOKENS, METERING_FLUSH_SECONDS, METERING_PENDING
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_SUFFIX = ".journal"
+ID_CHUNK_SIZE = 1000
+# Largest non-streamed body (or single SSE line) inspected for usage
+MAX_USAGE_BODY = 1024 * 1024
+
+def usage_tokens(usage: Dict[str, int]) -> int:
+    if "total_tokens" in usage:
+        return usage["total_tokens"]
+    return sum(usage.get(name, 0) for name in ("prompt_tokens", "completion_tokens", "input_tokens", "output_tokens"))
+
+class UsageParser:
+    """
+    Picks the token usage out of a response body fed chunk by chunk. SSE
+    streams may report usage in several events (Anthropic: input tokens at
+    message_start, cumulative output tokens in message_delta); the latest value
+    of each counter wins.
+    """
+    def __init__(self, content_type: str = "", content_encoding: str = ""):
+        self.stream = content_type.startswith("text/event-stream")
+        encoding = content_encoding.lower()
+        # wbits 47: zlib or gzip header, detected automatically
+        self._decoder = zlib.decompressobj(47) if encoding in ("gzip", "deflate") else None
+        self._buffer = b""
+        self._usage: Dict[str, int] = {}
+
+    def feed(self, chunk: bytes):
+        if self._decoder is not None:
+            try:
+                chunk = self._decoder.decompress(chunk)
+            except zlib.error:
+                self._decoder, self._buffer = None, b""
+                return
+        if not self.stream:
+            if len(self._buffer) <= MAX_USAGE_BODY:
+                self._buffer += chunk
+            return
+        self._buffer += chunk
+        *lines, self._buffer = self._buffer.split(b"\n")
+        for line in lines:
+            # Only events that carry usage are worth decoding
+            if line.startswith(b"data:") and b'"usage"' in line:
+                self._read(line[5:])
+        if len(self._buffer) > MAX_USAGE_BODY:
+            self._buffer = b""
+
+    def _read(self, payload: bytes):
+        try:
+            data = json.loads(payload)
+        except ValueError:
+            return
+        if not isinstance(data, dict):
+            return
+        usage = data.get("usage") or (data.get("message") or {}).get("usage")
+        if isinstance(usage, dict):
+            self._usage.update({k: v for k, v in usage.items() if isinstance(v, int)})
+
+    @property
+    def tokens(self) -> int:
+        if not self.stream and self._buffer:
+            self._read(self._buffer)
+            self._buffer = b""
+        return usage_tokens(self._usage)
+
+def parser_for(headers) -> Optional[UsageParser]:
+    """
+    A parser for responses that can carry usage (JSON and SSE), None for anything else.
+    """
+    content_type = headers.get("content-type", "").lower()
+    if "json" not in content_type and not content_type.startswith("text/event-stream"):
+        return None
+    return UsageParser(content_type, headers.get("content-encoding", ""))
+
+class TokenMeter:
+    """
+    Per-worker token balances. `record` charges usage in memory (and the
+    journal); `remaining` answers from memory once an application's persisted
+    total has been loaded with `load`. Without `start` (tests, scripts) usage
+    stays in memory until `flush`.
+    """
+    def __init__(self, flush_interval: float = 1.0):
+        self.flush_interval = flush_interval
+        self._used: Dict[int, int] = {}      # persisted totals as of the last flush
+        self._inflight: Dict[int, int] = {}  # being written by the current flush
+        self._pending: Dict[int, int] = {}   # charged since
+        self._lock = threading.Lock()
+        self._engine = None
+        self._dir: Optional[str] = None
+        self._journal: Optional[int] = None
+        self._journal_path: Optional[str] = None
+        self._retired: List[str] = []
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, engine, journal_dir: str):
+        if self.running:
+            return
+        self._engine = engine
+        self._dir = journal_dir
+        os.makedirs(journal_dir, exist_ok=True)
+        self.recover()
+        with self._lock:
+            self._open_journal()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="etrap-token-meter", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """
+        Stop the flush thread and write everything still pending.
+        """
+        if not self.running:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+        with self._lock:
+            fd, path = self._journal, self._journal_path
+            self._journal = self._journal_path = None
+            if fd is not None:
+                os.close(fd)
+                # Usage a failed final flush could not write stays journaled for the next start
+                if not self._pending:
+                    os.remove(path)
+
+    def clear(self):
+        with self._lock:
+            self._used.clear()
+            self._inflight.clear()
+            self._pending.clear()
+            METERING_PENDING.set(0)
+
+    # --- Request path ---
+
+    def loaded(self, application_id: int) -> bool:
+        return application_id in self._used
+
+    def load(self, session: Session, application_id: int):
+        used = session.exec(select(TokenUsage.used).where(TokenUsage.application_id == application_id)).first()
+        with self._lock:
+            self._used.setdefault(application_id, used or 0)
+
+    def used(self, application_id: int) -> int:
+        return (self._used.get(application_id, 0) + self._inflight.get(application_id, 0)
+                + self._pending.get(application_id, 0))
+
+    def remaining(self, grant: Grant) -> Optional[int]:
+        """
+        Tokens left for this grant, or None when the resource has no token quota.
+        """
+        if grant.token_quota is None:
+            return None
+        return grant.token_quota - self.used(grant.application_id)
+
+    def record(self, grant: Grant, tokens: int):
+        if tokens <= 0:
+            return
+        GATEWAY_TOKENS.inc(tokens, resource=grant.resource_id)
+        with self._lock:
+            if self._journal is not None:
+                os.write(self._journal, f"{grant.application_id} {tokens}\n".encode("ascii"))
+            self._pending[grant.application_id] = self._pending.get(grant.application_id, 0) + tokens
+            METERING_PENDING.set(len(self._pending))
+
+    # --- Write-behind ---
+
+    def flush(self, engine=None) -> int:
+        """
+        Apply pending usage in one transaction and refresh the totals other
+        workers have written. Returns the number of applications charged.
+        """
+        engine = engine or self._engine
+        with self._lock:
+            batch, self._pending = self._pending, {}
+            self._inflight = batch
+            old_journal = None
+            if batch and self._journal is not None:
+                # Later charges go to a fresh journal; the old one stays locked until it is applied
+                old_journal = (self._journal, self._journal_path)
+                self._open_journal()
+            METERING_PENDING.set(0)
+        start = time.perf_counter()
+        try:
+            with Session(engine) as session:
+                if batch:
+                    _apply(session, batch)
+                    if old_journal:
+                        session.add(MeterJournal(name=os.path.basename(old_journal[1])))
+                if self._retired:
+                    session.execute(MeterJournal.__table__.delete().where(MeterJournal.name.in_(self._retired)))
+                session.commit()
+        except Exception:
+            logger.exception("Failed to write token usage for %d applications", len(batch))
+            with self._lock:
+                # Back to pending, and into the current journal so the old one can go
+                for application_id, tokens in batch.items():
+                    self._pending[application_id] = self._pending.get(application_id, 0) + tokens
+                    if self._journal is not None:
+                        os.write(self._journal, f"{application_id} {tokens}\n".encode("ascii"))
+                self._inflight = {}
+                METERING_PENDING.set(len(self._pending))
+            if old_journal:
+                os.remove(old_journal[1])
+                os.close(old_journal[0])
+            return 0
+        # The journal's name is only needed while its file exists
+        self._retired = []
+        if old_journal:
+            os.remove(old_journal[1])
+            os.close(old_journal[0])
+            self._retired.append(os.path.basename(old_journal[1]))
+        # The batch is committed: failing to read the totals back must not charge it again
+        try:
+            with Session(engine) as session:
+                totals = _totals(session, list(self._used))
+        except Exception:
+            logger.exception("Failed to read back token usage totals")
+            totals = {application_id: self._used.get(application_id, 0) + tokens
+                      for application_id, tokens in batch.items()}
+        with self._lock:
+            self._used.update(totals)
+            self._inflight = {}
+        METERING_FLUSH_SECONDS.observe(time.perf_counter() - start)
+        return len(batch)
+
+    def recover(self) -> int:
+        """
+        Replay journals of workers that died before flushing. Returns the number of journals replayed.
+        """
+        replayed = 0
+        for name in sorted(os.listdir(self._dir)):
+            if not name.endswith(JOURNAL_SUFFIX):
+                continue
+            path = os.path.join(self._dir, name)
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except FileNotFoundError:
+                continue  # another worker recovered it
+            try:
+                if fcntl is not None:
+                    try:
+                        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except OSError:
+                        continue  # a live worker's journal
+                with Session(self._engine) as session:
+                    if session.get(MeterJournal, name) is None:
+                        batch = _read_journal(path)
+                        _apply(session, batch)
+                        session.add(MeterJournal(name=name))
+                        session.commit()
+                        replayed += 1
+                        logger.info("Replayed token usage journal %s (%d applications)", name, len(batch))
+                os.remove(path)
+            finally:
+                os.close(fd)
+        return replayed
+
+    def _open_journal(self):
+        path = os.path.join(self._dir, f"{os.getpid()}-{time.time_ns()}{JOURNAL_SUFFIX}")
+        # Locked under a temporary name, so recovery never sees it unlocked
+        fd = os.open(path + ".new", os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        os.rename(path + ".new", path)
+        self._journal, self._journal_path = fd, path
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+        self.flush()
+
+def _apply(session: Session, batch: Dict[int, int]):
+    now = datetime.now()
+    statement = insert(TokenUsage.__table__)
+    session.execute(
+        statement.on_conflict_do_update(
+            index_elements=["application_id"],
+            set_={"used": TokenUsage.__table__.c.used + statement.excluded.used, "updated_at": now},
+        ),
+        [{"application_id": application_id, "used": tokens, "updated_at": now}
+         for application_id, tokens in batch.items()],
+    )
+
+def _totals(session: Session, application_ids: list) -> Dict[int, int]:
+    totals: Dict[int, int] = {}
+    for i in range(0, len(application_ids), ID_CHUNK_SIZE):
+        chunk = application_ids[i:i + ID_CHUNK_SIZE]
+        totals.update(session.exec(
+            select(TokenUsage.application_id, TokenUsage.used).where(TokenUsage.application_id.in_(chunk))).all())
+    return totals
+
+def _read_journal(path: str) -> Dict[int, int]:
+    batch: Dict[int, int] = {}
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                application_id, tokens = map(int, line.split())
+            except ValueError:
+                continue  # torn last line
+            batch[application_id] = batch.get(application_id, 0) + tokens
+    return batch
+
+token_meter = TokenMeter(flush_interval=config.METERING_FLUSH_INTERVAL)
@@ -0,0 +1,308 @@
+"""
+In-process metrics with Prometheus text exposition.
+
+Hot-path friendly: each observation is a dict lookup plus a few additions under a lock.
+Per-request DB statistics are collected through SQLAlchemy cursor events and a
+context variable set by MetricsMiddleware.
+"""
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import event
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def collect(self):
+        lines = self.header()
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [bucket counts..., +Inf count, sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return sum(series[:-1]) if series else 0
+
+    def sum(self, **labels) -> float:
+        series = self._series.get(self._key(labels))
+        return series[-1] if series else 0.0
+
+    def collect(self):
+        lines = self.header()
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = 'le="%s"' % _format_value(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_DURATION = REGISTRY.histogram(
+    "etrap_http_request_duration_seconds", "HTTP request latency by route template.", ("method", "route", "status"))
+HTTP_REQUESTS_IN_PROGRESS = REGISTRY.gauge(
+    "etrap_http_requests_in_progress", "HTTP requests currently being served.")
+HTTP_REQUEST_DB_QUERIES = REGISTRY.histogram(
+    "etrap_http_request_db_queries", "SQL statements executed per request.", ("route",),
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100))
+HTTP_REQUEST_DB_SECONDS = REGISTRY.histogram(
+    "etrap_http_request_db_seconds", "Time spent in SQL per request.", ("route",))
+DB_QUERIES = REGISTRY.counter(
+    "etrap_db_queries_total", "SQL statements executed.")
+DB_QUERY_DURATION = REGISTRY.histogram(
+    "etrap_db_query_duration_seconds", "SQL statement latency.",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0))
+CAS_VALIDATION_DURATION = REGISTRY.histogram(
+    "etrap_cas_validation_duration_seconds", "CAS ticket validation latency.", ("outcome",))
+WATERMARK_BYTES = REGISTRY.counter(
+    "etrap_watermark_bytes_total", "Bytes streamed from watermarked downloads (rate() gives bytes/sec).")
+WATERMARK_STREAM_DURATION = REGISTRY.histogram(
+    "etrap_watermark_stream_duration_seconds", "Duration of watermarked download streams.",
+    buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0))
+WATERMARK_ACTIVE_STREAMS = REGISTRY.gauge(
+    "etrap_watermark_active_streams", "Watermarked download streams in progress.")
+AUDIT_QUEUE_DEPTH = REGISTRY.gauge(
+    "etrap_audit_queue_depth", "Audit events waiting for the background writer.")
+AUDIT_FLUSH_ROWS = REGISTRY.histogram(
+    "etrap_audit_flush_rows", "Rows written per audit batch insert.",
+    buckets=(1, 5, 10, 50, 100, 250, 500, 1000))
+AUDIT_DROPPED = REGISTRY.counter(
+    "etrap_audit_dropped_total", "Audit events lost because a batch insert failed.")
+GATEWAY_UPSTREAM_DURATION = REGISTRY.histogram(
+    "etrap_gateway_upstream_seconds", "Time to upstream response headers through the API gateway.",
+    ("resource", "status"))
+GATEWAY_BYTES = REGISTRY.counter(
+    "etrap_gateway_bytes_total", "Response bytes streamed through the API gateway.", ("resource",))
+GATEWAY_ACTIVE_STREAMS = REGISTRY.gauge(
+    "etrap_gateway_active_streams", "API gateway responses currently streaming.")
+GATEWAY_UPSTREAM_OUTSTANDING = REGISTRY.gauge(
+    "etrap_gateway_upstream_outstanding", "Requests in flight per gateway upstream.", ("resource", "upstream"))
+GATEWAY_UPSTREAM_EWMA = REGISTRY.gauge(
+    "etrap_gateway_upstream_latency_ewma_seconds", "EWMA of time to response headers per gateway upstream.",
+    ("resource", "upstream"))
+GATEWAY_UPSTREAM_BREAKER = REGISTRY.gauge(
+    "etrap_gateway_upstream_breaker_open", "1 while a gateway upstream's circuit breaker is open.",
+    ("resource", "upstream"))
+GATEWAY_CACHE_REQUESTS = REGISTRY.counter(
+    "etrap_gateway_cache_requests_total", "Cacheable gateway requests by outcome (hit, miss, coalesced).",
+    ("resource", "result"))
+GATEWAY_CACHE_BYTES = REGISTRY.gauge(
+    "etrap_gateway_cache_bytes", "Bytes held by the gateway response cache.", ("tier",))
+GATEWAY_TOKENS = REGISTRY.counter(
+    "etrap_gateway_tokens_total", "Tokens metered from API gateway responses.", ("resource",))
+METERING_PENDING = REGISTRY.gauge(
+    "etrap_metering_pending_applications", "Applications with token usage not yet written to the database.")
+METERING_FLUSH_SECONDS = REGISTRY.histogram(
+    "etrap_metering_flush_seconds", "Time to write one batch of token usage.",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0))
+RATE_LIMITED = REGISTRY.counter(
+    "etrap_rate_limited_total", "Requests refused with 429 by a rate limit.", ("scope",))
+NOTIFICATIONS = REGISTRY.counter(
+    "etrap_notifications_total", "Notification deliveries by channel and outcome (sent, retry, failed).",
+    ("channel", "result"))
+NOTIFICATION_BATCH_SECONDS = REGISTRY.histogram(
+    "etrap_notification_batch_seconds", "Time to deliver one batch of notifications.", ("channel",),
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0))
+SSO_SESSIONS_ENDED = REGISTRY.counter(
+    "etrap_sso_sessions_ended_total", "CAS login sessions ended, by CAS single logout or locally.", ("via",))
+
+# --- Per-request SQL accounting ---
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+current_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("etrap_request_stats", default=None)
+# Set by the profiler to a list that collects (statement, ms) for the current request
+current_sql_trace: ContextVar[Optional[list]] = ContextVar("etrap_sql_trace", default=None)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("etrap_query_start", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["etrap_query_start"].pop()
+    DB_QUERIES.inc()
+    DB_QUERY_DURATION.observe(elapsed)
+    stats = current_request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+    trace = current_sql_trace.get()
+    if trace is not None:
+        trace.append((statement, elapsed * 1000))
+
+def instrument_engine(engine):
+    """
+    Attach query counting/timing hooks to an engine (idempotent).
+    """
+    if getattr(engine, "_etrap_instrumented", False):
+        return engine
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    engine._etrap_instrumented = True
+    return engine
+
+# --- HTTP middleware ---
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware (keeps streaming responses unbuffered). Latency covers the full response body.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = current_request_stats.set(stats)
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_PROGRESS.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUESTS_IN_PROGRESS.dec()
+            current_request_stats.reset(token)
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            HTTP_REQUEST_DURATION.observe(time.perf_counter() - start, method=scope["method"], route=route_path, status=status_code)
+            HTTP_REQUEST_DB_QUERIES.observe(stats.queries, route=route_path)
+            HTTP_REQUEST_DB_SECONDS.observe(stats.db_seconds, route=route_path)
+
+# --- Streams ---
+
+def track_stream(chunks):
+    """
+    Wrap a watermark zip generator to count bytes, duration and concurrent streams.
+    """
+    WATERMARK_ACTIVE_STREAMS.inc()
+    start = time.perf_counter()
+    try:
+        for chunk in chunks:
+            WATERMARK_BYTES.inc(len(chunk))
+            yield chunk
+    finally:
+        WATERMARK_ACTIVE_STREAMS.dec()
+        WATERMARK_STREAM_DURATION.observe(time.perf_counter() - start)
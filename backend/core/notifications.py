@@ -0,0 +1,381 @@
+"""
+Approval notifications (email, SMS) through a transactional outbox.
+
+Review actions call `queue_review_notices` before they commit, so a
+`notification` row exists exactly when the status change it announces does,
+and the admin's request never waits on a mail server. A background
+dispatcher per worker claims due rows in batches per channel, delivers each
+batch over one pooled connection (a kept-open SMTP session; keep-alive HTTP
+for the SMS gateway) and records the outcome in one statement per result.
+
+Claiming a row bumps `attempts` and pushes `next_attempt_at` a lease into the
+future in the same UPDATE, so workers never pick up each other's batches and
+a worker killed mid-batch only delays its rows until the lease runs out.
+Delivery is therefore at least once. Transient failures (4xx SMTP replies,
+dropped connections, HTTP 429/5xx) are retried with jittered exponential
+backoff; permanent ones (5xx SMTP replies, other HTTP 4xx) and rows out of
+attempts end as FAILED with the error kept in `last_error`.
+"""
+import logging
+import random
+import smtplib
+import threading
+import time
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence
+
+import httpx
+from sqlalchemy import bindparam, select, update
+from sqlmodel import Session
+
+from .. import config
+from ..models import Notification, Resource, User
+from .i18n import DEFAULT_LANG, TRANSLATORS
+from .metrics import NOTIFICATION_BATCH_SECONDS, NOTIFICATIONS
+
+logger = logging.getLogger(__name__)
+
+ID_CHUNK_SIZE = 1000
+# How long a claimed batch is reserved for the worker delivering it
+CLAIM_LEASE = timedelta(minutes=5)
+
+MESSAGES = {
+    "approve": ("Application approved: {resource}",
+                "Your application #{id} for {resource} has been approved."),
+    "reject": ("Application rejected: {resource}",
+               "Your application #{id} for {resource} was rejected. Reason: {reason}"),
+}
+
+class Message(NamedTuple):
+    id: int
+    recipient: str
+    subject: str
+    body: str
+    attempts: int
+
+class Outcome(NamedTuple):
+    # error None means delivered; otherwise `permanent` decides between retry and FAILED
+    error: Optional[str] = None
+    permanent: bool = False
+
+DELIVERED = Outcome()
+
+def _chunks(values: list) -> Iterator[list]:
+    for i in range(0, len(values), ID_CHUNK_SIZE):
+        yield values[i:i + ID_CHUNK_SIZE]
+
+# --- Channels ---
+
+class SMTPChannel:
+    """
+    Sends each batch over one SMTP session, kept open between batches and
+    checked with NOOP before reuse.
+    """
+    name = "email"
+    # Recipient column on User
+    address = "email"
+
+    def __init__(self, host: str, port: int = 25, sender: str = "", username: str = "", password: str = "",
+                 starttls: bool = False, timeout: float = 10.0):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self.connections = 0
+        self._smtp: Optional[smtplib.SMTP] = None
+
+    def _connection(self) -> smtplib.SMTP:
+        if self._smtp is not None:
+            try:
+                if self._smtp.noop()[0] == 250:
+                    return self._smtp
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.close()
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.starttls:
+            smtp.starttls()
+        if self.username:
+            smtp.login(self.username, self.password)
+        self.connections += 1
+        self._smtp = smtp
+        return smtp
+
+    def send(self, messages: Sequence[Message]) -> List[Outcome]:
+        try:
+            smtp = self._connection()
+        except (smtplib.SMTPException, OSError) as e:
+            self.close()
+            return [Outcome(f"connect: {e}")] * len(messages)
+        outcomes = []
+        for message in messages:
+            mail = EmailMessage()
+            mail["From"] = self.sender
+            mail["To"] = message.recipient
+            mail["Subject"] = message.subject
+            mail.set_content(message.body)
+            try:
+                smtp.send_message(mail)
+                outcomes.append(DELIVERED)
+            except smtplib.SMTPRecipientsRefused as e:
+                code, reply = next(iter(e.recipients.values()))
+                outcomes.append(Outcome(f"{code} {reply.decode('utf-8', 'replace')}", code >= 500))
+            except smtplib.SMTPResponseException as e:
+                outcomes.append(Outcome(f"{e.smtp_code} {e.smtp_error.decode('utf-8', 'replace')}",
+                                        e.smtp_code >= 500))
+                try:
+                    smtp.rset()
+                except (smtplib.SMTPException, OSError):
+                    pass
+            except (smtplib.SMTPException, OSError) as e:
+                # Session lost: the rest of the batch goes back for a retry on a new connection
+                self.close()
+                error = Outcome(f"connection: {e}")
+                outcomes.extend([error] * (len(messages) - len(outcomes)))
+                break
+        return outcomes
+
+    def close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._smtp = None
+
+class HTTPChannel:
+    """
+    Posts each batch as one JSON request ({"messages": [{"to", "text"}]}) to an
+    SMS gateway over a keep-alive connection pool. The gateway accepts or
+    refuses a batch as a whole.
+    """
+    name = "sms"
+    address = "phone"
+
+    def __init__(self, url: str, token: str = "", timeout: float = 10.0):
+        self.url = url
+        self.token = token
+        self.timeout = timeout
+        self._client: Optional[httpx.Client] = None
+
+    def _connection(self) -> httpx.Client:
+        if self._client is None:
+            headers = {"Authorization": f"Bearer {self.token}"} if self.token else {}
+            self._client = httpx.Client(headers=headers, timeout=self.timeout,
+                                        limits=httpx.Limits(max_connections=4, max_keepalive_connections=4))
+        return self._client
+
+    def send(self, messages: Sequence[Message]) -> List[Outcome]:
+        payload = {"messages": [{"to": m.recipient, "text": m.body} for m in messages]}
+        try:
+            response = self._connection().post(self.url, json=payload)
+        except httpx.HTTPError as e:
+            return [Outcome(f"request: {e}")] * len(messages)
+        if response.is_success:
+            return [DELIVERED] * len(messages)
+        permanent = response.status_code < 500 and response.status_code != 429
+        return [Outcome(f"HTTP {response.status_code}: {response.text[:200]}", permanent)] * len(messages)
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+def channels_from_config() -> Dict[str, object]:
+    channels = {}
+    if config.NOTIFY_SMTP_HOST:
+        channels["email"] = SMTPChannel(config.NOTIFY_SMTP_HOST, config.NOTIFY_SMTP_PORT, config.NOTIFY_SENDER,
+                                        config.NOTIFY_SMTP_USER, config.NOTIFY_SMTP_PASSWORD,
+                                        config.NOTIFY_SMTP_STARTTLS)
+    if config.NOTIFY_SMS_URL:
+        channels["sms"] = HTTPChannel(config.NOTIFY_SMS_URL, config.NOTIFY_SMS_TOKEN)
+    return channels
+
+# --- Outbox ---
+
+def queue_review_notices(session: Session, action: str, updated: Sequence[tuple], reason: str = None,
+                         channels: Dict[str, object] = None) -> int:
+    """
+    Add outbox rows telling applicants about an approve/reject. `updated` holds
+    (application id, user id, resource id) as in BulkResult.updated; the
+    caller's commit persists the rows. Returns the number of rows queued.
+    """
+    channels = notification_dispatcher.channels if channels is None else channels
+    if action not in MESSAGES or not channels or not updated:
+        return 0
+    users, resources = {}, {}
+    user_ids = list({row[1] for row in updated})
+    resource_ids = list({row[2] for row in updated})
+    for chunk in _chunks(user_ids):
+        users.update((row[0], row) for row in session.execute(
+            select(User.id, User.email, User.phone).where(User.id.in_(chunk))))
+    for chunk in _chunks(resource_ids):
+        resources.update(session.execute(select(Resource.id, Resource.name).where(Resource.id.in_(chunk))).all())
+
+    _ = TRANSLATORS[DEFAULT_LANG]
+    subject_text, body_text = (_(text) for text in MESSAGES[action])
+    now = datetime.now()
+    rows = []
+    for app_id, user_id, resource_id in updated:
+        user = users.get(user_id)
+        if user is None:
+            continue
+        values = {"id": app_id, "resource": resources.get(resource_id, ""), "reason": reason or ""}
+        subject, body = subject_text.format(**values), body_text.format(**values)
+        for name, channel in channels.items():
+            recipient = getattr(user, channel.address)
+            if recipient:
+                rows.append({"channel": name, "recipient": recipient, "subject": subject, "body": body,
+                             "application_id": app_id, "status": "PENDING", "attempts": 0,
+                             "next_attempt_at": now, "created_at": now})
+    for chunk in _chunks(rows):
+        session.execute(Notification.__table__.insert(), chunk)
+    return len(rows)
+
+# --- Dispatcher ---
+
+class NotificationDispatcher:
+    """
+    Claims due outbox rows per channel and delivers them on a background
+    thread. `wake` (after a commit that queued rows) skips the rest of the
+    poll interval. Without `start` (tests, scripts) `dispatch` delivers one
+    round synchronously.
+    """
+    def __init__(self, channels: Dict[str, object] = None, batch_size: int = 100, poll_interval: float = 5.0,
+                 max_attempts: int = 8, retry_base: float = 30.0, retry_max: float = 3600.0):
+        self.channels = channels or {}
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self._engine = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, engine):
+        if self.running or not self.channels:
+            return
+        self._engine = engine
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="etrap-notifications", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """
+        Stop after the batch in progress; undelivered rows stay in the outbox for the next start.
+        """
+        if self.running:
+            self._stop.set()
+            self._wake.set()
+            self._thread.join(timeout)
+            self._thread = None
+        for channel in self.channels.values():
+            channel.close()
+
+    def wake(self):
+        self._wake.set()
+
+    def backoff(self, attempts: int) -> float:
+        delay = min(self.retry_max, self.retry_base * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    def dispatch(self, engine=None) -> int:
+        """
+        Deliver one batch per channel. Returns the number of rows attempted.
+        """
+        engine = engine or self._engine
+        attempted = 0
+        for name, channel in self.channels.items():
+            batch = self._claim(engine, name)
+            if not batch:
+                continue
+            start = time.perf_counter()
+            try:
+                outcomes = channel.send(batch)
+            except Exception as e:
+                logger.exception("Notification channel %s failed", name)
+                outcomes = [Outcome(f"{type(e).__name__}: {e}")] * len(batch)
+            NOTIFICATION_BATCH_SECONDS.observe(time.perf_counter() - start, channel=name)
+            self._record(engine, name, batch, outcomes)
+            attempted += len(batch)
+        return attempted
+
+    def _claim(self, engine, channel: str) -> List[Message]:
+        now = datetime.now()
+        due = (
+            select(Notification.id)
+            .where(Notification.status == "PENDING", Notification.channel == channel,
+                   Notification.next_attempt_at <= now)
+            .order_by(Notification.next_attempt_at, Notification.id)
+            .limit(self.batch_size)
+        )
+        statement = (
+            update(Notification)
+            .where(Notification.id.in_(due.scalar_subquery()))
+            .values(attempts=Notification.attempts + 1, next_attempt_at=now + CLAIM_LEASE)
+            .returning(Notification.id, Notification.recipient, Notification.subject, Notification.body,
+                       Notification.attempts)
+            .execution_options(synchronize_session=False)
+        )
+        with Session(engine) as session:
+            batch = [Message(*row) for row in session.execute(statement)]
+            session.commit()
+        batch.sort(key=lambda message: message.id)
+        return batch
+
+    def _record(self, engine, channel: str, batch: List[Message], outcomes: List[Outcome]):
+        now = datetime.now()
+        sent, retry, failed = [], [], []
+        for message, outcome in zip(batch, outcomes):
+            if outcome.error is None:
+                sent.append({"b_id": message.id})
+            elif outcome.permanent or message.attempts >= self.max_attempts:
+                failed.append({"b_id": message.id, "b_error": outcome.error})
+            else:
+                retry.append({"b_id": message.id, "b_error": outcome.error,
+                              "b_next": now + timedelta(seconds=self.backoff(message.attempts))})
+        by_id = Notification.id == bindparam("b_id")
+        with Session(engine) as session:
+            connection = session.connection()
+            if sent:
+                connection.execute(update(Notification).where(by_id).values(
+                    status="SENT", sent_at=now, last_error=None), sent)
+            if retry:
+                connection.execute(update(Notification).where(by_id).values(
+                    next_attempt_at=bindparam("b_next"), last_error=bindparam("b_error")), retry)
+            if failed:
+                connection.execute(update(Notification).where(by_id).values(
+                    status="FAILED", last_error=bindparam("b_error")), failed)
+            session.commit()
+        for result, rows in (("sent", sent), ("retry", retry), ("failed", failed)):
+            if rows:
+                NOTIFICATIONS.inc(len(rows), channel=channel, result=result)
+        if failed:
+            logger.warning("%d %s notifications failed permanently, e.g. %s", len(failed), channel,
+                           failed[0]["b_error"])
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                attempted = self.dispatch()
+            except Exception:
+                logger.exception("Notification dispatch failed")
+                attempted = 0
+            # A full batch means more are probably due; otherwise sleep until woken or the next poll
+            if attempted < self.batch_size:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+notification_dispatcher = NotificationDispatcher(
+    channels_from_config(), config.NOTIFY_BATCH_SIZE, config.NOTIFY_POLL_INTERVAL,
+    config.NOTIFY_MAX_ATTEMPTS, config.NOTIFY_RETRY_BASE, config.NOTIFY_RETRY_MAX)
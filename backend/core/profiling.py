@@ -0,0 +1,229 @@
+"""
+Opt-in per-request profiling.
+
+A request is profiled when it carries a valid admin-issued token (`X-Profile-Token`
+header or `_profile` query parameter) or is picked by the sampling rate for the
+configured path prefixes. The profile is a statistical stack sample plus the SQL
+statements executed, stored as JSON under PROFILE_DIR for download from /admin/profiles.
+
+The stack samples are process-wide: async handlers share the event loop thread
+and sync work runs on pooled threads, so stacks cannot be attributed to one
+request. Each report records the most requests that were in flight while it
+was sampled (`concurrent_requests_max`); above 1, the stacks include theirs.
+The SQL list is per request.
+
+The middleware is only installed when ETRAP_PROFILING=1, so a disabled profiler
+adds nothing to the request path.
+"""
+import hashlib
+import hmac
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from typing import List, Optional
+from urllib.parse import parse_qs
+
+from .. import config
+from .metrics import HTTP_REQUESTS_IN_PROGRESS, current_sql_trace
+
+# Timestamp to the microsecond so ids sort chronologically (listing order and retention rely on it)
+PROFILE_ID_RE = re.compile(r"^[0-9]{8}T[0-9]{12}-[0-9a-f]{6}$")
+IDLE_FILES = ("threading.py", "selectors.py", "queue.py")
+
+# --- Tokens ---
+
+def check_settings():
+    """
+    Refuse to profile in production with the development SECRET_KEY, which would let anyone mint tokens.
+    """
+    if config.PROFILING_ENABLED and config.IS_PRODUCTION and config.SECRET_KEY == config.DEV_SECRET_KEY:
+        raise RuntimeError("ETRAP_PROFILING=1 in production requires ETRAP_SECRET_KEY to be set")
+
+def issue_token(user_id: int, ttl: int = 3600) -> str:
+    """
+    Signed token letting an admin trigger profiling without a DB lookup in the middleware.
+    """
+    expires = int(time.time()) + ttl
+    payload = f"{user_id}.{expires}"
+    signature = hmac.new(config.SECRET_KEY.encode(), f"profile:{payload}".encode(), hashlib.sha256).hexdigest()[:32]
+    return f"{payload}.{signature}"
+
+def verify_token(token: str) -> bool:
+    try:
+        user_id, expires, signature = token.split(".")
+        if int(expires) < time.time():
+            return False
+    except ValueError:
+        return False
+    expected = hmac.new(config.SECRET_KEY.encode(), f"profile:{user_id}.{expires}".encode(), hashlib.sha256).hexdigest()[:32]
+    return hmac.compare_digest(signature, expected)
+
+# --- Sampler ---
+
+class StackSampler:
+    """
+    Samples the stacks of all other threads every `interval` seconds.
+    Idle threads (blocked in threading/selectors/queue) are skipped.
+    `in_flight`, if given, is read on every sample; its maximum is kept in
+    `concurrency_max`.
+    """
+    def __init__(self, interval: float = 0.001, in_flight=None):
+        self.interval = interval
+        self.in_flight = in_flight
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.concurrency_max = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="etrap-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.samples += 1
+            if self.in_flight is not None:
+                self.concurrency_max = max(self.concurrency_max, int(self.in_flight()))
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own or frame.f_code.co_filename.endswith(IDLE_FILES):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def top_functions(self, limit: int = 30) -> List[dict]:
+        self_counts: Counter = Counter()
+        total_counts: Counter = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            self_counts[frames[-1]] += count
+            for name in set(frames):
+                total_counts[name] += count
+        total = sum(self.stacks.values()) or 1
+        return [
+            {"function": name, "self": self_counts[name], "total": count, "total_pct": round(100.0 * count / total, 1)}
+            for name, count in total_counts.most_common(limit)
+        ]
+
+    def folded(self) -> str:
+        # flamegraph.pl / speedscope "collapsed stack" format
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+# --- Storage ---
+
+def _profile_path(profile_id: str) -> str:
+    return os.path.join(config.PROFILE_DIR, f"{profile_id}.json")
+
+def save_report(report: dict):
+    os.makedirs(config.PROFILE_DIR, exist_ok=True)
+    with open(_profile_path(report["id"]), "w", encoding="utf-8") as f:
+        json.dump(report, f)
+    # Keep only the newest PROFILE_KEEP reports
+    names = sorted(n for n in os.listdir(config.PROFILE_DIR) if n.endswith(".json"))
+    for name in names[:-config.PROFILE_KEEP]:
+        os.remove(os.path.join(config.PROFILE_DIR, name))
+
+def list_reports() -> List[dict]:
+    if not os.path.isdir(config.PROFILE_DIR):
+        return []
+    reports = []
+    for name in sorted(os.listdir(config.PROFILE_DIR), reverse=True):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(config.PROFILE_DIR, name), encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        reports.append({k: data.get(k) for k in ("id", "method", "path", "status", "duration_ms", "sql_count", "sql_ms", "trigger", "created_at",
+                                            "concurrent_requests_max")})
+    return reports
+
+def report_path(profile_id: str) -> Optional[str]:
+    if not PROFILE_ID_RE.match(profile_id):
+        return None
+    path = _profile_path(profile_id)
+    return path if os.path.exists(path) else None
+
+# --- Middleware ---
+
+class ProfilingMiddleware:
+    def __init__(self, app, sample_rate: float = None, paths=None):
+        self.app = app
+        self.sample_rate = config.PROFILE_SAMPLE_RATE if sample_rate is None else sample_rate
+        self.paths = tuple(config.PROFILE_PATHS if paths is None else paths)
+
+    def _trigger(self, scope) -> Optional[str]:
+        for name, value in scope["headers"]:
+            if name == b"x-profile-token":
+                return "token" if verify_token(value.decode("latin-1")) else None
+        query = scope.get("query_string", b"")
+        if b"_profile=" in query:
+            token = parse_qs(query.decode("latin-1")).get("_profile", [""])[0]
+            return "token" if verify_token(token) else None
+        if self.sample_rate > 0 and scope["path"].startswith(self.paths) and random.random() < self.sample_rate:
+            return "sample"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        trigger = self._trigger(scope) if scope["type"] == "http" else None
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = f"{datetime.now().strftime('%Y%m%dT%H%M%S%f')}-{uuid.uuid4().hex[:6]}"
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        statements = []
+        token = current_sql_trace.set(statements)
+        sampler = StackSampler(config.PROFILE_INTERVAL, in_flight=HTTP_REQUESTS_IN_PROGRESS.value)
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            sampler.stop()
+            duration = time.perf_counter() - start
+            current_sql_trace.reset(token)
+            sql_ms = sum(ms for _, ms in statements)
+            save_report({
+                "id": profile_id,
+                "created_at": datetime.now().isoformat(timespec="seconds"),
+                "trigger": trigger,
+                "method": scope["method"],
+                "path": scope["path"],
+                "query": re.sub(r"(^|&)_profile=[^&]*", "", scope.get("query_string", b"").decode("latin-1")).lstrip("&"),
+                "status": status_code,
+                "duration_ms": round(duration * 1000, 3),
+                "interval_ms": config.PROFILE_INTERVAL * 1000,
+                "samples": sampler.samples,
+                "stack_scope": "process",
+                "concurrent_requests_max": sampler.concurrency_max,
+                "top_functions": sampler.top_functions(),
+                "folded": sampler.folded(),
+                "sql_count": len(statements),
+                "sql_ms": round(sql_ms, 3),
+                "sql": [{"statement": stmt, "ms": round(ms, 3)} for stmt, ms in statements],
+            })
@@ -0,0 +1,135 @@
+"""
+Approval quotas (seats) per resource.
+
+`Resource.config["quota"]` caps how many applications to a resource can be
+APPROVED at once (for API_GATEWAY resources it is a token quota instead and is
+not handled here). The number of seats in use lives in a `resourcequota`
+counter row that is taken with a conditional
+
+    UPDATE resourcequota SET used = used + n WHERE resource_id = ? AND used + n <= quota
+
+in the same transaction as the approval, so concurrent applies can never
+exceed the cap and no request has to count approved rows. Seats are released
+on revoke and on expiry; expired approvals are swept lazily when a resource
+looks full, and the counter is recounted whenever the resource is saved.
+"""
+from datetime import datetime
+from typing import Dict, Optional
+
+from sqlalchemy import update
+from sqlalchemy.dialects.sqlite import insert
+from sqlmodel import Session, select, func
+
+from ..models import Application, Resource, ResourceQuota
+from . import api_keys
+from .app_state import app_state_cache
+
+def seat_limit(resource: Resource) -> Optional[int]:
+    if resource.auth_type == "API_GATEWAY":
+        return None
+    quota = (resource.config or {}).get("quota")
+    return int(quota) if quota not in (None, "") else None
+
+def expire_due(session: Session, resource_id: int = None, now: datetime = None) -> Dict[int, int]:
+    """
+    Mark approvals past `expired_at` as EXPIRED, release their seats and retire their gateway keys.
+    Returns {resource_id: seats released}.
+    """
+    statement = (
+        update(Application)
+        .where(Application.status == "APPROVED", Application.expired_at < (now or datetime.now()))
+        .values(status="EXPIRED")
+        .returning(Application.id, Application.user_id, Application.resource_id)
+        .execution_options(synchronize_session=False)
+    )
+    if resource_id is not None:
+        statement = statement.where(Application.resource_id == resource_id)
+    released: Dict[int, int] = {}
+    expired = []
+    for app_id, user_id, expired_resource_id in session.execute(statement):
+        released[expired_resource_id] = released.get(expired_resource_id, 0) + 1
+        expired.append(app_id)
+        app_state_cache.invalidate(user_id)
+    release(session, released)
+    api_keys.set_status(session, expired, "EXPIRED")
+    return released
+
+def sync_quota(session: Session, resource: Resource):
+    """
+    Create, update or drop the counter row after the resource's quota changed; recounts seats in use.
+    """
+    limit = seat_limit(resource)
+    if limit is None:
+        session.execute(ResourceQuota.__table__.delete().where(ResourceQuota.resource_id == resource.id))
+        return
+    expire_due(session, resource.id)
+    # Approvals the caller has pending in the session take their seats through acquire()
+    with session.no_autoflush:
+        used = session.exec(select(func.count(Application.id)).where(
+            Application.resource_id == resource.id, Application.status == "APPROVED")).one()
+    statement = insert(ResourceQuota.__table__).values(resource_id=resource.id, quota=limit, used=used)
+    session.execute(statement.on_conflict_do_update(
+        index_elements=["resource_id"], set_={"quota": limit, "used": used}))
+
+def ensure_counters(session: Session) -> Dict[int, Resource]:
+    """
+    Create missing counter rows before approving with set-based UPDATEs (which a
+    recount would already include). Returns {resource_id: resource} for resources with a quota.
+    """
+    resources = session.exec(select(Resource)).all()
+    limited = {resource.id: resource for resource in resources if seat_limit(resource) is not None}
+    if limited:
+        existing = set(session.exec(select(ResourceQuota.resource_id).where(
+            ResourceQuota.resource_id.in_(list(limited)))).all())
+        for resource_id, resource in limited.items():
+            if resource_id not in existing:
+                sync_quota(session, resource)
+    return limited
+
+def _take(session: Session, resource_id: int, n: int) -> bool:
+    table = ResourceQuota.__table__
+    result = session.execute(
+        update(table)
+        .where(table.c.resource_id == resource_id, table.c.used + n <= table.c.quota)
+        .values(used=table.c.used + n)
+    )
+    return result.rowcount == 1
+
+def acquire(session: Session, resource: Resource, n: int = 1, partial: bool = False) -> int:
+    """
+    Take `n` seats for approvals being made in this transaction. Returns the
+    number taken: `n`, or 0 if the quota is full (with `partial`, whatever is left).
+    Resources without a quota always grant.
+    """
+    if n <= 0 or seat_limit(resource) is None:
+        return n
+    if _take(session, resource.id, n):
+        return n
+    exists = session.execute(select(ResourceQuota.resource_id).where(ResourceQuota.resource_id == resource.id)).first()
+    if exists:
+        expire_due(session, resource.id)
+    else:
+        # First approval since the quota was configured (or a database from before counters)
+        sync_quota(session, resource)
+    if _take(session, resource.id, n):
+        return n
+    if partial:
+        table = ResourceQuota.__table__
+        available = session.execute(
+            select(table.c.quota - table.c.used).where(table.c.resource_id == resource.id)).scalar() or 0
+        if available > 0 and _take(session, resource.id, available):
+            return available
+    return 0
+
+def release(session: Session, counts: Dict[int, int]):
+    """
+    Give back seats, {resource_id: n}, for approvals revoked or expired in this transaction.
+    """
+    table = ResourceQuota.__table__
+    for resource_id, n in counts.items():
+        if n:
+            session.execute(
+                update(table)
+                .where(table.c.resource_id == resource_id)
+                .values(used=func.max(table.c.used - n, 0))
+            )
@@ -0,0 +1,219 @@
+"""
+Rate limiting (GCRA, the token bucket expressed as a single timestamp).
+
+A limit of `count` requests per `period` seconds with room for `burst`
+back-to-back requests keeps, per key, only the theoretical arrival time (TAT)
+of the next request: each hit moves it forward by `period / count`, and a hit
+is refused while that would put it more than `burst` intervals ahead of now.
+One float per key and O(1) work per check; a key whose TAT has passed is
+equivalent to an absent one, so idle keys can be dropped at any time.
+
+Keys are "<scope>:<id>" (user id, API key, client IP, ...), one scope per
+route. The memory backend is per worker; the "sqlite" backend keeps the TATs
+in a small SQLite file shared by the workers of one host, one UPSERT per check.
+"""
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, NamedTuple, Optional
+
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+
+from .. import config
+from .metrics import RATE_LIMITED
+
+UNITS = {"s": 1, "sec": 1, "second": 1, "m": 60, "min": 60, "minute": 60, "h": 3600, "hour": 3600}
+LIMIT_PATTERN = re.compile(r"^\s*(\d+)\s*/\s*(\d*)\s*([a-z]+)\s*(?:,\s*burst\s*=\s*(\d+))?\s*$")
+
+class Limit(NamedTuple):
+    count: int
+    period: float
+    burst: int
+
+    @property
+    def interval(self) -> float:
+        return self.period / self.count
+
+def parse_limit(text: Optional[str]) -> Optional[Limit]:
+    """
+    "30/min", "5/10s" or "10/s, burst=50"; empty means no limit. The burst defaults to the count.
+    """
+    if not text or not text.strip():
+        return None
+    match = LIMIT_PATTERN.match(text.lower())
+    if not match or match.group(3) not in UNITS or int(match.group(1)) < 1:
+        raise ValueError(f"Invalid rate limit {text!r}, expected e.g. '30/min' or '10/s, burst=50'")
+    count = int(match.group(1))
+    period = int(match.group(2) or 1) * UNITS[match.group(3)]
+    burst = int(match.group(4)) if match.group(4) else count
+    if burst < 1:
+        raise ValueError(f"Invalid rate limit {text!r}: burst must be at least 1")
+    return Limit(count, float(period), burst)
+
+class Decision(NamedTuple):
+    allowed: bool
+    remaining: int
+    retry_after: float
+
+def _decide(tat: float, now: float, limit: Limit, cost: int, allowed: bool) -> Decision:
+    # `tat` is the stored value after the hit (allowed) or as it stands (refused)
+    ahead = max(tat - now, 0.0)
+    tolerance = limit.interval * limit.burst
+    if allowed:
+        return Decision(True, int((tolerance - ahead) / limit.interval + 1e-9), 0.0)
+    return Decision(False, 0, ahead + limit.interval * cost - tolerance)
+
+class MemoryBackend:
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._tats: Dict[str, float] = {}
+        self._next_prune = max_keys
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, now: float, limit: Limit, cost: int) -> Decision:
+        interval = limit.period / limit.count
+        tolerance = interval * limit.burst
+        with self._lock:
+            tat = self._tats.get(key, now)
+            tat = (tat if tat > now else now) + interval * cost
+            if tat - now > tolerance:
+                return Decision(False, 0, tat - now - tolerance)
+            self._tats[key] = tat
+            if len(self._tats) >= self._next_prune:
+                self._prune(now)
+        return Decision(True, int((tolerance - (tat - now)) / interval + 1e-9), 0.0)
+
+    def _prune(self, now: float):
+        # Amortized O(1): only runs after the table doubled since the last prune
+        self._tats = {key: tat for key, tat in self._tats.items() if tat > now}
+        self._next_prune = max(2 * len(self._tats), self.max_keys)
+
+    def reset(self, key: str):
+        with self._lock:
+            self._tats.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._tats = {}
+            self._next_prune = self.max_keys
+
+    def __len__(self) -> int:
+        return len(self._tats)
+
+class SQLiteBackend:
+    """
+    TATs in a WITHOUT ROWID table. Each check is one autocommitted UPSERT, so
+    concurrent workers serialize on SQLite's write lock rather than racing.
+    Rate-limit state is disposable: no fsync.
+    """
+    PRUNE_INTERVAL = 60.0
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._next_prune = 0.0
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=OFF")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS ratelimit (key TEXT PRIMARY KEY, tat REAL NOT NULL) WITHOUT ROWID")
+            self._local.connection = connection
+        return connection
+
+    def hit(self, key: str, now: float, limit: Limit, cost: int) -> Decision:
+        connection = self._connection()
+        step, tolerance = limit.interval * cost, limit.interval * limit.burst
+        row = connection.execute(
+            "INSERT INTO ratelimit (key, tat) VALUES (:key, :now + :step) "
+            "ON CONFLICT (key) DO UPDATE SET tat = max(tat, :now) + :step "
+            "WHERE max(tat, :now) + :step - :now <= :tolerance RETURNING tat",
+            {"key": key, "now": now, "step": step, "tolerance": tolerance},
+        ).fetchone()
+        if now >= self._next_prune:
+            self._next_prune = now + self.PRUNE_INTERVAL
+            connection.execute("DELETE FROM ratelimit WHERE tat < ?", (now,))
+        if row is not None:
+            return _decide(row[0], now, limit, cost, True)
+        current = connection.execute("SELECT tat FROM ratelimit WHERE key = ?", (key,)).fetchone()
+        return _decide(current[0] if current else now, now, limit, cost, False)
+
+    def reset(self, key: str):
+        self._connection().execute("DELETE FROM ratelimit WHERE key = ?", (key,))
+
+    def clear(self):
+        self._connection().execute("DELETE FROM ratelimit")
+
+class RateLimiter:
+    """
+    `hit(key, limit)` charges one request to `key` and says whether it may
+    proceed. The backend is created on first use, so importing this module
+    never touches the data directory.
+    """
+    def __init__(self, backend: str = "memory", path: Optional[str] = None, clock=time.time):
+        if backend not in ("memory", "sqlite"):
+            raise ValueError(f"Unknown rate limit backend {backend!r}")
+        self.backend_name = backend
+        self.path = path
+        self.clock = clock
+        self._backend = None
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    self._backend = MemoryBackend() if self.backend_name == "memory" else SQLiteBackend(self.path)
+        return self._backend
+
+    @property
+    def shared(self) -> bool:
+        return self.backend_name == "sqlite"
+
+    def hit(self, key: str, limit: Limit, cost: int = 1) -> Decision:
+        if cost > limit.burst:
+            # Could never fit, however long the caller waits
+            return Decision(False, 0, math.inf)
+        return (self._backend or self.backend).hit(key, self.clock(), limit, cost)
+
+    def reset(self, key: str):
+        self.backend.reset(key)
+
+    def clear(self):
+        self.backend.clear()
+
+rate_limiter = RateLimiter(config.RATE_LIMIT_BACKEND, config.RATE_LIMIT_DB)
+
+LIMITS: Dict[str, Optional[Limit]] = {
+    "apply": parse_limit(config.RATE_LIMIT_APPLY),
+    "download": parse_limit(config.RATE_LIMIT_DOWNLOAD),
+    "login": parse_limit(config.RATE_LIMIT_LOGIN),
+    "gateway": parse_limit(config.RATE_LIMIT_GATEWAY),
+}
+
+async def enforce(scope: str, identity):
+    """
+    Charge one request of `identity` (user id, client IP, application id, ...)
+    to the `scope` limit; 429 with Retry-After once it is used up.
+    """
+    limit = LIMITS.get(scope)
+    if limit is None:
+        return
+    key = f"{scope}:{identity}"
+    if rate_limiter.shared:
+        decision = await run_in_threadpool(rate_limiter.hit, key, limit)
+    else:
+        decision = rate_limiter.hit(key, limit)
+    if not decision.allowed:
+        RATE_LIMITED.inc(scope=scope)
+        raise HTTPException(status_code=429, detail="Too many requests",
+                            headers={"Retry-After": str(max(1, math.ceil(decision.retry_after)))})
@@ -0,0 +1,305 @@
+"""
+Response cache for API gateway resources (opt-in per resource).
+
+    Resource.config["response_cache"] = {"ttl": 300}
+    # optional: "methods" (default GET, HEAD), "vary" (request headers that
+    # distinguish responses, default accept, accept-encoding, content-type),
+    # "max_entry_bytes" (default 1 MiB)
+
+Requests are keyed by resource, method, path, sorted query parameters, the
+`vary` headers and a hash of the body (JSON bodies canonicalized first), not
+by user: students of one course sending the same query share one upstream
+call. Only complete 200 responses without `Cache-Control: no-store/private`
+are kept; streams (SSE) and bodies over `max_entry_bytes` pass through
+uncached. Cache hits are answered without an upstream call and are not
+charged against the token quota (there is no upstream usage to read).
+
+Each worker keeps a byte-bounded LRU in memory (GATEWAY_CACHE_MEMORY_BYTES);
+entries it evicts before their TTL spill to a per-worker directory under
+GATEWAY_CACHE_DIR (GATEWAY_CACHE_DISK_BYTES, also LRU) and move back to
+memory when hit. Concurrent misses for one key are single-flighted: the first
+request goes upstream, the others wait for its response to be stored.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+from .. import config
+from .metrics import GATEWAY_CACHE_BYTES
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_METHODS = ("GET", "HEAD")
+DEFAULT_VARY = ("accept", "accept-encoding", "content-type")
+DEFAULT_MAX_ENTRY = 1024 * 1024
+# Rough per-entry bookkeeping on top of the body (key, headers, dict slot)
+ENTRY_OVERHEAD = 512
+
+class CachePolicy(NamedTuple):
+    ttl: float
+    methods: frozenset
+    vary: Tuple[str, ...]
+    max_entry_bytes: int
+
+def policy_for(resource_config: dict) -> Optional[CachePolicy]:
+    settings = (resource_config or {}).get("response_cache")
+    if not isinstance(settings, dict) or not settings.get("ttl"):
+        return None
+    try:
+        return CachePolicy(
+            float(settings["ttl"]),
+            frozenset(method.upper() for method in settings.get("methods", DEFAULT_METHODS)),
+            tuple(header.lower() for header in settings.get("vary", DEFAULT_VARY)),
+            int(settings.get("max_entry_bytes", DEFAULT_MAX_ENTRY)),
+        )
+    except (TypeError, ValueError, AttributeError):
+        logger.warning("Ignoring invalid response_cache settings: %r", settings)
+        return None
+
+def _canonical_body(body: bytes, content_type: str) -> bytes:
+    if body and "json" in content_type:
+        try:
+            return json.dumps(json.loads(body), sort_keys=True, separators=(",", ":")).encode("utf-8")
+        except ValueError:
+            pass
+    return body
+
+def cache_key(resource_id: int, method: str, path: str, query: str, headers, body: bytes,
+              policy: CachePolicy) -> str:
+    digest = hashlib.sha256()
+    for part in (str(resource_id), method, "/" + path.lstrip("/"),
+                 urlencode(sorted(parse_qsl(query, keep_blank_values=True)))):
+        digest.update(part.encode("utf-8") + b"\0")
+    for header in policy.vary:
+        digest.update(header.encode("ascii") + b"=" + headers.get(header, "").strip().encode("utf-8") + b"\0")
+    digest.update(hashlib.sha256(_canonical_body(body, headers.get("content-type", "").lower())).digest())
+    return digest.hexdigest()
+
+def cacheable(status: int, headers, policy: CachePolicy) -> bool:
+    if status != 200:
+        return False
+    directives = headers.get("cache-control", "").lower()
+    if "no-store" in directives or "private" in directives:
+        return False
+    if headers.get("content-type", "").lower().startswith("text/event-stream"):
+        return False
+    length = headers.get("content-length")
+    return not (length and length.isdigit() and int(length) > policy.max_entry_bytes)
+
+class CachedResponse(NamedTuple):
+    status: int
+    headers: List[Tuple[str, str]]
+    body: bytes
+    stored_at: float
+    expires: float
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + ENTRY_OVERHEAD
+
+class ResponseCache:
+    """
+    Memory and disk LRU tiers plus the in-flight table. `lookup` only touches
+    memory and is safe on the event loop; `load` (disk) and `store` (may spill
+    to disk) belong in the threadpool.
+    """
+    def __init__(self, memory_bytes: int, disk_bytes: int, directory: Optional[str]):
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.directory = directory
+        self._memory: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._memory_used = 0
+        # key -> (entry without its body, which lives in <worker dir>/<key>; size)
+        self._disk: "OrderedDict[str, Tuple[CachedResponse, int]]" = OrderedDict()
+        self._disk_used = 0
+        self._worker_dir: Optional[str] = None
+        self._flights: Dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+
+    # --- Memory tier ---
+
+    def lookup(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            if entry.expires <= time.monotonic():
+                self._drop_memory(key)
+                return None
+            self._memory.move_to_end(key)
+            return entry
+
+    def on_disk(self, key: str) -> bool:
+        return key in self._disk
+
+    def store(self, key: str, entry: CachedResponse):
+        if entry.size > self.memory_bytes:
+            return
+        with self._lock:
+            if key in self._memory:
+                self._drop_memory(key)
+            self._discard_disk(key)
+            self._memory[key] = entry
+            self._memory_used += entry.size
+            evicted = []
+            while self._memory_used > self.memory_bytes:
+                old_key, old = self._memory.popitem(last=False)
+                self._memory_used -= old.size
+                evicted.append((old_key, old))
+            GATEWAY_CACHE_BYTES.set(self._memory_used, tier="memory")
+        now = time.monotonic()
+        for old_key, old in evicted:
+            if old.expires > now:
+                self._spill(old_key, old)
+
+    def _drop_memory(self, key: str):
+        self._memory_used -= self._memory.pop(key).size
+        GATEWAY_CACHE_BYTES.set(self._memory_used, tier="memory")
+
+    # --- Disk tier ---
+
+    def _directory(self) -> str:
+        if self._worker_dir is None:
+            os.makedirs(self.directory, exist_ok=True)
+            _remove_orphans(self.directory)
+            self._worker_dir = tempfile.mkdtemp(prefix=f"{os.getpid()}-", dir=self.directory)
+        return self._worker_dir
+
+    def _spill(self, key: str, entry: CachedResponse):
+        if not self.directory or entry.size > self.disk_bytes:
+            return
+        try:
+            with open(os.path.join(self._directory(), key), "wb") as f:
+                f.write(entry.body)
+        except OSError:
+            logger.exception("Failed to spill a cached gateway response to disk")
+            return
+        with self._lock:
+            if key in self._disk:
+                return
+            self._disk[key] = (entry._replace(body=b""), entry.size)
+            self._disk_used += entry.size
+            while self._disk_used > self.disk_bytes:
+                self._discard_disk(next(iter(self._disk)))
+            GATEWAY_CACHE_BYTES.set(self._disk_used, tier="disk")
+
+    def _discard_disk(self, key: str):
+        spilled = self._disk.pop(key, None)
+        if spilled is None:
+            return
+        self._disk_used -= spilled[1]
+        GATEWAY_CACHE_BYTES.set(self._disk_used, tier="disk")
+        try:
+            os.remove(os.path.join(self._worker_dir, key))
+        except OSError:
+            pass
+
+    def load(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            spilled = self._disk.get(key)
+        meta = spilled[0] if spilled else None
+        if meta is None or meta.expires <= time.monotonic():
+            with self._lock:
+                self._discard_disk(key)
+            return None
+        try:
+            with open(os.path.join(self._worker_dir, key), "rb") as f:
+                entry = meta._replace(body=f.read())
+        except OSError:
+            with self._lock:
+                self._discard_disk(key)
+            return None
+        # Back to memory; the file goes, its entry may spill again later
+        self.store(key, entry)
+        return entry
+
+    # --- Single flight ---
+
+    def join(self, key: str) -> Optional[asyncio.Future]:
+        """
+        The pending upstream call for `key`, or None after registering the caller as the one making it.
+        """
+        loop = asyncio.get_running_loop()
+        flight = self._flights.get(key)
+        if flight is not None and not flight.done() and flight.get_loop() is loop:
+            return flight
+        self._flights[key] = loop.create_future()
+        return None
+
+    def land(self, key: str):
+        # Called by the request that made the upstream call, stored or not
+        flight = self._flights.pop(key, None)
+        if flight is not None and not flight.done():
+            flight.set_result(None)
+
+    # ---
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_used = 0
+            for key in list(self._disk):
+                self._discard_disk(key)
+            self._flights.clear()
+            GATEWAY_CACHE_BYTES.set(0, tier="memory")
+
+    def close(self):
+        self.clear()
+        if self._worker_dir is not None:
+            shutil.rmtree(self._worker_dir, ignore_errors=True)
+            self._worker_dir = None
+
+def _remove_orphans(directory: str):
+    # Spill directories of workers that died without closing their cache
+    for name in os.listdir(directory):
+        pid = name.split("-", 1)[0]
+        if not pid.isdigit():
+            continue
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+        except OSError:
+            pass
+
+class Recorder:
+    """
+    Copies a relayed response into the cache once it has streamed through completely.
+    """
+    def __init__(self, cache: ResponseCache, key: str, status: int, headers: List[Tuple[str, str]],
+                 policy: CachePolicy):
+        self.cache = cache
+        self.key = key
+        self.status = status
+        self.headers = headers
+        self.policy = policy
+        self.complete = False
+        self._chunks: List[bytes] = []
+        self._size = 0
+
+    def feed(self, chunk: bytes):
+        if self._chunks is None:
+            return
+        self._size += len(chunk)
+        if self._size > self.policy.max_entry_bytes:
+            self._chunks = None
+        else:
+            self._chunks.append(chunk)
+
+    def entry(self) -> Optional[CachedResponse]:
+        if not self.complete or self._chunks is None:
+            return None
+        now = time.monotonic()
+        return CachedResponse(self.status, self.headers, b"".join(self._chunks), now, now + self.policy.ttl)
+
+response_cache = ResponseCache(config.GATEWAY_CACHE_MEMORY_BYTES, config.GATEWAY_CACHE_DISK_BYTES,
+                               config.GATEWAY_CACHE_DIR)
@@ -0,0 +1,178 @@
+"""
+Local sessions opened by CAS logins, and CAS single logout (SLO).
+
+Each CAS login gets a random session token (the `sso_session` cookie). The
+`ssosession` table keeps SHA-256 of the token and of the service ticket it
+was opened with, so when the CAS server later POSTs a logout request naming
+that ticket, one indexed
+
+    UPDATE ssosession SET revoked_at = ..., version = ... WHERE ticket_hash = ?
+
+ends every session the ticket opened. As with gateway keys, every change
+stamps the row with the next `version`; each worker keeps a dict of token
+hash -> (user id, expiry) and brings it up to date with the rows changed
+since the version it last saw, at most every `SSO_SESSION_REFRESH` seconds.
+Checking a session on a request is a dict lookup; a token the worker has not
+seen yet (opened on another worker since the last refresh) costs one indexed
+read and is then cached.
+"""
+import hashlib
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import delete, insert, update
+from sqlmodel import Session, select, func
+
+from .. import config
+from ..models import SSOSession
+from .metrics import SSO_SESSIONS_ENDED
+
+# Expired rows are deleted, and expired entries dropped from the index, this often (seconds)
+PURGE_INTERVAL = 600.0
+
+def _hash(value: str) -> str:
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+def _next_version():
+    # Evaluated inside the writing statement, i.e. under SQLite's write lock, so versions follow commit order
+    return select(func.coalesce(func.max(SSOSession.version), 0) + 1).scalar_subquery()
+
+class SessionIndex:
+    """
+    In-memory token hash -> (user id, expires_at) of the live CAS sessions for
+    one worker.
+
+    `open` and `end_ticket`/`end` write the table and update this worker's
+    index at once; other workers pick the change up on their next `refresh`.
+    """
+    def __init__(self, ttl: int = 1800, refresh_interval: float = 2.0):
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval
+        self._entries: Dict[str, Tuple[int, datetime]] = {}
+        self._version = 0
+        self._next_refresh = 0.0
+        self._next_purge = time.monotonic() + PURGE_INTERVAL
+        self._lock = threading.Lock()
+
+    def stale(self) -> bool:
+        return time.monotonic() >= self._next_refresh
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+            self._version = 0
+            self._next_refresh = 0.0
+
+    def open(self, session: Session, ticket: str, user_id: int) -> str:
+        """
+        A new session for a validated service ticket. Commits; returns the cookie token.
+        """
+        token = secrets.token_urlsafe(32)
+        now = datetime.now()
+        expires_at = now + timedelta(seconds=self.ttl)
+        table = SSOSession.__table__
+        session.execute(insert(table).values(
+            token_hash=_hash(token), ticket_hash=_hash(ticket), user_id=user_id, expires_at=expires_at,
+            version=_next_version(), created_at=now))
+        if time.monotonic() >= self._next_purge:
+            self._next_purge = time.monotonic() + PURGE_INTERVAL
+            # The newest row stays so the next version never goes back below what workers have seen
+            session.execute(delete(table).where(
+                table.c.expires_at < now, table.c.version < select(func.max(table.c.version)).scalar_subquery()))
+        session.commit()
+        self._entries[_hash(token)] = (user_id, expires_at)
+        return token
+
+    def _revoke(self, session: Session, condition, via: str) -> int:
+        table = SSOSession.__table__
+        rows = session.execute(
+            update(table)
+            .where(condition, table.c.revoked_at.is_(None))
+            .values(revoked_at=datetime.now(), version=_next_version())
+            .returning(table.c.token_hash)
+        ).all()
+        session.commit()
+        for (token_hash,) in rows:
+            self._entries.pop(token_hash, None)
+        if rows:
+            SSO_SESSIONS_ENDED.inc(len(rows), via=via)
+        return len(rows)
+
+    def end_ticket(self, session: Session, ticket: str) -> int:
+        """
+        End the sessions opened with this service ticket (CAS single logout). Returns how many.
+        """
+        return self._revoke(session, SSOSession.__table__.c.ticket_hash == _hash(ticket), "single_logout")
+
+    def end(self, session: Session, token: str) -> int:
+        """
+        End the session behind a cookie token (local logout).
+        """
+        return self._revoke(session, SSOSession.__table__.c.token_hash == _hash(token), "local")
+
+    def refresh(self, session: Session) -> int:
+        """
+        Apply session changes since the last refresh. Returns the number of rows read.
+        """
+        with self._lock:
+            if not self.stale():
+                # Another thread refreshed while this one waited for the lock
+                return 0
+            now = datetime.now()
+            statement = (
+                select(SSOSession.token_hash, SSOSession.user_id, SSOSession.expires_at, SSOSession.revoked_at,
+                       SSOSession.version)
+                .where(SSOSession.version > self._version)
+                .order_by(SSOSession.version)
+            )
+            if self._version == 0:
+                statement = statement.where(SSOSession.revoked_at.is_(None), SSOSession.expires_at > now)
+            rows = session.exec(statement).all()
+            for token_hash, user_id, expires_at, revoked_at, version in rows:
+                if revoked_at is None and expires_at > now:
+                    self._entries[token_hash] = (user_id, expires_at)
+                else:
+                    self._entries.pop(token_hash, None)
+                self._version = max(self._version, version)
+            if time.monotonic() >= self._next_purge:
+                self._next_purge = time.monotonic() + PURGE_INTERVAL
+                self._entries = {h: entry for h, entry in self._entries.items() if entry[1] > now}
+            self._next_refresh = time.monotonic() + self.refresh_interval
+            return len(rows)
+
+    def lookup(self, session: Session, token: str) -> Optional[Tuple[int, bool]]:
+        """
+        (user id, live) for a session token, or None if it was never issued.
+        """
+        if self.stale():
+            self.refresh(session)
+        token_hash = _hash(token)
+        entry = self._entries.get(token_hash)
+        if entry is None:
+            row = session.exec(
+                select(SSOSession.user_id, SSOSession.expires_at, SSOSession.revoked_at)
+                .where(SSOSession.token_hash == token_hash)
+            ).first()
+            if row is None:
+                return None
+            user_id, expires_at, revoked_at = row
+            if revoked_at is not None:
+                return user_id, False
+            # Revoked later, it comes back with a version above the one this index has seen
+            entry = self._entries[token_hash] = (user_id, expires_at)
+        return entry[0], entry[1] > datetime.now()
+
+    def check(self, session: Session, token: str, user_id: int) -> bool:
+        """
+        Whether `token` is a live session of this user.
+        """
+        found = self.lookup(session, token)
+        return found is not None and found == (user_id, True)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+sso_sessions = SessionIndex(ttl=config.SSO_SESSION_TTL, refresh_interval=config.SSO_SESSION_REFRESH)
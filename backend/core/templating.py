@@ -0,0 +1,43 @@
+import os
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache
+from fastapi.templating import Jinja2Templates
+
+from .. import config
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates")
+
+def create_environment(cache_dir: str = None, auto_reload: bool = None) -> Environment:
+    """
+    Build the Jinja2 environment shared by every router.
+    Compiled template bytecode is persisted to disk so restarted workers skip the parse step.
+    """
+    if cache_dir is None:
+        cache_dir = config.TEMPLATE_CACHE_DIR
+    if auto_reload is None:
+        auto_reload = not config.IS_PRODUCTION
+
+    bytecode_cache = None
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        bytecode_cache = FileSystemBytecodeCache(cache_dir)
+
+    return Environment(
+        loader=FileSystemLoader(TEMPLATE_DIR),
+        autoescape=True,
+        bytecode_cache=bytecode_cache,
+        auto_reload=auto_reload,
+    )
+
+def precompile_templates(env: Environment) -> int:
+    """
+    Load every template once so the in-memory and bytecode caches are warm before the first request.
+    Returns the number of templates compiled.
+    """
+    count = 0
+    for name in env.list_templates(extensions=["html"]):
+        env.get_template(name)
+        count += 1
+    return count
+
+# Single shared instance (import this instead of creating Jinja2Templates per module)
+templates = Jinja2Templates(env=create_environment())
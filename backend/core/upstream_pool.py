@@ -0,0 +1,256 @@
+"""
+Upstream pools for API gateway resources.
+
+`Resource.config["upstream_pool"]` spreads a gateway resource over several
+upstream endpoints and keys (func.md: API Key 池管理):
+
+    {"balance": "least_outstanding",
+     "upstreams": [
+        {"url": "https://api.openai.com/v1", "key": "sk-...", "weight": 2, "max_concurrency": 50},
+        {"url": "https://backup.example.com/v1", "key": "sk-..."}]}
+
+`balance` is "weighted" (smooth weighted round-robin) or "least_outstanding"
+(fewest requests in flight relative to weight, then the lowest latency EWMA).
+Without a pool, `upstream_url` and `upstream_key` form a pool of one.
+
+Each worker tracks per upstream the requests in flight (capped at
+`max_concurrency`), an EWMA of the time to response headers and a circuit
+breaker: when at least GATEWAY_BREAKER_MIN_REQUESTS calls within the last
+GATEWAY_BREAKER_WINDOW seconds failed at GATEWAY_BREAKER_ERROR_RATE or more
+(connection errors, timeouts, 5xx and 429), the upstream is skipped for
+GATEWAY_BREAKER_COOLDOWN seconds and then probed by one request at a time
+until a probe succeeds.
+"""
+import json
+import logging
+import threading
+import time
+from collections import deque
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlsplit
+
+from .. import config
+from .metrics import GATEWAY_UPSTREAM_BREAKER, GATEWAY_UPSTREAM_EWMA, GATEWAY_UPSTREAM_OUTSTANDING
+
+BALANCE = ("weighted", "least_outstanding")
+UPSTREAM_FIELDS = ("url", "key", "weight", "max_concurrency")
+EWMA_ALPHA = 0.3
+
+logger = logging.getLogger(__name__)
+
+class Upstream(NamedTuple):
+    url: str
+    key: Optional[str] = None
+    weight: int = 1
+    max_concurrency: Optional[int] = None
+
+    @property
+    def label(self) -> str:
+        # Metrics label: no scheme, credentials or query
+        parts = urlsplit(self.url)
+        return f"{parts.hostname}{f':{parts.port}' if parts.port else ''}{parts.path}"
+
+def _upstream(index: int, spec) -> Upstream:
+    if not isinstance(spec, dict) or not isinstance(spec.get("url"), str):
+        raise ValueError(f"Upstream {index + 1}: needs a url")
+    unknown = set(spec) - set(UPSTREAM_FIELDS)
+    if unknown:
+        raise ValueError(f"Upstream {index + 1}: unknown settings {', '.join(sorted(unknown))}")
+    if urlsplit(spec["url"]).scheme not in ("http", "https"):
+        raise ValueError(f"Upstream {index + 1}: url must be http(s)")
+    weight, limit = spec.get("weight", 1), spec.get("max_concurrency")
+    if not isinstance(weight, int) or weight < 1:
+        raise ValueError(f"Upstream {index + 1}: weight must be a positive integer")
+    if limit is not None and (not isinstance(limit, int) or limit < 1):
+        raise ValueError(f"Upstream {index + 1}: max_concurrency must be a positive integer")
+    return Upstream(spec["url"], spec.get("key") or None, weight, limit)
+
+def parse_pool(text: Optional[str]) -> Optional[dict]:
+    """
+    Validate pool JSON from the resource editor. Empty text means no pool.
+    """
+    if not text or not text.strip():
+        return None
+    try:
+        pool = json.loads(text)
+    except ValueError as e:
+        raise ValueError(f"Upstream pool is not valid JSON: {e}")
+    if not isinstance(pool, dict) or not isinstance(pool.get("upstreams"), list) or not pool["upstreams"]:
+        raise ValueError('Upstream pool must be an object with a non-empty "upstreams" list')
+    if pool.get("balance", "weighted") not in BALANCE:
+        raise ValueError(f"Upstream pool balance must be one of {', '.join(BALANCE)}")
+    for i, spec in enumerate(pool["upstreams"]):
+        _upstream(i, spec)
+    return pool
+
+def pool_spec(resource_config: dict) -> Optional[Tuple[str, Tuple[Upstream, ...]]]:
+    """
+    (balance, upstreams) for a resource config, None if it has no upstream.
+    """
+    pool = (resource_config or {}).get("upstream_pool")
+    if pool:
+        return pool.get("balance", "weighted"), tuple(_upstream(i, spec) for i, spec in enumerate(pool["upstreams"]))
+    url = (resource_config or {}).get("upstream_url")
+    if not url:
+        return None
+    return "weighted", (Upstream(url, resource_config.get("upstream_key") or None),)
+
+class _State:
+    __slots__ = ("outstanding", "ewma", "current", "outcomes", "opened_until", "probing")
+
+    def __init__(self):
+        self.outstanding = 0
+        self.ewma: Optional[float] = None
+        self.current = 0          # smooth weighted round-robin credit
+        self.outcomes = deque()   # (monotonic time, ok) within the breaker window
+        self.opened_until = 0.0   # breaker open until then; half-open after, closed when 0
+        self.probing = False
+
+class UpstreamPool:
+    """
+    Selection and health state of one resource's upstreams in this worker.
+    `acquire` picks an upstream and counts the request in flight, `report`
+    records the outcome once response headers (or an error) arrive, `release`
+    ends the request after its body has been relayed.
+    """
+    def __init__(self, resource_id: int, balance: str, upstreams: Tuple[Upstream, ...], *,
+                 error_rate: float = 0.5, min_requests: int = 10, window: float = 30.0, cooldown: float = 10.0):
+        self.resource_id = resource_id
+        self.balance = balance
+        self.upstreams = upstreams
+        self.error_rate = error_rate
+        self.min_requests = min_requests
+        self.window = window
+        self.cooldown = cooldown
+        self._states: Dict[Upstream, _State] = {upstream: _State() for upstream in upstreams}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def adopt(self, previous: "UpstreamPool"):
+        # Keep health and in-flight counts of upstreams that survived a config change
+        for upstream, state in previous._states.items():
+            if upstream in self._states:
+                self._states[upstream] = state
+
+    def _available(self, upstream: Upstream, state: _State, now: float) -> bool:
+        if upstream.max_concurrency is not None and state.outstanding >= upstream.max_concurrency:
+            return False
+        if state.opened_until:
+            return now >= state.opened_until and not state.probing
+        return True
+
+    def acquire(self) -> Optional[Upstream]:
+        """
+        The upstream for the next request, or None if all are open or at their concurrency limit.
+        """
+        now = time.monotonic()
+        with self._lock:
+            candidates = [(u, s) for u, s in self._states.items() if self._available(u, s, now)]
+            if not candidates:
+                return None
+            if self.balance == "least_outstanding":
+                upstream, state = min(candidates, key=lambda c: (c[1].outstanding / c[0].weight, c[1].ewma or 0.0))
+            else:
+                total = 0
+                for candidate, candidate_state in candidates:
+                    candidate_state.current += candidate.weight
+                    total += candidate.weight
+                upstream, state = max(candidates, key=lambda c: c[1].current)
+                state.current -= total
+            state.outstanding += 1
+            if state.opened_until:
+                state.probing = True
+        GATEWAY_UPSTREAM_OUTSTANDING.inc(resource=self.resource_id, upstream=upstream.label)
+        return upstream
+
+    def report(self, upstream: Upstream, ok: bool, latency: Optional[float] = None):
+        now = time.monotonic()
+        with self._lock:
+            state = self._states.get(upstream)
+            if state is None:
+                return
+            if latency is not None:
+                state.ewma = latency if state.ewma is None else EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * state.ewma
+                GATEWAY_UPSTREAM_EWMA.set(state.ewma, resource=self.resource_id, upstream=upstream.label)
+            if state.opened_until:
+                if state.probing:
+                    state.probing = False
+                    # Half-open probe: close on success, back to open on failure
+                    state.opened_until = 0.0 if ok else now + self.cooldown
+                    state.outcomes.clear()
+                    GATEWAY_UPSTREAM_BREAKER.set(0 if ok else 1, resource=self.resource_id, upstream=upstream.label)
+                return
+            state.outcomes.append((now, ok))
+            while state.outcomes and state.outcomes[0][0] < now - self.window:
+                state.outcomes.popleft()
+            failures = sum(1 for _, outcome in state.outcomes if not outcome)
+            if len(state.outcomes) >= self.min_requests and failures >= self.error_rate * len(state.outcomes):
+                state.opened_until = now + self.cooldown
+                GATEWAY_UPSTREAM_BREAKER.set(1, resource=self.resource_id, upstream=upstream.label)
+
+    def release(self, upstream: Upstream):
+        with self._lock:
+            state = self._states.get(upstream)
+            if state is not None and state.outstanding > 0:
+                state.outstanding -= 1
+            if state is not None and state.probing:
+                # The probe ended without an outcome (client gone): stay open and probe again after the cooldown
+                state.probing = False
+                state.opened_until = time.monotonic() + self.cooldown
+        GATEWAY_UPSTREAM_OUTSTANDING.dec(resource=self.resource_id, upstream=upstream.label)
+
+    def snapshot(self) -> List[dict]:
+        now = time.monotonic()
+        with self._lock:
+            return [{
+                "upstream": upstream.label, "outstanding": state.outstanding,
+                "ewma_ms": round(state.ewma * 1000, 2) if state.ewma is not None else None,
+                "breaker": "closed" if not state.opened_until else "open" if now < state.opened_until else "half-open",
+            } for upstream, state in self._states.items()]
+
+class PoolRegistry:
+    """
+    One UpstreamPool per resource in this worker, rebuilt (keeping upstream
+    state) when the resource's upstream settings change.
+    """
+    def __init__(self, **settings):
+        self.settings = settings
+        self._pools: Dict[int, Tuple[tuple, UpstreamPool]] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, resource_id: int, resource_config: dict) -> Optional[UpstreamPool]:
+        try:
+            spec = pool_spec(resource_config)
+        except (ValueError, TypeError, AttributeError):
+            # Only reachable by editing the config outside the admin form
+            logger.warning("Resource %s has an invalid upstream pool; gateway disabled", resource_id)
+            spec = None
+        with self._lock:
+            current = self._pools.get(resource_id)
+            if spec is None:
+                self._pools.pop(resource_id, None)
+                return None
+            if current and current[0] == spec:
+                return current[1]
+            pool = UpstreamPool(resource_id, *spec, **self.settings)
+            if current:
+                pool.adopt(current[1])
+            self._pools[resource_id] = (spec, pool)
+            return pool
+
+    def get(self, resource_id: int) -> Optional[UpstreamPool]:
+        entry = self._pools.get(resource_id)
+        return entry[1] if entry else None
+
+    def clear(self):
+        with self._lock:
+            self._pools.clear()
+
+upstream_pools = PoolRegistry(
+    error_rate=config.GATEWAY_BREAKER_ERROR_RATE,
+    min_requests=config.GATEWAY_BREAKER_MIN_REQUESTS,
+    window=config.GATEWAY_BREAKER_WINDOW,
+    cooldown=config.GATEWAY_BREAKER_COOLDOWN,
+)
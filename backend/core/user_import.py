@@ -0,0 +1,194 @@
+"""
+Bulk user import (registrar roster -> `user` table).
+
+Rows are read from a CSV or JSONL stream one at a time, validated, and
+upserted by `swufe_uid` in batches: one SELECT to split the batch into new and
+existing uids, one multi-row INSERT and one executemany UPDATE, one commit.
+Accounts without a `password` column are SSO-only and get the SSO marker
+instead of a bcrypt hash, which is what makes 100k-row imports take seconds.
+
+On update, name/department always follow the roster; email and phone are only
+overwritten when non-empty (students may have completed their profile), and
+role/is_active/password only when the row provides them.
+"""
+import csv
+import io
+import json
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import bindparam, func, update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+
+from ..auth import SSO_PASSWORD_HASH, get_password_hash
+from ..models import User
+
+ROLES = ("user", "admin")
+MAX_REPORTED_ERRORS = 100
+
+@dataclass
+class ImportReport:
+    processed: int = 0
+    created: int = 0
+    updated: int = 0
+    failed: int = 0
+    errors: List[dict] = field(default_factory=list)
+
+    def error(self, line: int, uid: Optional[str], message: str):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "swufe_uid": uid, "error": message})
+
+    def as_dict(self) -> dict:
+        return {"processed": self.processed, "created": self.created, "updated": self.updated,
+                "failed": self.failed, "errors": self.errors}
+
+# --- Parsing ---
+
+def detect_format(filename: str) -> str:
+    return "jsonl" if filename.lower().endswith((".jsonl", ".ndjson", ".json")) else "csv"
+
+def read_rows(stream: io.TextIOBase, fmt: str) -> Iterator[Tuple[int, dict]]:
+    """
+    Yield (line number, raw row) from a text stream without loading it whole.
+    Malformed JSONL lines are yielded as {"_error": message}.
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, {k.strip().lower(): v for k, v in row.items() if k}
+        return
+    for line_no, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_no, {"_error": f"Invalid JSON: {e}"}
+            continue
+        yield line_no, row if isinstance(row, dict) else {"_error": "Expected a JSON object"}
+
+def _clean(value) -> Optional[str]:
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+def _parse_bool(value) -> Optional[bool]:
+    if value is None or value == "":
+        return None
+    if isinstance(value, bool):
+        return value
+    text_value = str(value).strip().lower()
+    if text_value in ("1", "true", "yes", "y", "active"):
+        return True
+    if text_value in ("0", "false", "no", "n", "disabled"):
+        return False
+    raise ValueError(f"Invalid is_active value: {value!r}")
+
+def normalize(row: dict) -> dict:
+    """
+    Validate a raw row into user column values (None = not provided). Raises ValueError.
+    """
+    if "_error" in row:
+        raise ValueError(row["_error"])
+    uid = _clean(row.get("swufe_uid") or row.get("uid"))
+    name = _clean(row.get("name"))
+    if not uid:
+        raise ValueError("Missing swufe_uid")
+    if not name:
+        raise ValueError("Missing name")
+    role = _clean(row.get("role"))
+    if role is not None and role not in ROLES:
+        raise ValueError(f"Invalid role: {role!r}")
+    password = _clean(row.get("password"))
+    return {
+        "swufe_uid": uid, "name": name, "email": _clean(row.get("email")), "phone": _clean(row.get("phone")),
+        "department": _clean(row.get("department")), "role": role, "is_active": _parse_bool(row.get("is_active")),
+        "password_hash": get_password_hash(password) if password else None,
+    }
+
+# --- Upsert ---
+
+_UPDATE = (
+    update(User.__table__)
+    .where(User.__table__.c.swufe_uid == bindparam("b_uid"))
+    .values(
+        name=bindparam("b_name"),
+        department=func.coalesce(bindparam("b_department"), User.__table__.c.department),
+        email=func.coalesce(bindparam("b_email"), User.__table__.c.email),
+        phone=func.coalesce(bindparam("b_phone"), User.__table__.c.phone),
+        role=func.coalesce(bindparam("b_role"), User.__table__.c.role),
+        is_active=func.coalesce(bindparam("b_is_active"), User.__table__.c.is_active),
+        password_hash=func.coalesce(bindparam("b_password_hash"), User.__table__.c.password_hash),
+    )
+    .execution_options(synchronize_session=False)
+)
+
+def _write_batch(session: Session, batch: Dict[str, dict], rolled_back: Set[str] = None) -> Tuple[int, int]:
+    existing = set(session.exec(select(User.swufe_uid).where(User.swufe_uid.in_(list(batch)))).all())
+    if rolled_back is not None:
+        # Dry run: uids created by earlier (rolled back) batches would exist by now in a real import
+        existing |= rolled_back & batch.keys()
+    new_rows = [
+        {**row, "email": row["email"] or "", "department": row["department"] or "",
+         "role": row["role"] or "user", "is_active": True if row["is_active"] is None else row["is_active"],
+         "password_hash": row["password_hash"] or SSO_PASSWORD_HASH}
+        for uid, row in batch.items() if uid not in existing
+    ]
+    updates = [{f"b_{k if k != 'swufe_uid' else 'uid'}": v for k, v in row.items()}
+               for uid, row in batch.items() if uid in existing]
+    if new_rows:
+        session.execute(User.__table__.insert(), new_rows)
+    if updates:
+        session.execute(_UPDATE, updates)
+    if rolled_back is not None:
+        rolled_back.update(row["swufe_uid"] for row in new_rows)
+    return len(new_rows), len(updates)
+
+def import_users(session: Session, rows: Iterable[Tuple[int, dict]], batch_size: int = 1000, dry_run: bool = False,
+                 progress: Callable[[ImportReport], None] = None) -> ImportReport:
+    """
+    Upsert users from (line number, raw row) pairs, committing every `batch_size` rows.
+    With `dry_run`, rows are validated and written but every batch is rolled back;
+    the counts are those a real import would report.
+    """
+    report = ImportReport()
+    batch: Dict[str, dict] = {}
+    rolled_back: Optional[Set[str]] = set() if dry_run else None
+
+    def flush():
+        for attempt in (1, 2):
+            try:
+                created, updated = _write_batch(session, batch, rolled_back)
+                if dry_run:
+                    session.rollback()
+                else:
+                    session.commit()
+                break
+            except IntegrityError:
+                # A concurrent CAS sign-in created one of the uids; re-split the batch once
+                session.rollback()
+                if attempt == 2:
+                    raise
+        report.created += created
+        report.updated += updated
+        batch.clear()
+        if progress:
+            progress(report)
+
+    for line_no, raw in rows:
+        report.processed += 1
+        try:
+            row = normalize(raw)
+        except ValueError as e:
+            report.error(line_no, _clean(raw.get("swufe_uid")), str(e))
+            continue
+        # A uid repeated within a batch: the later row wins
+        batch[row["swufe_uid"]] = row
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return report
@@ -0,0 +1,77 @@
+"""
+User search for /admin/users.
+
+Name, student/staff id and email are indexed in an FTS5 side table (see
+fts.py). Results are ranked exact id match first, then id prefix matches
+(a range scan on the unique `swufe_uid` index), then bm25 relevance with
+name and id weighted above email, and returned one page at a time with the
+total match count. Searches containing terms shorter than three characters
+(the trigram minimum, e.g. two-character Chinese names) use LIKE instead.
+"""
+from typing import List, Tuple
+
+from sqlalchemy import and_, case, func, or_, text
+from sqlmodel import Session, select
+
+from ..models import User
+from .fts import FTSIndex, match_expression
+
+PAGE_SIZE = 50
+
+USER_FTS = FTSIndex(User.__table__, ["name", "swufe_uid", "email"])
+
+# bm25 weights for (name, swufe_uid, email)
+_RANKED_IDS = text(f"""
+    WITH hits(id, score) AS (
+        SELECT id, CASE WHEN swufe_uid = :q THEN -2e9 ELSE -1e9 END
+        FROM "user" WHERE :prefix AND swufe_uid >= :lo AND swufe_uid < :hi
+        UNION ALL
+        SELECT rowid, bm25({USER_FTS.name}, 10.0, 10.0, 1.0)
+        FROM {USER_FTS.name} WHERE {USER_FTS.name} MATCH :match
+    )
+    SELECT id, MIN(score) AS score, count(*) OVER () AS total
+    FROM hits GROUP BY id ORDER BY score, id DESC LIMIT :limit OFFSET :offset
+""")
+
+def _prefix_upper_bound(prefix: str) -> str:
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+def search_users(session: Session, search: str = "", page: int = 1, page_size: int = PAGE_SIZE) -> Tuple[List[User], int]:
+    """
+    One page of users matching `search` (all users, newest first, when empty) and the total match count.
+    """
+    search = search.strip()
+    page = max(page, 1)
+    offset = (page - 1) * page_size
+    if not search:
+        total = session.exec(select(func.count(User.id))).one()
+        users = session.exec(select(User).order_by(User.id.desc()).offset(offset).limit(page_size)).all()
+        return users, total
+
+    terms = search.split()
+    if all(len(t) >= 3 for t in terms) and USER_FTS.available(session):
+        rows = session.execute(_RANKED_IDS, {
+            "q": search, "prefix": len(terms) == 1, "lo": search, "hi": _prefix_upper_bound(search),
+            "match": match_expression(terms), "limit": page_size, "offset": offset,
+        }).all()
+        by_id = {u.id: u for u in session.exec(select(User).where(User.id.in_([r.id for r in rows]))).all()} if rows else {}
+        users = [by_id[r.id] for r in rows]
+    else:
+        # Every term must appear in one of the columns, as with the FTS query
+        condition = and_(*(
+            or_(User.name.contains(t, autoescape=True), User.swufe_uid.contains(t, autoescape=True),
+                User.email.contains(t, autoescape=True))
+            for t in terms
+        ))
+        rank = case((User.swufe_uid == search, 0), (User.swufe_uid.startswith(search, autoescape=True), 1), else_=2)
+        # count() OVER () returns the total from the same scan as the page
+        rows = session.exec(
+            select(User, func.count().over().label("total")).where(condition)
+            .order_by(rank, User.id.desc()).offset(offset).limit(page_size)
+        ).all()
+        users = [row[0] for row in rows]
+
+    if rows:
+        return users, rows[0].total
+    # Past the last page there are no rows to carry the total
+    return [], (0 if offset == 0 else search_users(session, search, 1, 1)[1])
@@ -1,13 +1,24 @@
 from sqlmodel import SQLModel, Session, create_engine
+from . import config
+from .core.metrics import instrument_engine
+from .core import audit_search, user_search  # noqa: F401 (register FTS indexes)
+from .core.fts import install_all as install_fts_indexes
 
-sqlite_file_name = "data/database.db"
-sqlite_url = f"sqlite:///{sqlite_file_name}"
+sqlite_url = config.DATABASE_URL
+sqlite_file_name = sqlite_url[len("sqlite:///"):]
 
 connect_args = {"check_same_thread": False}
 engine = create_engine(sqlite_url, connect_args=connect_args)
+instrument_engine(engine)
 
 def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
+    # create_all skips existing tables, so add indexes introduced after a database was created
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+    with engine.begin() as connection:
+        install_fts_indexes(connection)
 
 def get_session():
     with Session(engine) as session:
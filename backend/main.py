@@ -1,32 +1,61 @@
 from fastapi import FastAPI, Request
-from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
 import os
 
-from .database import create_db_and_tables
+from .database import create_db_and_tables, engine
+from . import config
+from .core.templating import templates, precompile_templates
+from .core.i18n import TRANSLATORS, DEFAULT_LANG, LanguageVaryMiddleware
+from .core.metrics import MetricsMiddleware
+from .core.profiling import ProfilingMiddleware, check_settings as check_profiling_settings
+from .core.audit import audit_writer
+from .core.gateway import gateway_client
+from .core.api_keys import ensure_keys, key_index
+from .core.metering import token_meter
+from .core.response_cache import response_cache
+from .core.notifications import notification_dispatcher
+from sqlmodel import Session
 
 # Lifespan event to create tables on startup
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Ensure data dir exists
-    if not os.path.exists("data"):
-        os.makedirs("data")
+    if not os.path.exists(config.DATA_DIR):
+        os.makedirs(config.DATA_DIR)
     create_db_and_tables()
+    if config.PRECOMPILE_TEMPLATES:
+        precompile_templates(templates.env)
+    audit_writer.start(engine)
+    token_meter.start(engine, config.METERING_DIR)
+    notification_dispatcher.start(engine)
+    with Session(engine) as session:
+        ensure_keys(session)
+        session.commit()
+        key_index.refresh(session)
     yield
+    # Flush queued audit events before the worker exits
+    audit_writer.stop()
+    # Write token usage charged so far
+    token_meter.stop()
+    notification_dispatcher.stop()
+    await gateway_client.aclose()
+    response_cache.close()
 
 app = FastAPI(title="Experimental Teaching Resource Authorization Platform", version="2.0", lifespan=lifespan)
-
-# Templates
-templates = Jinja2Templates(directory="backend/templates")
+if config.PROFILING_ENABLED:
+    check_profiling_settings()
+    app.add_middleware(ProfilingMiddleware)
+app.add_middleware(LanguageVaryMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 from fastapi import Response
 from fastapi.responses import RedirectResponse
 
 @app.get("/set-language/{lang}")
 def set_language(lang: str, response: Response, next_url: str = "/"):
-    if lang not in ["zh", "en"]:
-        lang = "zh"
+    if lang not in TRANSLATORS:
+        lang = DEFAULT_LANG
     
     redirect_url = next_url if next_url else "/"
     resp = RedirectResponse(url=redirect_url, status_code=302)
@@ -34,12 +63,14 @@ def set_language(lang: str, response: Response, next_url: str = "/"):
     return resp
 
 # Register Routers
-from backend.routers import auth, resources, admin, sso
+from backend.routers import auth, resources, admin, sso, metrics, gateway
 
 app.include_router(auth.router)
 app.include_router(sso.router)
 app.include_router(resources.router)
 app.include_router(admin.router)
+app.include_router(metrics.router)
+app.include_router(gateway.router)
 
 @app.get("/")
 async def root():
@@ -1,6 +1,7 @@
 from datetime import datetime, date
 from typing import Optional, Dict, List, Any
 from sqlmodel import SQLModel, Field, JSON, Relationship
+from sqlalchemy import Index
 
 class User(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -41,6 +42,13 @@ class Resource(SQLModel, table=True):
     applications: List["Application"] = Relationship(back_populates="resource")
 
 class Application(SQLModel, table=True):
+    # Covers "latest application per resource for a user" (id is the implicit rowid suffix)
+    # and per-resource status counts / expiry sweeps for quotas
+    __table_args__ = (
+        Index("ix_application_user_resource", "user_id", "resource_id"),
+        Index("ix_application_resource_status", "resource_id", "status"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="user.id")
     resource_id: int = Field(foreign_key="resource.id")
@@ -63,6 +71,66 @@ class Application(SQLModel, table=True):
     user: Optional[User] = Relationship(back_populates="applications")
     resource: Optional[Resource] = Relationship(back_populates="applications")
 
+class ResourceQuota(SQLModel, table=True):
+    # Approval seats in use for resources with a quota; changed in the same transaction as the applications
+    resource_id: int = Field(foreign_key="resource.id", primary_key=True)
+    quota: int
+    used: int = Field(default=0)
+
+class ApiKey(SQLModel, table=True):
+    # Gateway keys by SHA-256; `version` increases with every change so workers can load just what changed
+    id: Optional[int] = Field(default=None, primary_key=True)
+    key_hash: str = Field(index=True, unique=True)
+    application_id: int = Field(foreign_key="application.id", index=True)
+    resource_id: int = Field(foreign_key="resource.id", index=True)
+    user_id: int = Field(foreign_key="user.id")
+    status: str = Field(default="ACTIVE") # ACTIVE, REVOKED, EXPIRED
+    expires_at: Optional[datetime] = None
+    version: int = Field(default=0, index=True)
+    created_at: datetime = Field(default_factory=datetime.now)
+
+class SSOSession(SQLModel, table=True):
+    # Local sessions opened by CAS logins, by SHA-256 of the cookie token and of the service ticket;
+    # `version` increases with every change so workers can load just what changed
+    id: Optional[int] = Field(default=None, primary_key=True)
+    token_hash: str = Field(index=True, unique=True)
+    ticket_hash: str = Field(index=True)
+    user_id: int = Field(foreign_key="user.id", index=True)
+    expires_at: datetime = Field(index=True)
+    revoked_at: Optional[datetime] = None
+    version: int = Field(default=0, index=True)
+    created_at: datetime = Field(default_factory=datetime.now)
+
+class TokenUsage(SQLModel, table=True):
+    # Gateway tokens consumed per application, written behind by the token meter
+    application_id: int = Field(foreign_key="application.id", primary_key=True)
+    used: int = Field(default=0)
+    updated_at: datetime = Field(default_factory=datetime.now)
+
+class MeterJournal(SQLModel, table=True):
+    # Usage journals already applied to TokenUsage, so a replay after a crash cannot count them twice
+    name: str = Field(primary_key=True)
+    applied_at: datetime = Field(default_factory=datetime.now)
+
+class Notification(SQLModel, table=True):
+    # Outbox: written in the transaction that changes the application, delivered by the notification dispatcher
+    __table_args__ = (
+        Index("ix_notification_due", "status", "channel", "next_attempt_at"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    channel: str # email, sms
+    recipient: str
+    subject: str = Field(default="")
+    body: str
+    application_id: Optional[int] = Field(default=None, foreign_key="application.id")
+    status: str = Field(default="PENDING") # PENDING, SENT, FAILED
+    attempts: int = Field(default=0)
+    next_attempt_at: datetime = Field(default_factory=datetime.now)
+    last_error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.now)
+    sent_at: Optional[datetime] = None
+
 class AuditLog(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int
@@ -70,4 +138,12 @@ class AuditLog(SQLModel, table=True):
     resource_id: Optional[int] = None
     ip_address: str
     details: str
-    timestamp: datetime = Field(default_factory=datetime.now)
+    timestamp: datetime = Field(default_factory=datetime.now, index=True)
+
+    # Audit explorer filters: each pairs with timestamp so filtered pages come back in index order
+    __table_args__ = (
+        Index("ix_auditlog_user_ts", "user_id", "timestamp"),
+        Index("ix_auditlog_action_ts", "action", "timestamp"),
+        Index("ix_auditlog_resource_ts", "resource_id", "timestamp"),
+        Index("ix_auditlog_ip_ts", "ip_address", "timestamp"),
+    )
@@ -1,15 +1,33 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Response, Form, UploadFile, File
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
-from fastapi.templating import Jinja2Templates
-from sqlmodel import Session, select, func, desc, or_
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, FileResponse
+from starlette.concurrency import run_in_threadpool
+from sqlmodel import Session, select, func, desc
 from datetime import datetime, timedelta, date, time
+from typing import List
+import io
+import logging
 from ..database import get_session
 from ..models import User, Application, Resource, AuditLog
 from ..auth import require_admin
 from ..core.i18n import get_translator
+from ..core.templating import templates
+from ..core.app_state import app_state_cache
+from ..core.audit import audit_writer
+from ..core.audit_search import query_audit_logs
+from ..core.user_search import search_users, PAGE_SIZE as USER_PAGE_SIZE
+from ..core.user_import import import_users, read_rows, detect_format
+from ..core.bulk_review import bulk_review
+from ..core.notifications import notification_dispatcher, queue_review_notices
+from ..core.approval_rules import parse_rules
+from ..core.upstream_pool import parse_pool
+from ..core import api_keys
+from ..core.api_keys import key_index
+from ..core.quota import acquire as acquire_seat, release as release_seats, sync_quota
+from ..core import profiling
+from .. import config as app_config
 
 router = APIRouter()
-templates = Jinja2Templates(directory="backend/templates")
+logger = logging.getLogger(__name__)
 
 @router.get("/admin", include_in_schema=False)
 async def admin_root(
@@ -87,6 +105,8 @@ async def approve_application(
         raise HTTPException(status_code=404, detail="Application not found")
         
     resource = session.get(Resource, app.resource_id)
+    if app.status != "APPROVED" and not acquire_seat(session, resource):
+        raise HTTPException(status_code=409, detail="Resource quota exhausted")
     
     app.status = "APPROVED"
     app.approved_at = datetime.now()
@@ -97,20 +117,29 @@ async def approve_application(
     else:
         # Fallback if no valid_until (should not happen in new logic, but safe default)
         app.expired_at = datetime.now() + timedelta(days=180)
+    if resource.auth_type == "API_GATEWAY":
+        # Downstream key for the proxy; a re-approval gets a fresh one
+        key = api_keys.issue(session, [(app.id, app.user_id, app.resource_id)])[app.id]
+        app.auth_output = {**(app.auth_output or {}), "api_key": key}
     
     session.add(app)
     
     # Audit Log
-    audit = AuditLog(
-        user_id=user.id, 
-        action="APPROVE", 
-        resource_id=app.resource_id, 
+    audit_writer.record(
+        session,
+        user_id=user.id,
+        action="APPROVE",
+        resource_id=app.resource_id,
         details=f"Approved Application #{app.id} for {app.user.name}",
-        ip_address=request.client.host if request.client else "unknown"
+        ip_address=request.client.host if request.client else "unknown",
+        durable=True,
     )
-    session.add(audit)
+    queue_review_notices(session, "approve", [(app.id, app.user_id, app.resource_id)])
     
     session.commit()
+    app_state_cache.invalidate(app.user_id)
+    key_index.invalidate()
+    notification_dispatcher.wake()
     return RedirectResponse(url="/admin/dashboard", status_code=status.HTTP_303_SEE_OTHER)
 
 @router.post("/admin/reject/{app_id}")
@@ -128,22 +157,30 @@ async def reject_application(
     if not reason.strip():
         raise HTTPException(status_code=400, detail="Rejection reason cannot be empty")
     
+    if app.status == "APPROVED":
+        release_seats(session, {app.resource_id: 1})
     app.status = "REJECTED"
+    api_keys.set_status(session, [app.id], "REVOKED")
     # Store rejection reason in auth_output for MVP
     app.auth_output = {"rejection_reason": reason}
     session.add(app)
     
     # Audit Log
-    audit = AuditLog(
-        user_id=user.id, 
-        action="REJECT", 
-        resource_id=app.resource_id, 
+    audit_writer.record(
+        session,
+        user_id=user.id,
+        action="REJECT",
+        resource_id=app.resource_id,
         details=f"Rejected Application #{app.id}. Reason: {reason}",
-        ip_address=request.client.host if request.client else "unknown"
+        ip_address=request.client.host if request.client else "unknown",
+        durable=True,
     )
-    session.add(audit)
+    queue_review_notices(session, "reject", [(app.id, app.user_id, app.resource_id)], reason)
     
     session.commit()
+    app_state_cache.invalidate(app.user_id)
+    key_index.invalidate()
+    notification_dispatcher.wake()
     return RedirectResponse(url="/admin/dashboard", status_code=status.HTTP_303_SEE_OTHER)
 
 @router.get("/admin/resources/new", response_class=HTMLResponse)
@@ -180,9 +217,17 @@ async def create_resource(
     quota: int = Form(None),
     upstream_url: str = Form(None),
     public_installer_url: str = Form(None),
+    approval_rules: str = Form(None),
+    upstream_pool: str = Form(None),
+    cache_ttl: int = Form(None),
     user: User = Depends(require_admin),
     session: Session = Depends(get_session)
 ):
+    try:
+        rules = parse_rules(approval_rules)
+        pool = parse_pool(upstream_pool)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     try:
         # 1. Handle File Upload (for SAS/Zip type)
         config = {}
@@ -213,6 +258,12 @@ async def create_resource(
             config["quota"] = quota
         if upstream_url:
             config["upstream_url"] = upstream_url
+        if rules:
+            config["approval_rules"] = rules
+        if pool:
+            config["upstream_pool"] = pool
+        if cache_ttl:
+            config["response_cache"] = {"ttl": cache_ttl}
             
         # 3. Default Form Schema construction (Simplified for MVP)
         # In a real app, we might have a schema builder UI.
@@ -243,6 +294,8 @@ async def create_resource(
         session.add(res)
         session.commit()
         session.refresh(res)
+        sync_quota(session, res)
+        session.commit()
         
         return RedirectResponse(url="/admin/dashboard?tab=resources", status_code=status.HTTP_303_SEE_OTHER)
 
@@ -305,12 +358,20 @@ async def update_resource(
     quota: int = Form(None),
     upstream_url: str = Form(None),
     public_installer_url: str = Form(None),
+    approval_rules: str = Form(None),
+    upstream_pool: str = Form(None),
+    cache_ttl: int = Form(None),
     user: User = Depends(require_admin),
     session: Session = Depends(get_session)
 ):
     resource = session.get(Resource, res_id)
     if not resource:
         raise HTTPException(status_code=404, detail="Resource not found")
+    try:
+        rules = parse_rules(approval_rules)
+        pool = parse_pool(upstream_pool)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     # Update Basic Info
     resource.name = name
@@ -327,9 +388,8 @@ async def update_resource(
         
     # Update Config (Merge)
     # 1. Handle File Upload (Unzip Strategy)
-    print(f"DEBUG: Update Resource {res_id}, File: {file_zip}, Filename: {file_zip.filename if file_zip else 'None'}")
+    logger.debug("Update resource %s, upload: %s", res_id, file_zip.filename if file_zip else None)
     if file_zip and file_zip.filename:
-        print("DEBUG: Processing Zip Upload...")
         import os
         import shutil
         import zipfile
@@ -377,6 +437,24 @@ async def update_resource(
         resource.config["quota"] = quota
     if upstream_url is not None:
         resource.config["upstream_url"] = upstream_url
+    # An emptied textarea arrives as None; the key being present still means "clear the setting"
+    form = await request.form()
+    if "approval_rules" in form:
+        if rules:
+            resource.config["approval_rules"] = rules
+        else:
+            resource.config.pop("approval_rules", None)
+    if "upstream_pool" in form:
+        if pool:
+            resource.config["upstream_pool"] = pool
+        else:
+            resource.config.pop("upstream_pool", None)
+    if "cache_ttl" in form:
+        if cache_ttl:
+            # Keeps advanced settings (methods, vary, max_entry_bytes) made in the config directly
+            resource.config["response_cache"] = {**resource.config.get("response_cache", {}), "ttl": cache_ttl}
+        else:
+            resource.config.pop("response_cache", None)
         
     # Re-assign config to trigger SQLModel/SQLAlchemy update detection
     # resource.config = dict(resource.config) # Sometimes insufficient
@@ -397,10 +475,12 @@ async def update_resource(
         form_schema["fields"].append({"name": "course_code", "label": "Course Code", "type": "text", "required": True})
     resource.form_schema = form_schema
 
-    print(f"DEBUG: Saving Resource Config: {resource.config}")
+    logger.debug("Saving resource %s config: %s", res_id, resource.config)
     session.add(resource)
+    sync_quota(session, resource)
+    api_keys.touch_resource(session, resource.id)
     session.commit()
-    print("DEBUG: Resource Saved.")
+    key_index.invalidate()
     
     return RedirectResponse(url="/admin/dashboard?tab=resources", status_code=status.HTTP_303_SEE_OTHER)
 
@@ -424,8 +504,10 @@ async def delete_resource(
     # Actually, model defined `is_active` but I didn't verify if I use it in queries.
     # Let's delete it.
     
+    api_keys.touch_resource(session, resource.id)
     session.delete(resource)
     session.commit()
+    key_index.invalidate()
     
     return RedirectResponse(url="/admin/dashboard?tab=resources", status_code=status.HTTP_303_SEE_OTHER)
 
@@ -481,38 +563,92 @@ async def decrypt_tool_run(
     
     return templates.TemplateResponse("admin_decrypt.html", {"request": request, "result": result, "_": _, "lang": lang})
 
+# --- Profiling ---
+
+@router.get("/admin/profiles", response_class=HTMLResponse)
+async def admin_profiles(
+    request: Request,
+    user: User = Depends(require_admin),
+    trans: tuple = Depends(get_translator)
+):
+    _, lang = trans
+    return templates.TemplateResponse("admin_profiles.html", {
+        "request": request,
+        "user": user,
+        "enabled": app_config.PROFILING_ENABLED,
+        "sample_rate": app_config.PROFILE_SAMPLE_RATE,
+        "token": profiling.issue_token(user.id),
+        "profiles": profiling.list_reports(),
+        "_": _,
+        "lang": lang
+    })
+
+@router.get("/admin/profiles/{profile_id}")
+async def download_profile(
+    profile_id: str,
+    user: User = Depends(require_admin)
+):
+    path = profiling.report_path(profile_id)
+    if not path:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/json", filename=f"profile-{profile_id}.json")
+
 # --- User Management ---
 
 @router.get("/admin/users", response_class=HTMLResponse)
 async def admin_users(
     request: Request,
     search: str = "",
+    page: int = 1,
     user: User = Depends(require_admin),
     session: Session = Depends(get_session),
     trans: tuple = Depends(get_translator)
 ):
     _, lang = trans
-    query = select(User)
-    if search:
-        query = query.where(
-            or_(
-                User.name.contains(search),
-                User.swufe_uid.contains(search),
-                User.email.contains(search)
-            )
-        )
-    query = query.order_by(User.id.desc())
-    users = session.exec(query).all()
+    page = max(page, 1)
+    users, total = search_users(session, search, page)
     
     return templates.TemplateResponse("admin_users.html", {
         "request": request, 
         "user": user,
         "users": users,
         "search": search,
+        "page": page,
+        "total": total,
+        "has_next": page * USER_PAGE_SIZE < total,
         "_": _,
         "lang": lang
     })
 
+@router.post("/admin/users/import")
+async def import_users_upload(
+    request: Request,
+    file: UploadFile = File(...),
+    dry_run: bool = Form(False),
+    user: User = Depends(require_admin),
+    session: Session = Depends(get_session)
+):
+    """
+    Upsert users from a CSV or JSONL roster (columns: swufe_uid, name, email, phone,
+    department, role, is_active, password). Rows without a password are SSO-only accounts.
+    """
+    stream = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    rows = read_rows(stream, detect_format(file.filename or ""))
+    # Parsing and batched writes are blocking; keep them off the event loop
+    report = await run_in_threadpool(import_users, session, rows, dry_run=dry_run)
+
+    if not dry_run:
+        audit_writer.record(
+            session,
+            user_id=user.id,
+            action="IMPORT_USERS",
+            details=f"Imported {file.filename}: {report.created} created, {report.updated} updated, {report.failed} failed",
+            ip_address=request.client.host if request.client else "unknown",
+            durable=True,
+        )
+        session.commit()
+    return {"dry_run": dry_run, **report.as_dict()}
+
 @router.get("/admin/users/{user_id}", response_class=HTMLResponse)
 async def admin_user_detail(
     user_id: int,
@@ -554,13 +690,14 @@ async def toggle_user_status(
     
     # Audit Log
     action = "ENABLE_USER" if target_user.is_active else "DISABLE_USER"
-    audit = AuditLog(
+    audit_writer.record(
+        session,
         user_id=user.id,
         action=action,
         details=f"{action} {target_user.name} ({target_user.swufe_uid})",
-        ip_address=request.client.host if request.client else "unknown"
+        ip_address=request.client.host if request.client else "unknown",
+        durable=True,
     )
-    session.add(audit)
     session.commit()
     
     return RedirectResponse(url=f"/admin/users/{user_id}", status_code=status.HTTP_303_SEE_OTHER)
@@ -582,17 +719,53 @@ async def change_user_role(
     session.add(target_user)
     
     # Audit Log
-    audit = AuditLog(
+    audit_writer.record(
+        session,
         user_id=user.id,
         action="CHANGE_ROLE",
         details=f"Changed role for {target_user.name} from {old_role} to {role}",
-        ip_address=request.client.host if request.client else "unknown"
+        ip_address=request.client.host if request.client else "unknown",
+        durable=True,
     )
-    session.add(audit)
     session.commit()
     
     return RedirectResponse(url=f"/admin/users/{user_id}", status_code=status.HTTP_303_SEE_OTHER)
 
+@router.post("/admin/applications/bulk")
+async def bulk_review_applications(
+    request: Request,
+    action: str = Form(...),
+    ids: List[int] = Form(None),
+    resource_id: int = Form(None),
+    category: str = Form(None),
+    start: date = Form(None),
+    end: date = Form(None),
+    reason: str = Form(None),
+    user: User = Depends(require_admin),
+    session: Session = Depends(get_session)
+):
+    """
+    Approve/reject/revoke the listed application ids and/or every application matching
+    the filters (resource, category, submission date range) in set-based updates.
+    """
+    if not ids and resource_id is None and not category and not start and not end:
+        raise HTTPException(status_code=400, detail="Select applications by ids or at least one filter")
+    try:
+        result = bulk_review(
+            session, action, admin_id=user.id, ip_address=request.client.host if request.client else "unknown",
+            ids=ids or None, resource_id=resource_id, category=category, start=start, end=end, reason=reason,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    queue_review_notices(session, action, result.updated, reason)
+    session.commit()
+    for user_id in result.user_ids:
+        app_state_cache.invalidate(user_id)
+    key_index.invalidate()
+    notification_dispatcher.wake()
+    logger.info("Bulk %s by admin %s: %d updated, %d failed", action, user.id, len(result.updated), len(result.failed))
+    return result.as_dict()
+
 @router.post("/admin/applications/{app_id}/revoke")
 async def revoke_application(
     app_id: int,
@@ -603,21 +776,27 @@ async def revoke_application(
     app = session.get(Application, app_id)
     if not app:
         raise HTTPException(status_code=404, detail="Application not found")
+    if app.status == "APPROVED":
+        release_seats(session, {app.resource_id: 1})
         
     app.status = "REVOKED"
     app.expired_at = datetime.now() # Expire immediately
     session.add(app)
+    api_keys.set_status(session, [app.id], "REVOKED")
     
     # Audit Log
-    audit = AuditLog(
+    audit_writer.record(
+        session,
         user_id=user.id,
         action="REVOKE",
         resource_id=app.resource_id,
         details=f"Revoked Application #{app.id} for {app.user.name}",
-        ip_address=request.client.host if request.client else "unknown"
+        ip_address=request.client.host if request.client else "unknown",
+        durable=True,
     )
-    session.add(audit)
     session.commit()
+    app_state_cache.invalidate(app.user_id)
+    key_index.invalidate()
     
     # Return to where we came from? Usually dashboard or user detail
     # Let's check referer or default to dashboard
@@ -637,25 +816,22 @@ async def revoke_all_user_applications(
     if not target_user:
         raise HTTPException(status_code=404, detail="User not found")
         
-    apps = session.exec(select(Application).where(Application.user_id == user_id, Application.status == "APPROVED")).all()
-    
-    count = 0
-    for app in apps:
-        app.status = "REVOKED"
-        app.expired_at = datetime.now()
-        session.add(app)
-        count += 1
+    result = bulk_review(session, "revoke", admin_id=user.id, user_id=user_id, audit=False)
+    count = len(result.updated)
         
     # Audit Log
     if count > 0:
-        audit = AuditLog(
+        audit_writer.record(
+            session,
             user_id=user.id,
             action="REVOKE_ALL",
             details=f"Revoked all {count} active applications for {target_user.name}",
-            ip_address=request.client.host if request.client else "unknown"
+            ip_address=request.client.host if request.client else "unknown",
+            durable=True,
         )
-        session.add(audit)
         session.commit()
+        app_state_cache.invalidate(user_id)
+        key_index.invalidate()
     
     return RedirectResponse(url=f"/admin/users/{user_id}", status_code=status.HTTP_303_SEE_OTHER)
 
@@ -754,3 +930,44 @@ async def get_admin_stats(
             "data": sorted_trend_values
         }
     }
+
+@router.get("/admin/audit/data")
+async def get_audit_logs(
+    user_id: int = None,
+    action: str = None,
+    resource_id: int = None,
+    ip_address: str = None,
+    start: datetime = None,
+    end: datetime = None,
+    q: str = None,
+    limit: int = 50,
+    cursor: str = None,
+    user: User = Depends(require_admin),
+    session: Session = Depends(get_session)
+):
+    try:
+        logs, next_cursor = query_audit_logs(
+            session, user_id=user_id, action=action, resource_id=resource_id, ip_address=ip_address,
+            start=start, end=end, q=q, limit=limit, cursor=cursor,
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    user_ids = {log.user_id for log in logs}
+    names = dict(session.exec(select(User.id, User.name).where(User.id.in_(user_ids))).all()) if user_ids else {}
+    return {
+        "items": [
+            {
+                "id": log.id,
+                "timestamp": log.timestamp.isoformat(),
+                "user_id": log.user_id,
+                "user_name": names.get(log.user_id),
+                "action": log.action,
+                "resource_id": log.resource_id,
+                "ip_address": log.ip_address,
+                "details": log.details,
+            }
+            for log in logs
+        ],
+        "next_cursor": next_cursor,
+    }
@@ -3,12 +3,13 @@ from fastapi.responses import HTMLResponse, RedirectResponse
 from sqlmodel import Session, select
 from backend.database import get_session
 from backend.models import User
-from backend.auth import get_current_user, get_password_hash, verify_password
+from backend.auth import get_current_user, get_password_hash, verify_password, SSO_COOKIE_NAME
 from backend.core.i18n import get_translator
-from fastapi.templating import Jinja2Templates
+from backend.core.templating import templates
+from backend.core.ratelimit import enforce as enforce_rate_limit
+from backend.core.sso_sessions import sso_sessions
 
 router = APIRouter()
-templates = Jinja2Templates(directory="backend/templates")
 
 @router.get("/login", response_class=HTMLResponse)
 async def login_page(
@@ -20,11 +21,14 @@ async def login_page(
 
 @router.post("/login")
 async def login(
+    request: Request,
     response: Response,
     swufe_uid: str = Form(...),
     password: str = Form(...),
     session: Session = Depends(get_session)
 ):
+    # Per client IP: password guessing spreads over accounts, not requests per account
+    await enforce_rate_limit("login", request.client.host if request.client else "unknown")
     user = session.exec(select(User).where(User.swufe_uid == swufe_uid)).first()
     if not user or not verify_password(password, user.password_hash):
         # In a real app return error message to template
@@ -33,12 +37,18 @@ async def login(
     # Simple Cookie Auth
     response = RedirectResponse(url="/resource", status_code=status.HTTP_303_SEE_OTHER)
     response.set_cookie(key="user_id", value=str(user.id))
+    # A CAS session left in this browser belongs to whoever used it before
+    response.delete_cookie(SSO_COOKIE_NAME)
     return response
 
 @router.get("/logout")
-async def logout():
+async def logout(request: Request, session: Session = Depends(get_session)):
+    token = request.cookies.get(SSO_COOKIE_NAME)
+    if token:
+        sso_sessions.end(session, token)
     response = RedirectResponse(url="/login")
     response.delete_cookie("user_id")
+    response.delete_cookie(SSO_COOKIE_NAME)
     return response
 
 @router.get("/register", response_class=HTMLResponse)
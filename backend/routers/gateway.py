@@ -0,0 +1,212 @@
+import asyncio
+import time
+from typing import Optional
+
+import httpx
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+from sqlmodel import Session
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+
+from .. import config
+from ..database import get_session
+from ..core import gateway
+from ..core.api_keys import key_index
+from ..core.gateway import Grant, gateway_client
+from ..core.metering import UsageParser, parser_for, token_meter
+from ..core.metrics import GATEWAY_ACTIVE_STREAMS, GATEWAY_BYTES, GATEWAY_CACHE_REQUESTS, GATEWAY_UPSTREAM_DURATION
+from ..core.ratelimit import enforce as enforce_rate_limit
+from ..core.response_cache import CachedResponse, Recorder, cache_key, cacheable, response_cache
+from ..core.upstream_pool import Upstream, UpstreamPool
+
+router = APIRouter()
+
+PROXY_METHODS = ["GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS"]
+
+class _Lease:
+    """
+    An upstream response and the pool slot it holds, given back exactly once
+    (by the relay, or by the background task if the relay never started).
+    A recorder, if any, gets its response cached and its waiters woken then.
+    """
+    def __init__(self, pool: UpstreamPool, upstream: Upstream, response: httpx.Response,
+                 recorder: Optional[Recorder] = None):
+        self.pool = pool
+        self.upstream = upstream
+        self.response = response
+        self.recorder = recorder
+        self._closed = False
+
+    async def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self.pool.release(self.upstream)
+        await self.response.aclose()
+        if self.recorder is not None:
+            try:
+                entry = self.recorder.entry()
+                if entry is not None:
+                    await run_in_threadpool(response_cache.store, self.recorder.key, entry)
+            finally:
+                response_cache.land(self.recorder.key)
+
+async def _relay(lease: _Lease, grant: Grant, parser: Optional[UsageParser]):
+    GATEWAY_ACTIVE_STREAMS.inc()
+    try:
+        async for chunk in lease.response.aiter_raw():
+            GATEWAY_BYTES.inc(len(chunk), resource=grant.resource_id)
+            if parser is not None:
+                parser.feed(chunk)
+            if lease.recorder is not None:
+                lease.recorder.feed(chunk)
+            yield chunk
+        if lease.recorder is not None:
+            lease.recorder.complete = True
+    finally:
+        # Also runs when the client disconnects mid-stream, returning the connection to the pool
+        GATEWAY_ACTIVE_STREAMS.dec()
+        if parser is not None:
+            # Whatever usage arrived before a disconnect is still charged
+            token_meter.record(grant, parser.tokens)
+        await lease.close()
+
+async def _cached(key: str) -> Optional[CachedResponse]:
+    entry = response_cache.lookup(key)
+    if entry is None and response_cache.on_disk(key):
+        entry = await run_in_threadpool(response_cache.load, key)
+    return entry
+
+def _cached_response(entry: CachedResponse) -> Response:
+    headers = dict(entry.headers)
+    headers["x-cache"] = "HIT"
+    headers["age"] = str(int(time.monotonic() - entry.stored_at))
+    return Response(content=entry.body, status_code=entry.status, headers=headers)
+
+@router.api_route(gateway.PROXY_PREFIX + "/{resource_id}/{path:path}", methods=PROXY_METHODS, include_in_schema=False)
+async def proxy(
+    resource_id: int,
+    path: str,
+    request: Request,
+    session: Session = Depends(get_session)
+):
+    key = gateway.extract_key(request.headers)
+    if not key:
+        raise HTTPException(status_code=401, detail="Missing API key")
+    if key_index.stale():
+        await run_in_threadpool(key_index.refresh, session)
+    grant = key_index.lookup(resource_id, key)
+    if not grant:
+        raise HTTPException(status_code=401, detail="Invalid or expired API key")
+    await enforce_rate_limit("gateway", grant.application_id)
+    if grant.token_quota is not None:
+        if not token_meter.loaded(grant.application_id):
+            await run_in_threadpool(token_meter.load, session, grant.application_id)
+        # 402 rather than 429: clients retry 429s, but the allowance will not come back by waiting
+        if token_meter.remaining(grant) <= 0:
+            raise HTTPException(status_code=402, detail="Token quota exhausted")
+
+    has_body = "content-length" in request.headers or "transfer-encoding" in request.headers
+    body = request.stream() if has_body else None
+    policy, entry_key = grant.cache, None
+    if policy is not None and request.method in policy.methods:
+        length = request.headers.get("content-length", "0")
+        # Keyed on the whole body, so only bodies of known, bounded size
+        if "transfer-encoding" not in request.headers and length.isdigit() and int(length) <= policy.max_entry_bytes:
+            body = await request.body() if has_body else None
+            entry_key = cache_key(resource_id, request.method, path, request.url.query, request.headers, body or b"",
+                                  policy)
+            entry = await _cached(entry_key)
+            result = "hit"
+            if entry is None:
+                flight = response_cache.join(entry_key)
+                if flight is not None:
+                    # The same request is on its way upstream; wait for its response rather than send another
+                    try:
+                        await asyncio.wait_for(asyncio.shield(flight), config.GATEWAY_READ_TIMEOUT)
+                    except asyncio.TimeoutError:
+                        pass
+                    entry, result = await _cached(entry_key), "coalesced"
+                    if entry is None and response_cache.join(entry_key) is not None:
+                        entry_key = None
+            if entry is not None:
+                GATEWAY_CACHE_REQUESTS.inc(resource=resource_id, result=result)
+                return _cached_response(entry)
+            GATEWAY_CACHE_REQUESTS.inc(resource=resource_id, result="miss")
+    try:
+        response, upstream = await _send(request, path, grant, body)
+    except BaseException:
+        if entry_key is not None:
+            response_cache.land(entry_key)
+        raise
+
+    recorder = None
+    headers = gateway.response_headers(response.headers)
+    if entry_key is not None:
+        if cacheable(response.status_code, response.headers, policy):
+            recorder = Recorder(response_cache, entry_key, response.status_code, list(headers.items()), policy)
+        else:
+            response_cache.land(entry_key)
+        headers["x-cache"] = "MISS"
+    lease = _Lease(grant.pool, upstream, response, recorder)
+    return StreamingResponse(
+        _relay(lease, grant, parser_for(response.headers)),
+        status_code=response.status_code,
+        headers=headers,
+        # The body iterator may never start (e.g. HEAD)
+        background=BackgroundTask(lease.close),
+    )
+
+async def _send(request: Request, path: str, grant: Grant, body):
+    """
+    Send the request to an upstream of the grant's pool; returns (response, upstream) with the upstream held.
+    """
+    resource_id = grant.resource_id
+    client = gateway_client.get()
+    client_host = request.client.host if request.client else None
+    pool = grant.pool
+    attempts = 0
+    while True:
+        upstream = pool.acquire()
+        if upstream is None:
+            raise HTTPException(status_code=503, detail="No upstream available", headers={"Retry-After": "1"})
+        attempts += 1
+        start = time.perf_counter()
+        try:
+            upstream_request = client.build_request(
+                request.method,
+                gateway.upstream_url(upstream.url, path, request.url.query),
+                headers=gateway.request_headers(request.headers, upstream.key, client_host),
+                content=body,
+            )
+            response = await client.send(upstream_request, stream=True)
+            break
+        except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+            GATEWAY_UPSTREAM_DURATION.observe(time.perf_counter() - start, resource=resource_id, status="error")
+            pool.report(upstream, False)
+            pool.release(upstream)
+            # Nothing of the request body was read yet, so the next upstream can take it
+            if attempts < len(pool):
+                continue
+            if isinstance(e, httpx.ConnectTimeout):
+                raise HTTPException(status_code=504, detail="Upstream timed out")
+            raise HTTPException(status_code=502, detail="Upstream unavailable")
+        except httpx.TimeoutException:
+            GATEWAY_UPSTREAM_DURATION.observe(time.perf_counter() - start, resource=resource_id, status="timeout")
+            pool.report(upstream, False)
+            pool.release(upstream)
+            raise HTTPException(status_code=504, detail="Upstream timed out")
+        except httpx.HTTPError:
+            GATEWAY_UPSTREAM_DURATION.observe(time.perf_counter() - start, resource=resource_id, status="error")
+            pool.report(upstream, False)
+            pool.release(upstream)
+            raise HTTPException(status_code=502, detail="Upstream unavailable")
+        except BaseException:
+            # Client gone while waiting for the upstream
+            pool.release(upstream)
+            raise
+    latency = time.perf_counter() - start
+    GATEWAY_UPSTREAM_DURATION.observe(latency, resource=resource_id, status=response.status_code)
+    pool.report(upstream, response.status_code < 500 and response.status_code != 429, latency)
+    return response, upstream
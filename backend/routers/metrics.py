@@ -0,0 +1,26 @@
+import hmac
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi.responses import PlainTextResponse
+
+from .. import config
+from ..models import User
+from ..auth import get_current_user_optional
+from ..core.metrics import REGISTRY
+
+router = APIRouter()
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics(
+    request: Request,
+    user: Optional[User] = Depends(get_current_user_optional)
+):
+    """
+    Prometheus text exposition. Admin session, or `Authorization: Bearer <ETRAP_METRICS_TOKEN>` for scrapers.
+    """
+    authorized = user is not None and user.role == "admin"
+    if not authorized and config.METRICS_TOKEN:
+        authorized = hmac.compare_digest(request.headers.get("authorization", ""), f"Bearer {config.METRICS_TOKEN}")
+    if not authorized:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin privileges required")
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
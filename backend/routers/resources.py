@@ -1,23 +1,35 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Response, Form
 from fastapi.responses import HTMLResponse, StreamingResponse, RedirectResponse
-from sqlmodel import Session, select, desc
+from sqlmodel import Session, select, desc, func
 from datetime import datetime, timedelta
 import json
+import logging
 import os
 
+from .. import config
 from ..database import get_session
-from ..models import User, Resource, Application, AuditLog
+from ..models import User, Resource, Application
 from ..auth import get_current_user, require_profile_completion, get_current_user_optional, create_access_token, COOKIE_NAME
+from ..auth import SSO_COOKIE_NAME
 from ..core.watermark import stream_zip_from_directory
-from ..main import templates
+from ..core.templating import templates
 from ..core.cas_client import CASClient
+from ..core.cas_provisioning import provision
+from ..core.sso_sessions import sso_sessions
+from ..core.app_state import app_state_cache
+from ..core.metrics import track_stream
+from ..core.audit import audit_writer
+from ..core.approval_rules import decide
+from ..core.quota import acquire as acquire_seat
+from ..core.ratelimit import enforce as enforce_rate_limit
 
 # Strict Service URL for Validation
-SERVICE_URL = "http://192.168.77.87/resource"
-CAS_SERVER_URL = "https://authserver.swufe.edu.cn/authserver"
+SERVICE_URL = config.CAS_SERVICE_URL
+CAS_SERVER_URL = config.CAS_SERVER_URL
 cas_client = CASClient(CAS_SERVER_URL)
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 from ..core.i18n import get_translator
 
@@ -37,34 +49,22 @@ async def list_resources(
             # Invalid ticket, show list but maybe error? Or just ignore
             pass 
         else:
-            cas_uid = user_data.get('user')
-            # Provision User
-            user_db = session.exec(select(User).where(User.swufe_uid == cas_uid)).first()
-            if not user_db:
-                user_db = User(
-                    swufe_uid=cas_uid,
-                    name=cas_uid, 
-                    role="user", 
-                    department="SSO User",
-                    password_hash="SSO_USER",
-                    email="",
-                    phone=""
-                )
-                session.add(user_db)
-                session.commit()
-                session.refresh(user_db)
+            # Provision User (created or updated from the released attributes)
+            user_db = provision(session, user_data.get('user'), user_data.get('attributes'))
                 
-            # Create Session
+            # Create Session (ended early if CAS sends a single logout request for this ticket)
             access_token = create_access_token(data={"sub": user_db.id})
+            sso_token = sso_sessions.open(session, ticket, user_db.id)
             
             # Check Profile Completion
-            if not user_db.email or not user_db.phone:
+            if not user_db.complete:
                 redirect_url = "/profile/complete"
             else:
                 redirect_url = "/resource"
             
             resp = RedirectResponse(url=redirect_url, status_code=status.HTTP_302_FOUND)
-            resp.set_cookie(key=COOKIE_NAME, value=access_token, httponly=True, max_age=1800)
+            resp.set_cookie(key=COOKIE_NAME, value=access_token, httponly=True, max_age=config.SSO_SESSION_TTL)
+            resp.set_cookie(key=SSO_COOKIE_NAME, value=sso_token, httponly=True, max_age=config.SSO_SESSION_TTL)
             return resp
 
     _, lang = trans # Unpack translation helper and language code
@@ -75,10 +75,8 @@ async def list_resources(
     # 2. Get user's applications (Only if logged in)
     app_map = {}
     if user:
-        # Fetch all applications sorted by ID ascending, so the dictionary comprehension
-        # keeps the latest application for each resource_id.
-        apps = session.exec(select(Application).where(Application.user_id == user.id).order_by(Application.id)).all()
-        app_map = {app.resource_id: app for app in apps}
+        # Latest application per resource (cached per user, invalidated on state changes)
+        app_map = app_state_cache.get(session, user.id)
     
     return templates.TemplateResponse("resources.html", {
         "request": request, 
@@ -96,6 +94,7 @@ async def apply_resource(
     user: User = Depends(require_profile_completion),
     session: Session = Depends(get_session)
 ):
+    await enforce_rate_limit("apply", user.id)
     resource = session.get(Resource, resource_id)
     if not resource:
         raise HTTPException(status_code=404, detail="Resource not found")
@@ -149,13 +148,48 @@ async def apply_resource(
         else:
              app.expired_at = datetime.now() + timedelta(days=365)
 
+    # MANUAL resources: approval rules may decide instantly instead of the review queue
+    decision = None
+    if resource.auth_type == 'MANUAL':
+        def approved_count():
+            # Insert the application first: the INSERT holds SQLite's write lock until commit,
+            # so no concurrent apply can approve between this count and our approval
+            session.add(app)
+            session.flush()
+            return session.exec(select(func.count(Application.id)).where(
+                Application.resource_id == resource_id, Application.status == "APPROVED")).one()
+        decision = decide(resource, user, user_input, approved_count)
+        if decision and decision.action == "approve":
+            app.status = 'APPROVED'
+            app.approved_at = datetime.now()
+            if resource.valid_until:
+                app.expired_at = datetime.combine(resource.valid_until, datetime.max.time())
+            else:
+                app.expired_at = datetime.now() + timedelta(days=180)
+        elif decision and decision.action == "reject":
+            app.status = 'REJECTED'
+            app.auth_output = {"rejection_reason": decision.reason or f"Rejected by rule {decision.rule}"}
+
+    # Approval quota: take a seat atomically with the approval
+    quota_full = app.status == 'APPROVED' and not acquire_seat(session, resource)
+    if quota_full:
+        if not decision:
+            session.commit() # keep expired approvals swept while checking
+            return Response(status_code=409, content="Resource quota exhausted")
+        # Rule approvals fall back to manual review
+        app.status, app.approved_at, app.expired_at = 'PENDING', None, None
+
     session.add(app)
     
     # Audit
-    audit = AuditLog(user_id=user.id, action="APPLY", resource_id=resource_id, ip_address=request.client.host, details=f"Status: {app.status}")
-    session.add(audit)
+    details = f"Status: {app.status}"
+    if decision:
+        details += f" (rule: {decision.rule}{', quota full' if quota_full else ''})"
+    audit_writer.record(session, user_id=user.id, action="APPLY", resource_id=resource_id,
+                        ip_address=request.client.host, details=details)
     
     session.commit()
+    app_state_cache.invalidate(user.id)
     return RedirectResponse(url="/resource", status_code=status.HTTP_303_SEE_OTHER)
 
 @router.get("/resources/{resource_id}/download")
@@ -164,6 +198,7 @@ async def download_resource(
     user: User = Depends(require_profile_completion),
     session: Session = Depends(get_session)
 ):
+    await enforce_rate_limit("download", user.id)
     # 1. Verify Application
     app = session.exec(select(Application).where(
         Application.user_id == user.id, 
@@ -206,14 +241,16 @@ async def download_resource(
             # LEGACY: Stream from zip file (Fix for "Legacy ZIP mode deprecated" error)
             from ..core.watermark import stream_zip_from_zip_file
             stream = stream_zip_from_zip_file(zip_path, user_info, inject_file)
-            print(f"WARNING: Serving legacy resource {resource.id} from zip file. Please re-upload.")
+            logger.warning("Serving legacy resource %s from zip file. Please re-upload.", resource.id)
         else:
              raise HTTPException(status_code=500, detail="Content file missing on server")
         
-        # Audit
-        audit = AuditLog(user_id=user.id, action="DOWNLOAD", resource_id=resource_id, ip_address="127.0.0.1", details=f"Downloaded {resource.name}")
-        session.add(audit)
-        session.commit()
+        stream = track_stream(stream)
+        
+        # Audit (queued; only commits here when written synchronously)
+        if not audit_writer.record(session, user_id=user.id, action="DOWNLOAD", resource_id=resource_id,
+                                   ip_address="127.0.0.1", details=f"Downloaded {resource.name}"):
+            session.commit()
         
         # Download Filename Logic
         download_name = "SAS LIC.zip" if "SAS" in resource.name else f"{resource.name}.zip"
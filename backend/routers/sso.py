@@ -1,17 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response, Form
 from fastapi.responses import RedirectResponse
 from sqlmodel import Session, select
 from datetime import datetime
+import logging
 
+from .. import config
 from ..database import get_session
 from ..models import User
-from ..core.cas_client import CASClient
-from ..auth import create_access_token, COOKIE_NAME
+from ..core.cas_client import CASClient, CASError, parse_logout_request
+from ..core.sso_sessions import sso_sessions
+from ..auth import create_access_token, COOKIE_NAME, SSO_COOKIE_NAME
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
-# CAS Configuration - Hardcoded for MVP based on doc
-CAS_SERVER_URL = "https://authserver.swufe.edu.cn/authserver"
+# CAS Configuration (see backend/config.py)
+CAS_SERVER_URL = config.CAS_SERVER_URL
 cas_client = CASClient(CAS_SERVER_URL)
 
 @router.get("/login/sso")
@@ -25,7 +29,7 @@ async def sso_login(
     The CAS server will redirect back to that URL with a ticket.
     """
     # STRICT Service URL for School CAS
-    service_url = "http://192.168.77.87/resource"
+    service_url = config.CAS_SERVICE_URL
     
     # Store next_url in session or cookie if needed to redirect after /resource?ticket=... 
     # But for MVP, we just land on /resource.
@@ -33,14 +37,40 @@ async def sso_login(
     return RedirectResponse(cas_client.get_login_url(service_url))
 
 @router.get("/logout/sso")
-async def sso_logout(request: Request):
+async def sso_logout(request: Request, session: Session = Depends(get_session)):
     """
     Logout locally and from CAS.
     """
     # STRICT Service URL for School CAS Logout Callback
-    service_url = "http://192.168.77.87/resource"
-    
+    service_url = config.CAS_SERVICE_URL
+
+    token = request.cookies.get(SSO_COOKIE_NAME)
+    if token:
+        sso_sessions.end(session, token)
     redirect_url = cas_client.get_logout_url(service_url)
     response = RedirectResponse(redirect_url)
     response.delete_cookie(COOKIE_NAME)
+    response.delete_cookie(SSO_COOKIE_NAME)
     return response
+
+@router.post("/resource")
+async def sso_single_logout(
+    logoutRequest: str = Form(None),
+    session: Session = Depends(get_session),
+):
+    """
+    CAS back-channel single logout: when a user logs out of CAS (or the CAS
+    session expires), the CAS server POSTs a SAML LogoutRequest naming the
+    service ticket to the service URL, i.e. /resource. The sessions that
+    ticket opened end here and on the other workers within SSO_SESSION_REFRESH.
+    """
+    if not logoutRequest:
+        return Response(status_code=status.HTTP_400_BAD_REQUEST)
+    try:
+        ticket = parse_logout_request(logoutRequest.encode("utf-8"))
+    except CASError as e:
+        logger.warning("Ignoring CAS logout request: %s", e)
+        return Response(status_code=status.HTTP_400_BAD_REQUEST)
+    ended = sso_sessions.end_ticket(session, ticket)
+    logger.info("CAS single logout ended %d session(s)", ended)
+    return Response(status_code=status.HTTP_200_OK)
@@ -0,0 +1,85 @@
+"""
+Catalog overlay cost for users with long application histories.
+
+Compares the legacy "load every application and keep the last per resource"
+approach with the grouped MAX(id) query and a warm per-user cache hit.
+
+Usage:
+    python benchmarks/bench_app_state.py [--history 100 1000 10000] [--resources 50]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, Session, create_engine, select
+
+from backend.models import User, Resource, Application
+from backend.core.app_state import ApplicationStateCache, load_latest_applications
+
+STATUSES = ["PENDING", "APPROVED", "REJECTED", "REVOKED"]
+
+def legacy(session, user_id):
+    apps = session.exec(select(Application).where(Application.user_id == user_id).order_by(Application.id)).all()
+    return {app.resource_id: app for app in apps}
+
+def timeit(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--history", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--resources", type=int, default=50)
+    parser.add_argument("--other-users", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    results = []
+    for history in args.history:
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        SQLModel.metadata.create_all(engine)
+        rng = random.Random(42)
+        with Session(engine) as session:
+            users = [User(swufe_uid=f"u{i}", password_hash="x", name=f"U{i}", email="", department="D") for i in range(args.other_users + 1)]
+            resources = [Resource(name=f"R{i}", category="Software", auth_type="MANUAL") for i in range(args.resources)]
+            session.add_all(users + resources)
+            session.commit()
+            target = users[0].id
+            rows = [
+                {"user_id": target, "resource_id": rng.randint(1, args.resources), "status": rng.choice(STATUSES), "user_input": {}, "auth_output": {}}
+                for _ in range(history)
+            ]
+            # Background noise from other users
+            rows += [
+                {"user_id": rng.randint(2, args.other_users + 1), "resource_id": rng.randint(1, args.resources), "status": rng.choice(STATUSES), "user_input": {}, "auth_output": {}}
+                for _ in range(history)
+            ]
+            session.execute(Application.__table__.insert(), rows)
+            session.commit()
+
+            expected = {rid: app.status for rid, app in legacy(session, target).items()}
+            assert {rid: s.status for rid, s in load_latest_applications(session, target).items()} == expected
+
+            cache = ApplicationStateCache(ttl=3600)
+            cache.get(session, target)
+            row = {
+                "history": history,
+                "legacy_ms": timeit(lambda: legacy(session, target), args.repeat),
+                "grouped_query_ms": timeit(lambda: load_latest_applications(session, target), args.repeat),
+                "cache_hit_ms": timeit(lambda: cache.get(session, target), args.repeat * 100),
+            }
+        results.append(row)
+        print(f"history={history:6d} legacy={row['legacy_ms']:8.2f}ms grouped={row['grouped_query_ms']:7.2f}ms cached={row['cache_hit_ms']:.4f}ms")
+
+    print(json.dumps(results))
+
+if __name__ == "__main__":
+    main()
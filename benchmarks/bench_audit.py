@@ -0,0 +1,54 @@
+"""
+Download throughput with synchronous vs. batched audit writes.
+
+Generates one dataset (small download files, so the request path rather than
+zip streaming dominates) and runs the load-test `download` scenario with
+ETRAP_AUDIT_MODE=sync and ETRAP_AUDIT_MODE=async against it.
+
+Usage:
+    python -m benchmarks.bench_audit [--mode inprocess|uvicorn] [--requests 1000] [--concurrency 16]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["inprocess", "uvicorn"], default="inprocess")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--download-file-kb", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        data_dir = os.path.join(workdir, "dataset")
+        subprocess.run([sys.executable, "-m", "benchmarks.datagen", "--out", data_dir, "--users", "500",
+                        "--applications", "1000", "--audit", "10000", "--download-files", "2",
+                        "--download-file-kb", str(args.download_file_kb)],
+                       cwd=ROOT, check=True, stdout=subprocess.DEVNULL)
+
+        results = {}
+        for audit_mode in ("sync", "async"):
+            out = os.path.join(workdir, f"{audit_mode}.json")
+            subprocess.run([sys.executable, "-m", "benchmarks.loadtest", "--data", data_dir, "--mode", args.mode,
+                            "--workers", str(args.workers), "--scenarios", "download",
+                            "--requests", str(args.requests), "--concurrency", str(args.concurrency), "--out", out],
+                           cwd=ROOT, check=True, stdout=subprocess.DEVNULL,
+                           env={**os.environ, "ETRAP_AUDIT_MODE": audit_mode})
+            with open(out) as f:
+                results[audit_mode] = json.load(f)["scenarios"]["download"]
+            r = results[audit_mode]
+            print(f"audit={audit_mode:5} rps={r['rps']:8.1f} p50={r['p50_ms']:7.2f}ms "
+                  f"p95={r['p95_ms']:7.2f}ms p99={r['p99_ms']:7.2f}ms errors={r['errors']}")
+
+    print(f"speedup: {results['async']['rps'] / results['sync']['rps']:.2f}x")
+    print(json.dumps(results))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Admin dashboard audit query on a large audit log.
+
+Builds an `auditlog` table with --rows events spread over --days and times the
+dashboard query (latest 10 events) without the timestamp index, with it, and
+after archiving everything older than the retention window. Also reports the
+archival throughput and compressed archive size.
+
+Usage:
+    python benchmarks/bench_audit_archive.py [--rows 10000000] [--days 1095] [--retention-days 180]
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlmodel import SQLModel, Session, create_engine, select
+
+from backend.models import AuditLog
+from backend.core.audit_archive import archive_audit_logs, retention_cutoff
+from backend.core.audit_search import AUDIT_FTS
+
+ACTIONS = ["APPLY", "APPROVE", "REJECT", "DOWNLOAD", "REVOKE"]
+BATCH = 100000
+
+def _row(rng, i: int, timestamp: datetime) -> tuple:
+    user_id, action, resource_id = rng.randint(1, 5000), rng.choice(ACTIONS), rng.randint(1, 50)
+    details = f"{action.title()} resource #{resource_id} for user {user_id} (ref {i:08x})"
+    return (user_id, action, resource_id, f"10.0.{rng.randint(0, 255)}.{rng.randint(1, 254)}", details,
+            timestamp.isoformat(sep=" ", timespec="microseconds"))
+
+def build(db_path: str, rows: int, days: int, seed: int = 42):
+    """
+    Bare `auditlog` table (no secondary indexes, no FTS) filled with `rows` events.
+    """
+    engine = create_engine(f"sqlite:///{db_path}")
+    SQLModel.metadata.create_all(engine, tables=[AuditLog.__table__])
+    with engine.begin() as connection:
+        AUDIT_FTS.drop(connection)
+        for index in AuditLog.__table__.indexes:
+            index.drop(connection)
+    engine.dispose()
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    rng = random.Random(seed)
+    start = datetime.now() - timedelta(days=days)
+    step = days * 86400 / rows
+    for offset in range(0, rows, BATCH):
+        conn.executemany(
+            "INSERT INTO auditlog (user_id, action, resource_id, ip_address, details, timestamp) VALUES (?, ?, ?, ?, ?, ?)",
+            [_row(rng, i, start + timedelta(seconds=i * step)) for i in range(offset, min(offset + BATCH, rows))])
+        conn.commit()
+    conn.close()
+
+def time_dashboard(engine, repeat: int = 20) -> float:
+    with Session(engine) as session:
+        session.exec(select(AuditLog).order_by(AuditLog.timestamp.desc()).limit(10)).all()
+        start = time.perf_counter()
+        for _ in range(repeat):
+            session.exec(select(AuditLog).order_by(AuditLog.timestamp.desc()).limit(10)).all()
+        return (time.perf_counter() - start) / repeat * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--days", type=int, default=1095)
+    parser.add_argument("--retention-days", type=int, default=180)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    results = {"rows": args.rows}
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, "audit.db")
+        start = time.perf_counter()
+        build(db_path, args.rows, args.days)
+        print(f"built {args.rows} rows in {time.perf_counter() - start:.1f}s")
+
+        engine = create_engine(f"sqlite:///{db_path}")
+        results["no_index_ms"] = time_dashboard(engine, max(1, args.repeat // 10))
+        print(f"dashboard query, no timestamp index: {results['no_index_ms']:9.2f}ms")
+
+        for index in AuditLog.__table__.indexes:
+            index.create(engine, checkfirst=True)
+        results["indexed_ms"] = time_dashboard(engine, args.repeat)
+        print(f"dashboard query, timestamp index:    {results['indexed_ms']:9.2f}ms")
+
+        archive_dir = os.path.join(workdir, "archive")
+        start = time.perf_counter()
+        with Session(engine) as session:
+            parts = archive_audit_logs(session, archive_dir, retention_cutoff(args.retention_days))
+        elapsed = time.perf_counter() - start
+        archived = sum(p["rows"] for p in parts)
+        size = sum(os.path.getsize(os.path.join(archive_dir, p["file"])) for p in parts)
+        results.update({
+            "archived_rows": archived, "archive_s": elapsed, "archive_rows_per_s": archived / elapsed if elapsed else 0.0,
+            "archive_bytes": size, "partitions": len(parts),
+        })
+        print(f"archived {archived} rows into {len(parts)} partitions in {elapsed:.1f}s "
+              f"({results['archive_rows_per_s']:.0f} rows/s, {size / 1024 / 1024:.1f}MB compressed)")
+
+        results["after_archive_ms"] = time_dashboard(engine, args.repeat)
+        print(f"dashboard query, after archival:     {results['after_archive_ms']:9.2f}ms")
+
+    print(json.dumps(results))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Audit explorer queries on a multi-million-row log.
+
+Builds a bare `auditlog` table, times representative /admin/audit/data queries
+(first page, filters, a deep keyset page, free-text search), then adds the
+composite indexes and the FTS5 table and times them again.
+
+Usage:
+    python benchmarks/bench_audit_query.py [--rows 2000000] [--repeat 20]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlmodel import Session, create_engine
+
+from backend.models import AuditLog
+from backend.core.audit_search import AUDIT_FTS, query_audit_logs
+from benchmarks.bench_audit_archive import build
+
+def queries(rows: int) -> dict:
+    rare_ref = f"{rows // 3:08x}"
+    return {
+        "first_page": dict(),
+        "user": dict(user_id=1234),
+        "action_window": dict(action="REJECT", start_days_ago=30),
+        "resource": dict(resource_id=7),
+        "ip": dict(ip_address="10.0.12.34"),
+        "deep_page_20": dict(pages=20),
+        "text_rare": dict(q=rare_ref),
+        "text_common_user": dict(q="resource #7", user_id=1234),
+    }
+
+def run_query(session, spec: dict, now) -> int:
+    spec = dict(spec)
+    pages = spec.pop("pages", 1)
+    days = spec.pop("start_days_ago", None)
+    if days is not None:
+        spec["start"] = now - timedelta(days=days)
+    cursor, count = None, 0
+    for _ in range(pages):
+        rows, cursor = query_audit_logs(session, limit=50, cursor=cursor, **spec)
+        count += len(rows)
+        if cursor is None:
+            break
+    return count
+
+def time_queries(engine, specs: dict, repeat: int, now) -> dict:
+    results = {}
+    with Session(engine) as session:
+        for name, spec in specs.items():
+            run_query(session, spec, now)
+            start = time.perf_counter()
+            for _ in range(repeat):
+                count = run_query(session, spec, now)
+            results[name] = {"ms": (time.perf_counter() - start) / repeat * 1000, "rows": count}
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--baseline-repeat", type=int, default=2)
+    args = parser.parse_args()
+
+    now = datetime.now()
+    specs = queries(args.rows)
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, "audit.db")
+        start = time.perf_counter()
+        build(db_path, args.rows, args.days)
+        print(f"built {args.rows} rows in {time.perf_counter() - start:.1f}s")
+        engine = create_engine(f"sqlite:///{db_path}")
+
+        before = time_queries(engine, specs, args.baseline_repeat, now)
+
+        start = time.perf_counter()
+        for index in AuditLog.__table__.indexes:
+            index.create(engine)
+        indexes_s = time.perf_counter() - start
+        start = time.perf_counter()
+        with engine.begin() as connection:
+            AUDIT_FTS.install(connection)
+        fts_s = time.perf_counter() - start
+        print(f"indexes built in {indexes_s:.1f}s, FTS5 in {fts_s:.1f}s; db size {os.path.getsize(db_path) / 1024 / 1024:.0f}MB")
+
+        after = time_queries(engine, specs, args.repeat, now)
+
+    for name in specs:
+        print(f"{name:18} no index {before[name]['ms']:10.2f}ms   indexed {after[name]['ms']:8.2f}ms   rows={after[name]['rows']}")
+    print(json.dumps({"rows": args.rows, "index_build_s": indexes_s, "fts_build_s": fts_s, "before": before, "after": after}))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+CAS service response parse time and allocations per response.
+
+Parses three success documents (the stub CAS's 4 attributes, a typical
+campus release of 20 attributes, and one with 500 group memberships) and a
+failure with:
+
+  streaming   backend.core.cas_client.parse_service_response (incremental feed, targeted walk)
+  etree       xml.etree.ElementTree.fromstring plus a walk for user/attributes
+  xmltodict   xmltodict.parse, the previous implementation (skipped if not installed)
+
+reporting microseconds per response and the peak bytes allocated while
+parsing one (tracemalloc).
+
+Usage:
+    python benchmarks/bench_cas_parse.py [--repeat 2000]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+import xml.etree.ElementTree as ElementTree
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import xmltodict
+except ImportError:
+    xmltodict = None
+
+from backend.core.cas_client import CASError, parse_service_response
+
+NS = "{http://www.yale.edu/tp/cas}"
+
+def document(attributes: list) -> bytes:
+    body = "".join(f"<cas:{name}>{value}</cas:{name}>" for name, value in attributes)
+    return (f"<cas:serviceResponse xmlns:cas='http://www.yale.edu/tp/cas'><cas:authenticationSuccess>"
+            f"<cas:user>20230001</cas:user><cas:attributes>{body}</cas:attributes>"
+            f"</cas:authenticationSuccess></cas:serviceResponse>").encode("utf-8")
+
+DOCUMENTS = {
+    "stub_4_attrs": document([("name", "Stub 20230001"), ("email", "20230001@swufe.edu.cn"),
+                              ("mobile", "13820230001"), ("department", "Stub School")]),
+    "campus_20_attrs": document([("cn", "张三"), ("mail", "zs@stu.swufe.edu.cn"), ("mobile", "13900000000"),
+                                 ("ou", "金融学院")] + [(f"attr{i}", f"value {i}" * 4) for i in range(16)]),
+    "groups_500": document([("cn", "张三")] + [("memberOf", f"cn=group{i},ou=groups,dc=swufe,dc=edu,dc=cn")
+                                               for i in range(500)]),
+    "failure": b"<cas:serviceResponse xmlns:cas='http://www.yale.edu/tp/cas'><cas:authenticationFailure "
+               b"code='INVALID_TICKET'>Ticket ST-1 not recognized</cas:authenticationFailure></cas:serviceResponse>",
+}
+
+def streaming(content: bytes):
+    try:
+        return parse_service_response(content).user
+    except CASError:
+        return None
+
+def etree(content: bytes):
+    root = ElementTree.fromstring(content)
+    success = root.find(f"{NS}authenticationSuccess")
+    if success is None:
+        return None
+    attributes = {}
+    for element in success.find(f"{NS}attributes") or ():
+        attributes.setdefault(element.tag, []).append(element.text)
+    return success.findtext(f"{NS}user")
+
+def legacy(content: bytes):
+    response = xmltodict.parse(content).get("cas:serviceResponse", {})
+    success = response.get("cas:authenticationSuccess")
+    return success.get("cas:user") if success else None
+
+def measure(parse, content: bytes, repeat: int) -> dict:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        parse(content)
+    per_call = (time.perf_counter() - start) / repeat
+    tracemalloc.start()
+    parse(content)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"us": round(per_call * 1e6, 1), "peak_bytes": peak}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    parsers = {"streaming": streaming, "etree": etree}
+    if xmltodict is not None:
+        parsers["xmltodict"] = legacy
+    results = {}
+    for name, content in DOCUMENTS.items():
+        expected = None if name == "failure" else "20230001"
+        results[name] = {"bytes": len(content)}
+        for parser_name, parse in parsers.items():
+            assert parse(content) == expected, (parser_name, name)
+            results[name][parser_name] = r = measure(parse, content, args.repeat)
+            print(f"{name:16s} {parser_name:10s} {r['us']:9.1f} us/response  peak {r['peak_bytes']:9,} B")
+    print(json.dumps({"repeat": args.repeat, **results}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+CAS login provisioning: first-login latency and database writes per login.
+
+Runs --logins CAS logins of distinct new students against a temporary SQLite
+file database (--existing users already present), each with the attributes a
+CAS server releases, through:
+
+  placeholder  the previous flow: SELECT, INSERT a placeholder user, commit,
+               then the /profile/complete UPDATE it forces, commit
+  upsert       provision(): SELECT, one INSERT ... ON CONFLICT DO UPDATE, commit
+  returning    provision() for the same students again
+  prefetched   provision() for students loaded beforehand with prefetch()
+               from a directory export (whose time is reported too)
+
+Latency covers the database work only; the CAS round trip is the same for all.
+
+Usage:
+    python benchmarks/bench_cas_provisioning.py [--logins 2000] [--existing 20000]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+from sqlmodel import SQLModel, Session, create_engine, select
+
+from backend.auth import SSO_PASSWORD_HASH
+from backend.models import User
+from backend.core.cas_provisioning import prefetch, provision
+
+def attributes(uid: str) -> dict:
+    return {"cas:cn": f"学生{uid}", "cas:mail": f"{uid}@stu.swufe.edu.cn", "cas:mobile": f"139{uid[-8:]}",
+            "cas:ou": "金融学院"}
+
+def placeholder_login(session: Session, uid: str, attrs: dict):
+    user = session.exec(select(User).where(User.swufe_uid == uid)).first()
+    if not user:
+        user = User(swufe_uid=uid, name=uid, role="user", department="SSO User", password_hash=SSO_PASSWORD_HASH,
+                    email="", phone="")
+        session.add(user)
+        session.commit()
+        session.refresh(user)
+    # The student then fills in /profile/complete
+    user.name, user.email = attrs["cas:cn"], attrs["cas:mail"]
+    user.phone, user.department = attrs["cas:mobile"], attrs["cas:ou"]
+    session.add(user)
+    session.commit()
+
+def upsert_login(session: Session, uid: str, attrs: dict):
+    provision(session, uid, attrs)
+
+def run(engine, login, uids: list) -> dict:
+    writes = commits = 0
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        nonlocal writes
+        writes += statement.lstrip().upper().startswith(("INSERT", "UPDATE", "DELETE"))
+
+    def count_commit(conn):
+        nonlocal commits
+        commits += 1
+
+    event.listen(engine, "before_cursor_execute", count)
+    event.listen(engine, "commit", count_commit)
+    latencies = []
+    try:
+        for uid in uids:
+            with Session(engine) as session:
+                start = time.perf_counter()
+                login(session, uid, attributes(uid))
+                latencies.append((time.perf_counter() - start) * 1000)
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+        event.remove(engine, "commit", count_commit)
+    latencies.sort()
+    return {"p50_ms": round(statistics.median(latencies), 3), "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 3),
+            "writes_per_login": round(writes / len(uids), 2), "commits_per_login": round(commits / len(uids), 2)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=2000)
+    parser.add_argument("--existing", type=int, default=20000)
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        engine = create_engine(f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+        SQLModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            session.execute(User.__table__.insert(), [
+                {"swufe_uid": f"2019{i:06d}", "name": f"老生{i}", "email": "", "phone": "", "department": "x",
+                 "role": "user", "is_active": True, "password_hash": SSO_PASSWORD_HASH} for i in range(args.existing)])
+            session.commit()
+
+        batches = {name: [f"{year}{i:06d}" for i in range(args.logins)]
+                   for name, year in (("placeholder", 2021), ("upsert", 2022), ("prefetched", 2023))}
+        results["placeholder"] = run(engine, placeholder_login, batches["placeholder"])
+        results["upsert"] = run(engine, upsert_login, batches["upsert"])
+        results["returning"] = run(engine, upsert_login, batches["upsert"])
+
+        export = ((line, {"uid": uid, **{k[4:]: v for k, v in attributes(uid).items()}})
+                  for line, uid in enumerate(batches["prefetched"], 1))
+        start = time.perf_counter()
+        with Session(engine) as session:
+            report = prefetch(session, export)
+        elapsed = time.perf_counter() - start
+        results["prefetch"] = {"rows": report.written, "seconds": round(elapsed, 3),
+                               "rows_per_s": round(report.written / elapsed)}
+        results["prefetched"] = run(engine, upsert_login, batches["prefetched"])
+
+    for name in ("placeholder", "upsert", "returning", "prefetched"):
+        r = results[name]
+        print(f"{name:12s} p50={r['p50_ms']:7.3f}ms p95={r['p95_ms']:7.3f}ms "
+              f"writes/login={r['writes_per_login']:.2f} commits/login={r['commits_per_login']:.2f}")
+    print(f"prefetch: {results['prefetch']['rows']} users in {results['prefetch']['seconds']}s "
+          f"({results['prefetch']['rows_per_s']:,} rows/s)")
+    print(json.dumps({"logins": args.logins, "existing": args.existing, **results}, indent=2))
+
+if __name__ == "__main__":
+    main()
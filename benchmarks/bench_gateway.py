@@ -0,0 +1,172 @@
+"""
+API gateway overhead.
+
+Runs the stub upstream and the app under uvicorn (separate processes) against
+a temporary database holding one API_GATEWAY resource with an approved key,
+then compares calling the upstream directly with calling it through
+/api/v1/proxy: small JSON requests (RPS, p50/p99), a large download
+(throughput) and SSE time to first event.
+
+Usage:
+    python benchmarks/bench_gateway.py [--requests 2000] [--concurrency 32] [--size-mb 20]
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+import httpx
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def seed(upstream_url: str, resource_config: dict = None) -> tuple:
+    # Imported late: backend config is read from the environment at import time
+    from sqlmodel import SQLModel, Session, create_engine, select
+    from backend import config
+    from backend.models import Application, Resource, User
+    from backend.core import api_keys
+
+    engine = create_engine(config.DATABASE_URL)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        user = session.exec(select(User).where(User.swufe_uid == "bench")).first() or \
+            User(swufe_uid="bench", name="Bench", email="", phone="", department="x", password_hash="SSO_USER")
+        res = Resource(name="LLM", category="API", auth_type="API_GATEWAY", form_schema={}, valid_until=date(2030, 1, 1),
+                       config={"upstream_url": upstream_url, "upstream_key": "sk-upstream", **(resource_config or {})})
+        session.add(user)
+        session.add(res)
+        session.commit()
+        app = Application(user_id=user.id, resource_id=res.id, status="APPROVED")
+        session.add(app)
+        session.flush()
+        key = api_keys.issue(session, [(app.id, user.id, res.id)])[app.id]
+        app.auth_output = {"api_key": key}
+        session.commit()
+        return res.id, key
+
+async def wait_ready(url: str):
+    async with httpx.AsyncClient() as client:
+        for _ in range(200):
+            try:
+                await client.get(url)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.05)
+    raise RuntimeError(f"{url} did not come up")
+
+async def small_requests(client, url: str, headers: dict, requests: int, concurrency: int) -> dict:
+    latencies, errors = [], 0
+    queue = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in queue:
+            start = time.perf_counter()
+            response = await client.post(url, content=b'{"model": "bench"}', headers=headers)
+            latencies.append((time.perf_counter() - start) * 1000)
+            errors += response.status_code != 200
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "rps": round(requests / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1], 2),
+        "errors": errors,
+    }
+
+async def download(client, url: str, headers: dict) -> dict:
+    start = time.perf_counter()
+    size = 0
+    async with client.stream("GET", url, headers=headers) as response:
+        async for chunk in response.aiter_raw():
+            size += len(chunk)
+    elapsed = time.perf_counter() - start
+    return {"mb_per_s": round(size / elapsed / 1e6, 1), "bytes": size}
+
+async def sse_first_event(client, url: str, headers: dict, rounds: int = 20) -> dict:
+    ttfb = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        async with client.stream("GET", url, headers=headers) as response:
+            async for line in response.aiter_lines():
+                if line.startswith("data:"):
+                    ttfb.append((time.perf_counter() - start) * 1000)
+                    break
+    return {"first_event_p50_ms": round(statistics.median(ttfb), 2)}
+
+async def run(args, upstream: str, gateway: str, headers: dict) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    results = {}
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        for name, base, hdrs in (("direct", upstream, {}), ("proxied", gateway, headers)):
+            await small_requests(client, f"{base}/echo/v1/chat", hdrs, 200, args.concurrency)
+            results[name] = {
+                "small": await small_requests(client, f"{base}/echo/v1/chat", hdrs, args.requests, args.concurrency),
+                "download": await download(client, f"{base}/bytes?size={args.size_mb * 1_000_000}", hdrs),
+                # Events 200 ms apart: a buffering proxy would hold the first one back for the whole stream
+                "sse": await sse_first_event(client, f"{base}/sse?events=5&delay=200", hdrs, rounds=5),
+            }
+            r = results[name]
+            print(f"{name:8} rps={r['small']['rps']:8.1f} p50={r['small']['p50_ms']:6.2f}ms "
+                  f"p99={r['small']['p99_ms']:6.2f}ms errors={r['small']['errors']} "
+                  f"download={r['download']['mb_per_s']:7.1f}MB/s sse_first_event={r['sse']['first_event_p50_ms']:.2f}ms")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--size-mb", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        env = {
+            "ETRAP_DATA_DIR": workdir,
+            "ETRAP_DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'database.db')}",
+            "ETRAP_ENV": "production",
+            # One key drives the whole run
+            "ETRAP_RATE_LIMIT_GATEWAY": "",
+        }
+        os.environ.update(env)
+        upstream_port, gateway_port = free_port(), free_port()
+        upstream = f"http://127.0.0.1:{upstream_port}"
+        gateway_base = f"http://127.0.0.1:{gateway_port}"
+        resource_id, key = seed(upstream)
+
+        procs = [
+            subprocess.Popen([sys.executable, "-m", "benchmarks.stub_upstream", "--port", str(upstream_port)],
+                             cwd=ROOT, stdout=subprocess.DEVNULL),
+            subprocess.Popen([sys.executable, "-m", "uvicorn", "backend.main:app", "--host", "127.0.0.1",
+                              "--port", str(gateway_port), "--log-level", "warning"],
+                             cwd=ROOT, env={**os.environ, **env}),
+        ]
+        try:
+            asyncio.run(wait_ready(upstream + "/echo"))
+            asyncio.run(wait_ready(gateway_base + "/"))
+            results = asyncio.run(run(args, upstream, f"{gateway_base}/api/v1/proxy/{resource_id}",
+                                      {"Authorization": f"Bearer {key}"}))
+        finally:
+            for proc in procs:
+                proc.terminate()
+                proc.wait(timeout=10)
+
+    print(json.dumps({"requests": args.requests, "concurrency": args.concurrency, **results}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Gateway response cache: hit rate and latency on a replayed request log.
+
+Runs the stub upstream (each response held back --upstream-ms, like a remote
+data API) and the app under uvicorn against a temporary database with two
+gateway resources on that upstream, one with `response_cache` and one
+without, then replays the same request log through each at --concurrency.
+
+The log is a JSONL file of {"method", "path", "query", "body"} objects
+(--log) or, by default, --requests queries drawn from --distinct ones with a
+Zipf-like popularity (a few popular quotes/reports, a long tail), the way a
+class hits a data API during an exercise.
+
+Usage:
+    python benchmarks/bench_gateway_cache.py [--requests 2000] [--distinct 200] [--concurrency 8] [--upstream-ms 50]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+import httpx
+
+from benchmarks.bench_gateway import free_port, seed, wait_ready
+
+def synthetic_log(requests: int, distinct: int, seed_value: int = 7) -> list:
+    rng = random.Random(seed_value)
+    weights = [1 / (rank + 1) ** 1.1 for rank in range(distinct)]
+    queries = [{"method": "GET", "path": "/echo/quotes", "query": f"code={600000 + i}&field=close"}
+               if i % 2 else
+               {"method": "POST", "path": "/echo/report", "body": {"code": 600000 + i, "year": 2024}}
+               for i in range(distinct)]
+    return rng.choices(queries, weights=weights, k=requests)
+
+async def replay(client, base: str, headers: dict, log: list, concurrency: int) -> dict:
+    latencies, outcomes, errors = [], {}, 0
+    queue = iter(log)
+
+    async def worker():
+        nonlocal errors
+        for item in queue:
+            url = base + item["path"] + (f"?{item['query']}" if item.get("query") else "")
+            start = time.perf_counter()
+            response = await client.request(item.get("method", "GET"), url, headers=headers,
+                                            json=item.get("body") if "body" in item else None)
+            latencies.append((time.perf_counter() - start) * 1000)
+            errors += response.status_code != 200
+            outcome = response.headers.get("x-cache", "none")
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "rps": round(len(log) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 2),
+        "hit_rate": round(outcomes.get("HIT", 0) / len(log), 3),
+        "upstream_calls": len(log) - outcomes.get("HIT", 0),
+        "errors": errors,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--distinct", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--upstream-ms", type=float, default=50)
+    parser.add_argument("--log", help="JSONL request log to replay instead of the synthetic one")
+    args = parser.parse_args()
+    if args.log:
+        with open(args.log) as f:
+            log = [json.loads(line) for line in f if line.strip()]
+    else:
+        log = synthetic_log(args.requests, args.distinct)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        env = {
+            "ETRAP_DATA_DIR": workdir,
+            "ETRAP_DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'database.db')}",
+            "ETRAP_ENV": "production",
+            "ETRAP_RATE_LIMIT_GATEWAY": "",
+        }
+        os.environ.update(env)
+        upstream_port, gateway_port = free_port(), free_port()
+        upstream = f"http://127.0.0.1:{upstream_port}"
+        gateway = f"http://127.0.0.1:{gateway_port}"
+        plain = seed(upstream)
+        cached = seed(upstream, {"response_cache": {"ttl": 600, "methods": ["GET", "POST"]}})
+
+        procs = [
+            subprocess.Popen([sys.executable, "-m", "benchmarks.stub_upstream", "--port", str(upstream_port),
+                              "--delay-ms", str(args.upstream_ms)], cwd=ROOT, stdout=subprocess.DEVNULL),
+            subprocess.Popen([sys.executable, "-m", "uvicorn", "backend.main:app", "--host", "127.0.0.1",
+                              "--port", str(gateway_port), "--log-level", "warning"],
+                             cwd=ROOT, env={**os.environ, **env}),
+        ]
+        results = {}
+        try:
+            asyncio.run(wait_ready(upstream + "/echo"))
+            asyncio.run(wait_ready(gateway + "/"))
+
+            async def run_all():
+                limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+                async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+                    for name, (resource_id, key) in (("uncached", plain), ("cached", cached)):
+                        results[name] = await replay(client, f"{gateway}/api/v1/proxy/{resource_id}",
+                                                     {"Authorization": f"Bearer {key}"}, log, args.concurrency)
+                        r = results[name]
+                        print(f"{name:9} rps={r['rps']:8.1f} p50={r['p50_ms']:7.2f}ms p95={r['p95_ms']:7.2f}ms "
+                              f"hit_rate={r['hit_rate']:.3f} upstream_calls={r['upstream_calls']} errors={r['errors']}")
+            asyncio.run(run_all())
+        finally:
+            for proc in procs:
+                proc.terminate()
+                proc.wait(timeout=10)
+
+    print(json.dumps({"requests": len(log), "distinct": len({json.dumps(i, sort_keys=True) for i in log}),
+                      "concurrency": args.concurrency, "upstream_ms": args.upstream_ms, **results}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Micro-benchmark: template rendering with hundreds of `_()` calls.
+
+Compares the legacy per-request closure (two dict lookups with a fallback chain)
+against the prebuilt per-language translators in backend.core.i18n.
+
+Usage:
+    python benchmarks/bench_i18n.py [--calls 300] [--renders 2000]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jinja2 import Environment
+from backend.core.i18n import TRANSLATIONS, TRANSLATORS
+
+def legacy_translator(lang):
+    def translate(key):
+        return TRANSLATIONS.get(lang, {}).get(key, key)
+    return translate
+
+def bench(template, make_translator, renders):
+    start = time.perf_counter()
+    for _ in range(renders):
+        template.render(_=make_translator())
+    return (time.perf_counter() - start) / renders * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=300)
+    parser.add_argument("--renders", type=int, default=2000)
+    args = parser.parse_args()
+
+    keys = list(TRANSLATIONS["zh"])
+    # Mix hits and misses (misses exercise the fallback path)
+    body = "".join(
+        "{{ _(%r) }}\n" % (keys[i % len(keys)] if i % 5 else f"missing key {i}")
+        for i in range(args.calls)
+    )
+    template = Environment(autoescape=True).from_string(body)
+
+    results = []
+    for lang in ("zh", "en"):
+        legacy_us = bench(template, lambda: legacy_translator(lang), args.renders)
+        compiled_us = bench(template, lambda: TRANSLATORS[lang], args.renders)
+        results.append({"lang": lang, "calls": args.calls, "legacy_us_per_render": legacy_us, "compiled_us_per_render": compiled_us})
+        print(f"lang={lang} calls={args.calls} legacy={legacy_us:8.1f}us compiled={compiled_us:8.1f}us "
+              f"speedup={legacy_us / compiled_us:4.2f}x")
+
+    print(json.dumps(results))
+
+if __name__ == "__main__":
+    main()
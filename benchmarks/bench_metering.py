@@ -0,0 +1,109 @@
+"""
+Token metering throughput.
+
+Charges --charges usages spread over --apps applications from --threads
+threads, once writing each charge straight to SQLite (UPDATE + commit per
+call, what the gateway would do without write-behind) and once through the
+TokenMeter (journal append + in-memory counter, batched flush in the
+background). Also times parsing usage out of a streamed completion.
+
+Usage:
+    python benchmarks/bench_metering.py [--charges 20000] [--apps 500] [--threads 8]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import update
+from sqlmodel import SQLModel, Session, create_engine, select, func
+
+from backend.models import TokenUsage
+from backend.core.gateway import Grant
+from backend.core.metering import TokenMeter, UsageParser
+
+def seed(engine, apps: int):
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.execute(TokenUsage.__table__.insert(), [{"application_id": i, "used": 0} for i in range(1, apps + 1)])
+        session.commit()
+
+def total(engine) -> int:
+    with Session(engine) as session:
+        return session.exec(select(func.sum(TokenUsage.used))).one()
+
+def run_threads(fn, charges: int, apps: int, threads: int) -> float:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(fn, (1 + i % apps for i in range(charges))))
+    return time.perf_counter() - start
+
+def write_through(engine, args) -> float:
+    def charge(application_id: int):
+        with Session(engine) as session:
+            session.execute(update(TokenUsage).where(TokenUsage.application_id == application_id)
+                            .values(used=TokenUsage.used + 10))
+            session.commit()
+    return run_threads(charge, args.charges, args.apps, args.threads)
+
+def write_behind(engine, journal_dir: str, args) -> tuple:
+    meter = TokenMeter(flush_interval=0.5)
+    meter.start(engine, journal_dir)
+    grants = {i: Grant(i, 1, 1, None, None) for i in range(1, args.apps + 1)}
+    elapsed = run_threads(lambda application_id: meter.record(grants[application_id], 10),
+                          args.charges, args.apps, args.threads)
+    start = time.perf_counter()
+    meter.stop()
+    return elapsed, time.perf_counter() - start
+
+def parse_stream(tokens: int, rounds: int = 200) -> float:
+    events = [{"choices": [{"delta": {"content": "x"}}]} for _ in range(tokens)]
+    events.append({"choices": [], "usage": {"prompt_tokens": 10, "completion_tokens": tokens, "total_tokens": tokens + 10}})
+    body = "".join(f"data: {json.dumps(event)}\n\n" for event in events).encode()
+    chunks = [body[i:i + 512] for i in range(0, len(body), 512)]
+    start = time.perf_counter()
+    for _ in range(rounds):
+        parser = UsageParser("text/event-stream")
+        for chunk in chunks:
+            parser.feed(chunk)
+        assert parser.tokens == tokens + 10
+    return (time.perf_counter() - start) / rounds
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--charges", type=int, default=20000)
+    parser.add_argument("--apps", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        engine = create_engine(f"sqlite:///{os.path.join(workdir, 'through.db')}",
+                               connect_args={"check_same_thread": False})
+        seed(engine, args.apps)
+        elapsed = write_through(engine, args)
+        assert total(engine) == args.charges * 10
+        results["write_through"] = {"charges_per_s": round(args.charges / elapsed, 1)}
+        print(f"write-through: {args.charges / elapsed:10.1f} charges/s")
+
+        engine = create_engine(f"sqlite:///{os.path.join(workdir, 'behind.db')}",
+                               connect_args={"check_same_thread": False})
+        seed(engine, args.apps)
+        elapsed, final_flush = write_behind(engine, os.path.join(workdir, "metering"), args)
+        assert total(engine) == args.charges * 10
+        results["write_behind"] = {"charges_per_s": round(args.charges / elapsed, 1),
+                                   "final_flush_ms": round(final_flush * 1000, 2)}
+        print(f"write-behind:  {args.charges / elapsed:10.1f} charges/s (final flush {final_flush * 1000:.1f}ms)")
+
+    per_stream = parse_stream(500)
+    results["parse_500_token_stream_ms"] = round(per_stream * 1000, 3)
+    print(f"usage parse:   {per_stream * 1000:10.3f}ms per 500-token SSE stream")
+    print(json.dumps({"charges": args.charges, "apps": args.apps, "threads": args.threads, **results}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Approval notification throughput: outbox plus dispatcher vs sending inline.
+
+Seeds --apps pending applications (one per student, each with email and
+phone) in a temporary database and runs the stub SMTP server (each message
+held back --smtp-ms, like a campus relay) and the stub upstream as the SMS
+gateway.
+
+  inline   the approve click sends each email itself over a new SMTP
+           connection before answering (timed on --sample applications,
+           extrapolated to --apps)
+  outbox   the click runs bulk_review() and queue_review_notices() and commits
+  drain    NotificationDispatcher delivering the whole outbox (email and SMS)
+           at several batch sizes: messages/s, SMTP connections opened and
+           SMS gateway requests made
+
+Usage:
+    python benchmarks/bench_notifications.py [--apps 2000] [--sample 100] [--smtp-ms 2]
+"""
+import argparse
+import json
+import os
+import smtplib
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+from email.message import EmailMessage
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import update
+from sqlmodel import SQLModel, Session, create_engine, select
+
+from backend.models import Application, Notification, Resource, User
+from backend.core.bulk_review import bulk_review
+from backend.core.notifications import HTTPChannel, NotificationDispatcher, SMTPChannel, queue_review_notices
+from benchmarks.bench_bulk_review import reset
+from benchmarks.stub_smtp import start_stub_smtp
+from benchmarks.stub_upstream import start_stub_upstream
+
+def seed(engine, apps: int) -> tuple:
+    with Session(engine) as session:
+        session.execute(User.__table__.insert(), [
+            {"swufe_uid": f"2024{i:06d}", "name": f"学生{i}", "email": f"s{i}@stu.swufe.edu.cn",
+             "phone": f"138{i:08d}", "department": "x", "role": "user", "is_active": True,
+             "password_hash": "SSO_USER"} for i in range(apps)])
+        admin = User(swufe_uid="admin", name="Admin", email="", phone="", department="x", role="admin",
+                     password_hash="SSO_USER")
+        resource = Resource(name="GPU Cluster", category="Compute", auth_type="MANUAL", form_schema={}, config={},
+                            valid_until=date(2030, 1, 1))
+        session.add_all([admin, resource])
+        session.commit()
+        now = datetime.now()
+        session.execute(Application.__table__.insert(), [
+            {"user_id": user_id, "resource_id": resource.id, "status": "PENDING", "user_input": {},
+             "auth_output": {}, "created_at": now, "updated_at": now}
+            for user_id in session.exec(select(User.id).where(User.role == "user")).all()])
+        session.commit()
+        return admin.id, session.exec(select(Application.id)).all()
+
+def inline_click(engine, ids: list, admin_id: int, smtp_port: int) -> float:
+    """
+    Bulk approve, then send every notice before the response, one SMTP session per message.
+    """
+    start = time.perf_counter()
+    with Session(engine) as session:
+        result = bulk_review(session, "approve", admin_id=admin_id, ids=ids)
+        emails = dict(session.execute(select(Application.id, User.email).join(User).where(
+            Application.id.in_([row[0] for row in result.updated]))).all())
+        for app_id, email in emails.items():
+            mail = EmailMessage()
+            mail["From"], mail["To"], mail["Subject"] = "etrap@swufe.edu.cn", email, "Application approved"
+            mail.set_content(f"Your application #{app_id} has been approved.")
+            with smtplib.SMTP("127.0.0.1", smtp_port) as smtp:
+                smtp.send_message(mail)
+        session.commit()
+    return time.perf_counter() - start
+
+def outbox_click(engine, ids: list, admin_id: int, channels: dict) -> tuple:
+    start = time.perf_counter()
+    with Session(engine) as session:
+        result = bulk_review(session, "approve", admin_id=admin_id, ids=ids)
+        queued = queue_review_notices(session, "approve", result.updated, channels=channels)
+        session.commit()
+    return time.perf_counter() - start, queued
+
+def drain(engine, channels: dict, batch_size: int) -> tuple:
+    dispatcher = NotificationDispatcher(channels, batch_size=batch_size)
+    start = time.perf_counter()
+    delivered = 0
+    while True:
+        attempted = dispatcher.dispatch(engine)
+        if not attempted:
+            break
+        delivered += attempted
+    elapsed = time.perf_counter() - start
+    dispatcher.stop()
+    return elapsed, delivered
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--apps", type=int, default=2000)
+    parser.add_argument("--sample", type=int, default=100)
+    parser.add_argument("--smtp-ms", type=float, default=2)
+    parser.add_argument("--batch-sizes", default="1,10,100")
+    args = parser.parse_args()
+
+    smtp, smtp_port = start_stub_smtp()
+    smtp.delay = args.smtp_ms / 1000
+    sms, sms_url = start_stub_upstream()
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        engine = create_engine(f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+        SQLModel.metadata.create_all(engine)
+        admin_id, ids = seed(engine, args.apps)
+
+        sample = inline_click(engine, ids[:args.sample], admin_id, smtp_port)
+        inline = sample / args.sample * len(ids)
+        results["inline_click_s"] = round(inline, 3)
+        print(f"inline: approve {len(ids)} and email each = {inline:8.3f}s per click "
+              f"(extrapolated from {args.sample})")
+        reset(engine)
+
+        channels = {"email": SMTPChannel("127.0.0.1", smtp_port, "etrap@swufe.edu.cn"),
+                    "sms": HTTPChannel(sms_url + "/echo/sms")}
+        click, queued = outbox_click(engine, ids, admin_id, channels)
+        results["outbox_click_s"] = round(click, 3)
+        results["queued"] = queued
+        print(f"outbox: approve {len(ids)} and queue {queued} notices = {click:8.3f}s per click "
+              f"({inline / click:.0f}x faster)")
+
+        results["drain"] = {}
+        for batch_size in (int(size) for size in args.batch_sizes.split(",")):
+            with Session(engine) as session:
+                session.execute(update(Notification).values(status="PENDING", attempts=0, sent_at=None,
+                                                            next_attempt_at=datetime.now()))
+                session.commit()
+            smtp.connections, sms.received[:] = 0, []
+            elapsed, delivered = drain(engine, channels, batch_size)
+            rate = delivered / elapsed
+            results["drain"][batch_size] = {"messages_per_s": round(rate), "seconds": round(elapsed, 3),
+                                            "smtp_connections": smtp.connections,
+                                            "sms_requests": len(sms.received)}
+            print(f"drain batch={batch_size:4d}: {delivered} messages in {elapsed:7.3f}s = {rate:8,.0f}/s, "
+                  f"{smtp.connections} SMTP connection(s), {len(sms.received)} SMS requests")
+
+    smtp.shutdown()
+    sms.shutdown()
+    print(json.dumps({"apps": args.apps, "smtp_ms": args.smtp_ms, **results}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Overhead of the profiling middleware.
+
+Measures per-request latency of an in-process request with the middleware
+absent (ETRAP_PROFILING=0), installed but not triggered, installed with a 1%
+sampling rate, and triggered on every request.
+
+Usage:
+    python benchmarks/bench_profiling.py [--requests 2000] [--path /login]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+async def measure(asgi_app, path: str, requests: int, headers=None) -> float:
+    transport = httpx.ASGITransport(app=asgi_app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for _ in range(50):
+            await client.get(path, headers=headers)
+        start = time.perf_counter()
+        for _ in range(requests):
+            await client.get(path, headers=headers)
+        return (time.perf_counter() - start) / requests * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--triggered-requests", type=int, default=200)
+    parser.add_argument("--path", default="/login")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ.setdefault("ETRAP_DATA_DIR", workdir)
+    os.environ["ETRAP_PROFILE_DIR"] = os.path.join(workdir, "profiles")
+
+    from backend.main import app
+    from backend.core.profiling import ProfilingMiddleware, issue_token
+
+    paths = (args.path,)
+    cases = [
+        ("disabled", app, args.requests, None),
+        ("installed_untriggered", ProfilingMiddleware(app, sample_rate=0.0, paths=paths), args.requests, None),
+        ("sampled_1pct", ProfilingMiddleware(app, sample_rate=0.01, paths=paths), args.requests, None),
+        ("triggered", ProfilingMiddleware(app, sample_rate=0.0, paths=paths), args.triggered_requests, {"X-Profile-Token": issue_token(1)}),
+    ]
+    results = []
+    baseline = None
+    for name, asgi_app, requests, headers in cases:
+        us = asyncio.run(measure(asgi_app, args.path, requests, headers))
+        baseline = baseline or us
+        results.append({"case": name, "path": args.path, "us_per_request": us, "overhead_pct": 100.0 * (us - baseline) / baseline})
+        print(f"{name:22} {us:9.1f}us/request  overhead={results[-1]['overhead_pct']:+6.1f}%")
+
+    print(json.dumps(results))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Rate limiter throughput and memory.
+
+Times RateLimiter.hit() on the memory and SQLite backends, from one thread and
+from --threads threads, over --keys keys (random key per check). For scale,
+also runs a sliding-window log (a deque of timestamps per key, the usual naive
+limiter) and compares bytes held per key once every key has used its burst.
+
+Usage:
+    python benchmarks/bench_ratelimit.py [--checks 200000] [--keys 10000] [--threads 8]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.core.ratelimit import RateLimiter, parse_limit
+
+LIMIT = parse_limit("60/min, burst=20")
+
+class SlidingLog:
+    def __init__(self):
+        self._logs = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, limit) -> bool:
+        now = time.time()
+        with self._lock:
+            log = self._logs.setdefault(key, deque())
+            while log and log[0] <= now - limit.period:
+                log.popleft()
+            if len(log) >= limit.count:
+                return False
+            log.append(now)
+            return True
+
+def run(hit, keys, checks: int, threads: int) -> float:
+    sequence = [random.choice(keys) for _ in range(checks)]
+    start = time.perf_counter()
+    if threads == 1:
+        for key in sequence:
+            hit(key, LIMIT)
+    else:
+        step = len(sequence) // threads
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(lambda i: [hit(key, LIMIT) for key in sequence[i * step:(i + 1) * step]], range(threads)))
+    return checks / (time.perf_counter() - start)
+
+def bytes_per_key(factory, keys) -> float:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    hit = factory().hit
+    for key in keys:
+        for _ in range(LIMIT.burst):
+            hit(key, LIMIT)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / len(keys)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--checks", type=int, default=200000)
+    parser.add_argument("--keys", type=int, default=10000)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+    keys = [f"user:{i}" for i in range(args.keys)]
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        candidates = [
+            ("gcra_memory", RateLimiter("memory").hit, args.checks),
+            ("sliding_log", SlidingLog().hit, args.checks),
+            # Every check is a write transaction; fewer of them keep the run short
+            ("gcra_sqlite", RateLimiter("sqlite", os.path.join(workdir, "ratelimit.db")).hit, args.checks // 10),
+        ]
+        for name, hit, checks in candidates:
+            single = run(hit, keys, checks, 1)
+            threaded = run(hit, keys, checks, args.threads)
+            results[name] = {"checks_per_s": round(single), f"checks_per_s_{args.threads}_threads": round(threaded)}
+            print(f"{name:12s} {single:12,.0f} checks/s   {threaded:12,.0f} checks/s with {args.threads} threads")
+
+    memory_keys = keys[:min(args.keys, 10000)]
+    gcra = bytes_per_key(lambda: RateLimiter("memory"), memory_keys)
+    log = bytes_per_key(SlidingLog, memory_keys)
+    results["bytes_per_key"] = {"gcra_memory": round(gcra), "sliding_log": round(log)}
+    print(f"memory per key after a full burst: gcra {gcra:,.0f} B, sliding log {log:,.0f} B")
+    print(json.dumps({"checks": args.checks, "keys": args.keys, "limit": "60/min, burst=20", **results}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+CAS session checks and single logout against a table of live sessions.
+
+Opens --sessions CAS sessions in a temporary SQLite file database, then
+measures:
+
+  check (index)  SessionIndex.check on a worker that has loaded the sessions
+  check (db)     the same answer from an indexed SELECT on every request
+  refresh        a worker bringing its index up to date after one logout
+  logout         SessionIndex.end_ticket for one service ticket (the SLO request)
+
+Usage:
+    python benchmarks/bench_sso_sessions.py [--sessions 50000] [--checks 20000]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlmodel import SQLModel, Session, create_engine, select
+
+from backend.models import SSOSession, User
+from backend.core.sso_sessions import SessionIndex, _hash
+
+def per_call_us(fn, calls: int) -> float:
+    start = time.perf_counter()
+    for i in range(calls):
+        fn(i)
+    return round((time.perf_counter() - start) / calls * 1e6, 2)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=50000)
+    parser.add_argument("--checks", type=int, default=20000)
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        engine = create_engine(f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+        SQLModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            session.add(User(swufe_uid="bench", name="Bench", email="", phone="", department="x",
+                             password_hash="SSO_USER"))
+            session.commit()
+            expires_at = datetime.now() + timedelta(hours=1)
+            tokens = [f"token-{i}" for i in range(args.sessions)]
+            session.execute(SSOSession.__table__.insert(), [
+                {"token_hash": _hash(token), "ticket_hash": _hash(f"ST-{i}"), "user_id": 1, "expires_at": expires_at,
+                 "version": i + 1, "created_at": datetime.now()} for i, token in enumerate(tokens)])
+            session.commit()
+
+            here, there = SessionIndex(refresh_interval=3600), SessionIndex(refresh_interval=3600)
+            start = time.perf_counter()
+            here.refresh(session)
+            there.refresh(session)
+            results["initial_load_s"] = round((time.perf_counter() - start) / 2, 3)
+            rng = random.Random(7)
+            picks = [rng.choice(tokens) for _ in range(args.checks)]
+
+            results["check_index_us"] = per_call_us(lambda i: here.check(session, picks[i], 1), args.checks)
+
+            def check_db(i):
+                session.exec(select(SSOSession.user_id, SSOSession.expires_at).where(
+                    SSOSession.token_hash == _hash(picks[i]), SSOSession.revoked_at.is_(None))).first()
+
+            results["check_db_us"] = per_call_us(check_db, args.checks)
+
+            latencies = []
+            for i in rng.sample(range(args.sessions), 200):
+                start = time.perf_counter()
+                here.end_ticket(session, f"ST-{i}")
+                latencies.append((time.perf_counter() - start) * 1000)
+            results["logout_p50_ms"] = round(statistics.median(latencies), 3)
+
+            there._next_refresh = 0.0
+            start = time.perf_counter()
+            rows = there.refresh(session)
+            results["refresh_after_200_logouts_ms"] = round((time.perf_counter() - start) * 1000, 3)
+            results["refresh_rows"] = rows
+            assert len(there) == len(here) == args.sessions - 200
+
+    print(f"check (index)  {results['check_index_us']:8.2f} us")
+    print(f"check (db)     {results['check_db_us']:8.2f} us")
+    print(f"logout         {results['logout_p50_ms']:8.3f} ms p50 with {args.sessions:,} live sessions")
+    print(f"refresh        {results['refresh_after_200_logouts_ms']:8.3f} ms for {results['refresh_rows']} changed rows")
+    print(json.dumps({"sessions": args.sessions, "checks": args.checks, **results}, indent=2))
+
+if __name__ == "__main__":
+    main()
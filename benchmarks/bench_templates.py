@@ -0,0 +1,68 @@
+"""
+Startup time and first-request latency across simulated worker restarts.
+
+Each run is a fresh interpreter (like a restarted uvicorn worker) sharing one
+bytecode cache directory, so the first run is cold and later runs are warm.
+
+Usage:
+    python benchmarks/bench_templates.py [--restarts 5]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORKER = r"""
+import json, time
+t0 = time.perf_counter()
+from fastapi.testclient import TestClient
+from backend.main import app
+t_import = time.perf_counter()
+with TestClient(app) as client:
+    t_ready = time.perf_counter()
+    r = client.get("/login")
+    t_first = time.perf_counter()
+    client.get("/login")
+    t_second = time.perf_counter()
+assert r.status_code == 200
+print(json.dumps({
+    "import_ms": (t_import - t0) * 1000,
+    "startup_ms": (t_ready - t0) * 1000,
+    "first_request_ms": (t_first - t_ready) * 1000,
+    "second_request_ms": (t_second - t_first) * 1000,
+}))
+"""
+
+def run_worker(workdir: str, cache_dir: str, precompile: bool) -> dict:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = ROOT
+    env["ETRAP_TEMPLATE_CACHE_DIR"] = cache_dir
+    env["ETRAP_PRECOMPILE_TEMPLATES"] = "1" if precompile else "0"
+    out = subprocess.run([sys.executable, "-c", WORKER], cwd=workdir, env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--restarts", type=int, default=5)
+    args = parser.parse_args()
+
+    results = []
+    for precompile in (False, True):
+        with tempfile.TemporaryDirectory() as workdir:
+            cache_dir = os.path.join(workdir, "template-cache")
+            for i in range(args.restarts):
+                row = run_worker(workdir, cache_dir, precompile)
+                row.update({"precompile": precompile, "restart": i, "bytecode_cache": "cold" if i == 0 else "warm"})
+                results.append(row)
+                print(f"precompile={precompile!s:5} restart={i} cache={row['bytecode_cache']:4} "
+                      f"startup={row['startup_ms']:8.1f}ms first={row['first_request_ms']:7.2f}ms "
+                      f"second={row['second_request_ms']:6.2f}ms")
+
+    print(json.dumps(results))
+
+if __name__ == "__main__":
+    main()
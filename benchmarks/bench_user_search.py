@@ -0,0 +1,91 @@
+"""
+/admin/users search on a large user table.
+
+Compares the legacy unpaginated `LIKE '%x%'` query over name/uid/email with
+the ranked, paginated FTS5 search for typical admin searches.
+
+Usage:
+    python benchmarks/bench_user_search.py [--users 100000] [--repeat 20]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import or_
+from sqlmodel import SQLModel, Session, create_engine, select
+
+from backend.models import User
+from backend.core.user_search import search_users
+
+SURNAMES = "王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗"
+GIVEN = "伟芳娜敏静丽强磊军洋勇艳杰娟涛明超秀霞平刚桂英华玉兰"
+PINYIN = ["wang", "li", "zhang", "liu", "chen", "yang", "huang", "zhao", "wu", "zhou"]
+
+def build(engine, users: int, seed: int = 42):
+    rng = random.Random(seed)
+    SQLModel.metadata.create_all(engine)
+    rows = []
+    for i in range(users):
+        name = rng.choice(SURNAMES) + "".join(rng.choice(GIVEN) for _ in range(rng.choice((1, 2))))
+        uid = f"{2015 + i % 10}{i:06d}"
+        rows.append({"swufe_uid": uid, "password_hash": "x", "name": name,
+                     "email": f"{rng.choice(PINYIN)}{i}@swufe.edu.cn", "department": f"Dept {i % 20}",
+                     "role": "user", "is_active": True})
+    with Session(engine) as session:
+        for start in range(0, len(rows), 10000):
+            session.execute(User.__table__.insert(), rows[start:start + 10000])
+        session.commit()
+
+def legacy_search(session, search: str):
+    query = select(User).where(or_(User.name.contains(search), User.swufe_uid.contains(search),
+                                   User.email.contains(search))).order_by(User.id.desc())
+    return session.exec(query).all()
+
+def timed(fn, repeat: int) -> float:
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    probe = args.users // 2
+    searches = {
+        "uid_exact": f"{2015 + probe % 10}{probe:06d}",
+        "uid_prefix": "2019",
+        "name_3chars": "王芳娜",
+        "name_2chars": "李伟",
+        "email_user": f"{probe}@swufe",
+        "email_domain": "swufe.edu.cn",
+    }
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        engine = create_engine(f"sqlite:///{os.path.join(workdir, 'users.db')}")
+        start = time.perf_counter()
+        build(engine, args.users)
+        print(f"built {args.users} users in {time.perf_counter() - start:.1f}s")
+        with Session(engine) as session:
+            for name, search in searches.items():
+                legacy_rows = len(legacy_search(session, search))
+                legacy_ms = timed(lambda: legacy_search(session, search), args.repeat)
+                users, total = search_users(session, search)
+                fts_ms = timed(lambda: search_users(session, search), args.repeat)
+                results[name] = {"search": search, "legacy_ms": legacy_ms, "legacy_rows": legacy_rows,
+                                 "fts_ms": fts_ms, "total": total, "page_rows": len(users)}
+                print(f"{name:13} {search!r:14} legacy {legacy_ms:8.2f}ms ({legacy_rows} rows)   "
+                      f"ranked page {fts_ms:8.2f}ms ({len(users)} of {total})")
+    print(json.dumps(results, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
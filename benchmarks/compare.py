@@ -0,0 +1,44 @@
+"""
+Compare two load-test result files (e.g. from two commits).
+
+Usage:
+    python -m benchmarks.compare base.json head.json
+"""
+import argparse
+import json
+
+METRICS = [("rps", True), ("p50_ms", False), ("p95_ms", False), ("p99_ms", False), ("peak_rss_kb", False)]
+
+def compare(base: dict, head: dict) -> dict:
+    """
+    Per-scenario relative change for each metric (positive = improvement).
+    """
+    out = {}
+    for name, head_row in head["scenarios"].items():
+        base_row = base["scenarios"].get(name)
+        if not base_row:
+            continue
+        out[name] = {}
+        for metric, higher_is_better in METRICS:
+            b, h = base_row.get(metric, 0), head_row.get(metric, 0)
+            change = (h - b) / b if b else 0.0
+            out[name][metric] = {"base": b, "head": h, "improvement": change if higher_is_better else -change}
+    return out
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base")
+    parser.add_argument("head")
+    args = parser.parse_args()
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.head) as f:
+        head = json.load(f)
+
+    print(f"base={base['meta'].get('commit')} head={head['meta'].get('commit')}")
+    for name, metrics in compare(base, head).items():
+        cells = " ".join(f"{m}={v['head']:.1f}({v['improvement']:+.0%})" for m, v in metrics.items())
+        print(f"{name:16} {cells}")
+
+if __name__ == "__main__":
+    main()
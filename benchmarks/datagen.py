@@ -0,0 +1,152 @@
+"""
+Benchmark data generator built on scripts/seed_data.py.
+
+Creates a SQLite database with the demo catalog and admin account plus
+configurable volumes of users, resources, applications and audit logs, and
+writes a manifest (JSON) describing the ids the load-test scenarios use.
+
+Usage:
+    python -m benchmarks.datagen --out bench-data --users 5000 --applications 50000 --audit 200000
+"""
+import argparse
+import json
+import os
+import random
+import zipfile
+from datetime import datetime, timedelta, date
+
+from sqlmodel import SQLModel, Session, create_engine, select
+
+from backend.models import User, Resource, Application, AuditLog
+from backend.auth import get_password_hash
+from scripts.seed_data import seed_resources, seed_admin
+
+CATEGORIES = ["Software", "Compute", "Data", "Teaching", "API"]
+STATUSES = ["PENDING", "APPROVED", "REJECTED", "REVOKED"]
+ACTIONS = ["APPLY", "APPROVE", "REJECT", "DOWNLOAD", "REVOKE"]
+USER_PASSWORD = "bench123"
+ADMIN_PASSWORD = "admin123"
+BATCH = 5000
+
+def _insert(session: Session, table, rows):
+    for start in range(0, len(rows), BATCH):
+        session.execute(table.insert(), rows[start:start + BATCH])
+
+def _make_content(out_dir: str, files: int, file_kb: int) -> tuple:
+    content_dir = os.path.join(out_dir, "content")
+    os.makedirs(content_dir, exist_ok=True)
+    for i in range(files):
+        with open(os.path.join(content_dir, f"file_{i}.bin"), "wb") as f:
+            f.write(os.urandom(file_kb * 1024))
+    zip_path = os.path.join(out_dir, "installer.zip")
+    with zipfile.ZipFile(zip_path, "w") as zf:
+        zf.writestr("README.txt", "Benchmark installer content.")
+    return os.path.abspath(content_dir), os.path.abspath(zip_path)
+
+def generate(out_dir: str, users: int = 1000, resources: int = 50, applications: int = 10000,
+             audit: int = 50000, download_files: int = 4, download_file_kb: int = 256, seed: int = 42) -> dict:
+    """
+    Build the benchmark database in `out_dir` and return the manifest.
+    """
+    rng = random.Random(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    db_path = os.path.abspath(os.path.join(out_dir, "database.db"))
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    db_url = f"sqlite:///{db_path}"
+    engine = create_engine(db_url, connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine)
+
+    content_dir, zip_path = _make_content(out_dir, download_files, download_file_kb)
+    # Hash once: bcrypt per row would dominate generation time
+    password_hash = get_password_hash(USER_PASSWORD)
+
+    with Session(engine) as session:
+        seed_resources(session, zip_path)
+        seed_admin(session, ADMIN_PASSWORD)
+        download = Resource(
+            name="Bench Download", category="Software", auth_type="AUTO_ZIP",
+            description="Benchmark download resource", valid_until=date.today() + timedelta(days=365),
+            config={"root_path": content_dir, "inject_file": "license.dat"}, form_schema={"fields": []},
+        )
+        session.add(download)
+        session.commit()
+        download_id = download.id
+
+        _insert(session, Resource.__table__, [
+            {"name": f"Bench Resource {i}", "category": CATEGORIES[i % len(CATEGORIES)], "auth_type": "MANUAL",
+             "description": "Generated", "valid_until": date.today() + timedelta(days=365), "is_active": True,
+             "form_schema": {"fields": []}, "config": {}}
+            for i in range(resources)
+        ])
+        _insert(session, User.__table__, [
+            {"swufe_uid": f"bench{i}", "password_hash": password_hash, "name": f"Bench User {i}",
+             "email": f"bench{i}@swufe.edu.cn", "phone": "13800000000", "department": f"Dept {i % 20}",
+             "role": "user", "is_active": True}
+            for i in range(users)
+        ])
+        session.commit()
+
+        admin_id = session.exec(select(User.id).where(User.swufe_uid == "admin")).one()
+        user_ids = session.exec(select(User.id).where(User.swufe_uid.startswith("bench")).order_by(User.id)).all()
+        manual_ids = session.exec(select(Resource.id).where(Resource.auth_type == "MANUAL").order_by(Resource.id)).all()
+
+        now = datetime.now()
+        app_rows = [
+            # Every user can download the bench resource
+            {"user_id": uid, "resource_id": download_id, "status": "APPROVED", "approved_at": now,
+             "expired_at": now + timedelta(days=180), "user_input": {}, "auth_output": {},
+             "created_at": now, "updated_at": now}
+            for uid in user_ids
+        ]
+        for _ in range(applications):
+            created = now - timedelta(minutes=rng.randint(0, 60 * 24 * 365))
+            status = rng.choice(STATUSES)
+            app_rows.append({
+                "user_id": rng.choice(user_ids), "resource_id": rng.choice(manual_ids), "status": status,
+                "approved_at": created if status == "APPROVED" else None,
+                "expired_at": created + timedelta(days=180) if status == "APPROVED" else None,
+                "user_input": {"project_desc": "generated"}, "auth_output": {},
+                "created_at": created, "updated_at": created,
+            })
+        _insert(session, Application.__table__, app_rows)
+
+        _insert(session, AuditLog.__table__, [
+            {"user_id": rng.choice(user_ids), "action": rng.choice(ACTIONS), "resource_id": rng.choice(manual_ids),
+             "ip_address": f"10.0.{rng.randint(0, 255)}.{rng.randint(1, 254)}", "details": "generated",
+             "timestamp": now - timedelta(seconds=rng.randint(0, 86400 * 365))}
+            for _ in range(audit)
+        ])
+        session.commit()
+
+    manifest = {
+        "db_url": db_url,
+        "admin_id": admin_id,
+        "admin_password": ADMIN_PASSWORD,
+        "user_ids": [user_ids[0], user_ids[-1]] if user_ids else [],
+        "user_password": USER_PASSWORD,
+        "manual_resource_ids": manual_ids,
+        "download_resource_id": download_id,
+        "sizes": {"users": users, "resources": resources, "applications": applications, "audit": audit},
+    }
+    with open(os.path.join(out_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", default="bench-data")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--resources", type=int, default=50)
+    parser.add_argument("--applications", type=int, default=10000)
+    parser.add_argument("--audit", type=int, default=50000)
+    parser.add_argument("--download-files", type=int, default=4)
+    parser.add_argument("--download-file-kb", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    manifest = generate(args.out, args.users, args.resources, args.applications, args.audit,
+                        args.download_files, args.download_file_kb, args.seed)
+    print(json.dumps(manifest["sizes"]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""
+Load-test harness for the whole request surface.
+
+Generates (or reuses) a benchmark dataset, starts a stub CAS, and drives
+scenarios against either the app in-process (httpx ASGI transport) or a
+uvicorn server subprocess. Reports RPS, p50/p95/p99 latency, error counts and
+peak RSS per scenario, and writes machine-readable JSON for comparing commits
+with benchmarks/compare.py.
+
+Usage:
+    python -m benchmarks.loadtest --mode inprocess --requests 500 --concurrency 16 --out results.json
+    python -m benchmarks.loadtest --mode uvicorn --workers 2 --scenarios catalog download
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import httpx
+
+from benchmarks.stub_cas import start_stub_cas
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# --- Scenarios ---
+# Each scenario is `async fn(client, ctx, i) -> httpx.Response` plus the status codes that count as success.
+
+def _cookie(user_id: int) -> dict:
+    return {"Cookie": f"user_id={user_id}"}
+
+class Context:
+    def __init__(self, manifest: dict):
+        self.manifest = manifest
+        first, last = manifest["user_ids"]
+        self.user_ids = list(range(first, last + 1))
+        self.manual_ids = manifest["manual_resource_ids"]
+
+    def user(self, i: int) -> int:
+        return self.user_ids[i % len(self.user_ids)]
+
+async def scenario_login(client, ctx, i):
+    uid = ctx.user(i) - ctx.user_ids[0]
+    return await client.post("/login", data={"swufe_uid": f"bench{uid}", "password": ctx.manifest["user_password"]})
+
+async def scenario_sso_login(client, ctx, i):
+    uid = ctx.user(i) - ctx.user_ids[0]
+    return await client.get(f"/resource?ticket=ST-bench{uid}")
+
+async def scenario_catalog(client, ctx, i):
+    return await client.get("/resource", headers=_cookie(ctx.user(i)))
+
+async def scenario_apply(client, ctx, i):
+    # Walk (user, resource) pairs so most applies are fresh rather than "already applied"
+    user_id = ctx.user(i)
+    resource_id = ctx.manual_ids[(i // len(ctx.user_ids)) % len(ctx.manual_ids)]
+    return await client.post(f"/resources/{resource_id}/apply", data={"project_desc": "load test"}, headers=_cookie(user_id))
+
+async def scenario_download(client, ctx, i):
+    return await client.get(f"/resources/{ctx.manifest['download_resource_id']}/download", headers=_cookie(ctx.user(i)))
+
+async def scenario_admin_dashboard(client, ctx, i):
+    return await client.get("/admin/dashboard", headers=_cookie(ctx.manifest["admin_id"]))
+
+async def scenario_admin_stats(client, ctx, i):
+    return await client.get("/admin/stats/data", headers=_cookie(ctx.manifest["admin_id"]))
+
+SCENARIOS = {
+    "login": (scenario_login, {303}),
+    "sso_login": (scenario_sso_login, {302}),
+    "catalog": (scenario_catalog, {200}),
+    "apply": (scenario_apply, {303, 400}),
+    "download": (scenario_download, {200}),
+    "admin_dashboard": (scenario_admin_dashboard, {200}),
+    "admin_stats": (scenario_admin_stats, {200}),
+}
+
+# --- Measurement ---
+
+def percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    # Nearest-rank method
+    rank = math.ceil(pct / 100 * len(sorted_values))
+    return sorted_values[min(len(sorted_values), max(rank, 1)) - 1]
+
+def peak_rss_kb(pid: int = None) -> int:
+    """
+    Peak resident set size in KB: this process (in-process mode) or a server pid (uvicorn mode).
+    """
+    if pid is None:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+def _server_pids(pid: int) -> list:
+    # uvicorn --workers N forks children; report the largest worker peak
+    pids = [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            pids += [int(p) for p in f.read().split()]
+    except OSError:
+        pass
+    return pids
+
+async def run_scenario(client, ctx, name: str, requests: int, concurrency: int, server_pid: int = None) -> dict:
+    fn, ok_statuses = SCENARIOS[name]
+    latencies = []
+    statuses = {}
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                response = await fn(client, ctx, i)
+                status = response.status_code
+            except Exception:
+                status = "exception"
+            latencies.append((time.perf_counter() - start) * 1000)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+            if status not in ok_statuses:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    if server_pid:
+        rss = max(peak_rss_kb(p) for p in _server_pids(server_pid))
+    else:
+        rss = peak_rss_kb()
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "elapsed_s": elapsed,
+        "rps": requests / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "max_ms": latencies[-1] if latencies else 0.0,
+        "errors": errors,
+        "statuses": statuses,
+        "peak_rss_kb": rss,
+    }
+
+# --- Targets ---
+
+def _app_env(manifest: dict, cas_url: str, workdir: str) -> dict:
+    return {
+        "ETRAP_DATABASE_URL": manifest["db_url"],
+        "ETRAP_CAS_SERVER_URL": cas_url,
+        "ETRAP_DATA_DIR": os.path.join(workdir, "data"),
+        "ETRAP_ENV": "production",
+        # Scenarios replay many requests per user and IP; measure the app, not the limiter
+        "ETRAP_RATE_LIMIT_APPLY": "", "ETRAP_RATE_LIMIT_DOWNLOAD": "", "ETRAP_RATE_LIMIT_LOGIN": "",
+    }
+
+def _generate_dataset(args, out_dir: str) -> dict:
+    # Separate process: importing backend here would freeze config before the benchmark env is set
+    cmd = [sys.executable, "-m", "benchmarks.datagen", "--out", out_dir,
+           "--users", str(args.users), "--resources", str(args.resources),
+           "--applications", str(args.applications), "--audit", str(args.audit),
+           "--download-files", str(args.download_files), "--download-file-kb", str(args.download_file_kb)]
+    subprocess.run(cmd, cwd=ROOT, check=True, stdout=subprocess.DEVNULL)
+    with open(os.path.join(out_dir, "manifest.json")) as f:
+        return json.load(f)
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+async def run_inprocess(args, manifest, env):
+    os.environ.update(env)
+    from backend.main import app
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    # ASGITransport doesn't send lifespan events; run startup/shutdown (tables, audit writer) directly
+    async with app.router.lifespan_context(app), \
+            httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        ctx = Context(manifest)
+        for name in args.scenarios:
+            await run_scenario(client, ctx, name, args.warmup, args.concurrency)
+            results[name] = await run_scenario(client, ctx, name, args.requests, args.concurrency)
+            _print_row(name, results[name])
+    return results
+
+async def run_uvicorn(args, manifest, env, workdir):
+    port = args.port
+    cmd = [sys.executable, "-m", "uvicorn", "backend.main:app", "--host", "127.0.0.1", "--port", str(port),
+           "--workers", str(args.workers), "--log-level", "warning"]
+    proc = subprocess.Popen(cmd, cwd=ROOT, env={**os.environ, **env})
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        async with httpx.AsyncClient(base_url=base_url, timeout=60,
+                                     limits=httpx.Limits(max_connections=args.concurrency * 2)) as client:
+            for _ in range(100):
+                try:
+                    await client.get("/")
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.1)
+            ctx = Context(manifest)
+            results = {}
+            for name in args.scenarios:
+                await run_scenario(client, ctx, name, args.warmup, args.concurrency, proc.pid)
+                results[name] = await run_scenario(client, ctx, name, args.requests, args.concurrency, proc.pid)
+                _print_row(name, results[name])
+            return results
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+def _print_row(name: str, r: dict):
+    print(f"{name:16} rps={r['rps']:8.1f} p50={r['p50_ms']:7.2f}ms p95={r['p95_ms']:7.2f}ms "
+          f"p99={r['p99_ms']:7.2f}ms errors={r['errors']:4d} peak_rss={r['peak_rss_kb'] / 1024:6.1f}MB")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["inprocess", "uvicorn"], default="inprocess")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=300, help="Measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers (uvicorn mode)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--data", help="Reuse a dataset directory from benchmarks.datagen instead of generating one")
+    parser.add_argument("--out", help="Write JSON results here")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--resources", type=int, default=50)
+    parser.add_argument("--applications", type=int, default=10000)
+    parser.add_argument("--audit", type=int, default=50000)
+    parser.add_argument("--download-files", type=int, default=4)
+    parser.add_argument("--download-file-kb", type=int, default=256)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        if args.data:
+            with open(os.path.join(args.data, "manifest.json")) as f:
+                manifest = json.load(f)
+        else:
+            manifest = _generate_dataset(args, os.path.join(workdir, "dataset"))
+        cas_server, cas_url = start_stub_cas()
+        env = _app_env(manifest, cas_url, workdir)
+        try:
+            if args.mode == "inprocess":
+                results = asyncio.run(run_inprocess(args, manifest, env))
+            else:
+                results = asyncio.run(run_uvicorn(args, manifest, env, workdir))
+        finally:
+            cas_server.shutdown()
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "mode": args.mode,
+            "workers": args.workers if args.mode == "uvicorn" else 1,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "dataset": manifest["sizes"],
+        },
+        "scenarios": results,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.out}")
+    else:
+        print(json.dumps(report))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Minimal local CAS server for benchmarks and tests.
+
+Any ticket of the form `ST-<uid>` validates as user `<uid>`; everything else fails
+with INVALID_TICKET. Serves /p3/serviceValidate (CAS 3.0, with attributes) and
+/serviceValidate (CAS 2.0, user only, as CAS 2.0 servers answer). Setting
+`server.p3 = False` answers the CAS 3.0 path with 404, like a 2.0-only server;
+`server.received` lists the paths of all requests served.
+
+`logout_request(ticket)` builds the SAML LogoutRequest a CAS server posts to a
+service for single logout, and `send_logout(service_url, ticket)` posts it.
+
+Usage:
+    python -m benchmarks.stub_cas --port 8900
+"""
+import argparse
+import threading
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlencode, urlparse, parse_qs
+from urllib.request import urlopen
+
+SUCCESS = """<cas:serviceResponse xmlns:cas='http://www.yale.edu/tp/cas'>
+    <cas:authenticationSuccess>
+        <cas:user>{uid}</cas:user>{attributes}
+    </cas:authenticationSuccess>
+</cas:serviceResponse>"""
+
+ATTRIBUTES = """
+        <cas:attributes>
+            <cas:name>Stub {uid}</cas:name>
+            <cas:email>{uid}@swufe.edu.cn</cas:email>
+            <cas:mobile>138{uid}</cas:mobile>
+            <cas:department>Stub School</cas:department>
+        </cas:attributes>"""
+
+FAILURE = """<cas:serviceResponse xmlns:cas='http://www.yale.edu/tp/cas'>
+    <cas:authenticationFailure code="INVALID_TICKET">Ticket {ticket} not recognized</cas:authenticationFailure>
+</cas:serviceResponse>"""
+
+LOGOUT_REQUEST = """<samlp:LogoutRequest xmlns:samlp="urn:oasis:names:tc:SAML:2.0:protocol" \
+xmlns:saml="urn:oasis:names:tc:SAML:2.0:assertion" ID="LR-{id}" Version="2.0" IssueInstant="{instant}">
+    <saml:NameID>@NOT_USED@</saml:NameID>
+    <samlp:SessionIndex>{ticket}</samlp:SessionIndex>
+</samlp:LogoutRequest>"""
+
+def logout_request(ticket: str) -> str:
+    return LOGOUT_REQUEST.format(id=uuid.uuid4().hex, ticket=ticket,
+                                 instant=datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"))
+
+def send_logout(service_url: str, ticket: str) -> int:
+    """
+    POST a back-channel logout request for `ticket` to the service, as CAS does. Returns the status.
+    """
+    with urlopen(service_url, data=urlencode({"logoutRequest": logout_request(ticket)}).encode(), timeout=10) as r:
+        return r.status
+
+class StubCASServer(ThreadingHTTPServer):
+    daemon_threads = True
+    p3 = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.received = []
+
+class StubCASHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        self.server.received.append(url.path)
+        p3 = url.path.rstrip("/").endswith("/p3/serviceValidate")
+        if url.path.rstrip("/").split("/")[-1] != "serviceValidate" or (p3 and not self.server.p3):
+            self.send_error(404)
+            return
+        ticket = parse_qs(url.query).get("ticket", [""])[0]
+        if ticket.startswith("ST-") and len(ticket) > 3:
+            uid = ticket[3:]
+            body = SUCCESS.format(uid=uid, attributes=ATTRIBUTES.format(uid=uid) if p3 else "")
+        else:
+            body = FAILURE.format(ticket=ticket)
+        payload = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/xml; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stub_cas(host: str = "127.0.0.1", port: int = 0):
+    """
+    Start the stub in a daemon thread. Returns (server, base_url); call server.shutdown() to stop.
+    """
+    server = StubCASServer((host, port), StubCASHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    args = parser.parse_args()
+    server = StubCASServer((args.host, args.port), StubCASHandler)
+    print(f"Stub CAS listening on http://{args.host}:{args.port}")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
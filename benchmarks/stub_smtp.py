@@ -0,0 +1,111 @@
+"""
+Minimal local SMTP server for notification benchmarks and tests.
+
+Speaks enough ESMTP for smtplib (EHLO/HELO, MAIL, RCPT, DATA, RSET, NOOP,
+QUIT) and keeps what it accepts in `server.messages` as (sender, recipients,
+raw message) tuples. `server.connections` counts sessions opened,
+`server.delay` (seconds) holds back every accepted message like a remote
+relay would, `server.reject` is a set of recipient addresses answered with
+550, and `server.fail_code` answers every DATA with that code (e.g. 451 for a
+transient failure).
+
+Usage:
+    python -m benchmarks.stub_smtp --port 8925 [--delay-ms 0]
+"""
+import argparse
+import socketserver
+import threading
+import time
+
+class StubSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 256
+    delay = 0.0
+    fail_code = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.messages = []
+        self.connections = 0
+        self.reject = set()
+        self._lock = threading.Lock()
+
+class StubSMTPHandler(socketserver.StreamRequestHandler):
+    def _reply(self, line: str):
+        self.wfile.write(line.encode("ascii") + b"\r\n")
+
+    def handle(self):
+        server = self.server
+        with server._lock:
+            server.connections += 1
+        self._reply("220 stub ESMTP")
+        sender, recipients = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode("utf-8", "replace").strip()
+            verb = command[:4].upper()
+            if verb == "EHLO":
+                self.wfile.write(b"250-stub\r\n250-8BITMIME\r\n250 SMTPUTF8\r\n")
+            elif verb == "HELO":
+                self._reply("250 stub")
+            elif verb == "MAIL":
+                sender, recipients = command.split(":", 1)[1].strip(" <>"), []
+                self._reply("250 OK")
+            elif verb == "RCPT":
+                address = command.split(":", 1)[1].strip(" <>")
+                if address in server.reject:
+                    self._reply("550 No such user")
+                else:
+                    recipients.append(address)
+                    self._reply("250 OK")
+            elif verb == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                data = []
+                for raw in self.rfile:
+                    if raw == b".\r\n":
+                        break
+                    data.append(raw[1:] if raw.startswith(b"..") else raw)
+                if server.delay:
+                    time.sleep(server.delay)
+                if server.fail_code:
+                    self._reply(f"{server.fail_code} Try again later")
+                else:
+                    with server._lock:
+                        server.messages.append((sender, recipients, b"".join(data)))
+                    self._reply("250 OK queued")
+                sender, recipients = None, []
+            elif verb in ("RSET", "NOOP"):
+                if verb == "RSET":
+                    sender, recipients = None, []
+                self._reply("250 OK")
+            elif verb == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+def start_stub_smtp(host: str = "127.0.0.1", port: int = 0):
+    """
+    Start the stub in a daemon thread. Returns (server, port); call server.shutdown() to stop.
+    """
+    server = StubSMTPServer((host, port), StubSMTPHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, server.server_address[1]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8925)
+    parser.add_argument("--delay-ms", type=float, default=0, help="hold every accepted message back this long")
+    args = parser.parse_args()
+    server = StubSMTPServer((args.host, args.port), StubSMTPHandler)
+    server.delay = args.delay_ms / 1000
+    print(f"Stub SMTP server listening on {args.host}:{args.port}")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
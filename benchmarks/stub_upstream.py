@@ -0,0 +1,157 @@
+"""
+Minimal local upstream API for gateway benchmarks and tests.
+
+    /echo/...           any method: JSON with the method, path, query, headers and body it received
+    /sse?events=&delay= text/event-stream, `events` chunked events `delay` ms apart; when the
+                        server has a `gate` (threading.Event) it waits for it after the first event
+    /bytes?size=        `size` bytes of payload
+    /v1/chat/completions  POST, OpenAI-style: `max_tokens` (default 16) completion tokens and 10
+                        prompt tokens, reported in `usage`; with "stream": true as SSE chunks
+                        with the usage in the last one
+
+Keeps connections alive (HTTP/1.1) and decodes chunked request bodies. Setting
+`server.delay` (seconds) holds every response back; `server.fail_status`
+answers every request with that status, e.g. to trip a gateway circuit breaker.
+`server.received` lists the paths of all requests served.
+
+Usage:
+    python -m benchmarks.stub_upstream --port 8901 [--delay-ms 0]
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+class StubUpstreamServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 drops connections under benchmark concurrency
+    request_queue_size = 256
+    delay = 0.0
+    fail_status = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.received = []
+
+class StubUpstreamHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out as separate writes; with Nagle on, each response waits for a delayed ACK
+    disable_nagle_algorithm = True
+
+    def _read_body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            body = b""
+            while True:
+                size = int(self.rfile.readline().split(b";")[0].strip() or b"0", 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return body
+                body += self.rfile.read(size)
+                self.rfile.readline()
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send(self, status: int, payload: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(payload)
+
+    def _handle(self):
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        body = self._read_body()
+        self.server.received.append(self.path)
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        if self.server.fail_status:
+            self._send(self.server.fail_status, b'{"error": "injected failure"}', "application/json")
+        elif url.path.startswith("/echo"):
+            payload = json.dumps({
+                "method": self.command, "path": url.path, "query": url.query,
+                "headers": {k.lower(): v for k, v in self.headers.items()}, "body": body.decode("utf-8", "replace"),
+            }).encode("utf-8")
+            self._send(200, payload, "application/json")
+        elif url.path == "/sse":
+            self._stream_events(int(query.get("events", 5)), float(query.get("delay", 0)) / 1000)
+        elif url.path.endswith("/chat/completions"):
+            self._completion(json.loads(body or b"{}"))
+        elif url.path == "/bytes":
+            self._send(200, b"x" * int(query.get("size", 1024)), "application/octet-stream")
+        else:
+            self._send(404, b'{"error": "not found"}', "application/json")
+
+    def _completion(self, request: dict):
+        completion_tokens = int(request.get("max_tokens", 16))
+        usage = {"prompt_tokens": 10, "completion_tokens": completion_tokens, "total_tokens": 10 + completion_tokens}
+        if not request.get("stream"):
+            payload = {"object": "chat.completion", "choices": [{"message": {"content": "x" * completion_tokens}}],
+                       "usage": usage}
+            self._send(200, json.dumps(payload).encode("utf-8"), "application/json")
+            return
+        self._start_chunked("text/event-stream")
+        events = [{"choices": [{"delta": {"content": "x"}}]} for _ in range(completion_tokens)]
+        events.append({"choices": [], "usage": usage})
+        for event in events:
+            self._write_chunk(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+        self._write_chunk(b"data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _start_chunked(self, content_type: str):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _stream_events(self, events: int, delay: float):
+        self._start_chunked("text/event-stream")
+        gate = getattr(self.server, "gate", None)
+        for i in range(events):
+            if i == 1 and gate is not None:
+                gate.wait(10)
+            elif i and delay:
+                time.sleep(delay)
+            data = f"data: {json.dumps({'index': i})}\n\n".encode("utf-8")
+            try:
+                self._write_chunk(data)
+            except (BrokenPipeError, ConnectionResetError):
+                # Client stopped reading (e.g. after the first event)
+                self.close_connection = True
+                return
+        self.wfile.write(b"0\r\n\r\n")
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = do_HEAD = _handle
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stub_upstream(host: str = "127.0.0.1", port: int = 0):
+    """
+    Start the stub in a daemon thread. Returns (server, base_url); call server.shutdown() to stop.
+    """
+    server = StubUpstreamServer((host, port), StubUpstreamHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--delay-ms", type=float, default=0, help="hold every response back this long")
+    args = parser.parse_args()
+    server = StubUpstreamServer((args.host, args.port), StubUpstreamHandler)
+    server.delay = args.delay_ms / 1000
+    print(f"Stub upstream listening on http://{args.host}:{args.port}")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
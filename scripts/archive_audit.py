@@ -0,0 +1,68 @@
+"""
+Move old audit log rows to compressed monthly archives.
+
+Usage:
+    python scripts/archive_audit.py                      # archive whole months older than ETRAP_AUDIT_RETENTION_DAYS
+    python scripts/archive_audit.py --retention-days 90 --dry-run
+    python scripts/archive_audit.py --list
+    python scripts/archive_audit.py --search --user-id 42 --action DOWNLOAD --since 2024-01-01
+    python scripts/archive_audit.py --restore 2024-03
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+
+sys.path.append(os.getcwd())
+
+from sqlmodel import Session
+
+from backend import config
+from backend.database import engine, create_db_and_tables
+from backend.core.audit_archive import (
+    archive_audit_logs, load_index, restore_partition, retention_cutoff, search_archive,
+)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--archive-dir", default=config.AUDIT_ARCHIVE_DIR)
+    parser.add_argument("--retention-days", type=int, default=config.AUDIT_RETENTION_DAYS)
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--list", action="store_true", help="Show archived partitions")
+    parser.add_argument("--restore", metavar="YYYY-MM", help="Re-import an archived month")
+    parser.add_argument("--search", action="store_true", help="Print matching archived events as JSONL")
+    parser.add_argument("--user-id", type=int)
+    parser.add_argument("--resource-id", type=int)
+    parser.add_argument("--action")
+    parser.add_argument("--since", type=datetime.fromisoformat)
+    parser.add_argument("--until", type=datetime.fromisoformat)
+    args = parser.parse_args()
+
+    if args.list:
+        for month, parts in sorted(load_index(args.archive_dir)["partitions"].items()):
+            rows = sum(p["rows"] for p in parts)
+            print(f"{month}  {rows:10d} rows  {len(parts)} file(s)")
+        return
+
+    if args.search:
+        for record in search_archive(args.archive_dir, args.since, args.until, args.user_id, args.action, args.resource_id):
+            print(json.dumps(record, default=str, ensure_ascii=False))
+        return
+
+    create_db_and_tables()
+    with Session(engine) as session:
+        if args.restore:
+            restored = restore_partition(session, args.archive_dir, args.restore)
+            print(f"Restored {restored} rows for {args.restore}")
+            return
+
+        cutoff = retention_cutoff(args.retention_days)
+        parts = archive_audit_logs(session, args.archive_dir, cutoff, dry_run=args.dry_run)
+        verb = "Would archive" if args.dry_run else "Archived"
+        for part in parts:
+            print(f"{verb} {part['rows']} rows for {part['month']}" + (f" -> {part['file']}" if "file" in part else ""))
+        print(f"{verb} {sum(p['rows'] for p in parts)} rows older than {cutoff:%Y-%m-%d}")
+
+if __name__ == "__main__":
+    main()
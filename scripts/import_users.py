@@ -0,0 +1,57 @@
+"""
+Bulk import users from a registrar roster (CSV or JSONL), upserting by swufe_uid.
+
+Columns: swufe_uid, name, email, phone, department, role, is_active, password.
+Rows without a password become SSO-only accounts (no bcrypt cost).
+
+Usage:
+    python scripts/import_users.py roster.csv
+    python scripts/import_users.py roster.jsonl --batch-size 2000 --dry-run
+    cat roster.csv | python scripts/import_users.py - --format csv
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.getcwd())
+
+from sqlmodel import Session
+
+from backend.database import engine, create_db_and_tables
+from backend.core.user_import import detect_format, import_users, read_rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="Roster file, or - for stdin")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="Default: from the file extension")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true", help="Validate and report without saving")
+    args = parser.parse_args()
+
+    fmt = args.format or detect_format(args.path)
+    if args.path == "-":
+        stream = io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8-sig", newline="")
+    else:
+        stream = open(args.path, encoding="utf-8-sig", newline="")
+
+    started = time.perf_counter()
+
+    def progress(report):
+        elapsed = time.perf_counter() - started
+        print(f"\r{report.processed} rows ({report.created} created, {report.updated} updated, "
+              f"{report.failed} failed) {report.processed / elapsed:.0f} rows/s", end="", file=sys.stderr, flush=True)
+
+    create_db_and_tables()
+    with stream, Session(engine) as session:
+        report = import_users(session, read_rows(stream, fmt), batch_size=args.batch_size,
+                              dry_run=args.dry_run, progress=progress)
+    print(file=sys.stderr)
+    for error in report.errors:
+        print(f"line {error['line']}: {error['swufe_uid'] or '-'}: {error['error']}", file=sys.stderr)
+    print(json.dumps({"dry_run": args.dry_run, **report.as_dict()}, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Provision CAS users ahead of their first login from a directory export (CSV or JSONL).
+
+Records carry the uid (`uid`, `swufe_uid` or `user`) and directory attributes,
+mapped onto user fields by ETRAP_CAS_ATTRIBUTE_MAP exactly as attributes
+released at login are; users are upserted in batches, one statement each.
+
+Usage:
+    python scripts/prefetch_cas_users.py directory.jsonl
+    python scripts/prefetch_cas_users.py export.csv --batch-size 2000
+    cat export.csv | python scripts/prefetch_cas_users.py - --format csv
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.getcwd())
+
+from sqlmodel import Session
+
+from backend.database import engine, create_db_and_tables
+from backend.core.cas_provisioning import prefetch
+from backend.core.user_import import detect_format, read_rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="Directory export, or - for stdin")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="Default: from the file extension")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    fmt = args.format or detect_format(args.path)
+    if args.path == "-":
+        stream = io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8-sig", newline="")
+    else:
+        stream = open(args.path, encoding="utf-8-sig", newline="")
+
+    started = time.perf_counter()
+    create_db_and_tables()
+    with stream, Session(engine) as session:
+        report = prefetch(session, read_rows(stream, fmt), batch_size=args.batch_size)
+    elapsed = time.perf_counter() - started
+    print(json.dumps({**report._asdict(), "seconds": round(elapsed, 2)}))
+
+if __name__ == "__main__":
+    main()
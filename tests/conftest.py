@@ -5,6 +5,14 @@ from backend.main import app
 from backend.database import get_session
 from backend.models import User, Resource
 from backend.auth import get_current_user, get_current_user_optional, require_admin
+from backend.core.app_state import app_state_cache
+from backend.core.api_keys import key_index
+from backend.core.metering import token_meter
+from backend.core.metrics import instrument_engine
+from backend.core.upstream_pool import upstream_pools
+from backend.core.ratelimit import rate_limiter
+from backend.core.response_cache import response_cache
+from backend.core.sso_sessions import sso_sessions
 
 from sqlalchemy.pool import StaticPool
 
@@ -15,6 +23,7 @@ engine = create_engine(
     connect_args={"check_same_thread": False}, 
     poolclass=StaticPool
 )
+instrument_engine(engine)
 
 @pytest.fixture(name="session")
 def session_fixture():
@@ -29,6 +38,13 @@ def client_fixture(session: Session):
         return session
 
     app.dependency_overrides[get_session] = get_session_override
+    app_state_cache.clear()
+    key_index.clear()
+    token_meter.clear()
+    upstream_pools.clear()
+    rate_limiter.clear()
+    response_cache.clear()
+    sso_sessions.clear()
     
     # We will override auth per test or here if we want a default user
     # For now, let's just override session
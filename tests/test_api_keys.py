@@ -0,0 +1,109 @@
+import time
+from datetime import date
+
+from sqlalchemy import event
+from sqlmodel import select
+
+from backend.models import ApiKey, Application, Resource
+from backend.core.api_keys import KeyIndex, ensure_keys, hash_key, key_index
+from backend.core.bulk_review import bulk_review
+from tests.conftest import engine
+
+def _gateway_resource(session, **config):
+    res = Resource(name="LLM", category="API", auth_type="API_GATEWAY", form_schema={}, valid_until=date(2030, 1, 1),
+                   config={"upstream_url": "http://upstream.invalid", **config})
+    session.add(res)
+    session.commit()
+    return res
+
+def _pending(session, user, res, n=1):
+    apps = [Application(user_id=user.id, resource_id=res.id, status="PENDING") for _ in range(n)]
+    session.add_all(apps)
+    session.commit()
+    return apps
+
+def test_revocation_reaches_other_workers_within_refresh_interval(client, session, admin_user, admin_headers):
+    res = _gateway_resource(session)
+    app_obj, = _pending(session, admin_user, res)
+    client.post(f"/admin/approve/{app_obj.id}", follow_redirects=False)
+    session.refresh(app_obj)
+    key = app_obj.auth_output["api_key"]
+    assert session.exec(select(ApiKey.key_hash).where(ApiKey.application_id == app_obj.id)).one() == hash_key(key)
+
+    # A second worker process: its own index over the same database
+    other_worker = KeyIndex(refresh_interval=0.3)
+    other_worker.refresh(session)
+    assert other_worker.lookup(res.id, key).application_id == app_obj.id
+
+    client.post(f"/admin/applications/{app_obj.id}/revoke", follow_redirects=False)
+    revoked_at = time.monotonic()
+    # The worker that handled the revoke reloads on its next request
+    assert client.get(f"/api/v1/proxy/{res.id}/models", headers={"X-API-Key": key}).status_code == 401
+
+    while other_worker.lookup(res.id, key) is not None:
+        assert time.monotonic() - revoked_at < 0.3 + 0.2
+        time.sleep(0.01)
+        if other_worker.stale():
+            other_worker.refresh(session)
+
+def test_lookups_run_no_sql_and_refresh_reads_only_changes(session, admin_user):
+    res = _gateway_resource(session)
+    apps = _pending(session, admin_user, res, 50)
+    bulk_review(session, "approve", admin_id=admin_user.id, resource_id=res.id)
+    session.commit()
+    session.expire_all()
+    keys = [session.get(Application, app.id).auth_output["api_key"] for app in apps]
+    resource_id = res.id
+
+    index = KeyIndex(refresh_interval=60)
+    assert index.refresh(session) == 50 and len(index) == 50
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        assert all(index.lookup(resource_id, key) for key in keys)
+        assert index.lookup(resource_id + 1, keys[0]) is None
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert statements == []
+
+    bulk_review(session, "revoke", admin_id=admin_user.id, ids=[apps[0].id])
+    session.commit()
+    assert index.refresh(session) == 0  # not stale yet
+    index.invalidate()
+    assert index.refresh(session) == 1
+    assert index.lookup(resource_id, keys[0]) is None and len(index) == 49
+
+def test_reapproval_resource_changes_and_backfill(client, session, admin_user, admin_headers):
+    res = _gateway_resource(session, upstream_key="sk-old")
+    app_obj, = _pending(session, admin_user, res)
+    client.post(f"/admin/approve/{app_obj.id}", follow_redirects=False)
+    session.refresh(app_obj)
+    first = app_obj.auth_output["api_key"]
+    client.post(f"/admin/approve/{app_obj.id}", follow_redirects=False)
+    session.refresh(app_obj)
+    second = app_obj.auth_output["api_key"]
+
+    key_index.refresh(session)
+    assert key_index.lookup(res.id, first) is None
+    assert key_index.lookup(res.id, second).pool.upstreams[0].key == "sk-old"
+
+    # Editing the resource reloads its keys with the new upstream settings
+    assert client.post(f"/admin/resources/{res.id}", data={
+        "name": "LLM", "category": "API", "auth_type": "API_GATEWAY", "description": "d", "valid_until": "2030-01-01",
+        "upstream_url": "http://new-upstream.invalid",
+    }, follow_redirects=False).status_code == 303
+    key_index.refresh(session)
+    assert key_index.lookup(res.id, second).pool.upstreams[0].url == "http://new-upstream.invalid"
+
+    # Keys approved before the key table existed are indexed at startup
+    legacy, = _pending(session, admin_user, res)
+    legacy.status, legacy.auth_output = "APPROVED", {"api_key": "sk-etrap-legacy"}
+    session.add(legacy)
+    session.commit()
+    assert ensure_keys(session) == 1 and ensure_keys(session) == 0
+    session.commit()
+    key_index.invalidate()
+    key_index.refresh(session)
+    assert key_index.lookup(res.id, "sk-etrap-legacy").application_id == legacy.id
@@ -0,0 +1,47 @@
+from backend.models import Resource, Application
+from backend.core.app_state import app_state_cache, load_latest_applications
+
+def _setup(session, user):
+    res = Resource(name="GPU", category="Compute", auth_type="MANUAL", form_schema={}, config={})
+    session.add(res)
+    session.commit()
+    session.refresh(res)
+    for status in ["REJECTED", "REVOKED", "PENDING"]:
+        session.add(Application(user_id=user.id, resource_id=res.id, status=status))
+    session.commit()
+    return res
+
+def test_load_latest_applications_keeps_newest(session, test_user):
+    res = _setup(session, test_user)
+    app_map = load_latest_applications(session, test_user.id)
+    assert list(app_map) == [res.id]
+    assert app_map[res.id].status == "PENDING"
+
+def test_cache_invalidated_on_approve(client, session, test_user, admin_user, admin_headers):
+    res = _setup(session, test_user)
+    before = app_state_cache.get(session, test_user.id)
+    assert before[res.id].status == "PENDING"
+    # Served from cache until invalidated
+    assert app_state_cache.get(session, test_user.id) is before
+
+    pending = session.get(Application, before[res.id].id)
+    response = client.post(f"/admin/approve/{pending.id}", follow_redirects=False)
+    assert response.status_code == 303
+
+    after = app_state_cache.get(session, test_user.id)
+    assert after is not before
+    assert after[res.id].status == "APPROVED"
+
+def test_cache_invalidated_on_apply(client, session, test_user, auth_headers):
+    res = Resource(name="SAS", category="Software", auth_type="AUTO_ZIP", form_schema={}, config={})
+    session.add(res)
+    session.commit()
+    session.refresh(res)
+
+    assert app_state_cache.get(session, test_user.id) == {}
+    client.post(f"/resources/{res.id}/apply", data={}, follow_redirects=False)
+    assert app_state_cache.get(session, test_user.id)[res.id].status == "APPROVED"
+
+    response = client.get("/resource")
+    assert response.status_code == 200
+    assert "/resources/%d/download" % res.id in response.text
@@ -0,0 +1,145 @@
+import json
+import sqlite3
+from datetime import datetime
+
+import pytest
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from backend.main import app
+from backend.auth import get_current_user
+from backend.database import get_session
+from backend.routers import resources
+from backend.models import Application, AuditLog, Resource, User
+from backend.core.approval_rules import compile_rules, decide, evaluate, parse_rules, rule_cache
+
+STUDENT = User(swufe_uid="s1", name="Stu", email="", department="经济学院", role="user", password_hash="x")
+# Wednesday
+NOON = datetime(2025, 3, 5, 12, 0)
+
+RULES = {"rules": [
+    {"name": "blocked-course", "action": "reject", "fields": {"course_code": "FIN999"}, "reason": "Course closed"},
+    {"name": "econ-teaching", "departments": ["经济学院"], "fields": {"usage_purpose": "Teaching"}, "quota": 2},
+    {"name": "night-manual", "action": "manual", "hours": "22:00-06:00"},
+    {"name": "fin-courses", "fields": {"course_code": {"regex": "^FIN\\d{3}$"}}, "weekdays": [1, 2, 3, 4, 5],
+     "from": "2025-02-17", "until": "2025-06-30"},
+]}
+
+def _decide(data, now=NOON, approved=0, user=STUDENT):
+    decision = evaluate(compile_rules(RULES), user, data, now, lambda: approved)
+    return decision and (decision.action, decision.rule)
+
+def test_first_matching_rule_wins():
+    assert _decide({"usage_purpose": "Teaching", "course_code": "FIN999"}) == ("reject", "blocked-course")
+    assert _decide({"usage_purpose": "Teaching", "course_code": "FIN101"}) == ("approve", "econ-teaching")
+    assert _decide({"usage_purpose": "Research", "course_code": "FIN101"}) == ("approve", "fin-courses")
+    other = User(swufe_uid="s2", name="Other", email="", department="统计学院", password_hash="x")
+    assert _decide({"usage_purpose": "Teaching"}, user=other) is None
+
+def test_quota_falls_through_to_later_rules():
+    data = {"usage_purpose": "Teaching", "course_code": "FIN101"}
+    assert _decide(data, approved=1) == ("approve", "econ-teaching")
+    assert _decide(data, approved=2) == ("approve", "fin-courses")
+    assert _decide({"usage_purpose": "Teaching"}, approved=2) is None
+
+def test_time_windows():
+    data = {"course_code": "FIN101"}
+    # Midnight-wrapping hours window stops evaluation before the approve rule
+    assert _decide(data, now=datetime(2025, 3, 5, 23, 30)) == ("manual", "night-manual")
+    assert _decide(data, now=datetime(2025, 3, 8, 12)) is None  # Saturday
+    assert _decide(data, now=datetime(2025, 7, 1, 12)) is None  # after "until"
+
+@pytest.mark.parametrize("rule, message", [
+    ({"action": "grant"}, "action must be one of"),
+    ({"department": ["x"]}, "unknown keys department"),
+    ({"hours": "8-22"}, "hours must look like"),
+    ({"fields": {"code": {"regex": "("}}}, "invalid regex"),
+    ({"quota": -1}, "quota must be"),
+])
+def test_invalid_rules_are_rejected(rule, message):
+    with pytest.raises(ValueError, match=message):
+        parse_rules(json.dumps({"rules": [rule]}))
+
+def test_apply_uses_rules(client, session, test_user, auth_headers):
+    rules = parse_rules(json.dumps({"rules": [
+        {"name": "teaching", "fields": {"usage_purpose": "Teaching"}, "quota": 1},
+        {"name": "no-crypto", "action": "reject", "fields": {"usage_purpose": {"regex": "(?i)mining"}}},
+    ]}))
+    res = Resource(name="GPU", category="Compute", auth_type="MANUAL", form_schema={}, config={"approval_rules": rules})
+    other = Resource(name="HPC", category="Compute", auth_type="MANUAL", form_schema={}, config={"approval_rules": rules})
+    session.add_all([res, other])
+    session.commit()
+    rule_cache.clear()
+
+    client.post(f"/resources/{res.id}/apply", data={"usage_purpose": "Teaching"}, follow_redirects=False)
+    client.post(f"/resources/{other.id}/apply", data={"usage_purpose": "Mining"}, follow_redirects=False)
+    apps = session.exec(select(Application).order_by(Application.id)).all()
+    assert [app.status for app in apps] == ["APPROVED", "REJECTED"]
+    assert apps[0].expired_at is not None
+    assert apps[1].auth_output == {"rejection_reason": "Rejected by rule no-crypto"}
+    assert session.exec(select(AuditLog.details)).all() == ["Status: APPROVED (rule: teaching)",
+                                                            "Status: REJECTED (rule: no-crypto)"]
+
+    # Quota of 1 used up on this resource: back to the manual queue
+    session.add(User(swufe_uid="s9", name="Nine", email="n@x.cn", phone="1", department="x", password_hash="x"))
+    session.commit()
+    nine = session.exec(select(User).where(User.swufe_uid == "s9")).one()
+    app.dependency_overrides[get_current_user] = lambda: nine
+    client.post(f"/resources/{res.id}/apply", data={"usage_purpose": "Teaching"}, follow_redirects=False)
+    assert session.exec(select(Application).where(Application.user_id == nine.id)).one().status == "PENDING"
+
+def test_rule_quota_is_counted_under_the_write_lock(client, tmp_path, monkeypatch):
+    # A file database, so a second connection can try to approve while the apply counts
+    path = tmp_path / "etrap.db"
+    file_engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(file_engine)
+    rules = parse_rules(json.dumps({"rules": [{"name": "teaching", "quota": 1}]}))
+    attempts = []
+
+    def decide_probing(resource, user, user_input, approved_count):
+        def count():
+            approved = approved_count()
+            other = sqlite3.connect(path, timeout=0)
+            try:
+                other.execute("BEGIN IMMEDIATE")
+                attempts.append("written")
+            except sqlite3.OperationalError as e:
+                attempts.append(str(e))
+            finally:
+                other.close()
+            return approved
+        return decide(resource, user, user_input, count)
+
+    monkeypatch.setattr(resources, "decide", decide_probing)
+    rule_cache.clear()
+    with Session(file_engine) as session:
+        student = User(swufe_uid="s1", name="Stu", email="s@x.cn", phone="1", department="x", password_hash="x")
+        res = Resource(name="GPU", category="Compute", auth_type="MANUAL", form_schema={},
+                       config={"approval_rules": rules})
+        session.add_all([student, res])
+        session.commit()
+        app.dependency_overrides[get_session] = lambda: session
+        app.dependency_overrides[get_current_user] = lambda: student
+
+        response = client.post(f"/resources/{res.id}/apply", data={}, follow_redirects=False)
+        assert response.status_code == 303
+        assert attempts == ["database is locked"]
+        assert session.exec(select(Application.status)).all() == ["APPROVED"]
+    file_engine.dispose()
+
+def test_editor_validates_and_versions_rules(client, session, admin_user, admin_headers):
+    res = Resource(name="GPU", category="Compute", auth_type="MANUAL", form_schema={}, config={})
+    session.add(res)
+    session.commit()
+    form = {"name": "GPU", "category": "Compute", "description": "d", "auth_type": "MANUAL", "valid_until": "2030-01-01"}
+
+    response = client.post(f"/admin/resources/{res.id}", data={**form, "approval_rules": "{\"rules\": [{\"action\": \"x\"}]}"})
+    assert response.status_code == 400
+
+    client.post(f"/admin/resources/{res.id}", data={**form, "approval_rules": json.dumps(RULES)}, follow_redirects=False)
+    session.refresh(res)
+    assert res.config["approval_rules"]["rules"] == RULES["rules"]
+    assert len(res.config["approval_rules"]["version"]) == 12
+
+    client.post(f"/admin/resources/{res.id}", data={**form, "approval_rules": ""}, follow_redirects=False)
+    session.refresh(res)
+    assert "approval_rules" not in res.config
@@ -0,0 +1,83 @@
+import threading
+
+from sqlmodel import select
+
+from backend.models import AuditLog, Resource
+from backend.core.audit import AuditWriter, audit_writer
+from backend.core.metrics import AUDIT_FLUSH_ROWS
+from tests.conftest import engine
+
+def _record(writer, session, i=0, **kwargs):
+    return writer.record(session, user_id=1, action="DOWNLOAD", resource_id=1, details=f"event {i}", **kwargs)
+
+def test_writes_through_session_when_not_running(session):
+    writer = AuditWriter()
+    assert _record(writer, session) is False
+    session.commit()
+    assert len(session.exec(select(AuditLog)).all()) == 1
+
+def test_batched_flush_on_stop(session):
+    writer = AuditWriter(batch_size=100, flush_interval=60)
+    flushes = AUDIT_FLUSH_ROWS.count()
+    writer.start(engine)
+    assert all(_record(writer, session, i) for i in range(250))
+    writer.stop()
+
+    logs = session.exec(select(AuditLog).order_by(AuditLog.id)).all()
+    assert [log.details for log in logs] == [f"event {i}" for i in range(250)]
+    # Multi-row inserts of at most batch_size rows
+    assert AUDIT_FLUSH_ROWS.count() - flushes == 3
+
+def test_stop_timeout_keeps_the_busy_writer(session, monkeypatch):
+    writer = AuditWriter(batch_size=100, flush_interval=60)
+    release = threading.Event()
+    write = writer._write
+
+    def slow_write(batch):
+        release.wait(5)
+        return write(batch)
+
+    monkeypatch.setattr(writer, "_write", slow_write)
+    writer.start(engine)
+    thread = writer._thread
+    assert all(_record(writer, session, i) for i in range(3))
+    writer.stop(timeout=0.05)
+    # Still flushing: not reported stopped, and no second writer on the same queue
+    assert writer.running
+    writer.start(engine)
+    assert writer._thread is thread
+
+    release.set()
+    writer.stop()
+    assert not writer.running
+    assert len(session.exec(select(AuditLog)).all()) == 3
+
+def test_durable_and_full_queue_bypass_writer(session):
+    writer = AuditWriter(maxsize=2, batch_size=100, flush_interval=60)
+    writer.start(engine)
+    try:
+        assert _record(writer, session, 0, durable=True) is False
+        assert _record(writer, session, 1) is True
+        assert _record(writer, session, 2) is True
+        # Queue full: falls back to the request session instead of dropping
+        assert _record(writer, session, 3) is False
+        session.commit()
+        assert len(session.exec(select(AuditLog)).all()) == 2
+    finally:
+        writer.stop()
+    assert len(session.exec(select(AuditLog)).all()) == 4
+
+def test_apply_audit_is_queued(client, session, test_user, auth_headers):
+    res = Resource(name="GPU", category="Compute", auth_type="MANUAL", form_schema={}, config={})
+    session.add(res)
+    session.commit()
+
+    audit_writer.start(engine)
+    try:
+        response = client.post(f"/resources/{res.id}/apply", data={"project_desc": "x"}, follow_redirects=False)
+        assert response.status_code == 303
+    finally:
+        audit_writer.stop()
+
+    log = session.exec(select(AuditLog)).one()
+    assert (log.action, log.user_id, log.resource_id) == ("APPLY", test_user.id, res.id)
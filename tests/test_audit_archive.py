@@ -0,0 +1,91 @@
+import gzip
+import os
+from datetime import datetime
+
+import pytest
+from sqlmodel import select
+
+from backend.models import AuditLog
+from backend.core import audit_archive
+from backend.core.audit_archive import (
+    archive_audit_logs, load_index, restore_partition, retention_cutoff, search_archive,
+)
+
+def _seed(session):
+    timestamps = [
+        datetime(2024, 1, 5, 10, 0, 0, 123456), datetime(2024, 1, 31, 23, 59, 59),
+        datetime(2024, 2, 1, 0, 0, 0), datetime(2024, 2, 14, 8, 30),
+        datetime(2024, 3, 2, 12, 0),
+    ]
+    for i, ts in enumerate(timestamps):
+        session.add(AuditLog(user_id=i % 2 + 1, action="DOWNLOAD" if i % 2 else "APPLY", resource_id=i,
+                             ip_address="10.0.0.1", details=f"事件 {i}", timestamp=ts))
+    session.commit()
+    return [log.model_dump() for log in session.exec(select(AuditLog).order_by(AuditLog.id)).all()]
+
+def test_retention_cutoff_is_month_aligned():
+    assert retention_cutoff(30, now=datetime(2024, 3, 15, 9, 0)) == datetime(2024, 2, 1)
+
+def test_archive_round_trip(session, tmp_path):
+    original = _seed(session)
+    parts = archive_audit_logs(session, str(tmp_path), before=datetime(2024, 3, 1))
+
+    assert [(p["month"], p["rows"]) for p in parts] == [("2024-01", 2), ("2024-02", 2)]
+    remaining = session.exec(select(AuditLog)).all()
+    assert [log.id for log in remaining] == [original[4]["id"]]
+
+    index = load_index(str(tmp_path))
+    assert sorted(index["partitions"]) == ["2024-01", "2024-02"]
+    assert index["partitions"]["2024-02"][0]["actions"] == {"APPLY": 1, "DOWNLOAD": 1}
+    with gzip.open(tmp_path / parts[0]["file"], "rt", encoding="utf-8") as f:
+        assert len(f.readlines()) == 2
+
+    # Lookup returns the exact rows, including microseconds and non-ASCII details
+    assert list(search_archive(str(tmp_path))) == original[:4]
+    assert [r["id"] for r in search_archive(str(tmp_path), user_id=2, action="DOWNLOAD")] == [original[1]["id"], original[3]["id"]]
+    assert [r["id"] for r in search_archive(str(tmp_path), start=datetime(2024, 2, 1))] == [original[2]["id"], original[3]["id"]]
+
+    assert restore_partition(session, str(tmp_path), "2024-01") == 2
+    restored = [log.model_dump() for log in session.exec(select(AuditLog).order_by(AuditLog.id)).all()]
+    assert restored == [original[0], original[1], original[4]]
+    assert list(load_index(str(tmp_path))["partitions"]) == ["2024-02"]
+    assert not os.path.exists(tmp_path / parts[0]["file"])
+
+def test_archive_is_incremental(session, tmp_path):
+    _seed(session)
+    archive_audit_logs(session, str(tmp_path), before=datetime(2024, 2, 1))
+    assert archive_audit_logs(session, str(tmp_path), before=datetime(2024, 2, 1)) == []
+
+    # A late row for an archived month goes to a second part file
+    session.add(AuditLog(user_id=1, action="APPLY", ip_address="x", details="late", timestamp=datetime(2024, 1, 20)))
+    session.commit()
+    parts = archive_audit_logs(session, str(tmp_path), before=datetime(2024, 2, 1))
+    assert [(p["file"], p["rows"]) for p in parts] == [("2024-01.0002.jsonl.gz", 1)]
+    assert len(list(search_archive(str(tmp_path)))) == 3
+
+def test_dry_run_changes_nothing(session, tmp_path):
+    _seed(session)
+    parts = archive_audit_logs(session, str(tmp_path), before=datetime(2024, 3, 1), dry_run=True)
+    assert [(p["month"], p["rows"]) for p in parts] == [("2024-01", 2), ("2024-02", 2)]
+    assert len(session.exec(select(AuditLog)).all()) == 5
+    assert load_index(str(tmp_path)) == {"partitions": {}}
+
+def test_interrupted_archive_is_finished_by_the_next_run(session, tmp_path, monkeypatch):
+    original = _seed(session)
+    save_index = audit_archive._save_index
+
+    def save_then_crash(archive_dir, index):
+        save_index(archive_dir, index)
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(audit_archive, "_save_index", save_then_crash)
+    with pytest.raises(KeyboardInterrupt):
+        archive_audit_logs(session, str(tmp_path), before=datetime(2024, 3, 1))
+    session.rollback()
+    assert len(session.exec(select(AuditLog)).all()) == 5
+
+    monkeypatch.setattr(audit_archive, "_save_index", save_index)
+    parts = archive_audit_logs(session, str(tmp_path), before=datetime(2024, 3, 1))
+    assert [(p["month"], p["rows"]) for p in parts] == [("2024-02", 2)]
+    assert [log.id for log in session.exec(select(AuditLog)).all()] == [original[4]["id"]]
+    assert restore_partition(session, str(tmp_path), "2024-01") == 2
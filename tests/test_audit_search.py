@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta
+
+from sqlmodel import select
+from sqlalchemy import text
+
+from backend.models import AuditLog
+from backend.core.audit_search import query_audit_logs
+
+BASE = datetime(2024, 5, 1, 12, 0)
+
+def _seed(session, admin_user):
+    for i in range(30):
+        session.add(AuditLog(
+            user_id=admin_user.id if i % 3 == 0 else 999, action="DOWNLOAD" if i % 2 else "APPLY",
+            resource_id=i % 5, ip_address=f"10.0.0.{i % 4}",
+            details=f"Approved Application #{i} for 张三丰" if i % 10 == 0 else f"Downloaded Resource {i}",
+            # Pairs of rows share a timestamp so paging has to break ties on id
+            timestamp=BASE + timedelta(minutes=i // 2),
+        ))
+    session.commit()
+
+def test_keyset_pagination_walks_every_row_once(session, admin_user):
+    _seed(session, admin_user)
+    seen, cursor = [], None
+    while True:
+        rows, cursor = query_audit_logs(session, limit=7, cursor=cursor)
+        seen += [(r.timestamp, r.id) for r in rows]
+        if cursor is None:
+            break
+    assert len(seen) == 30
+    assert seen == sorted(seen, reverse=True)
+
+def test_filters_combine(session, admin_user):
+    _seed(session, admin_user)
+    rows, cursor = query_audit_logs(session, user_id=admin_user.id, action="APPLY", start=BASE + timedelta(minutes=3))
+    assert cursor is None
+    assert [r.details for r in rows] == ["Downloaded Resource 24", "Downloaded Resource 18", "Downloaded Resource 12", "Downloaded Resource 6"]
+    rows, _ = query_audit_logs(session, ip_address="10.0.0.1", resource_id=1, end=BASE + timedelta(minutes=5))
+    assert [r.id for r in rows] == [2]
+
+def test_full_text_search_uses_fts_and_stays_in_sync(session, admin_user):
+    _seed(session, admin_user)
+    assert session.execute(text("SELECT count(*) FROM auditlog_fts WHERE auditlog_fts MATCH '\"张三丰\"'")).scalar() == 3
+
+    rows, _ = query_audit_logs(session, q="张三丰")
+    assert [r.details for r in rows] == ["Approved Application #20 for 张三丰", "Approved Application #10 for 张三丰", "Approved Application #0 for 张三丰"]
+    # Short terms fall back to LIKE
+    rows, _ = query_audit_logs(session, q="#1 Approved")
+    assert [r.details for r in rows] == ["Approved Application #10 for 张三丰"]
+    # Quotes and operators in input are matched literally, not parsed as FTS syntax
+    assert query_audit_logs(session, q='"Approved OR NEAR(') == ([], None)
+
+    log = session.exec(select(AuditLog).where(AuditLog.details.contains("#20 "))).one()
+    session.delete(log)
+    session.commit()
+    rows, _ = query_audit_logs(session, q="张三丰")
+    assert len(rows) == 2
+
+def test_audit_endpoint(client, session, admin_user, admin_headers):
+    _seed(session, admin_user)
+    response = client.get("/admin/audit/data", params={"user_id": admin_user.id, "limit": 5})
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data["items"]) == 5
+    assert data["items"][0]["user_name"] == "Admin User"
+
+    response = client.get("/admin/audit/data", params={"user_id": admin_user.id, "limit": 5, "cursor": data["next_cursor"]})
+    data = response.json()
+    assert len(data["items"]) == 5
+    assert data["next_cursor"] is None
+
+    response = client.get("/admin/audit/data", params={"cursor": "garbage"})
+    assert response.status_code == 400
+    response = client.get("/admin/audit/data", params={"start": "2024-05-01T12:10:00", "action": "DOWNLOAD"})
+    assert [item["timestamp"] for item in response.json()["items"]][-1] == "2024-05-01T12:10:00"
+
+def test_common_terms_fall_back_to_like(session, admin_user, monkeypatch):
+    _seed(session, admin_user)
+    expected = [r.id for r in query_audit_logs(session, q="Resource 1")[0]]
+    monkeypatch.setattr("backend.core.audit_search.FTS_SELECTIVE_ROWS", 1)
+    assert [r.id for r in query_audit_logs(session, q="Resource 1")[0]] == expected
+    assert len(expected) == 11
@@ -0,0 +1,84 @@
+from datetime import date, datetime, time, timedelta
+
+from sqlmodel import select
+
+from backend.models import Application, AuditLog, Resource, User
+from backend.core.app_state import app_state_cache
+from backend.core.bulk_review import bulk_review
+
+def _setup(session, user):
+    gpu = Resource(name="GPU", category="Compute", auth_type="MANUAL", form_schema={}, config={},
+                   valid_until=date(2030, 6, 30))
+    data = Resource(name="Wind", category="Data", auth_type="MANUAL", form_schema={}, config={})
+    session.add_all([gpu, data])
+    session.commit()
+    apps = [
+        Application(user_id=user.id, resource_id=gpu.id, status="PENDING", created_at=datetime(2025, 3, 1, 10)),
+        Application(user_id=user.id, resource_id=gpu.id, status="PENDING", created_at=datetime(2025, 3, 2, 23)),
+        Application(user_id=user.id, resource_id=data.id, status="PENDING", created_at=datetime(2025, 3, 5)),
+        Application(user_id=user.id, resource_id=data.id, status="APPROVED", created_at=datetime(2025, 3, 1)),
+    ]
+    session.add_all(apps)
+    session.commit()
+    return gpu, data, [app.id for app in apps]
+
+def test_bulk_approve_by_ids_reports_partial_failures(client, session, test_user, admin_user, admin_headers):
+    gpu, data, ids = _setup(session, test_user)
+    app_state_cache.get(session, test_user.id)
+
+    response = client.post("/admin/applications/bulk", data={"action": "approve", "ids": ids + [9999]})
+    assert response.status_code == 200
+    result = response.json()
+    assert (result["updated"], result["ids"]) == (3, ids[:3])
+    assert result["failed"] == [
+        {"id": ids[3], "error": "Status is APPROVED, expected PENDING"},
+        {"id": 9999, "error": "Application not found"},
+    ]
+
+    session.expire_all()
+    apps = {app.id: app for app in session.exec(select(Application)).all()}
+    assert all(apps[i].status == "APPROVED" and apps[i].approved_at for i in ids[:3])
+    # expired_at computed in SQL from valid_until; resources without one get the 180-day default
+    assert apps[ids[0]].expired_at == datetime.combine(gpu.valid_until, time.max)
+    assert apps[ids[2]].expired_at.date() == (datetime.now() + timedelta(days=180)).date()
+    assert app_state_cache.get(session, test_user.id)[gpu.id].status == "APPROVED"
+
+    logs = session.exec(select(AuditLog).order_by(AuditLog.id)).all()
+    assert [log.action for log in logs] == ["APPROVE"] * 3
+    assert logs[0].details == f"Approved Application #{ids[0]} for {test_user.name} (bulk)"
+    assert {log.user_id for log in logs} == {admin_user.id}
+
+def test_bulk_by_filters(session, test_user, admin_user):
+    gpu, data, ids = _setup(session, test_user)
+    # End date is inclusive
+    result = bulk_review(session, "reject", admin_id=admin_user.id, category="Compute",
+                         start=date(2025, 3, 2), end=date(2025, 3, 2), reason="Quota exhausted")
+    session.commit()
+    assert result.as_dict()["ids"] == [ids[1]]
+
+    result = bulk_review(session, "revoke", admin_id=admin_user.id, resource_id=data.id)
+    session.commit()
+    assert result.as_dict()["ids"] == [ids[3]]
+
+    session.expire_all()
+    statuses = [session.get(Application, i).status for i in ids]
+    assert statuses == ["PENDING", "REJECTED", "PENDING", "REVOKED"]
+    assert session.get(Application, ids[1]).auth_output == {"rejection_reason": "Quota exhausted"}
+
+def test_bulk_endpoint_validation(client, session, admin_user, admin_headers):
+    assert client.post("/admin/applications/bulk", data={"action": "approve"}).status_code == 400
+    response = client.post("/admin/applications/bulk", data={"action": "reject", "ids": [1]})
+    assert (response.status_code, response.json()["detail"]) == (400, "Rejection reason cannot be empty")
+    assert client.post("/admin/applications/bulk", data={"action": "delete", "ids": [1]}).status_code == 400
+
+def test_revoke_all_is_set_based(client, session, test_user, admin_user, admin_headers):
+    gpu, data, ids = _setup(session, test_user)
+    bulk_review(session, "approve", admin_id=admin_user.id, ids=ids[:2])
+    session.commit()
+
+    response = client.post(f"/admin/users/{test_user.id}/revoke-all", follow_redirects=False)
+    assert response.status_code == 303
+    session.expire_all()
+    assert [session.get(Application, i).status for i in ids] == ["REVOKED", "REVOKED", "PENDING", "REVOKED"]
+    log = session.exec(select(AuditLog).where(AuditLog.action == "REVOKE_ALL")).one()
+    assert log.details == f"Revoked all 3 active applications for {test_user.name}"
@@ -0,0 +1,94 @@
+import io
+import json
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from sqlalchemy import event
+from sqlmodel import select
+
+from backend.models import User
+from backend.core.cas_provisioning import map_attributes, parse_attribute_map, prefetch
+from backend.core.user_import import read_rows
+from tests.conftest import engine
+
+ATTRIBUTES = {"cas:cn": "张三", "cas:mail": ["zhangsan@stu.swufe.edu.cn", "zs@example.com"],
+              "cas:mobile": " 13900000000 ", "cas:ou": "金融学院"}
+
+@pytest.fixture(name="writes")
+def writes_fixture():
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        # Writes to user rows; every CAS login also opens an SSO session
+        if statement.lstrip().upper().startswith(("INSERT", "UPDATE", "DELETE")) and "ssosession" not in statement:
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    yield statements
+    event.remove(engine, "before_cursor_execute", record)
+
+def _login(client, uid, attributes):
+    with patch("backend.routers.resources.cas_client.validate_ticket", new_callable=AsyncMock) as validate:
+        validate.return_value = {"user": uid, "attributes": attributes}
+        return client.get(f"/resource?ticket=ST-{uid}", follow_redirects=False)
+
+def _user(session, uid):
+    session.expire_all()
+    return session.exec(select(User).where(User.swufe_uid == uid)).one()
+
+def test_attribute_mapping():
+    assert map_attributes(ATTRIBUTES) == {"name": "张三", "email": "zhangsan@stu.swufe.edu.cn",
+                                          "phone": "13900000000", "department": "金融学院"}
+    mapping = parse_attribute_map("name=XM, email=dzyx|mail")
+    assert mapping == {"name": ("xm",), "email": ("dzyx", "mail")}
+    assert map_attributes({"xm": "李四", "mail": "", "dzyx": "ls@swufe.edu.cn"}, mapping) == \
+        {"name": "李四", "email": "ls@swufe.edu.cn"}
+    for text in ("password=pw", "name="):
+        with pytest.raises(ValueError):
+            parse_attribute_map(text)
+
+def test_first_login_provisions_a_complete_profile(client, session, writes):
+    response = _login(client, "20240001", ATTRIBUTES)
+    assert response.status_code == 302 and response.headers["location"] == "/resource"
+    user = _user(session, "20240001")
+    assert (user.name, user.email, user.phone, user.department) == \
+        ("张三", "zhangsan@stu.swufe.edu.cn", "13900000000", "金融学院")
+    assert len(writes) == 1
+
+    # Returning with the same attributes: nothing to write
+    writes.clear()
+    assert _login(client, "20240001", ATTRIBUTES).headers["location"] == "/resource"
+    assert writes == []
+
+    # The student corrected their phone; a department change still comes through
+    session.add(user)
+    user.phone = "13700000000"
+    session.commit()
+    writes.clear()
+    _login(client, "20240001", {**ATTRIBUTES, "cas:ou": "统计学院"})
+    user = _user(session, "20240001")
+    assert (user.phone, user.department) == ("13700000000", "统计学院") and len(writes) == 1
+
+def test_login_without_attributes_still_needs_the_profile(client, session, admin_user):
+    assert _login(client, "20240002", None).headers["location"] == "/profile/complete"
+    user = _user(session, "20240002")
+    assert (user.name, user.email, user.role) == ("20240002", "", "user")
+
+    # Existing accounts keep what the directory does not say
+    _login(client, "admin", {"cas:mail": "other@swufe.edu.cn"})
+    admin = _user(session, "admin")
+    assert (admin.name, admin.email, admin.role) == ("Admin User", "admin@swufe.edu.cn", "admin")
+
+def test_prefetch_from_directory_export(session, writes):
+    export = "\n".join(json.dumps(record, ensure_ascii=False) for record in [
+        {"uid": f"2024{i:04d}", "cn": f"学生{i}", "mail": f"s{i}@stu.swufe.edu.cn", "mobile": f"1390000{i:04d}",
+         "ou": "金融学院"} for i in range(25)] + [{"cn": "no uid"}])
+    report = prefetch(session, read_rows(io.StringIO(export), "jsonl"), batch_size=10)
+    assert report._asdict() == {"processed": 26, "written": 25, "skipped": 1}
+    # One statement per batch
+    assert len(writes) == 3
+    assert _user(session, "20240007").email == "s7@stu.swufe.edu.cn"
+
+    writes.clear()
+    again = prefetch(session, read_rows(io.StringIO(export), "jsonl"), batch_size=10)
+    assert again.written == 0 and len(writes) == 3
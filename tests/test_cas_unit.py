@@ -1,7 +1,23 @@
-from backend.core.cas_client import CASClient
-from unittest.mock import MagicMock, patch
+from backend.core.cas_client import (CASAuthenticationFailure, CASClient, CASProtocolError, CASUnavailable,
+                                     ServiceResponseParser, parse_service_response)
+from benchmarks.stub_cas import start_stub_cas
+from benchmarks.stub_upstream import start_stub_upstream
+from contextlib import asynccontextmanager
+from unittest.mock import patch
+import httpx
 import pytest
 
+def _answer(body: bytes):
+    # Stands in for AsyncClient.stream: the body arrives in small chunks
+    async def chunks():
+        for i in range(0, len(body), 16):
+            yield body[i:i + 16]
+
+    @asynccontextmanager
+    async def stream(self, method, url, **kwargs):
+        yield httpx.Response(200, content=chunks())
+    return stream
+
 def test_cas_client_urls():
     client = CASClient("https://cas.example.com")
     
@@ -15,19 +31,14 @@ def test_cas_client_urls():
 async def test_cas_validate_ticket_success():
     client = CASClient("https://cas.example.com")
     
-    with patch("httpx.AsyncClient.get") as mock_get:
-        mock_get.return_value = MagicMock(
-            status_code=200,
-            content=b"""<cas:serviceResponse xmlns:cas='http://www.yale.edu/tp/cas'>
+    with patch("httpx.AsyncClient.stream", _answer(b"""<cas:serviceResponse xmlns:cas='http://www.yale.edu/tp/cas'>
                 <cas:authenticationSuccess>
                     <cas:user>testuser</cas:user>
                     <cas:attributes>
                         <cas:email>test@example.com</cas:email>
                     </cas:attributes>
                 </cas:authenticationSuccess>
-            </cas:serviceResponse>"""
-        )
-        
+            </cas:serviceResponse>""")):
         user_data = await client.validate_ticket("ST-123", "http://service.com")
         assert user_data["user"] == "testuser"
         assert user_data["attributes"]["cas:email"] == "test@example.com"
@@ -36,15 +47,71 @@ async def test_cas_validate_ticket_success():
 async def test_cas_validate_ticket_fail():
     client = CASClient("https://cas.example.com")
     
-    with patch("httpx.AsyncClient.get") as mock_get:
-        mock_get.return_value = MagicMock(
-            status_code=200,
-            content=b"""<cas:serviceResponse xmlns:cas='http://www.yale.edu/tp/cas'>
+    with patch("httpx.AsyncClient.stream", _answer(b"""<cas:serviceResponse xmlns:cas='http://www.yale.edu/tp/cas'>
                 <cas:authenticationFailure code="INVALID_TICKET">
                     Ticket not recognized
                 </cas:authenticationFailure>
-            </cas:serviceResponse>"""
-        )
-        
+            </cas:serviceResponse>""")):
         user_data = await client.validate_ticket("ST-123", "http://service.com")
         assert user_data is None
+
+def test_parse_service_response_attributes():
+    response = parse_service_response("""<cas:serviceResponse xmlns:cas='http://www.yale.edu/tp/cas'>
+        <cas:authenticationSuccess>
+            <cas:user> 20230001 </cas:user>
+            <cas:attributes>
+                <cas:cn>张三</cas:cn>
+                <cas:memberOf>cn=students</cas:memberOf>
+                <cas:memberOf>cn=finance</cas:memberOf>
+                <cas:memberOf>cn=lab</cas:memberOf>
+                <cas:attribute name="mail" value="zs@swufe.edu.cn"/>
+                <cas:isFromNewLogin>true</cas:isFromNewLogin>
+            </cas:attributes>
+            <cas:proxyGrantingTicket>PGTIOU-1</cas:proxyGrantingTicket>
+        </cas:authenticationSuccess>
+    </cas:serviceResponse>""".encode("utf-8"))
+    assert response.user == "20230001" and response.proxy_granting_ticket == "PGTIOU-1"
+    assert response.attributes == {"cas:cn": "张三", "cas:memberOf": ["cn=students", "cn=finance", "cn=lab"],
+                                   "mail": "zs@swufe.edu.cn", "cas:isFromNewLogin": "true"}
+
+def test_parse_service_response_errors():
+    with pytest.raises(CASAuthenticationFailure) as failure:
+        parse_service_response(b"""<cas:serviceResponse xmlns:cas='http://www.yale.edu/tp/cas'>
+            <cas:authenticationFailure code="INVALID_SERVICE">Ticket ST-1 does not match service</cas:authenticationFailure>
+        </cas:serviceResponse>""")
+    assert failure.value.code == "INVALID_SERVICE" and failure.value.message == "Ticket ST-1 does not match service"
+    for content in (b"<html><body>Login</body></html>", b"<cas:serviceResponse><cas:authenticationSuccess>",
+                    b"<cas:serviceResponse xmlns:cas='x'><cas:authenticationSuccess/></cas:serviceResponse>"):
+        with pytest.raises(CASProtocolError):
+            parse_service_response(content)
+
+    # Incremental feeding gives the same result as one buffer
+    document = b"<cas:serviceResponse xmlns:cas='x'><cas:authenticationSuccess><cas:user>u1</cas:user>" \
+               b"<cas:attributes><cas:mail>u1@x</cas:mail></cas:attributes></cas:authenticationSuccess></cas:serviceResponse>"
+    parser = ServiceResponseParser()
+    for i in range(0, len(document), 7):
+        parser.feed(document[i:i + 7])
+    assert parser.result() == parse_service_response(document)
+
+@pytest.mark.asyncio
+async def test_cas_validate_raises_structured_errors():
+    server, url = start_stub_cas()
+    try:
+        client = CASClient(url)
+        with pytest.raises(CASAuthenticationFailure) as failure:
+            await client.validate("bogus", "http://service")
+        assert failure.value.code == "INVALID_TICKET"
+        # Not a CAS server: 404 on both validation paths, then JSON instead of XML
+        upstream, upstream_url = start_stub_upstream()
+        with pytest.raises(CASProtocolError) as error:
+            await CASClient(upstream_url).validate("ST-u1", "http://service")
+        assert error.value.code == "HTTP_ERROR"
+        with pytest.raises(CASProtocolError) as error:
+            await CASClient(upstream_url + "/echo").validate("ST-u1", "http://service")
+        assert error.value.code == "INVALID_RESPONSE"
+        upstream.shutdown()
+    finally:
+        server.shutdown()
+        server.server_close()
+    with pytest.raises(CASUnavailable):
+        await client.validate("ST-u1", "http://service")
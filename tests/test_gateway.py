@@ -0,0 +1,99 @@
+import socket
+import threading
+import time
+from datetime import date, timedelta
+
+import httpx
+import pytest
+import uvicorn
+
+from backend.main import app
+from backend.models import Application, Resource
+from backend.core.gateway import KEY_PREFIX
+from benchmarks.stub_upstream import start_stub_upstream
+
+@pytest.fixture(name="upstream")
+def upstream_fixture():
+    server, url = start_stub_upstream()
+    yield server, url
+    server.shutdown()
+
+def _approved_key(client, session, user, upstream_url, valid_until=date(2030, 1, 1)):
+    res = Resource(name="LLM", category="API", auth_type="API_GATEWAY", form_schema={}, valid_until=valid_until,
+                   config={"upstream_url": upstream_url, "upstream_key": "sk-upstream"})
+    session.add(res)
+    session.commit()
+    app_obj = Application(user_id=user.id, resource_id=res.id, status="PENDING")
+    session.add(app_obj)
+    session.commit()
+    assert client.post(f"/admin/approve/{app_obj.id}", follow_redirects=False).status_code == 303
+    session.refresh(app_obj)
+    return res, app_obj, app_obj.auth_output["api_key"]
+
+def test_proxy_forwards_request_and_swaps_credentials(client, session, admin_user, admin_headers, upstream):
+    res, _, key = _approved_key(client, session, admin_user, upstream[1] + "/echo")
+    assert key.startswith(KEY_PREFIX)
+
+    response = client.post(f"/api/v1/proxy/{res.id}/v1/chat/completions?stream=false", content=b'{"model": "x"}',
+                           headers={"Authorization": f"Bearer {key}", "Content-Type": "application/json",
+                                    "Cookie": "user_id=1"})
+    assert response.status_code == 200
+    echoed = response.json()
+    assert (echoed["method"], echoed["path"], echoed["query"]) == ("POST", "/echo/v1/chat/completions", "stream=false")
+    assert echoed["body"] == '{"model": "x"}'
+    # The downstream key and portal cookies stay here; the upstream sees its own key
+    assert echoed["headers"]["authorization"] == "Bearer sk-upstream"
+    assert "cookie" not in echoed["headers"]
+    assert echoed["headers"]["x-forwarded-for"]
+
+    assert client.get(f"/api/v1/proxy/{res.id}/models", headers={"X-API-Key": key}).json()["path"] == "/echo/models"
+
+def test_proxy_rejects_missing_revoked_and_expired_keys(client, session, admin_user, admin_headers, upstream):
+    res, app_obj, key = _approved_key(client, session, admin_user, upstream[1] + "/echo")
+    assert client.get(f"/api/v1/proxy/{res.id}/models").status_code == 401
+    assert client.get(f"/api/v1/proxy/{res.id}/models", headers={"X-API-Key": KEY_PREFIX + "nope"}).status_code == 401
+    assert client.get(f"/api/v1/proxy/{res.id + 1}/models", headers={"X-API-Key": key}).status_code == 401
+
+    assert client.get(f"/api/v1/proxy/{res.id}/models", headers={"X-API-Key": key}).status_code == 200
+    client.post(f"/admin/applications/{app_obj.id}/revoke", follow_redirects=False)
+    assert client.get(f"/api/v1/proxy/{res.id}/models", headers={"X-API-Key": key}).status_code == 401
+
+    expired, _, expired_key = _approved_key(client, session, admin_user, upstream[1] + "/echo",
+                                            valid_until=date.today() - timedelta(days=1))
+    assert client.get(f"/api/v1/proxy/{expired.id}/models", headers={"X-API-Key": expired_key}).status_code == 401
+
+def test_upstream_unreachable_is_502(client, session, admin_user, admin_headers):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    res, _, key = _approved_key(client, session, admin_user, f"http://127.0.0.1:{port}")
+    assert client.get(f"/api/v1/proxy/{res.id}/models", headers={"X-API-Key": key}).status_code == 502
+
+def test_sse_is_streamed_without_buffering(client, session, admin_user, admin_headers, upstream):
+    server, url = upstream
+    res, _, key = _approved_key(client, session, admin_user, url)
+    server.gate = threading.Event()
+
+    # A real server: the in-process test client collects whole bodies
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    gateway = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, lifespan="off", log_level="warning"))
+    thread = threading.Thread(target=gateway.run, daemon=True)
+    thread.start()
+    while not gateway.started:
+        time.sleep(0.01)
+    try:
+        with httpx.stream("GET", f"http://127.0.0.1:{port}/api/v1/proxy/{res.id}/sse?events=3",
+                          headers={"X-API-Key": key}, timeout=10) as response:
+            assert response.headers["content-type"] == "text/event-stream"
+            lines = response.iter_lines()
+            # The first event arrives while the upstream is still holding the rest back
+            assert next(lines) == 'data: {"index": 0}'
+            server.gate.set()
+            events = [line for line in lines if line]
+        assert events == ['data: {"index": 1}', 'data: {"index": 2}']
+    finally:
+        server.gate.set()
+        gateway.should_exit = True
+        thread.join(5)
@@ -0,0 +1,92 @@
+import json
+import pytest
+from types import MappingProxyType
+from backend.core import i18n
+from backend.core.i18n import TABLES, TRANSLATORS, build_tables, validate_translations, _find_duplicate_keys
+
+def test_builtin_tables_have_no_duplicates():
+    assert _find_duplicate_keys() == {}
+
+def test_tables_are_immutable():
+    assert isinstance(TABLES["zh"], MappingProxyType)
+    with pytest.raises(TypeError):
+        TABLES["zh"]["Logout"] = "x"
+
+def test_prebuilt_translator_fallback():
+    _ = TRANSLATORS["zh"]
+    assert _("Logout") == "退出登录"
+    assert _("Not a real key") == "Not a real key"
+    assert TRANSLATORS["zh"] is _
+
+def test_validate_flags_missing_and_duplicates(tmp_path):
+    (tmp_path / "zh.json").write_text('{"Hello": "你好", "Hello": "您好", "Bye": "再见"}', encoding="utf-8")
+    (tmp_path / "en.json").write_text(json.dumps({"Hello": "Hello"}), encoding="utf-8")
+
+    duplicates = {}
+    catalogs = i18n.load_catalogs(str(tmp_path), duplicates)
+    assert catalogs["zh"]["Hello"] == "您好"
+
+    report = validate_translations(catalogs, duplicates)
+    assert report["duplicates"] == {"zh": ["Hello"]}
+    assert report["missing"] == {"en": ["Bye"]}
+
+def test_loaded_catalog_duplicates_are_reported(tmp_path):
+    (tmp_path / "en.json").write_text('{"Login": "Log in", "Login": "Sign in"}', encoding="utf-8")
+    try:
+        i18n.reload_translations(str(tmp_path))
+        assert i18n.TABLES["en"]["Login"] == "Sign in"
+        assert validate_translations()["duplicates"] == {"en": ["Login"]}
+    finally:
+        i18n.reload_translations()
+    assert validate_translations()["duplicates"] == {}
+
+def test_disk_catalog_overrides_builtin(tmp_path):
+    (tmp_path / "en.json").write_text(json.dumps({"Logout": "Sign out"}), encoding="utf-8")
+    tables = build_tables(str(tmp_path))
+    assert tables["en"]["Logout"] == "Sign out"
+    assert tables["zh"]["Logout"] == "退出登录"
+
+def test_language_cookie(client):
+    zh_title = TABLES["zh"]["Experimental Teaching Resource Authorization Platform"]
+
+    client.cookies.set("lang", "en")
+    response = client.get("/login")
+    assert response.status_code == 200
+    assert zh_title not in response.text
+
+    # Unknown languages fall back to zh
+    client.cookies.set("lang", "fr")
+    response = client.get("/login")
+    assert zh_title in response.text
+
+def test_parse_accept_language_orders_by_q():
+    header = "en;q=0.5, zh-CN, fr;q=0.8, de;q=0"
+    assert i18n.parse_accept_language(header) == ("zh-cn", "fr", "en")
+    # Ties keep header order; extra params are tolerated
+    assert i18n.parse_accept_language("fr;level=1;q=0.7, en;q=0.7") == ("fr", "en")
+
+def test_negotiate_language_fallback_order():
+    assert i18n.negotiate_language("fr, en-US;q=0.9, zh;q=0.8") == "en"
+    assert i18n.negotiate_language("zh-TW;q=0.3, en;q=0.2") == "zh"
+    assert i18n.negotiate_language("fr, *;q=0.1") == "zh"
+    assert i18n.negotiate_language("fr, de") is None
+    assert i18n.negotiate_language("en;q=0, zh;q=0.1") == "zh"
+
+def test_accept_language_header_and_cookie_precedence(client):
+    zh_title = TABLES["zh"]["Experimental Teaching Resource Authorization Platform"]
+
+    response = client.get("/login", headers={"Accept-Language": "en-US,en;q=0.9,zh;q=0.5"})
+    assert zh_title not in response.text
+
+    # Explicit cookie choice wins over the browser header
+    client.cookies.set("lang", "zh")
+    response = client.get("/login", headers={"Accept-Language": "en-US"})
+    assert zh_title in response.text
+
+def test_negotiated_pages_vary_by_language(client):
+    response = client.get("/login", headers={"Accept-Language": "en"})
+    assert response.headers["vary"] == "Accept-Language, Cookie"
+    client.cookies.set("lang", "en")
+    assert client.get("/login").headers["vary"] == "Cookie"
+    # Pages that are not translated are left alone
+    assert "vary" not in client.get("/").headers
@@ -0,0 +1,30 @@
+import pytest
+from backend.core.cas_client import CASClient
+from benchmarks.stub_cas import start_stub_cas
+from benchmarks.loadtest import percentile
+from benchmarks.compare import compare
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile(values, 99) == 99
+    assert percentile([], 50) == 0.0
+
+def test_compare_direction():
+    base = {"scenarios": {"catalog": {"rps": 100, "p95_ms": 20}}}
+    head = {"scenarios": {"catalog": {"rps": 150, "p95_ms": 10}}}
+    result = compare(base, head)["catalog"]
+    assert result["rps"]["improvement"] == pytest.approx(0.5)
+    assert result["p95_ms"]["improvement"] == pytest.approx(0.5)
+
+@pytest.mark.asyncio
+async def test_stub_cas_validates_tickets():
+    server, url = start_stub_cas()
+    try:
+        client = CASClient(url)
+        user_data = await client.validate_ticket("ST-20230001", "http://service")
+        assert user_data["user"] == "20230001"
+        assert await client.validate_ticket("bogus", "http://service") is None
+    finally:
+        server.shutdown()
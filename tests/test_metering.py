@@ -0,0 +1,165 @@
+import gzip
+import json
+import os
+import shutil
+import subprocess
+import sys
+import textwrap
+from datetime import date
+
+import pytest
+from sqlmodel import SQLModel, Session, create_engine, select
+
+from backend.models import Application, MeterJournal, Resource, TokenUsage, User
+from backend.core.gateway import Grant
+from backend.core.metering import TokenMeter, UsageParser, token_meter
+from benchmarks.stub_upstream import start_stub_upstream
+from tests.conftest import engine
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _feed(parser, body: bytes, step: int = 7) -> int:
+    for i in range(0, len(body), step):
+        parser.feed(body[i:i + step])
+    return parser.tokens
+
+def test_usage_parser_reads_json_sse_and_compressed_bodies():
+    body = json.dumps({"choices": [], "usage": {"prompt_tokens": 12, "completion_tokens": 30, "total_tokens": 42}})
+    assert _feed(UsageParser("application/json"), body.encode()) == 42
+    assert _feed(UsageParser("application/json", "gzip"), gzip.compress(body.encode())) == 42
+
+    openai = "".join(f"data: {json.dumps(event)}\n\n" for event in [
+        {"choices": [{"delta": {"content": "hi"}}]},
+        {"choices": [], "usage": {"prompt_tokens": 5, "completion_tokens": 2, "total_tokens": 7}},
+    ]) + "data: [DONE]\n\n"
+    assert _feed(UsageParser("text/event-stream; charset=utf-8"), openai.encode()) == 7
+
+    anthropic = "".join(f"event: {kind}\ndata: {json.dumps(event)}\n\n" for kind, event in [
+        ("message_start", {"type": "message_start", "message": {"usage": {"input_tokens": 25, "output_tokens": 1}}}),
+        ("content_block_delta", {"type": "content_block_delta", "delta": {"text": "usage"}}),
+        ("message_delta", {"type": "message_delta", "usage": {"output_tokens": 15}}),
+    ])
+    assert _feed(UsageParser("text/event-stream"), anthropic.encode()) == 40
+    assert _feed(UsageParser("application/json"), b'{"data": []}') == 0
+
+def test_proxy_charges_usage_and_refuses_exhausted_quota(client, session, admin_user, admin_headers):
+    server, url = start_stub_upstream()
+    try:
+        res = Resource(name="LLM", category="API", auth_type="API_GATEWAY", form_schema={}, valid_until=date(2030, 1, 1),
+                       config={"upstream_url": url, "quota": 60})
+        session.add(res)
+        session.commit()
+        app_obj = Application(user_id=admin_user.id, resource_id=res.id, status="PENDING")
+        session.add(app_obj)
+        session.commit()
+        client.post(f"/admin/approve/{app_obj.id}", follow_redirects=False)
+        session.refresh(app_obj)
+        headers = {"X-API-Key": app_obj.auth_output["api_key"]}
+        completions = f"/api/v1/proxy/{res.id}/v1/chat/completions"
+
+        # 26 tokens per call; a call is let through while anything is left
+        assert client.post(completions, json={"max_tokens": 16}, headers=headers).json()["usage"]["total_tokens"] == 26
+        streamed = client.post(completions, json={"max_tokens": 16, "stream": True}, headers=headers)
+        assert streamed.status_code == 200 and streamed.text.endswith("data: [DONE]\n\n")
+        assert token_meter.used(app_obj.id) == 52
+        assert client.post(completions, json={"max_tokens": 16}, headers=headers).status_code == 200
+        response = client.post(completions, json={"max_tokens": 16}, headers=headers)
+        assert response.status_code == 402
+
+        assert token_meter.flush(engine) == 1
+        session.expire_all()
+        assert session.get(TokenUsage, app_obj.id).used == 78
+        assert token_meter.used(app_obj.id) == 78
+    finally:
+        server.shutdown()
+
+@pytest.fixture(name="file_engine")
+def file_engine_fixture(tmp_path):
+    file_engine = create_engine(f"sqlite:///{tmp_path / 'meter.db'}", connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(file_engine)
+    with Session(file_engine) as session:
+        user = User(swufe_uid="u", name="U", email="", department="x", password_hash="x")
+        res = Resource(name="LLM", category="API", auth_type="API_GATEWAY", form_schema={}, config={"quota": 1000})
+        session.add(user)
+        session.add(res)
+        session.commit()
+        session.add(Application(user_id=user.id, resource_id=res.id, status="APPROVED"))
+        session.commit()
+    return file_engine
+
+def _used(file_engine, application_id=1):
+    with Session(file_engine) as session:
+        return session.exec(select(TokenUsage.used).where(TokenUsage.application_id == application_id)).first()
+
+def test_no_usage_lost_across_graceful_restart(tmp_path, file_engine):
+    grant = Grant(1, 1, 1, None, 1000)
+    journals = tmp_path / "metering"
+
+    meter = TokenMeter(flush_interval=3600)
+    meter.start(file_engine, str(journals))
+    for _ in range(100):
+        meter.record(grant, 7)
+    meter.stop()
+    assert _used(file_engine) == 700
+    assert os.listdir(journals) == []
+
+    restarted = TokenMeter(flush_interval=3600)
+    restarted.start(file_engine, str(journals))
+    with Session(file_engine) as session:
+        restarted.load(session, 1)
+    assert restarted.remaining(grant) == 300
+    restarted.record(grant, 50)
+    restarted.stop()
+    assert _used(file_engine) == 750
+
+def test_killed_worker_journal_is_replayed_exactly_once(tmp_path, file_engine):
+    journals = tmp_path / "metering"
+    # A worker that charges usage and dies before any flush
+    script = textwrap.dedent(f"""
+        import os
+        from sqlmodel import create_engine
+        from backend.core.gateway import Grant
+        from backend.core.metering import TokenMeter
+        meter = TokenMeter(flush_interval=3600)
+        meter.start(create_engine({str(file_engine.url)!r}), {str(journals)!r})
+        for _ in range(40):
+            meter.record(Grant(1, 1, 1, None, 1000), 5)
+        os._exit(1)
+    """)
+    subprocess.run([sys.executable, "-c", script], cwd=ROOT, check=False)
+    assert _used(file_engine) is None
+    journal, = os.listdir(journals)
+    shutil.copy(journals / journal, tmp_path / journal)
+
+    meter = TokenMeter(flush_interval=3600)
+    meter.start(file_engine, str(journals))
+    meter.stop()
+    assert _used(file_engine) == 200
+
+    # Crash between applying a journal and deleting it: the copy is not counted again
+    shutil.copy(tmp_path / journal, journals / journal)
+    meter.start(file_engine, str(journals))
+    meter.stop()
+    assert _used(file_engine) == 200
+    assert os.listdir(journals) == []
+    with Session(file_engine) as session:
+        assert session.get(MeterJournal, journal) is not None
+
+def test_failed_read_back_does_not_charge_twice(tmp_path, file_engine, monkeypatch):
+    grant = Grant(1, 1, 1, None, 1000)
+    meter = TokenMeter(flush_interval=3600)
+    meter.start(file_engine, str(tmp_path / "metering"))
+    with Session(file_engine) as session:
+        meter.load(session, 1)
+    meter.record(grant, 30)
+
+    def broken(session, application_ids):
+        raise RuntimeError("database went away")
+
+    with monkeypatch.context() as patched:
+        patched.setattr("backend.core.metering._totals", broken)
+        assert meter.flush() == 1
+        assert meter.used(1) == 30
+    meter.stop()
+    assert _used(file_engine) == 30
+    assert meter.used(1) == 30
@@ -0,0 +1,75 @@
+from datetime import datetime
+from backend.models import Resource, Application
+from backend.core import metrics
+from backend.core.metrics import Registry, REGISTRY
+
+def test_histogram_exposition():
+    registry = Registry()
+    h = registry.histogram("demo_seconds", "Demo.", ("route",), buckets=(0.1, 1.0))
+    h.observe(0.05, route="/a")
+    h.observe(0.5, route="/a")
+    h.observe(5, route="/a")
+    text = registry.render()
+    assert "# TYPE demo_seconds histogram" in text
+    assert 'demo_seconds_bucket{route="/a",le="0.1"} 1' in text
+    assert 'demo_seconds_bucket{route="/a",le="1"} 2' in text
+    assert 'demo_seconds_bucket{route="/a",le="+Inf"} 3' in text
+    assert 'demo_seconds_count{route="/a"} 3' in text
+
+def test_request_latency_and_db_queries_recorded(client, session, test_user, auth_headers):
+    before = metrics.HTTP_REQUEST_DURATION.count(method="GET", route="/resource", status=200)
+    db_before = metrics.HTTP_REQUEST_DB_QUERIES.sum(route="/resource")
+
+    response = client.get("/resource")
+    assert response.status_code == 200
+
+    assert metrics.HTTP_REQUEST_DURATION.count(method="GET", route="/resource", status=200) == before + 1
+    # At least the resource list and the application overlay queries
+    assert metrics.HTTP_REQUEST_DB_QUERIES.sum(route="/resource") >= db_before + 2
+
+def test_download_stream_metrics(client, session, test_user, auth_headers, tmp_path):
+    content_dir = tmp_path / "content"
+    content_dir.mkdir()
+    (content_dir / "a.txt").write_text("x" * 1000)
+    res = Resource(name="DL", category="Software", auth_type="AUTO_ZIP", form_schema={}, config={"root_path": str(content_dir)})
+    session.add(res)
+    session.commit()
+    session.add(Application(user_id=test_user.id, resource_id=res.id, status="APPROVED", approved_at=datetime.now()))
+    session.commit()
+
+    bytes_before = metrics.WATERMARK_BYTES.value()
+    response = client.get(f"/resources/{res.id}/download")
+    assert response.status_code == 200
+    assert metrics.WATERMARK_BYTES.value() == bytes_before + len(response.content)
+    assert metrics.WATERMARK_ACTIVE_STREAMS.value() == 0
+
+def test_metrics_endpoint_requires_admin(client, session, test_user, auth_headers):
+    response = client.get("/metrics")
+    assert response.status_code == 403
+
+def test_metrics_endpoint_for_admin(client, session, admin_user, admin_headers):
+    client.get("/login")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'etrap_http_request_duration_seconds_count{method="GET",route="/login",status="200"}' in response.text
+    assert "etrap_db_queries_total" in response.text
+
+def test_metrics_bearer_token(client, monkeypatch):
+    from backend import config
+    monkeypatch.setattr(config, "METRICS_TOKEN", "secret")
+    assert client.get("/metrics").status_code == 403
+    assert client.get("/metrics", headers={"Authorization": "Bearer secret"}).status_code == 200
+
+def test_cas_validation_latency_recorded():
+    import asyncio
+    from backend.core.cas_client import CASClient
+    from benchmarks.stub_cas import start_stub_cas
+
+    server, url = start_stub_cas()
+    try:
+        before = metrics.CAS_VALIDATION_DURATION.count(outcome="success")
+        assert asyncio.run(CASClient(url).validate_ticket("ST-u1", "http://svc"))["user"] == "u1"
+        assert metrics.CAS_VALIDATION_DURATION.count(outcome="success") == before + 1
+    finally:
+        server.shutdown()
@@ -0,0 +1,135 @@
+from datetime import date, datetime, timedelta
+from email import message_from_bytes, policy
+
+import pytest
+from sqlmodel import select
+
+from backend.models import Application, Notification, Resource
+from backend.core.notifications import HTTPChannel, NotificationDispatcher, SMTPChannel, notification_dispatcher
+from benchmarks.stub_smtp import start_stub_smtp
+from benchmarks.stub_upstream import start_stub_upstream
+from tests.conftest import engine
+
+@pytest.fixture(name="stubs")
+def stubs_fixture():
+    smtp, smtp_port = start_stub_smtp()
+    sms, sms_url = start_stub_upstream()
+    channels = {"email": SMTPChannel("127.0.0.1", smtp_port, "etrap@swufe.edu.cn"),
+                "sms": HTTPChannel(sms_url + "/echo/sms")}
+    yield smtp, sms, channels
+    for channel in channels.values():
+        channel.close()
+    smtp.shutdown()
+    sms.shutdown()
+
+def _pending(session, users, name="GPU Cluster"):
+    res = Resource(name=name, category="Compute", auth_type="MANUAL", form_schema={}, config={},
+                   valid_until=date(2030, 1, 1))
+    session.add(res)
+    session.commit()
+    apps = [Application(user_id=user.id, resource_id=res.id, status="PENDING") for user in users]
+    session.add_all(apps)
+    session.commit()
+    return res, apps
+
+def _outbox(session):
+    session.expire_all()
+    return session.exec(select(Notification).order_by(Notification.id)).all()
+
+def test_reviews_queue_notifications_with_the_status_change(client, session, test_user, admin_user, admin_headers,
+                                                            stubs, monkeypatch):
+    smtp, sms, channels = stubs
+    _, (approved, rejected) = _pending(session, [test_user, admin_user])
+
+    # No channel configured: nothing is queued
+    client.post(f"/admin/approve/{approved.id}", follow_redirects=False)
+    assert _outbox(session) == []
+
+    monkeypatch.setattr(notification_dispatcher, "channels", channels)
+    client.post(f"/admin/approve/{approved.id}", follow_redirects=False)
+    client.post(f"/admin/reject/{rejected.id}", data={"reason": "Missing course code"}, follow_redirects=False)
+    rows = _outbox(session)
+    assert [(n.channel, n.recipient, n.application_id, n.status) for n in rows] == [
+        ("email", "test@swufe.edu.cn", approved.id, "PENDING"), ("sms", "13800000000", approved.id, "PENDING"),
+        ("email", "admin@swufe.edu.cn", rejected.id, "PENDING"), ("sms", "13800000001", rejected.id, "PENDING")]
+    assert "GPU Cluster" in rows[0].subject and "Missing course code" in rows[2].body
+
+    # A refused request leaves no notification behind
+    assert client.post(f"/admin/reject/{approved.id}", data={"reason": " "}).status_code == 400
+    assert len(_outbox(session)) == 4
+
+    dispatcher = NotificationDispatcher(channels)
+    assert dispatcher.dispatch(engine) == 4
+    assert all(n.status == "SENT" and n.attempts == 1 and n.sent_at for n in _outbox(session))
+    assert [m[1] for m in smtp.messages] == [["test@swufe.edu.cn"], ["admin@swufe.edu.cn"]]
+    mail = message_from_bytes(smtp.messages[0][2], policy=policy.default)
+    assert mail["Subject"] == rows[0].subject and mail.get_content().strip() == rows[0].body
+    # One gateway request per batch
+    assert sms.received == ["/echo/sms"]
+    assert dispatcher.dispatch(engine) == 0
+
+def test_bulk_review_batches_over_one_connection(client, session, test_user, admin_headers, stubs, monkeypatch):
+    smtp, sms, channels = stubs
+    monkeypatch.setattr(notification_dispatcher, "channels", {"email": channels["email"]})
+    _, apps = _pending(session, [test_user] * 25)
+    response = client.post("/admin/applications/bulk", data={"action": "approve", "ids": [a.id for a in apps]})
+    assert response.json()["updated"] == 25
+    assert len(_outbox(session)) == 25
+
+    dispatcher = NotificationDispatcher({"email": channels["email"]}, batch_size=10)
+    assert [dispatcher.dispatch(engine) for _ in range(4)] == [10, 10, 5, 0]
+    assert len(smtp.messages) == 25 and smtp.connections == 1
+
+def test_failures_are_retried_with_backoff_then_given_up(session, test_user, stubs):
+    smtp, sms, channels = stubs
+    _, (app,) = _pending(session, [test_user])
+    now = datetime.now()
+    session.add_all([
+        Notification(channel="email", recipient="test@swufe.edu.cn", subject="s", body="b", application_id=app.id),
+        Notification(channel="email", recipient="gone@swufe.edu.cn", subject="s", body="b", application_id=app.id),
+        Notification(channel="sms", recipient="13800000000", body="b", application_id=app.id),
+    ])
+    session.commit()
+    smtp.reject.add("gone@swufe.edu.cn")
+    smtp.fail_code = 451
+    sms.fail_status = 503
+    dispatcher = NotificationDispatcher(channels, max_attempts=3, retry_base=60, retry_max=120)
+
+    assert dispatcher.dispatch(engine) == 3
+    retried, refused, text = _outbox(session)
+    # 5xx recipient refusal is permanent; the rest wait 30-60s (first backoff step, jittered)
+    assert refused.status == "FAILED" and refused.last_error.startswith("550")
+    for row in (retried, text):
+        assert row.status == "PENDING" and row.attempts == 1
+        assert now + timedelta(seconds=29) <= row.next_attempt_at <= now + timedelta(seconds=61)
+    assert retried.last_error.startswith("451") and text.last_error.startswith("HTTP 503")
+    # Not due yet
+    assert dispatcher.dispatch(engine) == 0
+
+    smtp.fail_code = None
+    session.add(retried)
+    retried.next_attempt_at = datetime.now()
+    session.commit()
+    assert dispatcher.dispatch(engine) == 1
+    assert _outbox(session)[0].status == "SENT" and len(smtp.messages) == 1
+
+    # Out of attempts: the third failure is final
+    for _ in range(2):
+        row = _outbox(session)[2]
+        row.next_attempt_at = datetime.now()
+        session.add(row)
+        session.commit()
+        assert dispatcher.dispatch(engine) == 1
+    text = _outbox(session)[2]
+    assert text.status == "FAILED" and text.attempts == 3 and len(sms.received) == 3
+
+def test_claimed_rows_are_leased_to_one_dispatcher(session, test_user):
+    _, (app,) = _pending(session, [test_user])
+    session.add_all([Notification(channel="email", recipient=f"u{i}@swufe.edu.cn", body="b", application_id=app.id)
+                     for i in range(5)])
+    session.commit()
+    first, second = NotificationDispatcher(batch_size=3), NotificationDispatcher(batch_size=3)
+    claimed = first._claim(engine, "email") + second._claim(engine, "email") + second._claim(engine, "email")
+    assert sorted(m.id for m in claimed) == [n.id for n in _outbox(session)]
+    # Until the lease runs out (the claiming worker died), nobody else gets them
+    assert first._claim(engine, "sms") == []
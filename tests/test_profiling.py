@@ -0,0 +1,86 @@
+import json
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+from backend import config
+from backend.core import profiling
+from backend.core.profiling import ProfilingMiddleware, issue_token, verify_token
+from backend.models import User
+from tests.conftest import engine
+
+@pytest.fixture(name="profile_dir")
+def profile_dir_fixture(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "PROFILE_DIR", str(tmp_path))
+    return tmp_path
+
+def _profiled_app():
+    app = FastAPI()
+
+    @app.get("/admin/slow")
+    def slow():
+        with Session(engine) as session:
+            session.exec(select(User)).all()
+        return {"ok": True}
+
+    return ProfilingMiddleware(app, sample_rate=0.0, paths=("/admin",))
+
+def test_token_roundtrip(monkeypatch):
+    token = issue_token(1)
+    assert verify_token(token)
+    assert not verify_token(token[:-1] + ("0" if token[-1] != "0" else "1"))
+    assert not verify_token(issue_token(1, ttl=-10))
+    assert not verify_token("garbage")
+
+def test_production_profiling_needs_a_real_secret(monkeypatch):
+    monkeypatch.setattr(config, "PROFILING_ENABLED", True)
+    monkeypatch.setattr(config, "IS_PRODUCTION", True)
+    with pytest.raises(RuntimeError):
+        profiling.check_settings()
+    monkeypatch.setattr(config, "SECRET_KEY", "s3cret")
+    profiling.check_settings()
+
+def test_untriggered_request_not_profiled(session, profile_dir):
+    client = TestClient(_profiled_app())
+    response = client.get("/admin/slow")
+    assert response.status_code == 200
+    assert "x-profile-id" not in response.headers
+    assert list(profile_dir.iterdir()) == []
+
+def test_token_triggers_profile_with_sql(session, profile_dir):
+    client = TestClient(_profiled_app())
+    response = client.get("/admin/slow", headers={"X-Profile-Token": issue_token(1)})
+    profile_id = response.headers["x-profile-id"]
+
+    report = json.loads((profile_dir / f"{profile_id}.json").read_text())
+    assert report["path"] == "/admin/slow"
+    assert report["status"] == 200
+    assert report["sql_count"] >= 1
+    assert "FROM user" in report["sql"][0]["statement"]
+    # Stacks come from every thread; the report says how many requests could have mixed in
+    assert report["stack_scope"] == "process" and report["concurrent_requests_max"] >= 0
+
+    response = client.get(f"/admin/slow?_profile={issue_token(1)}")
+    assert "x-profile-id" in response.headers
+    assert profiling.list_reports()[0]["id"] == response.headers["x-profile-id"]
+
+def test_sampling_rate(session, profile_dir):
+    inner = _profiled_app().app
+    client = TestClient(ProfilingMiddleware(inner, sample_rate=1.0, paths=("/admin",)))
+    response = client.get("/admin/slow")
+    assert response.headers.get("x-profile-id")
+    assert profiling.list_reports()[0]["trigger"] == "sample"
+
+def test_admin_profiles_page_and_download(client, session, admin_user, admin_headers, profile_dir):
+    TestClient(_profiled_app()).get("/admin/slow", headers={"X-Profile-Token": issue_token(admin_user.id)})
+    profile_id = profiling.list_reports()[0]["id"]
+
+    response = client.get("/admin/profiles")
+    assert response.status_code == 200
+    assert profile_id in response.text
+
+    response = client.get(f"/admin/profiles/{profile_id}")
+    assert response.status_code == 200
+    assert response.json()["id"] == profile_id
+
+    assert client.get("/admin/profiles/..%2F..%2Fetc").status_code == 404
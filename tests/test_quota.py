@@ -0,0 +1,146 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+from fastapi import Request
+from fastapi.testclient import TestClient
+from sqlmodel import SQLModel, Session, create_engine, select, func
+
+from backend.main import app
+from backend.auth import require_profile_completion
+from backend.database import get_session
+from backend.models import Application, Resource, ResourceQuota, User
+from backend.core.bulk_review import bulk_review
+from backend.core.quota import acquire, expire_due, sync_quota
+
+def _resource(session, quota, auth_type="AUTO_ZIP"):
+    res = Resource(name="SAS", category="Software", auth_type=auth_type, form_schema={}, config={"quota": quota},
+                   valid_until=date(2030, 1, 1))
+    session.add(res)
+    session.commit()
+    sync_quota(session, res)
+    session.commit()
+    return res
+
+def _used(session, resource_id):
+    session.expire_all()
+    return session.get(ResourceQuota, resource_id).used
+
+def test_concurrent_applies_never_exceed_quota(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'quota.db'}", connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        resource_id = _resource(session, 25).id
+        session.add_all(User(swufe_uid=f"u{i}", name=f"U{i}", email="u@x.cn", phone="1", department="x",
+                             password_hash="x") for i in range(200))
+        session.commit()
+        users = {u.id: u for u in session.exec(select(User)).all()}
+
+    def get_session_override():
+        with Session(engine) as session:
+            yield session
+
+    def current_user_override(request: Request):
+        return users[int(request.headers["x-user"])]
+
+    app.dependency_overrides[get_session] = get_session_override
+    app.dependency_overrides[require_profile_completion] = current_user_override
+    # No `with`: each request runs on its own event loop thread, so the applies really overlap
+    client = TestClient(app)
+    try:
+        with ThreadPoolExecutor(max_workers=32) as pool:
+            codes = list(pool.map(
+                lambda uid: client.post(f"/resources/{resource_id}/apply", headers={"x-user": str(uid)},
+                                        follow_redirects=False).status_code,
+                users))
+    finally:
+        app.dependency_overrides.clear()
+
+    assert (codes.count(303), codes.count(409)) == (25, 175)
+    with Session(engine) as session:
+        approved = session.exec(select(func.count(Application.id)).where(Application.status == "APPROVED")).one()
+        assert approved == 25
+        assert _used(session, resource_id) == 25
+
+def test_revoke_and_expiry_release_seats(client, session, admin_user, admin_headers):
+    res = _resource(session, 2, auth_type="MANUAL")
+    apps = [Application(user_id=admin_user.id, resource_id=res.id, status="PENDING") for _ in range(3)]
+    session.add_all(apps)
+    session.commit()
+
+    assert client.post(f"/admin/approve/{apps[0].id}", follow_redirects=False).status_code == 303
+    assert client.post(f"/admin/approve/{apps[1].id}", follow_redirects=False).status_code == 303
+    assert client.post(f"/admin/approve/{apps[2].id}", follow_redirects=False).status_code == 409
+    assert _used(session, res.id) == 2
+
+    assert client.post(f"/admin/applications/{apps[0].id}/revoke", follow_redirects=False).status_code == 303
+    assert _used(session, res.id) == 1
+
+    # An approval past its expiry is swept (and its seat freed) when the quota looks full
+    assert client.post(f"/admin/approve/{apps[2].id}", follow_redirects=False).status_code == 303
+    session.get(Application, apps[1].id).expired_at = datetime.now() - timedelta(seconds=1)
+    session.commit()
+    late = Application(user_id=admin_user.id, resource_id=res.id, status="PENDING")
+    session.add(late)
+    session.commit()
+    assert client.post(f"/admin/approve/{late.id}", follow_redirects=False).status_code == 303
+    session.expire_all()
+    assert session.get(Application, apps[1].id).status == "EXPIRED"
+    assert _used(session, res.id) == 2
+
+def test_rejecting_an_approval_releases_its_seat(client, session, admin_user, admin_headers):
+    res = _resource(session, 1, auth_type="MANUAL")
+    apps = [Application(user_id=admin_user.id, resource_id=res.id, status="PENDING") for _ in range(2)]
+    session.add_all(apps)
+    session.commit()
+    assert client.post(f"/admin/approve/{apps[0].id}", follow_redirects=False).status_code == 303
+    assert client.post(f"/admin/reject/{apps[0].id}", data={"reason": "Left the lab"},
+                       follow_redirects=False).status_code == 303
+    assert _used(session, res.id) == 0
+    # Rejecting a pending application has no seat to give back
+    assert client.post(f"/admin/reject/{apps[1].id}", data={"reason": "No"}, follow_redirects=False).status_code == 303
+    assert _used(session, res.id) == 0
+
+def test_bulk_approve_fills_remaining_seats(session, admin_user):
+    res = _resource(session, 3, auth_type="MANUAL")
+    apps = [Application(user_id=admin_user.id, resource_id=res.id, status="PENDING") for _ in range(5)]
+    session.add_all(apps)
+    session.commit()
+    ids = [app.id for app in apps]
+
+    result = bulk_review(session, "approve", admin_id=admin_user.id, ids=ids)
+    session.commit()
+    assert result.as_dict()["ids"] == ids[:3]
+    assert result.failed == [{"id": i, "error": "Resource quota exhausted"} for i in ids[3:]]
+    session.expire_all()
+    assert [session.get(Application, i).status for i in ids] == ["APPROVED"] * 3 + ["PENDING"] * 2
+    assert _used(session, res.id) == 3
+
+    bulk_review(session, "revoke", admin_id=admin_user.id, resource_id=res.id)
+    session.commit()
+    assert _used(session, res.id) == 0
+
+def test_counter_created_lazily_and_recounted(session, admin_user):
+    res = Resource(name="SAS", category="Software", auth_type="MANUAL", form_schema={}, config={"quota": 2})
+    session.add(res)
+    session.commit()
+    session.add(Application(user_id=admin_user.id, resource_id=res.id, status="APPROVED"))
+    session.commit()
+
+    # No counter yet (quota set before counters existed): recount on first use
+    assert acquire(session, res) == 1
+    assert acquire(session, res) == 0
+    session.commit()
+    assert _used(session, res.id) == 2
+
+    res.config = {"quota": 5}
+    sync_quota(session, res)
+    session.commit()
+    assert (session.get(ResourceQuota, res.id).quota, _used(session, res.id)) == (5, 1)
+    assert expire_due(session) == {}
+
+    # API gateway quotas are tokens, not seats
+    res.auth_type = "API_GATEWAY"
+    sync_quota(session, res)
+    session.commit()
+    assert session.get(ResourceQuota, res.id) is None
+    assert acquire(session, res, 10) == 10
@@ -0,0 +1,110 @@
+import threading
+
+import pytest
+
+from backend.core import ratelimit
+from backend.core.metrics import RATE_LIMITED
+from backend.core.ratelimit import Limit, MemoryBackend, RateLimiter, parse_limit
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture(name="limiter", params=["memory", "sqlite"])
+def limiter_fixture(request, tmp_path):
+    clock = Clock()
+    return RateLimiter(request.param, str(tmp_path / "ratelimit.db"), clock=clock), clock
+
+def test_parse_limit():
+    assert parse_limit("30/min") == Limit(30, 60.0, 30)
+    assert parse_limit("5/10s") == Limit(5, 10.0, 5)
+    assert parse_limit(" 10/s, burst=50 ") == Limit(10, 1.0, 50)
+    assert parse_limit("") is None
+    for text in ("30", "0/min", "10/fortnight", "10/s, burst=0"):
+        with pytest.raises(ValueError):
+            parse_limit(text)
+
+def test_burst_then_steady_rate(limiter):
+    limiter, clock = limiter
+    limit = parse_limit("10/s, burst=5")
+    decisions = [limiter.hit("user:1", limit) for _ in range(6)]
+    assert [d.allowed for d in decisions] == [True] * 5 + [False]
+    assert [d.remaining for d in decisions[:5]] == [4, 3, 2, 1, 0]
+    assert decisions[5].retry_after == pytest.approx(0.1)
+    # Other keys have their own bucket
+    assert limiter.hit("user:2", limit).allowed
+
+    clock.now += 0.1
+    assert limiter.hit("user:1", limit).allowed
+    assert not limiter.hit("user:1", limit).allowed
+
+    # Over a second of steady traffic only the refill rate gets through
+    allowed = 0
+    for _ in range(100):
+        clock.now += 0.01
+        allowed += limiter.hit("user:1", limit).allowed
+    assert allowed == 10
+
+    # Idle long enough and the full burst is back, never more
+    clock.now += 60
+    assert sum(limiter.hit("user:1", limit).allowed for _ in range(20)) == 5
+
+def test_weighted_hits_and_reset(limiter):
+    limiter, clock = limiter
+    limit = parse_limit("1/s, burst=4")
+    assert limiter.hit("key", limit, cost=3).allowed
+    refused = limiter.hit("key", limit, cost=3)
+    assert not refused.allowed and refused.retry_after == pytest.approx(2.0)
+    assert not limiter.hit("key", limit, cost=5).allowed
+    limiter.reset("key")
+    assert limiter.hit("key", limit, cost=4).allowed
+
+def test_concurrent_hits_never_exceed_the_burst(limiter):
+    limiter, _ = limiter
+    limit = parse_limit("1/h, burst=50")
+    allowed = []
+
+    def worker():
+        allowed.append(sum(limiter.hit("shared", limit).allowed for _ in range(40)))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sum(allowed) == 50
+
+def test_sqlite_backend_is_shared_between_workers(tmp_path):
+    clock = Clock()
+    path = str(tmp_path / "shared.db")
+    first, second = RateLimiter("sqlite", path, clock=clock), RateLimiter("sqlite", path, clock=clock)
+    limit = parse_limit("10/min")
+    assert sum(first.hit("ip:10.0.0.1", limit).allowed for _ in range(6)) == 6
+    assert sum(second.hit("ip:10.0.0.1", limit).allowed for _ in range(6)) == 4
+
+def test_memory_backend_drops_idle_keys():
+    backend = MemoryBackend(max_keys=100)
+    limit = parse_limit("1/s")
+    for i in range(99):
+        backend.hit(f"k{i}", 0.0, limit, 1)
+    # All earlier buckets have refilled by t=10, so they go when the table fills up
+    backend.hit("late", 10.0, limit, 1)
+    assert len(backend) == 1
+
+def test_routes_answer_429_with_retry_after(client, session, auth_headers, monkeypatch):
+    monkeypatch.setitem(ratelimit.LIMITS, "login", parse_limit("2/min"))
+    before = RATE_LIMITED.value(scope="login")
+    form = {"swufe_uid": "nobody", "password": "wrong"}
+    assert [client.post("/login", data=form).status_code for _ in range(3)] == [400, 400, 429]
+    response = client.post("/login", data=form)
+    assert response.status_code == 429 and 1 <= int(response.headers["retry-after"]) <= 30
+    assert RATE_LIMITED.value(scope="login") == before + 2
+
+    # Per user: checked before the download is even looked up
+    monkeypatch.setitem(ratelimit.LIMITS, "download", parse_limit("2/min"))
+    assert [client.get("/resources/999/download").status_code for _ in range(3)] == [403, 403, 429]
+    monkeypatch.setitem(ratelimit.LIMITS, "download", None)
+    assert client.get("/resources/999/download").status_code == 403
@@ -0,0 +1,139 @@
+import asyncio
+import os
+import socket
+import threading
+import time
+from datetime import date
+
+import httpx
+import pytest
+import uvicorn
+
+from backend.main import app
+from backend.models import Application, Resource
+from backend.core.api_keys import key_index
+from backend.core.response_cache import CachedResponse, ResponseCache, cache_key, policy_for
+from benchmarks.stub_upstream import start_stub_upstream
+
+POLICY = policy_for({"response_cache": {"ttl": 60, "methods": ["GET", "POST"]}})
+
+@pytest.fixture(name="upstream")
+def upstream_fixture():
+    server, url = start_stub_upstream()
+    yield server, url
+    server.shutdown()
+
+def _cached_resource(client, session, users, upstream_url, cache=None):
+    res = Resource(name="Data", category="Data", auth_type="API_GATEWAY", form_schema={}, valid_until=date(2030, 1, 1),
+                   config={"upstream_url": upstream_url, "response_cache": cache or {"ttl": 60, "methods": ["GET", "POST"]}})
+    session.add(res)
+    session.commit()
+    keys = []
+    for user in users:
+        app_obj = Application(user_id=user.id, resource_id=res.id, status="PENDING")
+        session.add(app_obj)
+        session.commit()
+        client.post(f"/admin/approve/{app_obj.id}", follow_redirects=False)
+        session.refresh(app_obj)
+        keys.append({"X-API-Key": app_obj.auth_output["api_key"]})
+    return res, keys
+
+def _entry(body: bytes, ttl: float = 60) -> CachedResponse:
+    now = time.monotonic()
+    return CachedResponse(200, [("content-type", "application/json")], body, now, now + ttl)
+
+def test_keys_normalize_query_order_and_json_bodies():
+    def key(method="GET", query="", headers=None, body=b""):
+        return cache_key(1, method, "v1/query", query, headers or {}, body, POLICY)
+
+    assert key(query="b=2&a=1") == key(query="a=1&b=2") != key(query="a=1&b=3")
+    json_headers = {"content-type": "application/json"}
+    assert key("POST", headers=json_headers, body=b'{"code": "600519", "fields": ["close"]}') == \
+        key("POST", headers=json_headers, body=b'{"fields":["close"],"code":"600519"}')
+    assert key("POST", headers=json_headers, body=b'{"code": "000001"}') != \
+        key("POST", headers=json_headers, body=b'{"code": "600519"}')
+    assert key(headers={"accept": "text/csv"}) != key(headers={"accept": "application/json"})
+    # Headers outside `vary` (user agents, the caller's own key) do not split the cache
+    assert key(headers={"user-agent": "a", "x-api-key": "sk-1"}) == key(headers={"user-agent": "b"})
+    assert cache_key(2, "GET", "v1/query", "", {}, b"", POLICY) != key()
+    assert policy_for({"response_cache": {"ttl": 0}}) is None and policy_for({}) is None
+
+def test_memory_lru_spills_to_disk_and_promotes_back(tmp_path):
+    cache = ResponseCache(memory_bytes=3 * 1536, disk_bytes=2 * 1536, directory=str(tmp_path))
+    for i in range(5):
+        cache.store(f"k{i}", _entry(bytes([i]) * 1024))
+    # Three fit in memory; the two oldest went to disk
+    assert [cache.lookup(f"k{i}") is not None for i in range(5)] == [False, False, True, True, True]
+    assert cache.on_disk("k0") and cache.on_disk("k1")
+    worker_dir, = os.listdir(tmp_path)
+    assert sorted(os.listdir(tmp_path / worker_dir)) == ["k0", "k1"]
+
+    # A disk hit moves back to memory, pushing the least recently used entry out
+    assert cache.load("k0").body == b"\x00" * 1024
+    assert cache.lookup("k0") is not None and not cache.on_disk("k0")
+    assert cache.on_disk("k2") and cache.lookup("k2") is None
+
+    # The disk tier is bounded too: k1 was the oldest there
+    cache.store("k5", _entry(b"5" * 1024))
+    assert not cache.on_disk("k1") and cache.load("k1") is None
+
+    # Expired entries are neither served nor spilled
+    cache.store("old", _entry(b"x", ttl=-1))
+    assert cache.lookup("old") is None
+    cache.close()
+    assert os.listdir(tmp_path) == []
+
+def test_identical_requests_are_served_from_cache(client, session, test_user, admin_user, admin_headers, upstream):
+    server, url = upstream
+    res, (first, second) = _cached_resource(client, session, [test_user, admin_user], url)
+    base = f"/api/v1/proxy/{res.id}"
+
+    miss = client.get(f"{base}/echo/quotes?code=600519&field=close", headers=first)
+    assert miss.headers["x-cache"] == "MISS"
+    # Another student, parameters in another order: same query
+    hit = client.get(f"{base}/echo/quotes?field=close&code=600519", headers=second)
+    assert hit.headers["x-cache"] == "HIT" and hit.json() == miss.json()
+    assert len(server.received) == 1
+
+    assert client.post(f"{base}/echo/query", json={"a": 1, "b": [1, 2]}, headers=first).headers["x-cache"] == "MISS"
+    assert client.post(f"{base}/echo/query", content=b'{"b": [1, 2], "a": 1}',
+                       headers={**second, "content-type": "application/json"}).headers["x-cache"] == "HIT"
+    assert len(server.received) == 2
+
+    # Streams and failures are passed through and not kept
+    for _ in range(2):
+        assert client.get(f"{base}/sse?events=2", headers=first).headers["x-cache"] == "MISS"
+    server.fail_status = 500
+    for _ in range(2):
+        assert client.get(f"{base}/echo/broken", headers=first).status_code == 500
+    assert len(server.received) == 6
+
+def test_concurrent_misses_share_one_upstream_call(client, session, admin_user, admin_headers, upstream):
+    server, url = upstream
+    server.delay = 0.3
+    res, (headers,) = _cached_resource(client, session, [admin_user], url)
+    key_index.refresh(session)
+
+    # A real server: concurrent requests need one event loop
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    gateway = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, lifespan="off", log_level="warning"))
+    thread = threading.Thread(target=gateway.run, daemon=True)
+    thread.start()
+    while not gateway.started:
+        time.sleep(0.01)
+
+    async def burst():
+        async with httpx.AsyncClient(timeout=10) as http:
+            return await asyncio.gather(*(
+                http.get(f"http://127.0.0.1:{port}/api/v1/proxy/{res.id}/echo/report?year=2024", headers=headers)
+                for _ in range(8)))
+    try:
+        responses = asyncio.run(burst())
+    finally:
+        gateway.should_exit = True
+        thread.join(5)
+    assert [r.status_code for r in responses] == [200] * 8
+    assert sorted(r.headers["x-cache"] for r in responses) == ["HIT"] * 7 + ["MISS"]
+    assert len(server.received) == 1
@@ -1,5 +1,14 @@
+import time
 from unittest.mock import AsyncMock, patch
-from backend.models import User
+from fastapi.testclient import TestClient
+from sqlmodel import select
+from backend.main import app
+from backend.auth import get_password_hash
+from backend.models import SSOSession, User
+from backend.core.cas_client import CASClient
+from backend.core.sso_sessions import SessionIndex
+from backend.routers import resources
+from benchmarks.stub_cas import logout_request, start_stub_cas
 
 def test_sso_login_success(client, session):
     # Mock validate_ticket in resources.py (where it is used)
@@ -29,3 +38,100 @@ def test_sso_router_login(client):
     response = client.get("/login/sso", follow_redirects=False)
     assert response.status_code in [302, 303, 307]
     assert "authserver.swufe.edu.cn" in response.headers["location"]
+
+def test_sso_login_against_stub_cas(client, session, monkeypatch):
+    server, url = start_stub_cas()
+    try:
+        monkeypatch.setattr(resources, "cas_client", CASClient(url))
+        response = client.get("/resource?ticket=ST-20230100", follow_redirects=False)
+        # CAS 3.0 released the attributes, so the profile is already complete
+        assert response.status_code == 302 and response.headers["location"] == "/resource"
+        user = session.exec(select(User).where(User.swufe_uid == "20230100")).one()
+        assert (user.name, user.email, user.department) == ("Stub 20230100", "20230100@swufe.edu.cn", "Stub School")
+        assert server.received == ["/p3/serviceValidate"]
+
+        response = client.get("/resource?ticket=bogus", follow_redirects=False)
+        assert response.status_code == 200 and "user_id" not in response.headers.get("set-cookie", "")
+    finally:
+        server.shutdown()
+
+def test_sso_login_falls_back_to_cas_2(client, session, monkeypatch):
+    server, url = start_stub_cas()
+    server.p3 = False
+    try:
+        monkeypatch.setattr(resources, "cas_client", CASClient(url))
+        for uid in ("20230101", "20230102"):
+            response = client.get(f"/resource?ticket=ST-{uid}", follow_redirects=False)
+            # No attributes from CAS 2.0: the student completes the profile
+            assert response.headers["location"] == "/profile/complete"
+        # The 404 is only paid once
+        assert server.received == ["/p3/serviceValidate", "/serviceValidate", "/serviceValidate"]
+    finally:
+        server.shutdown()
+
+def test_cas_single_logout_ends_the_session(client, session, monkeypatch):
+    server, url = start_stub_cas()
+    try:
+        monkeypatch.setattr(resources, "cas_client", CASClient(url))
+        browsers = {}
+        for uid in ("20230200", "20230201"):
+            browsers[uid] = TestClient(app)
+            response = browsers[uid].get(f"/resource?ticket=ST-{uid}", follow_redirects=False)
+            assert any(c.startswith("sso_session=") for c in response.headers.get_list("set-cookie"))
+            assert browsers[uid].get("/profile/complete").status_code == 200
+    finally:
+        server.shutdown()
+
+    # The CAS server reports that the first student logged out
+    response = client.post("/resource", data={"logoutRequest": logout_request("ST-20230200")})
+    assert response.status_code == 200
+    assert browsers["20230200"].get("/profile/complete").status_code == 401
+    assert browsers["20230201"].get("/profile/complete").status_code == 200
+    # A CAS-only account cannot fall back to the plain user cookie
+    browsers["20230200"].cookies.delete("sso_session")
+    assert browsers["20230200"].get("/profile/complete").status_code == 401
+    assert session.exec(select(SSOSession).where(SSOSession.revoked_at != None)).one().user_id == \
+        session.exec(select(User.id).where(User.swufe_uid == "20230200")).one()
+
+    for body in ({"logoutRequest": "<samlp:LogoutRequest/>"}, {"logoutRequest": "not xml"}, {}):
+        assert client.post("/resource", data=body).status_code == 400
+
+    # Logging out here ends the session too
+    assert browsers["20230201"].get("/logout/sso", follow_redirects=False).status_code == 307
+    assert len(session.exec(select(SSOSession).where(SSOSession.revoked_at != None)).all()) == 2
+
+def test_single_logout_reaches_other_workers(session, test_user):
+    here, there = SessionIndex(refresh_interval=60), SessionIndex(refresh_interval=0.05)
+    token = here.open(session, "ST-1", test_user.id)
+    # Opened on another worker since its last refresh: read once, then served from the index
+    assert there.check(session, token, test_user.id) and len(there) == 1
+    assert not there.check(session, token, test_user.id + 1)
+    assert not there.check(session, "forged", test_user.id)
+
+    assert here.end_ticket(session, "ST-1") == 1
+    assert not here.check(session, token, test_user.id)
+    assert here.end_ticket(session, "ST-1") == 0
+    time.sleep(0.06)
+    assert not there.check(session, token, test_user.id) and len(there) == 0
+
+def test_password_login_after_a_cas_session(client, session):
+    admin = User(swufe_uid="root", password_hash=get_password_hash("pw"), name="Root", email="root@swufe.edu.cn",
+                 phone="13800000009", department="IT", role="admin")
+    session.add(admin)
+    session.commit()
+    with patch("backend.routers.resources.cas_client.validate_ticket", new_callable=AsyncMock) as validate:
+        validate.return_value = {"user": "20230300"}
+        client.get("/resource?ticket=ST-20230300", follow_redirects=False)
+    token = client.cookies["sso_session"]
+
+    # Someone else's CAS session left in the browser does not lock out a password account
+    other = TestClient(app, cookies={"user_id": str(admin.id), "sso_session": token})
+    assert other.get("/profile/complete").status_code == 200
+
+    response = client.get("/logout", follow_redirects=False)
+    assert "sso_session" not in client.cookies
+    assert session.exec(select(SSOSession)).one().revoked_at is not None
+    response = client.post("/login", data={"swufe_uid": "root", "password": "pw"}, follow_redirects=False)
+    assert response.status_code == 303
+    assert any(c.startswith("sso_session=\"\"") for c in response.headers.get_list("set-cookie"))
+    assert client.get("/profile/complete").status_code == 200
@@ -0,0 +1,29 @@
+import os
+from backend.core import templating
+from backend.core.templating import create_environment, precompile_templates
+
+def test_routers_share_one_environment():
+    from backend import main
+    from backend.routers import auth, admin, resources
+    assert auth.templates is templating.templates
+    assert admin.templates is templating.templates
+    assert resources.templates is templating.templates
+    assert main.templates is templating.templates
+
+def test_precompile_writes_bytecode_cache(tmp_path):
+    env = create_environment(cache_dir=str(tmp_path), auto_reload=False)
+    count = precompile_templates(env)
+
+    assert count == len(env.list_templates(extensions=["html"]))
+    assert count > 0
+    assert len(os.listdir(tmp_path)) == count
+
+    # A fresh environment (restarted worker) loads from the bytecode cache
+    env2 = create_environment(cache_dir=str(tmp_path), auto_reload=False)
+    assert env2.get_template("login.html") is not None
+    assert env2.auto_reload is False
+
+def test_shared_env_renders_url_for(client):
+    assert "url_for" in templating.templates.env.globals
+    response = client.get("/login")
+    assert response.status_code == 200
@@ -0,0 +1,174 @@
+import json
+import socket
+import time
+from datetime import date
+
+import pytest
+
+from backend.models import Application, Resource
+from backend.core.metrics import GATEWAY_UPSTREAM_BREAKER, GATEWAY_UPSTREAM_EWMA
+from backend.core.upstream_pool import Upstream, UpstreamPool, parse_pool, upstream_pools
+from benchmarks.stub_upstream import start_stub_upstream
+
+@pytest.fixture(name="stubs")
+def stubs_fixture():
+    servers = [start_stub_upstream() for _ in range(2)]
+    yield servers
+    for server, _ in servers:
+        server.shutdown()
+
+@pytest.fixture(name="breaker")
+def breaker_fixture(monkeypatch):
+    monkeypatch.setattr(upstream_pools, "settings",
+                        dict(error_rate=0.5, min_requests=3, window=30.0, cooldown=1.0))
+
+def _dead_url() -> str:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+def _pooled_key(client, session, user, pool):
+    res = Resource(name="LLM", category="API", auth_type="API_GATEWAY", form_schema={}, valid_until=date(2030, 1, 1),
+                   config={"upstream_pool": pool})
+    session.add(res)
+    session.commit()
+    app_obj = Application(user_id=user.id, resource_id=res.id, status="PENDING")
+    session.add(app_obj)
+    session.commit()
+    client.post(f"/admin/approve/{app_obj.id}", follow_redirects=False)
+    session.refresh(app_obj)
+    return res, {"X-API-Key": app_obj.auth_output["api_key"]}
+
+def _served_by(client, res, headers, count):
+    ports = []
+    for _ in range(count):
+        response = client.get(f"/api/v1/proxy/{res.id}/echo", headers=headers)
+        ports.append(response.json()["headers"]["host"].rsplit(":", 1)[1] if response.status_code == 200
+                     else response.status_code)
+    return ports
+
+def test_selection_weights_outstanding_and_concurrency_limits():
+    a, b = Upstream("http://a.invalid", weight=3), Upstream("http://b.invalid")
+    pool = UpstreamPool(1, "weighted", (a, b))
+    picks = [pool.acquire() for _ in range(8)]
+    # Smooth weighted round-robin interleaves instead of sending bursts
+    assert picks == [a, a, b, a, a, a, b, a]
+
+    pool = UpstreamPool(1, "least_outstanding", (a, Upstream("http://c.invalid", max_concurrency=1)))
+    first, second = pool.acquire(), pool.acquire()
+    assert {first, second} == set(pool.upstreams)
+    # c is full, so a takes everything until c is released
+    assert [pool.acquire() for _ in range(3)] == [a, a, a]
+    pool.release(second if second != a else first)
+    assert pool.acquire().url == "http://c.invalid"
+
+    limited = UpstreamPool(1, "weighted", (Upstream("http://d.invalid", max_concurrency=2),))
+    assert limited.acquire() and limited.acquire() and limited.acquire() is None
+
+def test_breaker_opens_on_errors_and_recovers_through_one_probe():
+    a, b = Upstream("http://a.invalid"), Upstream("http://b.invalid")
+    pool = UpstreamPool(7, "weighted", (a, b), error_rate=0.5, min_requests=4, window=30, cooldown=0.05)
+    for ok in (True, False, False, True):
+        pool.report(a, ok)
+    assert GATEWAY_UPSTREAM_BREAKER.value(resource=7, upstream="a.invalid") == 1
+    assert {pool.acquire() for _ in range(4)} == {b}
+
+    time.sleep(0.06)
+    probe = [pool.acquire() for _ in range(3)]
+    # Half-open: a gets exactly one request until it reports back
+    assert probe.count(a) == 1
+    pool.report(a, True, 0.01)
+    assert pool.snapshot()[0]["breaker"] == "closed"
+    assert GATEWAY_UPSTREAM_BREAKER.value(resource=7, upstream="a.invalid") == 0
+    assert a in {pool.acquire() for _ in range(4)}
+
+def test_cancelled_probe_does_not_wedge_the_breaker():
+    a = Upstream("http://a.invalid")
+    pool = UpstreamPool(8, "weighted", (a,), error_rate=0.5, min_requests=2, window=30, cooldown=0.05)
+    pool.report(a, False)
+    pool.report(a, False)
+    time.sleep(0.06)
+    assert pool.acquire() == a and pool.acquire() is None
+    # The client went away before the upstream answered: released without a report
+    pool.release(a)
+    assert pool.snapshot()[0]["breaker"] == "open" and pool.acquire() is None
+    time.sleep(0.06)
+    assert pool.acquire() == a
+    pool.report(a, True, 0.01)
+    pool.release(a)
+    assert pool.snapshot()[0] == {"upstream": "a.invalid", "outstanding": 0, "ewma_ms": 10.0, "breaker": "closed"}
+
+def test_parse_pool_rejects_bad_settings():
+    assert parse_pool("  ") is None
+    for text, message in [
+        ("[1]", "non-empty"),
+        ('{"upstreams": []}', "non-empty"),
+        ('{"balance": "random", "upstreams": [{"url": "http://a"}]}', "balance"),
+        ('{"upstreams": [{"url": "ftp://a"}]}', "http(s)"),
+        ('{"upstreams": [{"url": "http://a", "weight": 0}]}', "weight"),
+        ('{"upstreams": [{"url": "http://a", "retries": 3}]}', "unknown"),
+    ]:
+        with pytest.raises(ValueError, match=message.replace("(", r"\(").replace(")", r"\)")):
+            parse_pool(text)
+
+def test_failover_and_breaker_through_the_proxy(client, session, admin_user, admin_headers, stubs, breaker):
+    (healthy, healthy_url), (flaky, flaky_url) = stubs
+    dead = _dead_url()
+    res, headers = _pooled_key(client, session, admin_user, {"upstreams": [
+        {"url": dead}, {"url": healthy_url, "key": "sk-healthy"}, {"url": flaky_url, "key": "sk-flaky"}]})
+    healthy_port, flaky_port = healthy_url.rsplit(":", 1)[1], flaky_url.rsplit(":", 1)[1]
+
+    # Refused connections move on to the next upstream; three of them open the dead one's breaker
+    flaky.fail_status = 500
+    served = _served_by(client, res, headers, 9)
+    assert healthy_port in served and served.count(500) >= 3
+    pool = upstream_pools.get(res.id)
+    assert [s["breaker"] for s in pool.snapshot()] == ["open", "closed", "open"]
+    assert set(_served_by(client, res, headers, 4)) == {healthy_port}
+
+    # Once the last one fails often enough too: 503 from the gateway, with a hint to retry
+    healthy.fail_status = 503
+    for _ in range(30):
+        response = client.get(f"/api/v1/proxy/{res.id}/echo", headers=headers)
+        if "retry-after" in response.headers:
+            break
+    assert response.status_code == 503 and response.json()["detail"] == "No upstream available"
+    assert response.headers["retry-after"] == "1"
+
+    # After the cooldown each upstream gets a probe; the ones that answer are closed again
+    healthy.fail_status = flaky.fail_status = None
+    time.sleep(1.05)
+    _served_by(client, res, headers, 3)
+    assert [s["breaker"] for s in pool.snapshot()] == ["open", "closed", "closed"]
+    assert set(_served_by(client, res, headers, 4)) == {healthy_port, flaky_port}
+
+def test_least_outstanding_prefers_the_faster_upstream(client, session, admin_user, admin_headers, stubs):
+    (fast, fast_url), (slow, slow_url) = stubs
+    slow.delay = 0.05
+    res, headers = _pooled_key(client, session, admin_user, {"balance": "least_outstanding", "upstreams": [
+        {"url": slow_url}, {"url": fast_url}]})
+    served = _served_by(client, res, headers, 12)
+    assert served.count(slow_url.rsplit(":", 1)[1]) == 1
+
+    slow_label, fast_label = (url.split("//", 1)[1] for url in (slow_url, fast_url))
+    assert GATEWAY_UPSTREAM_EWMA.value(resource=res.id, upstream=slow_label) >= 0.05
+    assert GATEWAY_UPSTREAM_EWMA.value(resource=res.id, upstream=fast_label) < 0.05
+    assert client.get("/metrics").text.count("etrap_gateway_upstream_latency_ewma_seconds{") >= 2
+
+def test_admin_edits_upstream_pool(client, session, admin_headers):
+    res = Resource(name="LLM", category="API", auth_type="API_GATEWAY", form_schema={}, valid_until=date(2030, 1, 1),
+                   config={"upstream_url": "http://a.invalid"})
+    session.add(res)
+    session.commit()
+    form = {"name": "LLM", "category": "API", "auth_type": "API_GATEWAY", "description": "d",
+            "valid_until": "2030-01-01"}
+    assert client.post(f"/admin/resources/{res.id}", data={**form, "upstream_pool": '{"upstreams": [{}]}'},
+                       follow_redirects=False).status_code == 400
+    pool = {"balance": "least_outstanding", "upstreams": [{"url": "http://b.invalid", "max_concurrency": 5}]}
+    assert client.post(f"/admin/resources/{res.id}", data={**form, "upstream_pool": json.dumps(pool)},
+                       follow_redirects=False).status_code == 303
+    session.refresh(res)
+    assert res.config["upstream_pool"] == pool
+    client.post(f"/admin/resources/{res.id}", data={**form, "upstream_pool": ""}, follow_redirects=False)
+    session.refresh(res)
+    assert "upstream_pool" not in res.config and res.config["upstream_url"] == "http://a.invalid"
@@ -0,0 +1,72 @@
+import io
+
+from sqlmodel import select
+
+from backend.models import User, AuditLog
+from backend.auth import SSO_PASSWORD_HASH, verify_password
+from backend.core.user_import import import_users, read_rows
+
+CSV = """swufe_uid,name,email,phone,department,role,is_active,password
+20230001,张三,zs@swufe.edu.cn,13800000000,经济学院,,,
+20230002,李四,,,金融学院,,,
+,No Uid,,,,,,
+20230003,Bad Role,,,,root,,
+20230004,Local Account,la@swufe.edu.cn,,IT,admin,yes,secret123
+"""
+
+def _csv_rows(text):
+    return read_rows(io.StringIO(text), "csv")
+
+def test_import_creates_and_reports_errors(session):
+    report = import_users(session, _csv_rows(CSV), batch_size=2)
+    assert (report.processed, report.created, report.updated, report.failed) == (5, 3, 0, 2)
+    assert [(e["line"], e["error"]) for e in report.errors] == [(4, "Missing swufe_uid"), (5, "Invalid role: 'root'")]
+
+    users = {u.swufe_uid: u for u in session.exec(select(User)).all()}
+    assert users["20230001"].department == "经济学院"
+    assert users["20230002"].email == ""
+    assert users["20230002"].password_hash == SSO_PASSWORD_HASH
+    assert not verify_password("anything", users["20230002"].password_hash)
+    local = users["20230004"]
+    assert (local.role, local.is_active) == ("admin", True)
+    assert verify_password("secret123", local.password_hash)
+
+def test_reimport_updates_without_clobbering_profile(session):
+    import_users(session, _csv_rows(CSV))
+    session.expire_all()
+    user = session.exec(select(User).where(User.swufe_uid == "20230002")).one()
+    user.email, user.phone = "ls@example.com", "13900000000"
+    session.add(user)
+    session.commit()
+
+    update = "swufe_uid,name,department,is_active\n20230002,李四,统计学院,0\n20230009,新同学,统计学院,\n"
+    report = import_users(session, _csv_rows(update))
+    assert (report.created, report.updated) == (1, 1)
+
+    session.expire_all()
+    user = session.exec(select(User).where(User.swufe_uid == "20230002")).one()
+    assert (user.department, user.is_active) == ("统计学院", False)
+    # Profile fields the roster leaves empty are kept
+    assert (user.email, user.phone) == ("ls@example.com", "13900000000")
+
+def test_jsonl_and_dry_run(session):
+    text = '{"swufe_uid": "T001", "name": "Teacher", "role": "user"}\nnot json\n\n{"swufe_uid": "T002", "name": "Other"}\n'
+    report = import_users(session, read_rows(io.StringIO(text), "jsonl"), dry_run=True)
+    assert (report.created, report.failed) == (2, 1)
+    assert report.errors[0]["line"] == 2
+    assert session.exec(select(User)).all() == []
+
+def test_dry_run_reports_what_the_import_will_do(session):
+    roster = CSV + "20230001,张三,,,统计学院,,,\n20230002,李四,,,,,,\n"
+    preview = import_users(session, _csv_rows(roster), batch_size=1, dry_run=True)
+    assert session.exec(select(User)).all() == []
+    actual = import_users(session, _csv_rows(roster), batch_size=1)
+    assert (preview.created, preview.updated, preview.failed) == (actual.created, actual.updated, actual.failed) \
+        == (3, 2, 2)
+
+def test_import_endpoint(client, session, admin_user, admin_headers):
+    response = client.post("/admin/users/import", files={"file": ("roster.csv", CSV.encode("utf-8-sig"), "text/csv")})
+    assert response.status_code == 200
+    data = response.json()
+    assert (data["created"], data["failed"], data["dry_run"]) == (3, 2, False)
+    assert session.exec(select(AuditLog).where(AuditLog.action == "IMPORT_USERS")).one()
@@ -0,0 +1,70 @@
+from sqlalchemy import text
+
+from backend.models import User
+from backend.core.user_search import search_users
+
+def _add(session, uid, name, email=None):
+    user = User(swufe_uid=uid, password_hash="x", name=name, email=email or f"{uid}@swufe.edu.cn", department="CS")
+    session.add(user)
+    return user
+
+def _seed(session):
+    _add(session, "20230001", "张三丰")
+    _add(session, "20230002", "李四")
+    _add(session, "20230010", "王五", email="wangwu@example.com")
+    _add(session, "1120230001", "Zhang Wei")
+    _add(session, "T9001", "Li Ming", email="liming.20230@swufe.edu.cn")
+    session.commit()
+
+def test_uid_ranking_exact_then_prefix_then_substring(session):
+    _seed(session)
+    users, total = search_users(session, "20230001")
+    assert [u.swufe_uid for u in users] == ["20230001", "1120230001"]
+    assert total == 2
+
+    users, total = search_users(session, "20230")
+    # Prefix matches first (newest first among them), then substring matches in uid/email
+    assert [u.swufe_uid for u in users][:3] == ["20230010", "20230002", "20230001"]
+    assert {u.swufe_uid for u in users[3:]} == {"1120230001", "T9001"}
+    assert total == 5
+
+def test_fts_tracks_inserts_updates_and_deletes(session):
+    _seed(session)
+    assert [u.name for u in search_users(session, "张三丰")[0]] == ["张三丰"]
+    assert session.execute(text("SELECT count(*) FROM user_fts WHERE user_fts MATCH '\"张三丰\"'")).scalar() == 1
+
+    user = search_users(session, "张三丰")[0][0]
+    user.name = "张三丰二世"
+    session.add(user)
+    session.commit()
+    assert [u.name for u in search_users(session, "三丰二")[0]] == ["张三丰二世"]
+
+    session.delete(user)
+    session.commit()
+    assert search_users(session, "张三丰") == ([], 0)
+
+def test_short_terms_and_multi_term_search(session):
+    _seed(session)
+    # Two-character names are below the trigram minimum and use LIKE
+    assert [u.name for u in search_users(session, "李四")[0]] == ["李四"]
+    assert [u.name for u in search_users(session, "zhang wei")[0]] == ["Zhang Wei"]
+    assert search_users(session, '"zhang OR') == ([], 0)
+
+def test_pagination(session):
+    for i in range(12):
+        _add(session, f"2024{i:04d}", f"Student {i}")
+    session.commit()
+    first, total = search_users(session, "Student", page=1, page_size=5)
+    third, _ = search_users(session, "Student", page=3, page_size=5)
+    assert total == 12
+    assert len(first) == 5 and len(third) == 2
+    assert search_users(session, "Student", page=4, page_size=5) == ([], 12)
+    assert search_users(session, "", page=2, page_size=5)[1] == 12
+
+def test_admin_users_page(client, session, admin_user, admin_headers):
+    _seed(session)
+    response = client.get("/admin/users", params={"search": "20230"})
+    assert response.status_code == 200
+    assert "张三丰" in response.text
+    assert "Zhang Wei" in response.text
+    assert "page=2" in response.text